@@ -0,0 +1,240 @@
+"""End-to-end acquisition benchmark: virtual device -> serial -> decode -> LSL -> H5
+
+Run from 2_pc_datahandler with
+    python -m benchmark.acquisition_benchmark --rates 1000 4000 16000 64000 160000 --duration 5 --output bench.json
+"""
+import argparse
+import gc
+import json
+import os
+import platform
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+from datetime import datetime
+from pathlib import Path
+import numpy as np
+from eeg_api import ApiEEGDeviceController
+from src import EEGDeviceConfig, EEGDeviceMetadata, H5Handler, VirtualEEGDevice, VirtualEEGPty
+from src import register_virtual_device, unregister_virtual_device
+
+AD7779_BENCHMARK_RATES = [1000, 2000, 4000, 8000, 16000, 32000, 64000, 128000, 160000]
+
+
+class _InstrumentedH5Handler(H5Handler):
+    """H5Handler which records the host time of every commit together with the committed device timestamps"""
+    def __init__(self, *args, **kwargs) -> None:
+        super().__init__(*args, **kwargs)
+        self.commit_records = []
+        self.append_wall_sec = 0.
+
+
+    def append_data_ad7779(self, timestamps, measurements, alerts) -> None:
+        t_start = time.perf_counter()
+        super().append_data_ad7779(timestamps, measurements, alerts)
+        t_commit = time.perf_counter()
+        self.append_wall_sec += t_commit - t_start
+        self.commit_records.append((t_commit, np.asarray(timestamps, dtype=np.int64)))
+
+
+class _BenchmarkController(ApiEEGDeviceController):
+    """Controller for the stand-in device, which is configured through its URL instead of the 2-byte commands
+    (SET_SAMP_RATE cannot carry rates above 65535 SPS)"""
+    h5_writer: _InstrumentedH5Handler = None
+
+    def _configure_device(self) -> None:
+        pass
+
+
+    def _init_h5_file_writer(self) -> H5Handler:
+        self.h5_writer = _InstrumentedH5Handler(recording_name=self._recording_name, metadata=self._metadata,
+                                                eeg_device_config=self._eeg_device_config, poti_values=self._poti_config)
+        return self.h5_writer
+
+
+def _thread_cpu_time(thread: threading.Thread) -> float:
+    """CPU time of a running thread in seconds, None if the platform does not expose it"""
+    if thread is None or not thread.is_alive() or not hasattr(time, "pthread_getcpuclockid"):
+        return None
+    try:
+        return time.clock_gettime(time.pthread_getcpuclockid(thread.ident))
+    except (OSError, ProcessLookupError):
+        return None
+
+
+def _max_rss_mb() -> float:
+    """Peak resident set size of the process in MiB, None if the platform does not expose it"""
+    try:
+        import resource
+    except ImportError:
+        return None
+    max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return max_rss / 2 ** 20 if sys.platform == "darwin" else max_rss / 2 ** 10
+
+
+def summarize_latencies(latency_sec: np.ndarray) -> dict:
+    """Percentiles of the end-to-end latency in milliseconds
+
+    Args:
+        latency_sec (np.ndarray): Latencies in seconds
+
+    Returns:
+        dict: Mean, p50, p90, p99, p99.9 and max latency in ms, None values if no latency was recorded
+    """
+    keys = ["mean_ms", "p50_ms", "p90_ms", "p99_ms", "p999_ms", "max_ms"]
+    if latency_sec.size == 0:
+        return dict.fromkeys(keys)
+    values = [np.mean(latency_sec)] + list(np.percentile(latency_sec, [50, 90, 99, 99.9])) + [np.max(latency_sec)]
+    return {key: float(1e3 * value) for key, value in zip(keys, values)}
+
+
+def summarize_gaps(timestamps_us: np.ndarray, sampling_rate: float) -> dict:
+    """Count the gaps in the recorded device timestamps
+
+    Args:
+        timestamps_us (np.ndarray): Device timestamps in microseconds as written to the H5 file
+        sampling_rate (float): Sampling rate in Hz
+
+    Returns:
+        dict: Number of gaps, estimated number of lost samples and the gap rate per recorded sample
+    """
+    if timestamps_us.size < 2:
+        return {"num_gaps": 0, "lost_samples": 0, "gap_rate": 0.}
+    period_us = 1e6 / sampling_rate
+    lost = np.rint(np.diff(timestamps_us) / period_us).astype(np.int64) - 1
+    lost = lost[lost > 0]
+    return {"num_gaps": int(lost.size), "lost_samples": int(lost.sum()), "gap_rate": float(lost.size / timestamps_us.size)}
+
+
+def run_acquisition_benchmark(sampling_rate: int, duration_sec: float, workdir: Path, transport: str = "url",
+                              isolated_ingest: bool = False, tx_buffer_size: int = None) -> dict:
+    """Drive the complete acquisition path with a virtual device for a fixed duration
+
+    Args:
+        sampling_rate (int): Sampling rate of the virtual device in Hz
+        duration_sec (float): Duration of the acquisition in seconds
+        workdir (Path): Directory for the H5 recording
+        transport (str, optional): "url" for the eegsim:// port or "pty" for a pseudo terminal. Defaults to "url".
+        isolated_ingest (bool, optional): Run the serial ingest in a child process, needs the "pty" transport. Defaults to False.
+        tx_buffer_size (int, optional): Bytes the virtual device buffers for the host before frames are lost, None for the
+            default of VirtualEEGDevice. Defaults to None.
+
+    Returns:
+        dict: Benchmark results for this sampling rate
+    """
+    if isolated_ingest and transport != "pty":
+        raise ValueError("The isolated ingest opens the device in a child process and needs the pty transport")
+    device = VirtualEEGDevice(sampling_rate=sampling_rate, seed=0,
+                              **({"tx_buffer_size": tx_buffer_size} if tx_buffer_size is not None else {}))
+    device.lock_sampling_rate(sampling_rate)
+    pty = VirtualEEGPty(device).start() if transport == "pty" else None
+    device_name = f"benchmark_{sampling_rate}"
+    com_name = pty.port if pty is not None else register_virtual_device(device_name, device)
+
+    config = EEGDeviceConfig(com_name=com_name, measure_duration=int(np.ceil(duration_sec)), adc_pga_gain=1,
+                             channel_mask=[1] * 8, sdo_driver_strength=3, adc_samplingrate=sampling_rate,
+                             test_mode_enabled=False, adc_power_mode_high=True, error_header=False,
+                             reference_active_shielding=False, gain_instrument_amplifier=1)
+    metadata = EEGDeviceMetadata(waveform_generator="VirtualEEGDevice", waveform_generator_frequency=str(device.signal_frequency_hz),
+                                 waveform_generator_amplitude=str(device.signal_amplitude), waveform_type="Sine")
+    gc.collect()
+    tracemalloc.start()
+    try:
+        controller = _BenchmarkController(config=config, metadata=metadata, fast_start=True, isolated_ingest=isolated_ingest,
+                                          recording_name=str(workdir / f"benchmark_{sampling_rate}"))
+        controller.start_daq()
+        t_start = time.perf_counter()
+        cpu_start = {"serial_decode_lsl": _thread_cpu_time(controller.read_process_thread),
+                     "lsl_pull_h5": _thread_cpu_time(controller.writer_thread),
+                     "device": _thread_cpu_time(getattr(pty, "_thread", None))}
+        time.sleep(duration_sec)
+        cpu_stop = {"serial_decode_lsl": _thread_cpu_time(controller.read_process_thread),
+                    "lsl_pull_h5": _thread_cpu_time(controller.writer_thread),
+                    "device": _thread_cpu_time(getattr(pty, "_thread", None))}
+        t_measured = time.perf_counter() - t_start
+        controller.stop_daq()
+        cold_start_sec = controller.get_cold_start_time
+        _, peak_traced = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+        if pty is not None:
+            pty.stop()
+        else:
+            unregister_virtual_device(device_name)
+
+    writer = controller.h5_writer
+    frames_written = writer.get_file_length
+    commit_times = np.concatenate([np.full(ts.size, t) for t, ts in writer.commit_records]) if writer.commit_records else np.zeros(0)
+    timestamps_us = np.concatenate([ts for _, ts in writer.commit_records]) if writer.commit_records else np.zeros(0, dtype=np.int64)
+    latency_sec = commit_times - (device.boot_time + timestamps_us * 1e-6)
+    # the overflowed frames are part of frames_generated, they are generated but never reach the host
+    counters = device.counters
+    frames_lost = max(counters["frames_generated"] - frames_written, 0)
+    del controller
+    gc.collect()
+
+    return {
+        "sampling_rate": sampling_rate,
+        "duration_sec": t_measured,
+        "cold_start_sec": cold_start_sec,
+        "transport": transport,
+        "isolated_ingest": isolated_ingest,
+        "frames_generated": counters["frames_generated"],
+        "frames_written": int(frames_written),
+        "frames_lost": int(frames_lost),
+        "sustained_fps": float(frames_written / t_measured),
+        "target_fps": float(sampling_rate),
+        "drop_rate": float(frames_lost / max(counters["frames_generated"], 1)),
+        "device_overflow_frames": counters["frames_overflowed"],
+        "gaps": summarize_gaps(timestamps_us, sampling_rate),
+        "latency_device_to_h5": summarize_latencies(latency_sec),
+        "cpu_sec_per_stage": {stage: (cpu_stop[stage] - cpu_start[stage]) if cpu_start[stage] is not None and cpu_stop[stage] is not None else None
+                              for stage in cpu_start},
+        "h5_append_wall_sec": writer.append_wall_sec,
+        "memory": {"python_heap_peak_mb": peak_traced / 2 ** 20, "process_max_rss_mb": _max_rss_mb()},
+    }
+
+
+def run_benchmark_suite(sampling_rates: list, duration_sec: float, output: Path = None, transport: str = "url",
+                        isolated_ingest: bool = False) -> dict:
+    """Run the acquisition benchmark for all sampling rates and optionally store the results as JSON
+
+    Args:
+        sampling_rates (list): Sampling rates in Hz
+        duration_sec (float): Duration of each run in seconds
+        output (Path, optional): Path of the JSON file. Defaults to None.
+        transport (str, optional): "url" or "pty", see run_acquisition_benchmark. Defaults to "url".
+        isolated_ingest (bool, optional): Run the serial ingest in a child process. Defaults to False.
+
+    Returns:
+        dict: Environment information and the results of all runs
+    """
+    report = {
+        "benchmark": "acquisition_end_to_end",
+        "created_at": datetime.now().isoformat(timespec="seconds"),
+        "environment": {"python": platform.python_version(), "platform": platform.platform(),
+                        "numpy": np.__version__, "cpu_count": os.cpu_count()},
+        "results": [],
+    }
+    with tempfile.TemporaryDirectory() as workdir:
+        for rate in sampling_rates:
+            result = run_acquisition_benchmark(rate, duration_sec, Path(workdir), transport, isolated_ingest)
+            print(f"{rate:>7} SPS: {result['sustained_fps']:>10.1f} frames/s, drop rate {result['drop_rate']:.4f}, "
+                  f"p99 latency {result['latency_device_to_h5']['p99_ms']} ms")
+            report["results"].append(result)
+    if output is not None:
+        Path(output).write_text(json.dumps(report, indent=2))
+    return report
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="End-to-end acquisition throughput and latency benchmark")
+    parser.add_argument("--rates", type=int, nargs="+", default=AD7779_BENCHMARK_RATES, help="Sampling rates in Hz")
+    parser.add_argument("--duration", type=float, default=5., help="Duration of each run in seconds")
+    parser.add_argument("--transport", choices=["url", "pty"], default="url", help="Connection to the virtual device")
+    parser.add_argument("--isolated", action="store_true", help="Run the serial ingest in a child process (pty only)")
+    parser.add_argument("--output", type=Path, default=Path("bench_acquisition.json"), help="Path of the JSON report")
+    args = parser.parse_args()
+    run_benchmark_suite(args.rates, args.duration, args.output, args.transport, args.isolated)
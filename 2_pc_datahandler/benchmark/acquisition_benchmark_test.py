@@ -0,0 +1,29 @@
+import tempfile
+import unittest
+from pathlib import Path
+import numpy as np
+from benchmark.acquisition_benchmark import summarize_gaps, summarize_latencies, run_acquisition_benchmark
+
+
+class AcquisitionBenchmarkTest(unittest.TestCase):
+    def test_summarize_gaps(self):
+        timestamps_us = np.array([0, 1000, 2000, 5000, 6000, 8000])
+
+        result = summarize_gaps(timestamps_us, sampling_rate=1000)
+        self.assertEqual(result["num_gaps"], 2)
+        self.assertEqual(result["lost_samples"], 3)
+
+
+    def test_summarize_latencies(self):
+        result = summarize_latencies(np.linspace(0., 1., 1001))
+        self.assertAlmostEqual(result["p50_ms"], 500.)
+        self.assertAlmostEqual(result["max_ms"], 1000.)
+        self.assertIsNone(summarize_latencies(np.zeros(0))["p99_ms"])
+
+
+    def test_overflowed_frames_are_counted_once(self):
+        with tempfile.TemporaryDirectory() as workdir:
+            result = run_acquisition_benchmark(8000, 0.5, Path(workdir), tx_buffer_size=2 * 38)
+        self.assertGreater(result["device_overflow_frames"], 0)
+        self.assertEqual(result["frames_generated"], result["frames_written"] + result["frames_lost"])
+        self.assertGreaterEqual(result["frames_lost"], result["device_overflow_frames"])
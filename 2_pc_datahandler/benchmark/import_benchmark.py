@@ -0,0 +1,118 @@
+"""Cold import benchmark of the recorder and reader entry points
+
+Run from 2_pc_datahandler with
+    python -m benchmark.import_benchmark --repeats 5 --output bench_import.json --check
+"""
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+from datetime import datetime
+from pathlib import Path
+import numpy as np
+
+# Import statement of every entry point, the ingest worker is what a multiprocessing child of the acquisition imports,
+# cli_inspect what the inspect and analyze commands import
+ENTRY_POINTS = {
+    "package": "import src",
+    "recorder": "from eeg_api import ApiEEGDeviceController",
+    "reader": "from eeg_api import EEGDataReader",
+    "ingest_worker": "from eeg_api.ingest_worker import run_device_ingest",
+    "cli_inspect": "from eeg_api.cli import main; from src.recording_info import read_recording_info",
+}
+# Modules which only the plotting, live visualization and pandas based functions may load
+DEFERRED_MODULES = ("matplotlib", "pandas", "pyqtgraph", "PyQt5")
+# Cold import budgets in seconds for --check, with headroom for slow machines
+IMPORT_BUDGETS_SEC = {"package": 0.2, "recorder": 1.5, "reader": 1.5, "ingest_worker": 1.5, "cli_inspect": 1.}
+_PROBE = """import json, sys, time
+start = time.perf_counter()
+{statement}
+import_sec = time.perf_counter() - start
+print(json.dumps({{"import_sec": import_sec, "modules": sorted(sys.modules)}}))
+"""
+_PACKAGE_ROOT = Path(__file__).resolve().parents[1]
+
+
+def measure_cold_import(statement: str, repeats: int = 5, deferred_modules: tuple = DEFERRED_MODULES) -> dict:
+    """Time an import statement in fresh interpreters, so nothing is cached in sys.modules
+
+    Args:
+        statement (str): Import statement
+        repeats (int, optional): Number of interpreters. Defaults to 5.
+        deferred_modules (tuple, optional): Top-level modules the statement should not load. Defaults to DEFERRED_MODULES.
+
+    Returns:
+        dict: Median, minimum and maximum import time in seconds, the number of loaded modules and the deferred modules
+            which the statement loaded
+    """
+    times, modules = [], []
+    for _ in range(repeats):
+        completed = subprocess.run([sys.executable, "-c", _PROBE.format(statement=statement)], cwd=_PACKAGE_ROOT,
+                                   capture_output=True, text=True, check=True)
+        probe = json.loads(completed.stdout.strip().splitlines()[-1])
+        times.append(probe["import_sec"])
+        modules = probe["modules"]
+    loaded = sorted({name.split(".")[0] for name in modules} & set(deferred_modules))
+    return {"statement": statement, "median_sec": float(np.median(times)), "min_sec": float(np.min(times)),
+            "max_sec": float(np.max(times)), "num_modules": len(modules), "deferred_modules_loaded": loaded}
+
+
+def check_import_budgets(report: dict, budgets: dict = IMPORT_BUDGETS_SEC) -> list:
+    """Find entry points which load deferred modules or exceed their import budget
+
+    Args:
+        report (dict): Report of run_import_benchmark
+        budgets (dict, optional): Budget in seconds per entry point. Defaults to IMPORT_BUDGETS_SEC.
+
+    Returns:
+        list: Description of every violation, empty if all entry points are within budget
+    """
+    violations = []
+    for name, result in report["results"].items():
+        if result["deferred_modules_loaded"]:
+            violations.append(f"{name} loads {', '.join(result['deferred_modules_loaded'])}")
+        if name in budgets and result["median_sec"] > budgets[name]:
+            violations.append(f"{name} imports in {result['median_sec']:.3f} s, budget {budgets[name]:.3f} s")
+    return violations
+
+
+def run_import_benchmark(entry_points: dict = ENTRY_POINTS, repeats: int = 5, output: Path = None) -> dict:
+    """Measure the cold import of all entry points and optionally store the results as JSON
+
+    Args:
+        entry_points (dict, optional): Import statement per entry point. Defaults to ENTRY_POINTS.
+        repeats (int, optional): Number of interpreters per entry point. Defaults to 5.
+        output (Path, optional): Path of the JSON file. Defaults to None.
+
+    Returns:
+        dict: Environment information and the result of every entry point
+    """
+    report = {
+        "benchmark": "cold_import",
+        "created_at": datetime.now().isoformat(timespec="seconds"),
+        "environment": {"python": platform.python_version(), "platform": platform.platform(), "cpu_count": os.cpu_count()},
+        "results": {},
+    }
+    for name, statement in entry_points.items():
+        result = measure_cold_import(statement, repeats)
+        print(f"{name:>14}: {1e3 * result['median_sec']:>8.1f} ms, {result['num_modules']:>5} modules, "
+              f"deferred loaded: {', '.join(result['deferred_modules_loaded']) or '-'}")
+        report["results"][name] = result
+    if output is not None:
+        Path(output).write_text(json.dumps(report, indent=2))
+    return report
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Cold import time of the recorder and reader entry points")
+    parser.add_argument("--repeats", type=int, default=5, help="Fresh interpreters per entry point")
+    parser.add_argument("--output", type=Path, default=Path("bench_import.json"), help="Path of the JSON report")
+    parser.add_argument("--check", action="store_true", help="Exit with 1 if an entry point loads deferred modules or exceeds its budget")
+    args = parser.parse_args()
+    violations = check_import_budgets(run_import_benchmark(repeats=args.repeats, output=args.output))
+    for violation in violations:
+        print(f"Violation: {violation}")
+    if args.check and violations:
+        sys.exit(1)
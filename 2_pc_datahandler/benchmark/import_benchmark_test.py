@@ -0,0 +1,29 @@
+import unittest
+from benchmark.import_benchmark import measure_cold_import, check_import_budgets, ENTRY_POINTS
+
+
+class ImportBenchmarkTest(unittest.TestCase):
+    def test_entry_points_do_not_load_deferred_modules(self):
+        report = {"results": {name: measure_cold_import(statement, repeats=1) for name, statement in ENTRY_POINTS.items()}}
+        self.assertEqual(check_import_budgets(report, budgets={}), [])
+
+
+    def test_package_import_loads_no_dependency(self):
+        result = measure_cold_import("import src", repeats=1, deferred_modules=("h5py", "pylsl", "serial", "matplotlib"))
+        self.assertEqual(result["deferred_modules_loaded"], [])
+
+
+    def test_offline_writer_loads_no_lsl(self):
+        result = measure_cold_import("from src import H5Handler, convert_raw_capture", repeats=1, deferred_modules=("pylsl",))
+        self.assertEqual(result["deferred_modules_loaded"], [])
+
+
+
+    def test_check_import_budgets(self):
+        report = {"results": {"reader": {"median_sec": 2., "deferred_modules_loaded": ["pandas"]}}}
+        self.assertEqual(check_import_budgets(report, budgets={"reader": 1.}),
+                         ["reader loads pandas", "reader imports in 2.000 s, budget 1.000 s"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,280 @@
+"""Serial link benchmark: command round-trip latency and sustained DAQ throughput per sampling rate and channel mask
+
+Run from 2_pc_datahandler with
+    python -m benchmark.link_benchmark --com-name AUTOCOM --rates 1000 4000 16000 32000 --masks 0xFF 0x0F --output bench_link.json
+Without --com-name the virtual device (eegsim://) is measured, which only characterizes the host side of the link.
+"""
+import argparse
+import json
+import os
+import platform
+import threading
+import time
+from datetime import datetime
+from pathlib import Path
+import numpy as np
+from benchmark.acquisition_benchmark import summarize_latencies
+from src import EEGDeviceConfig, McuCommunicationHandler, SerialHandler, StreamFramer, DemuxInterface, VirtualEEGDevice
+from src import register_virtual_device, unregister_virtual_device, ADC_DATA_FRAME_DTYPE, detect_packet_gaps
+
+LINK_BENCHMARK_RATES = [1000, 2000, 4000, 8000, 16000, 32000, 64000]
+LINK_BENCHMARK_MASKS = [0xFF]
+# Commands whose round trip can be timed, each one is answered with a fixed-length response
+LATENCY_COMMANDS = {"state": lambda handler: handler.is_daq_active,
+                    "firmware": lambda handler: handler.get_firmware_version(),
+                    "runtime": lambda handler: handler.get_runtime_sec(),
+                    "echo": lambda handler: handler.echo("ok")}
+# Payload bytes per second of a USB full-speed CDC bulk endpoint, 19 packets of 64 bytes per 1 ms frame
+USB_FS_CDC_BYTES_PER_SEC = 19 * 64 * 1000
+# Fraction of the nominal frame rate a run has to deliver without lost frames to count as carried by the link
+CARRIED_FRACTION = 0.99
+# Highest sampling rate the 2-byte SET_SAMP_RATE command can carry
+MAX_COMMAND_SAMPLING_RATE = 0xFFFF
+# Bytes read from the port at once during the throughput runs
+READ_CHUNK_BYTES = 1024 * ADC_DATA_FRAME_DTYPE.itemsize
+
+
+def frame_bandwidth(sampling_rate: float) -> float:
+    """Bytes per second the DAQ frames need, the frame length does not depend on the channel mask
+
+    Args:
+        sampling_rate (float): Sampling rate in Hz
+
+    Returns:
+        float: Required downstream bandwidth in bytes per second
+    """
+    return float(sampling_rate * ADC_DATA_FRAME_DTYPE.itemsize)
+
+
+def measure_command_latency(handler: McuCommunicationHandler, num_commands: int = 1000, command: str = "state") -> dict:
+    """Time the round trips of a command, one after another like the controller sends them
+
+    Args:
+        handler (McuCommunicationHandler): Handler of the idle device, or of a running DAQ with a DemuxInterface
+        num_commands (int, optional): Number of round trips. Defaults to 1000.
+        command (str, optional): Command of LATENCY_COMMANDS. Defaults to "state".
+
+    Returns:
+        dict: Latency percentiles in ms (see summarize_latencies), number of commands, failed commands and commands per second
+    """
+    send = LATENCY_COMMANDS[command]
+    latency_sec = np.zeros(num_commands)
+    num_failed = 0
+    t_start = time.perf_counter()
+    for idx in range(num_commands):
+        t_send = time.perf_counter()
+        try:
+            send(handler)
+        except (TimeoutError, ValueError):
+            num_failed += 1
+        latency_sec[idx] = time.perf_counter() - t_send
+    t_total = time.perf_counter() - t_start
+    return {"command": command, "commands": num_commands, "failed": num_failed,
+            "commands_per_sec": float(num_commands / t_total) if t_total > 0 else None, **summarize_latencies(latency_sec)}
+
+
+def measure_daq_throughput(connection, config: EEGDeviceConfig, duration_sec: float, sampling_rate: int = None,
+                           probe_interval: float = 0.01, probe_command: str = "state") -> dict:
+    """Run the DAQ with the given settings and read the port as fast as possible for a fixed duration. The bytes are
+    only cut into frames to count them and their gaps, nothing is decoded. Meanwhile a probe thread sends commands
+    through a DemuxInterface to time their round trip under load
+
+    Args:
+        connection (serial.Serial): Open serial connection of the idle device
+        config (EEGDeviceConfig): DAQ settings of the run
+        duration_sec (float): Time in seconds the port is read after the first bytes arrived
+        sampling_rate (int, optional): Sampling rate of the device if it differs from the config, e.g. of a virtual device
+            with a locked rate above the command range. Defaults to None.
+        probe_interval (float, optional): Pause in seconds between two probe commands, 0 disables the probes. Defaults to 0.01.
+        probe_command (str, optional): Probe command of LATENCY_COMMANDS. Defaults to "state".
+
+    Returns:
+        dict: Received bytes and frames per second, frame bandwidth, delivered fraction of the nominal frame rate,
+            lost frames, framing errors and the latency of the probe commands
+    """
+    sampling_rate = sampling_rate or config.adc_samplingrate
+    handler = McuCommunicationHandler(connection, config)
+    handler.set_daq_settings()
+    framer = StreamFramer()
+    demux = DemuxInterface(device=connection, framer=framer)
+    probe_stop = threading.Event()
+    probe_latency, probe_failed = [], [0]
+
+    def probe() -> None:
+        send = LATENCY_COMMANDS[probe_command]
+        while not probe_stop.wait(probe_interval):
+            t_send = time.perf_counter()
+            try:
+                send(handler)
+            except (TimeoutError, ValueError):
+                probe_failed[0] += 1
+                continue
+            probe_latency.append(time.perf_counter() - t_send)
+
+    num_bytes = num_frames = lost_frames = 0
+    previous = (None, None)
+    handler.start_daq()
+    first = b""
+    t_wait = time.perf_counter()
+    while not first and time.perf_counter() - t_wait < 1.:
+        first = connection.read(max(connection.in_waiting, 1))
+    direct = handler.use_interface(demux)
+    probe_thread = threading.Thread(target=probe, name="LinkProbe", daemon=True) if probe_interval > 0 else None
+    if probe_thread is not None:
+        probe_thread.start()
+    t_start = time.perf_counter()
+    t_measured = None
+    data = first
+    try:
+        while True:
+            frames = framer.feed(data)
+            if t_measured is None:
+                num_bytes += len(data)
+                num_frames += frames.size
+                if frames.size:
+                    _, lost = detect_packet_gaps(frames["index"], frames["timestamp"], sampling_rate, *previous)
+                    lost_frames += int(lost.sum())
+                    previous = (int(frames["index"][-1]), int(frames["timestamp"][-1]))
+                if time.perf_counter() - t_start >= duration_sec:
+                    t_measured = time.perf_counter() - t_start
+                    probe_stop.set()
+            # the stream is fed until the last probe got its response
+            if t_measured is not None and (probe_thread is None or not probe_thread.is_alive()):
+                break
+            data = connection.read(min(max(connection.in_waiting, ADC_DATA_FRAME_DTYPE.itemsize), READ_CHUNK_BYTES))
+    finally:
+        t_measured = t_measured if t_measured is not None else time.perf_counter() - t_start
+        probe_stop.set()
+        if probe_thread is not None:
+            probe_thread.join()
+        handler.use_interface(direct)
+        handler.stop_daq()
+        time.sleep(0.05)
+        connection.reset_input_buffer()
+
+    bytes_per_sec = num_bytes / t_measured
+    frames_per_sec = num_frames / t_measured
+    delivered = frames_per_sec / sampling_rate
+    return {
+        "sampling_rate": sampling_rate,
+        "channel_mask": int(sum(bit << ch for ch, bit in enumerate(config.channel_mask))),
+        "active_channels": int(sum(config.channel_mask)),
+        "duration_sec": t_measured,
+        "bytes_per_sec": float(bytes_per_sec),
+        "frames_per_sec": float(frames_per_sec),
+        "frame_bandwidth_bytes_per_sec": frame_bandwidth(sampling_rate),
+        "delivered_fraction": float(delivered),
+        "lost_frames": lost_frames,
+        "discarded_bytes": framer.discarded_bytes,
+        "resyncs": framer.resync_count,
+        "carried": bool(delivered >= CARRIED_FRACTION and lost_frames == 0),
+        "probe_latency": {"command": probe_command, "commands": len(probe_latency) + probe_failed[0], "failed": probe_failed[0],
+                          **summarize_latencies(np.asarray(probe_latency))},
+    }
+
+
+def summarize_link(results: list, link_capacity: float = USB_FS_CDC_BYTES_PER_SEC) -> dict:
+    """Estimate the capacity of the link and the headroom of every run. If a run was not carried, the link saturated
+    and its throughput is the measured capacity, otherwise the nominal capacity is used
+
+    Args:
+        results (list): Results of measure_daq_throughput
+        link_capacity (float, optional): Nominal capacity of the link in bytes per second. Defaults to USB_FS_CDC_BYTES_PER_SEC.
+
+    Returns:
+        dict: Capacity in bytes per second, if it was measured, the highest carried sampling rate and per run the headroom
+            as fraction of its frame bandwidth (capacity / frame bandwidth - 1, negative if the link cannot carry it)
+    """
+    saturated = [result["bytes_per_sec"] for result in results if not result["carried"]]
+    capacity = max(saturated) if saturated else link_capacity
+    for result in results:
+        result["headroom"] = float(capacity / result["frame_bandwidth_bytes_per_sec"] - 1)
+    carried = [result["sampling_rate"] for result in results if result["carried"]]
+    return {"capacity_bytes_per_sec": float(capacity), "capacity_measured": bool(saturated),
+            "max_carried_sampling_rate": max(carried) if carried else None}
+
+
+def run_link_benchmark(com_name: str = None, sampling_rates: list = None, channel_masks: list = None, duration_sec: float = 5.,
+                       num_commands: int = 1000, command: str = "state", link_capacity: float = USB_FS_CDC_BYTES_PER_SEC,
+                       output: Path = None) -> dict:
+    """Measure the command latency of the idle device and the throughput of every combination of sampling rate and
+    channel mask, and optionally store the results as JSON
+
+    Args:
+        com_name (str, optional): Port of the device, None measures a virtual device. Defaults to None.
+        sampling_rates (list, optional): Sampling rates in Hz. Defaults to LINK_BENCHMARK_RATES.
+        channel_masks (list, optional): Channel masks as bitmask. Defaults to LINK_BENCHMARK_MASKS.
+        duration_sec (float, optional): Duration of each throughput run in seconds. Defaults to 5.
+        num_commands (int, optional): Number of timed round trips of the idle device. Defaults to 1000.
+        command (str, optional): Timed command of LATENCY_COMMANDS. Defaults to "state".
+        link_capacity (float, optional): Nominal link capacity in bytes per second. Defaults to USB_FS_CDC_BYTES_PER_SEC.
+        output (Path, optional): Path of the JSON file. Defaults to None.
+
+    Returns:
+        dict: Environment information, idle command latency, throughput results and link summary
+    """
+    sampling_rates = sampling_rates or LINK_BENCHMARK_RATES
+    channel_masks = channel_masks or LINK_BENCHMARK_MASKS
+    device = VirtualEEGDevice(seed=0) if com_name is None else None
+    device_name = "link_benchmark"
+    port = register_virtual_device(device_name, device) if device is not None else com_name
+    report = {
+        "benchmark": "serial_link",
+        "created_at": datetime.now().isoformat(timespec="seconds"),
+        "environment": {"python": platform.python_version(), "platform": platform.platform(),
+                        "numpy": np.__version__, "cpu_count": os.cpu_count(), "port": port, "virtual_device": device is not None},
+        "results": [],
+    }
+    try:
+        connection = SerialHandler(com_name=port, baudrate=115200, time_out=1, fast_start=True).get_serial_connection
+        idle_handler = McuCommunicationHandler(connection, _link_config(port, sampling_rates[0], channel_masks[0]))
+        idle_handler.wait_until_ready()
+        report["command_latency"] = measure_command_latency(idle_handler, num_commands, command)
+        print(f"{command}: {report['command_latency']['commands_per_sec']:.0f} commands/s, "
+              f"p50 {report['command_latency']['p50_ms']:.3f} ms, p99 {report['command_latency']['p99_ms']:.3f} ms")
+        for rate in sampling_rates:
+            if rate > MAX_COMMAND_SAMPLING_RATE and device is None:
+                print(f"{rate:>7} SPS: skipped, SET_SAMP_RATE carries at most {MAX_COMMAND_SAMPLING_RATE} SPS")
+                continue
+            if device is not None:
+                device.lock_sampling_rate(rate)
+            for mask in channel_masks:
+                config = _link_config(port, min(rate, MAX_COMMAND_SAMPLING_RATE), mask)
+                result = measure_daq_throughput(connection, config, duration_sec, sampling_rate=rate, probe_command=command)
+                print(f"{rate:>7} SPS mask 0x{mask:02X}: {result['bytes_per_sec'] / 1e3:>9.1f} kB/s, "
+                      f"delivered {result['delivered_fraction']:.3f}, lost {result['lost_frames']}, "
+                      f"probe p99 {result['probe_latency']['p99_ms']} ms")
+                report["results"].append(result)
+        connection.close()
+    finally:
+        if device is not None:
+            unregister_virtual_device(device_name)
+    report["link"] = summarize_link(report["results"], link_capacity)
+    if output is not None:
+        Path(output).write_text(json.dumps(report, indent=2))
+    return report
+
+
+def _link_config(com_name: str, sampling_rate: int, channel_mask: int) -> EEGDeviceConfig:
+    """DAQ settings of a benchmark run"""
+    return EEGDeviceConfig(com_name=com_name, measure_duration=1, adc_pga_gain=1,
+                           channel_mask=[(channel_mask >> ch) & 1 for ch in range(8)], sdo_driver_strength=3,
+                           adc_samplingrate=sampling_rate, test_mode_enabled=False, adc_power_mode_high=True,
+                           error_header=False, reference_active_shielding=False, gain_instrument_amplifier=1)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Command round-trip latency and DAQ throughput of the serial link")
+    parser.add_argument("--com-name", default=None, help="Port of the device or AUTOCOM, default a virtual device")
+    parser.add_argument("--rates", type=int, nargs="+", default=LINK_BENCHMARK_RATES, help="Sampling rates in Hz")
+    parser.add_argument("--masks", type=lambda value: int(value, 0), nargs="+", default=LINK_BENCHMARK_MASKS,
+                        help="Channel masks, e.g. 0xFF 0x0F")
+    parser.add_argument("--duration", type=float, default=5., help="Duration of each throughput run in seconds")
+    parser.add_argument("--commands", type=int, default=1000, help="Number of timed round trips of the idle device")
+    parser.add_argument("--command", choices=sorted(LATENCY_COMMANDS), default="state", help="Timed command")
+    parser.add_argument("--link-capacity", type=float, default=USB_FS_CDC_BYTES_PER_SEC,
+                        help="Nominal link capacity in bytes per second, used if no run saturates the link")
+    parser.add_argument("--output", type=Path, default=Path("bench_link.json"), help="Path of the JSON report")
+    args = parser.parse_args()
+    run_link_benchmark(args.com_name, args.rates, args.masks, args.duration, args.commands, args.command,
+                       args.link_capacity, args.output)
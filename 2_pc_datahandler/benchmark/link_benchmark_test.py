@@ -0,0 +1,35 @@
+import unittest
+from benchmark.link_benchmark import run_link_benchmark, summarize_link, frame_bandwidth
+
+
+class LinkBenchmarkTest(unittest.TestCase):
+    def test_virtual_link_carries_rates_and_answers_probes(self):
+        report = run_link_benchmark(sampling_rates=[1000, 8000], channel_masks=[0xFF, 0x0F], duration_sec=0.3, num_commands=200)
+        self.assertEqual(report["command_latency"]["commands"], 200)
+        self.assertEqual(report["command_latency"]["failed"], 0)
+        self.assertEqual([(result["sampling_rate"], result["active_channels"]) for result in report["results"]],
+                         [(1000, 8), (1000, 4), (8000, 8), (8000, 4)])
+        for result in report["results"]:
+            self.assertTrue(result["carried"])
+            self.assertEqual(result["lost_frames"], 0)
+            self.assertEqual(result["discarded_bytes"], 0)
+            self.assertAlmostEqual(result["bytes_per_sec"] / result["frame_bandwidth_bytes_per_sec"], 1., delta=0.1)
+            self.assertGreater(result["probe_latency"]["commands"], 0)
+            self.assertEqual(result["probe_latency"]["failed"], 0)
+        self.assertEqual(report["link"]["max_carried_sampling_rate"], 8000)
+
+
+    def test_summarize_link_uses_saturated_throughput_as_capacity(self):
+        results = [{"sampling_rate": 16000, "carried": True, "bytes_per_sec": frame_bandwidth(16000),
+                    "frame_bandwidth_bytes_per_sec": frame_bandwidth(16000)},
+                   {"sampling_rate": 64000, "carried": False, "bytes_per_sec": frame_bandwidth(32000),
+                    "frame_bandwidth_bytes_per_sec": frame_bandwidth(64000)}]
+        link = summarize_link(results, link_capacity=1e9)
+        self.assertEqual(link, {"capacity_bytes_per_sec": frame_bandwidth(32000), "capacity_measured": True,
+                                "max_carried_sampling_rate": 16000})
+        self.assertAlmostEqual(results[0]["headroom"], 1.)
+        self.assertAlmostEqual(results[1]["headroom"], -0.5)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,2 +1,24 @@
-from .reader import EEGDataReader
-from .eeghw_control import ApiEEGDeviceController
\ No newline at end of file
+import importlib
+
+# Exported names by submodule, imported on first use (PEP 562) so a recorder does not load the reader and vice versa
+_EXPORTS = {
+    ".reader": ["EEGDataReader"],
+    ".eeghw_control": ["ApiEEGDeviceController"],
+    ".multi_device_control": ["ApiMultiEEGDeviceController"],
+}
+_EXPORT_MODULES = {name: module for module, names in _EXPORTS.items() for name in names}
+__all__ = list(_EXPORT_MODULES)
+
+
+def __getattr__(name: str):
+    """Import the submodule of an exported name on first access and keep the name in the package namespace"""
+    module = _EXPORT_MODULES.get(name)
+    if module is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(module, __name__), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__() -> list:
+    return sorted(set(globals()) | set(__all__))
@@ -0,0 +1,245 @@
+"""Headless command line interface for recording, converting, inspecting and analyzing recordings
+
+Every command imports only the modules it needs inside of its handler, so inspect and analyze load neither pylsl nor
+pyserial and no command loads the plotting or live visualization dependencies. Installed as the console scripts
+eeghw (with the commands as subcommands) and eeghw-record, eeghw-convert, eeghw-inspect and eeghw-analyze, or run with
+    python -m eeg_api.cli <command> --help
+"""
+import argparse
+import json
+import signal
+import sys
+import threading
+from pathlib import Path
+
+# Suffix of the H5 files written by the controllers and by convert_raw_capture
+RECORDING_SUFFIX = "_data.h5"
+# Suffix of the raw captures written with raw_capture=True
+RAW_CAPTURE_SUFFIX = "_frames.raw"
+# Sections of a record config file, besides the optional keys output_dir and name
+RECORD_CONFIG_SECTIONS = ("device", "metadata", "controller")
+
+
+# ========== API METHODS ==========
+def load_record_config(path: Path) -> dict:
+    """Load the config file of the record command, a JSON or TOML (.toml) file with the sections device (the fields of
+    EEGDeviceConfig), metadata (the fields of EEGDeviceMetadata) and the optional section controller (keyword arguments
+    of ApiEEGDeviceController, or of ApiMultiEEGDeviceController if it holds com_names) and the optional keys output_dir
+    and name for the path of the recording
+
+    Args:
+        path (Path): Path of the config file
+
+    Raises:
+        ValueError: If the section device or metadata is missing or the file has unknown sections
+
+    Returns:
+        dict: Content of the config file
+    """
+    path = Path(path)
+    if path.suffix == ".toml":
+        import tomllib
+        with open(path, "rb") as file:
+            config = tomllib.load(file)
+    else:
+        with open(path) as file:
+            config = json.load(file)
+    missing = [section for section in RECORD_CONFIG_SECTIONS[:2] if section not in config]
+    unknown = sorted(set(config) - set(RECORD_CONFIG_SECTIONS) - {"output_dir", "name"})
+    if missing or unknown:
+        raise ValueError(f"Invalid config {path}, missing sections: {missing}, unknown keys: {unknown}")
+    return config
+
+
+def main(argv: list = None) -> int:
+    """Run a command of the command line interface
+
+    Args:
+        argv (list, optional): Command and its arguments, None uses sys.argv. Defaults to None.
+
+    Returns:
+        int: Exit code, 0 on success
+    """
+    args = _init_parser().parse_args(argv)
+    return args.handler(args)
+
+
+def record_main(argv: list = None) -> int:
+    """Console script eeghw-record, see main"""
+    return main(["record", *(sys.argv[1:] if argv is None else argv)])
+
+
+def convert_main(argv: list = None) -> int:
+    """Console script eeghw-convert, see main"""
+    return main(["convert", *(sys.argv[1:] if argv is None else argv)])
+
+
+def inspect_main(argv: list = None) -> int:
+    """Console script eeghw-inspect, see main"""
+    return main(["inspect", *(sys.argv[1:] if argv is None else argv)])
+
+
+def analyze_main(argv: list = None) -> int:
+    """Console script eeghw-analyze, see main"""
+    return main(["analyze", *(sys.argv[1:] if argv is None else argv)])
+
+
+#  ========== INTERNAL METHODS ==========
+def _init_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(prog="eeghw", description="Record, convert, inspect and analyze EEG recordings without GUI")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    record = commands.add_parser("record", help="Record from a config file without live plotter")
+    record.add_argument("config", type=Path, help="JSON or TOML file with the sections device, metadata and controller")
+    record.add_argument("--duration", type=float, default=None, help="Recording time in seconds, overrides measure_duration of the config")
+    record.add_argument("--output-dir", type=Path, default=None, help="Directory of the recording, overrides output_dir of the config")
+    record.add_argument("--name", default=None, help="Recording name, overrides name of the config, default Measurement_hardware_eeg<date>_<time>")
+    record.set_defaults(handler=_run_record)
+
+    convert = commands.add_parser("convert", help="Convert a raw capture into a H5 recording or a H5 recording into BDF")
+    convert.add_argument("input", type=Path, help=f"Raw capture (*{RAW_CAPTURE_SUFFIX}) or H5 recording (*.h5)")
+    convert.add_argument("--to", choices=("h5", "bdf"), default=None, help="Output format, default h5 for raw captures and bdf for H5 recordings")
+    convert.add_argument("-o", "--output", type=Path, default=None, help=f"Output file, H5 files must end with {RECORDING_SUFFIX}")
+    convert.add_argument("--workers", type=int, default=None, help="Decoding processes of raw captures, default all cores")
+    convert.set_defaults(handler=_run_convert)
+
+    inspect = commands.add_parser("inspect", help="Print metadata, gaps and alerts of recordings without reading the samples")
+    inspect.add_argument("files", type=Path, nargs="+", help="H5 recordings")
+    inspect.add_argument("--json", action="store_true", help="Print one JSON object per recording")
+    inspect.set_defaults(handler=_run_inspect)
+
+    analyze = commands.add_parser("analyze", help="Compute the channel statistics of all recordings of a directory")
+    analyze.add_argument("directory", type=Path, help="Directory with H5 recordings")
+    analyze.add_argument("--pattern", default=f"*{RECORDING_SUFFIX}", help=f"Glob pattern of the recordings, default *{RECORDING_SUFFIX}")
+    analyze.add_argument("--recursive", action="store_true", help="Search the subdirectories as well")
+    analyze.add_argument("-o", "--output", type=Path, default=None, help="Report file, .json or .csv with one row per recording and channel")
+    analyze.set_defaults(handler=_run_analyze)
+    return parser
+
+
+def _run_record(args: argparse.Namespace) -> int:
+    from datetime import datetime
+    from dataclasses import asdict
+    from src.data_structures import EEGDeviceConfig, EEGDeviceMetadata
+
+    config = load_record_config(args.config)
+    device_config = EEGDeviceConfig(**config["device"])
+    if args.duration is not None:
+        device_config.measure_duration = args.duration
+    metadata = EEGDeviceMetadata(**config["metadata"])
+    controller_kwargs = dict(config.get("controller", {}))
+    output_dir = args.output_dir if args.output_dir is not None else Path(config.get("output_dir", "."))
+    output_dir.mkdir(parents=True, exist_ok=True)
+    name = args.name or config.get("name") or datetime.now().strftime("Measurement_hardware_eeg%Y%m%d_%H%M%S")
+    recording_name = str(output_dir / name)
+    if "com_names" in controller_kwargs:
+        from eeg_api.multi_device_control import ApiMultiEEGDeviceController as Controller
+    else:
+        from eeg_api.eeghw_control import ApiEEGDeviceController as Controller
+
+    controller = Controller(config=device_config, metadata=metadata, recording_name=recording_name, **controller_kwargs)
+    stop_event = threading.Event()  # set by SIGTERM, e.g. from a scheduler, so the files are closed properly
+    previous_handler = signal.signal(signal.SIGTERM, lambda *_: stop_event.set())
+    controller.start_daq()
+    print(f"Recording {recording_name} for {device_config.measure_duration} s", flush=True)
+    try:
+        stop_event.wait(device_config.measure_duration)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        controller.stop_daq()
+        signal.signal(signal.SIGTERM, previous_handler)
+    print(json.dumps(asdict(controller.get_stats()), default=str))
+    return 0
+
+
+def _run_convert(args: argparse.Namespace) -> int:
+    raw_input = args.input.name.endswith(".raw")
+    target = args.to if args.to is not None else ("h5" if raw_input else "bdf")
+    if not raw_input and target == "h5":
+        print(f"{args.input} is already a H5 recording", file=sys.stderr)
+        return 2
+    if target == "h5" and args.output is not None and not args.output.name.endswith(RECORDING_SUFFIX):
+        print(f"H5 output {args.output} must end with {RECORDING_SUFFIX}", file=sys.stderr)
+        return 2
+
+    path = args.input
+    if raw_input:
+        from src.raw_capture import convert_raw_capture
+        recording_name = str(args.output)[:-len(RECORDING_SUFFIX)] if target == "h5" and args.output is not None else None
+        path = convert_raw_capture(path, recording_name=recording_name, num_workers=args.workers)
+    if target == "bdf":
+        from src.bdf_export import export_bdf
+        path = export_bdf(path, output_path=args.output)
+    print(path)
+    return 0
+
+
+def _run_inspect(args: argparse.Namespace) -> int:
+    from src.recording_info import read_recording_info
+
+    exit_code = 0
+    for path in args.files:
+        try:
+            info = read_recording_info(path)
+        except (OSError, KeyError) as error:
+            print(f"{path}: {error}", file=sys.stderr)
+            exit_code = 1
+            continue
+        print(json.dumps(info) if args.json else _format_recording_info(info))
+    return exit_code
+
+
+def _run_analyze(args: argparse.Namespace) -> int:
+    from src.recording_info import analyze_recording
+
+    files = sorted(args.directory.rglob(args.pattern) if args.recursive else args.directory.glob(args.pattern))
+    reports, exit_code = [], 0
+    for path in files:
+        try:
+            report = analyze_recording(path)
+        except (OSError, KeyError) as error:
+            print(f"{path}: {error}", file=sys.stderr)
+            exit_code = 1
+            continue
+        reports.append(report)
+        saturated = [channel["channel"] for channel in report["channels"] if channel["near_rail"]]
+        print(f"{path}: {report['duration_sec']:.1f} s, {report['num_gaps']} gaps ({report['lost_samples']} samples lost), "
+              f"{sum(channel['alerts'] for channel in report['channels'])} alerts, saturated channels: {saturated or '-'}")
+    if args.output is not None:
+        _write_analysis_report(args.output, reports)
+    print(f"Analyzed {len(reports)} of {len(files)} recordings")
+    return exit_code
+
+
+def _format_recording_info(info: dict) -> str:
+    alerts = " ".join(str(count) for count in info["alert_counts"]) if info["alert_counts"] is not None else "n/a (no block statistics)"
+    lines = [info["path"],
+             f"  created_at      {info['file_attrs'].get('created_at', '-')}",
+             f"  samples         {info['num_samples']} ({info['num_channels']} channels, {info['sampling_rate']:g} Hz, {info['duration_sec']:.3f} s)",
+             f"  gaps            {info['num_gaps']} ({info['lost_samples']} samples lost)",
+             f"  device gaps     {info['num_device_gaps']}",
+             f"  alerts          {alerts}",
+             f"  summary levels  {', '.join(map(str, info['summary_levels'])) or '-'}",
+             f"  streams         {', '.join(f'{name} ({count} samples)' for name, count in info['streams'].items()) or '-'}"]
+    lines += ["  attributes"] + [f"    {key:<28} {value}" for key, value in info["attrs"].items()]
+    return "\n".join(lines)
+
+
+def _write_analysis_report(path: Path, reports: list) -> None:
+    if path.suffix == ".json":
+        path.write_text(json.dumps(reports, indent=2))
+        return
+    import csv
+    columns = ("path", "duration_sec", "num_samples", "num_gaps", "lost_samples", "num_device_gaps")
+    channel_columns = ("channel", "mean", "std", "min", "max", "near_rail", "alerts")
+    with open(path, "w", newline="") as file:
+        writer = csv.writer(file)
+        writer.writerow(columns + channel_columns)
+        for report in reports:
+            for channel in report["channels"]:
+                writer.writerow([report[column] for column in columns] + [channel[column] for column in channel_columns])
+
+
+if __name__ == "__main__":
+    sys.exit(main())
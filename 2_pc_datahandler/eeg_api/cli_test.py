@@ -0,0 +1,107 @@
+import csv
+import io
+import json
+import tempfile
+import unittest
+from contextlib import redirect_stdout
+from pathlib import Path
+import numpy as np
+from eeg_api.cli import main, load_record_config
+from benchmark.import_benchmark import measure_cold_import
+from src import H5Handler, EEGDeviceConfig, EEGDeviceMetadata, PotiConfig
+
+
+class CliTest(unittest.TestCase):
+    def setUp(self):
+        self._tmpdir = tempfile.TemporaryDirectory()
+        self._dir = Path(self._tmpdir.name)
+        self._device = {"com_name": "eegsim://?seed=0", "measure_duration": 1, "adc_pga_gain": 1, "channel_mask": [1] * 8,
+                        "sdo_driver_strength": 3, "adc_samplingrate": 4000, "test_mode_enabled": False, "adc_power_mode_high": True,
+                        "error_header": False, "reference_active_shielding": False, "gain_instrument_amplifier": 1}
+        self._metadata = {"waveform_generator": "VirtualEEGDevice", "waveform_generator_frequency": "10",
+                          "waveform_generator_amplitude": "1", "waveform_type": "Sine"}
+
+    def tearDown(self):
+        self._tmpdir.cleanup()
+
+    def _run(self, *argv) -> tuple[int, str]:
+        output = io.StringIO()
+        with redirect_stdout(output):
+            exit_code = main([str(arg) for arg in argv])
+        return exit_code, output.getvalue()
+
+    def _write_recording(self, name: str, stats_block_sec: float) -> tuple[np.ndarray, np.ndarray]:
+        config = EEGDeviceConfig(**{**self._device, "adc_samplingrate": 100})
+        writer = H5Handler(recording_name=str(self._dir / name), metadata=EEGDeviceMetadata(**self._metadata), eeg_device_config=config,
+                           poti_values=PotiConfig(gain=1, calculated_resistor_value=0, poti_value=0, actual_resistor_value=0, actual_gain_value=1),
+                           stats_block_sec=stats_block_sec)
+        rng = np.random.default_rng(0)
+        measurements = rng.integers(-1000, 1000, size=(250, 8), dtype=np.int32)
+        measurements[10, 3] = 2 ** 23 - 1
+        alerts = np.zeros((250, 8), dtype=np.int8)
+        alerts[[5, 6, 7], 1] = 1
+        writer.append_data_ad7779(timestamps=np.arange(250) * 10000, measurements=measurements, alerts=alerts)
+        writer.append_gaps_ad7779([100], [4])
+        writer.close_h5_file()
+        return measurements, alerts
+
+    def test_inspect_reads_gaps_and_alerts(self):
+        self._write_recording("stats", stats_block_sec=1.)
+        self._write_recording("plain", stats_block_sec=0)
+        exit_code, output = self._run("inspect", self._dir / "stats_data.h5", self._dir / "plain_data.h5", "--json")
+        self.assertEqual(exit_code, 0)
+        with_stats, without_stats = [json.loads(line) for line in output.splitlines()]
+        self.assertEqual(with_stats["num_samples"], 250)
+        self.assertAlmostEqual(with_stats["duration_sec"], 2.49)
+        self.assertEqual((with_stats["num_gaps"], with_stats["lost_samples"]), (1, 4))
+        self.assertEqual(with_stats["alert_counts"], [0, 3, 0, 0, 0, 0, 0, 0])
+        self.assertEqual(with_stats["attrs"]["channel_mask"], [1] * 8)
+        self.assertIsNone(without_stats["alert_counts"])
+        self.assertEqual(self._run("inspect", self._dir / "missing_data.h5")[0], 1)
+
+    def test_analyze_directory(self):
+        measurements, _ = self._write_recording("stats", stats_block_sec=1.)
+        self._write_recording("plain", stats_block_sec=0)
+        exit_code, output = self._run("analyze", self._dir, "--output", self._dir / "report.csv")
+        self.assertEqual(exit_code, 0)
+        self.assertIn("Analyzed 2 of 2 recordings", output)
+        with open(self._dir / "report.csv") as file:
+            rows = list(csv.DictReader(file))
+        self.assertEqual(len(rows), 16)
+        for rows_of_file in (rows[:8], rows[8:]):
+            np.testing.assert_allclose([float(row["mean"]) for row in rows_of_file], measurements.mean(axis=0))
+            np.testing.assert_allclose([float(row["std"]) for row in rows_of_file], measurements.std(axis=0))
+            self.assertEqual([int(row["max"]) for row in rows_of_file], measurements.max(axis=0).tolist())
+            self.assertEqual([int(row["near_rail"]) for row in rows_of_file], [0, 0, 0, 1, 0, 0, 0, 0])
+            self.assertEqual([int(row["alerts"]) for row in rows_of_file], [0, 3, 0, 0, 0, 0, 0, 0])
+
+    def test_record_and_convert_raw_capture(self):
+        config_path = self._dir / "record.json"
+        config_path.write_text(json.dumps({"device": self._device, "metadata": self._metadata, "output_dir": str(self._dir),
+                                           "controller": {"fast_start": True, "raw_capture": True}}))
+        exit_code, output = self._run("record", config_path, "--duration", 0.5, "--name", "cli")
+        self.assertEqual(exit_code, 0)
+        frames_written = json.loads(output.splitlines()[-1])["frames_written"]
+        self.assertGreater(frames_written, 1000)
+
+        exit_code, output = self._run("convert", self._dir / "cli_frames.raw", "--workers", 1, "-o", self._dir / "converted_data.h5")
+        self.assertEqual(exit_code, 0)
+        self.assertEqual(output.strip(), str(self._dir / "converted_data.h5"))
+        info = json.loads(self._run("inspect", self._dir / "converted_data.h5", "--json")[1])
+        self.assertEqual(info["num_samples"], frames_written)
+        self.assertEqual(info["attrs"]["waveform_generator"], "VirtualEEGDevice")
+
+    def test_load_record_config_rejects_unknown_sections(self):
+        config_path = self._dir / "record.toml"
+        config_path.write_text('name = "x"\n[device]\ncom_name = "AUTOCOM"\n[plotter]\nchannel = 0\n')
+        with self.assertRaises(ValueError):
+            load_record_config(config_path)
+
+    def test_inspect_loads_no_acquisition_dependency(self):
+        result = measure_cold_import("from eeg_api.cli import main; from src.recording_info import read_recording_info", repeats=1,
+                                     deferred_modules=("pylsl", "serial", "matplotlib", "pandas", "pyqtgraph", "PyQt5"))
+        self.assertEqual(result["deferred_modules_loaded"], [])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,13 +1,40 @@
-from src import SerialHandler, LSLHandler, H5Handler, McuCommunicationHandler, LivePlotter, LivePlotterChannelConfig, PotiConfig, generate_poti_config, start_live_plotter, extract_channel_data, extract_error_flags, calculate_requierd_resistor_value_for_amplification, calculate_poti_value, calculate_gain
-from src import EEGDeviceConfig, EEGDeviceMetadata, ErrorRegisterData
+from src import SerialHandler, LSLHandler, H5Handler, McuCommunicationHandler, PotiConfig, generate_poti_config, calculate_requierd_resistor_value_for_amplification, calculate_poti_value, calculate_gain
+from src import decode_channel_values, decode_alert_flags, detect_packet_gaps, StreamFramer, ClockAligner
+from src import EEGDeviceConfig, EEGDeviceMetadata, ErrorRegisterData, ADC_DATA_FRAME_DTYPE
+from src import AcquisitionStats, AcquisitionStatsSnapshot, PrometheusExporter, BoundedSampleBuffer, RawCaptureWriter, ChannelQualityMonitor, LSLStreamRecorder
+from src import pull_chunk_into, StageProfiler, NULL_PROFILER, DemuxInterface
+from src.mcu_communication_interface import InterfaceSerialUSB
 import serial, threading, queue, time
 from datetime import datetime
-from pylsl import StreamOutlet, resolve_byprop, StreamInlet, proc_threadsafe
+from pylsl import StreamOutlet, resolve_byprop, StreamInlet, proc_threadsafe, local_clock
 import multiprocessing
 import numpy as np
+from typing import TYPE_CHECKING
+if TYPE_CHECKING:
+    from src import LivePlotterChannelConfig
 
 #Define packet length
 PACKET_LENGTH = 38
+# Maximum number of frames read and decoded in one batch
+MAX_FRAMES_PER_BATCH = 1024
+# Columns of a decoded sample: 8 channel values, 8 alert flags and the timestamp
+SAMPLE_COLUMNS = 17
+# Samples buffered between an isolated ingest process and the controller, in seconds of acquisition
+ISOLATED_INGEST_BUFFER_SEC = 10
+# Timeout of a single LSL resolve attempt of the H5 writer in seconds
+LSL_RESOLVE_INTERVAL = 0.1
+# Timeout of a single pull from the LSL inlet of the H5 writer in seconds
+LSL_PULL_TIMEOUT = 0.01
+# Rows of the arrays the drain thread pulls the LSL chunks into, a new one is started when one is used up
+DRAIN_SLAB_ROWS = 16 * MAX_FRAMES_PER_BATCH
+# Margin of the preallocated raw capture file over the configured measurement duration
+RAW_CAPTURE_MARGIN = 1.1
+# Suffix of the name of the LSL outlet with the channel quality
+QUALITY_STREAM_SUFFIX = "_Quality"
+# Time in seconds a profiled live plotter gets to write its trace before it is terminated
+PLOTTER_STOP_TIMEOUT = 2.
+# Longest sleep of the error register poll thread in seconds, so it ends soon after DAQ is stopped
+ERROR_REGISTER_POLL_STEP = 0.05
 
 # Define Characteristics of the different data frames
 characteristics_dataframes = {"adc_data_24": 0x00,
@@ -21,7 +48,10 @@ class ApiEEGDeviceController:
     _metadata: EEGDeviceMetadata
 
     _packet_length: int
-    _expected_packet_number: int
+    _last_frame: tuple
+    _gap_queue: queue.Queue
+    _framer: StreamFramer
+    _clock: ClockAligner
     _start_time: time
     _stop_time: time
 
@@ -33,28 +63,126 @@ class ApiEEGDeviceController:
     _deployed_data_frames: list
     _deployed_serial_connection: serial.Serial
     _deployed_daq_outlet: StreamOutlet
+    _stream_name: str
     deployed_mcu_communication_handler: McuCommunicationHandler
-    _config_live_plotter: list[LivePlotterChannelConfig]
+    _config_live_plotter: "list[LivePlotterChannelConfig]"
 
-    def __init__(self, config: EEGDeviceConfig, metadata: EEGDeviceMetadata, config_live_plotter: list[LivePlotterChannelConfig]=None) -> None:
+    _stats: AcquisitionStats
+    _metrics_port: int
+    _metrics_exporter: PrometheusExporter
+
+    _writer_policy: str
+    _writer_buffer_sec: float
+    _spill_dir: str
+
+    _raw_capture: bool
+    _capture_writer: RawCaptureWriter
+
+    _quality_monitor: ChannelQualityMonitor
+    _deployed_quality_outlet: StreamOutlet
+
+    _record_streams: list
+
+    _profiler: StageProfiler
+    _plotter_stop: object
+
+    _direct_interface: InterfaceSerialUSB
+    _command_interface: DemuxInterface
+    _error_register_interval: float
+    _error_register_queue: queue.Queue
+
+    _fast_start: bool
+    _isolated_ingest: bool
+    _ingest: object
+    _startup_timeout: float
+    _init_time: float
+    _cold_start_sec: float
+
+    def __init__(self, config: EEGDeviceConfig, metadata: EEGDeviceMetadata, config_live_plotter: "list[LivePlotterChannelConfig]"=None, metrics_port: int=None,
+                 fast_start: bool=False, startup_timeout: float=10., stream_name: str="DAQ_Stream", isolated_ingest: bool=False,
+                 writer_policy: str="block", writer_buffer_sec: float=10., spill_dir: str=None, raw_capture: bool=False,
+                 quality_stream: bool=False, record_streams: list=None, profile: bool=False, recording_name: str=None,
+                 error_register_interval: float=None) -> None:
         """Initialize the SerialDataHandler with serial connection and thread management / subprocess mangagement also handles the DAQ settings on the device side and initializes the LSL outlet for streaming data
 
         Args:
             config (EEGDeviceConfig): Configuration parameters for the EEG device
             metadata (EEGDeviceMetadata): Metadata information for the measurement
             config_live_plotter (list[LivePlotterChannelConfig], optional): Configuration for live plotter channels. Defaults to None.
+            metrics_port (int, optional): Port for exporting the acquisition counters as Prometheus text during DAQ, None disables the export. Defaults to None.
+            fast_start (bool, optional): Poll the device until it is ready instead of waiting a fixed settle time after opening the port. Defaults to False.
+            startup_timeout (float, optional): Deadline in seconds for the device to get ready and for the H5 writer to connect to the LSL stream. Defaults to 10.
+            stream_name (str, optional): Name of the LSL outlet, must be unique if several devices stream at once. Defaults to "DAQ_Stream".
+            isolated_ingest (bool, optional): Read and decode the serial data in a child process during DAQ, which hands the samples over
+                through shared memory, so the acquisition does not depend on the load of this process. The child owns the serial port
+                while DAQ is running. Scripts need an if __name__ == "__main__" guard. Defaults to False.
+            writer_policy (str, optional): Overflow policy of the buffer between the LSL inlet and the H5 file if the writer falls behind,
+                "block" (the LSL inlet holds further samples), "drop_oldest" or "spill" (to a temporary file). Losses are counted and
+                stored as gaps in the H5 file. With "block" samples which overflow the LSL inlet (60 s) while the writer is blocked are
+                neither counted nor stored as gaps. Defaults to "block".
+            writer_buffer_sec (float, optional): Samples held in memory by the writer buffer, in seconds of acquisition. Defaults to 10.
+            spill_dir (str, optional): Directory of the spill file, None uses the temporary directory. Defaults to None.
+            raw_capture (bool, optional): Append the validated raw frames to the file <recording name>_frames.raw instead of decoding them,
+                no LSL outlets are created and the H5 writer and live plotter are skipped. See convert_raw_capture for the conversion into a H5 recording. Defaults to False.
+            quality_stream (bool, optional): Compute the quality of every channel once per second (RMS, 50/60 Hz line components, flatline,
+                saturation and alert rate, see ChannelQualityMonitor) and push it to the LSL outlet <stream name>_Quality, which the
+                live plotter shows as summary. Defaults to False.
+            record_streams (list, optional): Names of further LSL streams (markers, stimulus or player data) which the H5 writer records
+                into the group streams of the same file, with the timestamps of the sender and the measured clock offsets, see
+                LSLStreamRecorder and read_h5_stream. Defaults to None.
+            profile (bool, optional): Record the duration of every serial read, decoding, LSL push and pull, file write and flush
+                and of the updates of the live plotter as spans, see StageProfiler. stop_daq writes them as Chrome trace to
+                <recording name>_trace.json, which chrome://tracing or https://ui.perfetto.dev show as timeline. Defaults to False.
+            recording_name (str, optional): Path prefix of the written files, e.g. <recording name>_data.h5, None uses
+                Measurement_hardware_eeg<date>_<time> in the working directory. Defaults to None.
+            error_register_interval (float, optional): Read the error register of the device every interval seconds while DAQ
+                is running and store the readouts in the dataset error_registers of the H5 file, see read_h5_error_registers.
+                None disables the polling. Defaults to None.
+
+        Raises:
+            ValueError: If raw capture and isolated ingest are both enabled or the error register is polled without H5 writer
+                or with isolated ingest
         """
+        if raw_capture and isolated_ingest:
+            raise ValueError("Raw capture and isolated ingest can not be combined")
+        if error_register_interval and (raw_capture or isolated_ingest):
+            raise ValueError("The error register can only be polled into the H5 file and while this process reads the serial port")
+        self._init_time = time.perf_counter()
         self._eeg_device_config = config
         self._adc_samplingrate = config.adc_samplingrate
         self._metadata = metadata
         self._config_live_plotter = config_live_plotter
         self._packet_length = PACKET_LENGTH
-        self._expected_packet_number = None 
+        self._last_frame = None  # (packet number, timestamp) of the last decoded frame
+        self._decode_channels = self._init_decode_channels(config.channel_mask)
+        self._gap_queue = queue.Queue()  # gap records (offset, lost_count) for the H5 writer
+        self._framer = StreamFramer(frame_dtype=ADC_DATA_FRAME_DTYPE)
+        self._clock = ClockAligner()  # maps the device timestamps to the LSL clock
         self._start_time = None  # To record the start time of data acquisition
         self._stop_time = None   # To record the stop time of data acquisition
         self._running = False    # Flag to control thread execution
-        self._recording_name = datetime.now().strftime("Measurement_hardware_eeg%Y%m%d_%H%M%S")
-
+        self._recording_name = recording_name if recording_name is not None else datetime.now().strftime("Measurement_hardware_eeg%Y%m%d_%H%M%S")
+        self._stats = AcquisitionStats()
+        self._metrics_port = metrics_port
+        self._metrics_exporter = None
+        self._fast_start = fast_start
+        self._startup_timeout = startup_timeout
+        self._cold_start_sec = None
+        self._isolated_ingest = isolated_ingest
+        self._ingest = None
+        self._writer_policy = writer_policy
+        self._writer_buffer_sec = writer_buffer_sec
+        self._spill_dir = spill_dir
+        self._raw_capture = raw_capture
+        self._capture_writer = None
+        self._record_streams = list(record_streams) if record_streams else []
+        self._profiler = StageProfiler(process_name="ApiEEGDeviceController") if profile else NULL_PROFILER
+        self._plotter_stop = None
+        self._direct_interface = None
+        self._command_interface = None
+        self._error_register_interval = error_register_interval
+        self._error_register_queue = queue.Queue()  # readouts (offset, ErrorRegisterData) for the H5 writer
+        self.error_register_thread = None
 
         self._poti_config = generate_poti_config(config.gain_instrument_amplifier)
         
@@ -63,17 +191,21 @@ class ApiEEGDeviceController:
         self._poti_config.actual_gain_value = calculate_gain(self._poti_config.actual_resistor_value)
 
         self._deployed_data_frames = characteristics_dataframes
-        self._deployed_serial_connection = SerialHandler(com_name= config.com_name, baudrate=115200, time_out=1).get_serial_connection
-        self._deployed_daq_outlet = LSLHandler(name="DAQ_Stream", sampling_rate=self._adc_samplingrate).create_lsl_outlet_daq
+        self._deployed_serial_connection = SerialHandler(com_name= config.com_name, baudrate=115200, time_out=1, fast_start=fast_start).get_serial_connection
+        self._stream_name = stream_name
+        # raw capture decodes nothing, an advertised outlet would keep consumers waiting for samples which never come
+        self._deployed_daq_outlet = self._init_daq_outlet() if not raw_capture else None
+        self._quality_monitor = ChannelQualityMonitor(sampling_rate=self._adc_samplingrate) if quality_stream else None
+        self._deployed_quality_outlet = self._init_quality_outlet() if quality_stream and not raw_capture else None
 
         self.deployed_mcu_communication_handler = McuCommunicationHandler(serial_handler=self._deployed_serial_connection, config= self._eeg_device_config)
-        self.deployed_mcu_communication_handler.set_daq_settings() # handles the DAQ settings on the device
-        self.deployed_mcu_communication_handler.set_shielding_settings() # handles the GPIO pins for shielding electrodes and reference
-        self.deployed_mcu_communication_handler.set_gain_instrument_amplifier(self._poti_config.poti_value) # handles the gain settings for the instrumentation amplifier on the device
+        if self._fast_start:
+            self.deployed_mcu_communication_handler.wait_until_ready(timeout=self._startup_timeout)
+        self._configure_device()
 
     # ========== API METHODS ==========
     def output_daq_error_register(self) -> ErrorRegisterData:
-        """Get the latest error register data from the device
+        """Get the latest error register data from the device, also while DAQ is running
 
         Returns:
             ErrorRegisterData: Dataclass containing error register information for both channels
@@ -81,9 +213,28 @@ class ApiEEGDeviceController:
         return self.deployed_mcu_communication_handler.error_register()
 
 
+    def get_stats(self) -> AcquisitionStatsSnapshot:
+        """Get a snapshot of the acquisition counters, safe to call from any thread while DAQ is running
+
+        Returns:
+            AcquisitionStatsSnapshot: Dataclass with frame, byte, error, alert and writer counters
+        """
+        return self._stats.snapshot()
+
+
+    @property
+    def get_cold_start_time(self) -> float:
+        """Time in seconds from creating the controller until the device was started by the first start_daq call,
+        None before the first start"""
+        return self._cold_start_sec
+
+
     def start_daq(self) -> bool:
         """Start the data acquisition threads
 
+        Raises:
+            TimeoutError: If the H5 writer does not connect to the LSL stream within the startup timeout
+
         Returns:
             bool: True if threads started successfully, False if already running
         """
@@ -91,10 +242,21 @@ class ApiEEGDeviceController:
             print("Already running!")
             return False
         self._running = True
-
+        self._stats.reset()
+        self._last_frame = None
+        self._framer.reset()
+        self._clock.reset()
+        self._profiler.reset()
+        if self._quality_monitor is not None:
+            self._quality_monitor.reset()
+        if self._metrics_port is not None:
+            self._metrics_exporter = PrometheusExporter(self._stats, port=self._metrics_port)
+            self._metrics_exporter.start()
+        if self._raw_capture:
+            return self._start_raw_capture()
 
         self.read_process_thread = threading.Thread(
-            target=self._read_and_process_serial_data,
+            target=self._read_and_process_serial_data if not self._isolated_ingest else self._pump_isolated_ingest,
             name="SerialReadProcess",
             daemon=True
         )
@@ -105,18 +267,43 @@ class ApiEEGDeviceController:
             daemon=True
         )
 
-        self.writer_thread.start()
-        while not self._deployed_daq_outlet.have_consumers():
-            print("Waiting for LSL consumers to connect...")
-            time.sleep(0.001)
-        self.deployed_mcu_communication_handler.start_daq() # Start DAQ on the device side
-
+        # the live plotter starts up in parallel, only the H5 writer is required before the device is started
+        self.live_plotter_process = None
         if self._config_live_plotter is not None:
-            self.live_plotter_process = multiprocessing.Process(target=start_live_plotter, kwargs={"config": self._config_live_plotter})
+            quality_layer_name = self._stream_name + QUALITY_STREAM_SUFFIX if self._quality_monitor is not None else None
+            # the plotter shows translation_func_adc channels in volts at the electrode, scaled like the recording
+            calibration_attrs = {"adc_pga_gain": self._eeg_device_config.adc_pga_gain, "actual_gain_value": self._poti_config.actual_gain_value}
+            plotter_kwargs = {"config": self._config_live_plotter, "quality_layer_name": quality_layer_name,
+                              "calibration_attrs": calibration_attrs}
+            if self._profiler.enabled:
+                # the profiled plotter quits on its own to write its trace
+                self._plotter_stop = multiprocessing.Event()
+                plotter_kwargs.update(profile_path=self._plotter_trace_path, stop_event=self._plotter_stop)
+            # imported here, Qt and pyqtgraph are only loaded if a live plotter is used
+            from src import start_live_plotter
+            self.live_plotter_process = multiprocessing.Process(target=start_live_plotter, kwargs=plotter_kwargs)
             self.live_plotter_process.start()
 
+        self.writer_thread.start()
+        wait_start = time.monotonic()
+        consumers_ready = self._deployed_daq_outlet.wait_for_consumers(timeout=self._startup_timeout)
+        self._stats.consumer_wait_sec = time.monotonic() - wait_start
+        if not consumers_ready:
+            self.stop_daq()
+            raise TimeoutError(f"H5 writer did not connect to the LSL stream within {self._startup_timeout} s")
+        if self._isolated_ingest:
+            self._start_isolated_ingest()
+        else:
+            self.deployed_mcu_communication_handler.start_daq() # Start DAQ on the device side
+            self._start_command_demux()
+        if self._cold_start_sec is None:
+            self._cold_start_sec = time.perf_counter() - self._init_time
+
         self.read_process_thread.start()
         self._start_time = time.time()
+        if self._error_register_interval:
+            self.error_register_thread = threading.Thread(target=self._poll_error_register, name="ErrorRegisterPoll", daemon=True)
+            self.error_register_thread.start()
         return True
 
 
@@ -128,16 +315,41 @@ class ApiEEGDeviceController:
         """
         self._running = False
 
-        self.deployed_mcu_communication_handler.stop_daq() # Stop DAQ on the device side
+        if self._ingest is not None:
+            self._ingest.stop() # the child stops DAQ on the device side and releases the serial port
+            self._deployed_serial_connection.open()
+        else:
+            self.deployed_mcu_communication_handler.stop_daq() # Stop DAQ on the device side
         self._stop_time = time.time()
         
         time.sleep(0.5)  # Give threads time to exit their loops
-        if self.read_process_thread is not None:
+        if self.read_process_thread is not None and self.read_process_thread.is_alive():
             self.read_process_thread.join()
-        if self.writer_thread is not None:
+        if self.error_register_thread is not None:
+            self.error_register_thread.join()
+            self.error_register_thread = None
+        if self.writer_thread is not None and self.writer_thread.is_alive():
             self.writer_thread.join()
-        if self.live_plotter_process.is_alive():
+        self._stop_command_demux()
+        if self._plotter_stop is not None:
+            self._plotter_stop.set()
+            self.live_plotter_process.join(timeout=PLOTTER_STOP_TIMEOUT)
+            self._plotter_stop = None
+        if self.live_plotter_process is not None and self.live_plotter_process.is_alive():
             self.live_plotter_process.terminate()
+        if self._metrics_exporter is not None:
+            self._metrics_exporter.stop()
+            self._metrics_exporter = None
+        if self._ingest is not None:
+            self._ingest.close()
+            self._ingest = None
+        if self._capture_writer is not None:
+            self._capture_writer.close()
+            print(f"Total frames captured to file: {self._capture_writer.frames_written}")
+            self._capture_writer = None
+        if self._profiler.enabled:
+            trace_path = self._profiler.write_chrome_trace(f"{self._recording_name}_trace.json", merge_files=[self._plotter_trace_path])
+            print(f"Stage profile written to {trace_path}")
         print("Threads stopped.")
         return True
 
@@ -145,89 +357,485 @@ class ApiEEGDeviceController:
     #  ========== INTERNAL METHODS ==========
     @property
     def _thread_frame_datatype(self) -> np.dtype:
-        return np.dtype([
-            ("head", "u1"),  # 1 Byte unsigned
-            ("frame_id", "u1"),  # 1 Byte unsigned
-            ("index", "u1"),  # 1 Byte unsigned
-            ("timestamp", "<u8"),  # 8 Byte unsigned
-            ("active_channels", "u1"),  # 1 Byte unsigned
-            ("alert", "u1",),  # 1 Byte unsigned
-            ("channel_values", "u1", (24,)),  # 24 Byte unsigned
-            ("tail", "u1"),  # 1 Byte unsigned
-        ])
+        return ADC_DATA_FRAME_DTYPE
+
+
+    @property
+    def _plotter_trace_path(self) -> str:
+        return f"{self._recording_name}_plotter_trace.json"
+
+
+    def _configure_device(self) -> None:
+        """Write the DAQ, shielding and gain settings to the device"""
+        self.deployed_mcu_communication_handler.set_daq_settings() # handles the DAQ settings on the device
+        self.deployed_mcu_communication_handler.set_shielding_settings() # handles the GPIO pins for shielding electrodes and reference
+        self.deployed_mcu_communication_handler.set_gain_instrument_amplifier(self._poti_config.poti_value) # handles the gain settings for the instrumentation amplifier on the device
+
+
+    def _read_serial_batch(self) -> bytes:
+        """Read the waiting bytes from the serial connection, at least one frame and at most one batch
+
+        Returns:
+            bytes: Received bytes, empty if nothing arrived within the timeout or the read failed
+        """
+        stats = self._stats
+        read_start = time.perf_counter_ns()
+        try:
+            num_bytes = min(max(self._deployed_serial_connection.in_waiting, PACKET_LENGTH), MAX_FRAMES_PER_BATCH * PACKET_LENGTH)
+            batch = self._deployed_serial_connection.read(num_bytes)
+        except serial.SerialException:
+            stats.incomplete_reads += 1
+            return b""
+        if batch:
+            self._profiler.record("serial_read", read_start, time.perf_counter_ns(), len(batch))
+        stats.bytes_read += len(batch)
+        if len(batch) < num_bytes:
+            stats.incomplete_reads += 1
+        return batch
 
 
     def _read_and_process_serial_data(self) -> None:
-        """Read data from the serial connection and process packets"""
+        """Read the waiting bytes from the serial connection, cut them into frames, decode and push them to the LSL outlet.
+        The samples are stamped with their device timestamps mapped to the LSL clock"""
+        stats = self._stats
+        profiler = self._profiler
         while self._running:
-            try:
-                batch = self._deployed_serial_connection.read(PACKET_LENGTH)
-            
-                if len(batch) != PACKET_LENGTH:
-                    print("Incomplete packet received, skipping")
-                    raise Exception
-                frames = np.frombuffer(batch, dtype= self._thread_frame_datatype)
-
-                if not (frames['head'] == 0xAA) & (frames['tail'] == 0xBB):
-                    print("Invalid packet header or tail, skipping")
-                    raise Exception
-                if not self._check_packet_number(int(frames["index"][0])):
-                    print("Packet number check failed, skipping")
-                    raise Exception
-
-                data_list = extract_channel_data(frames["channel_values"][0])
-                error_flag_list = extract_error_flags(frames["alert"][0])
-                packet_to_send = data_list + error_flag_list + [frames["timestamp"][0]]
-
-                self._deployed_daq_outlet.push_sample(packet_to_send, pushthrough=True)
-            except Exception:
+            batch = self._read_serial_batch()
+            read_time = local_clock()
+            if not batch:
                 continue
-    
 
-    def _check_packet_number(self, packet_index) -> bool:
-        """Function to check the packet number for continuity, Check for lost packets
+            decode_start = time.perf_counter_ns()
+            frames = self._framer.feed(batch)
+            stats.framing_errors = self._framer.resync_count
+            stats.discarded_bytes = self._framer.discarded_bytes
+            if not frames.size:
+                continue
+            packet_to_send = self._decode_frames(frames)
+            self._clock.observe(int(frames["timestamp"][-1]), read_time)
+            sample_times = self._clock.to_host_time(frames["timestamp"])
+            stats.clock_offset_sec = self._clock.offset_sec
+            stats.clock_drift_ppm = self._clock.drift_ppm
+            decode_stop = time.perf_counter_ns()
+            stats.decode_time.observe((decode_stop - decode_start) * 1e-9)
+            profiler.record("decode", decode_start, decode_stop, frames.size)
+
+            with profiler.span("lsl_push", frames.size):
+                self._deployed_daq_outlet.push_chunk(packet_to_send, timestamp=sample_times, pushthrough=True)
+            stats.frames_pushed += frames.size
+            self._push_channel_quality(packet_to_send, sample_times)
+
+
+    def _capture_raw_frames(self) -> None:
+        """Read the waiting bytes from the serial connection and append the valid frames to the raw capture without decoding them"""
+        stats = self._stats
+        while self._running:
+            batch = self._read_serial_batch()
+            if not batch:
+                continue
+            frames = self._framer.feed(batch)
+            stats.framing_errors = self._framer.resync_count
+            stats.discarded_bytes = self._framer.discarded_bytes
+            if frames.size:
+                with self._profiler.span("raw_append", frames.size):
+                    self._capture_writer.append(frames)
+                stats.frames_read += frames.size
+                stats.frames_written += frames.size
+
+
+    def _decode_frames(self, frames: np.ndarray) -> np.ndarray:
+        """Decode valid frames into LSL rows, count alerts and hand detected gaps to the H5 writer
+
+        Args:
+            frames (np.ndarray): Structured array of valid frames with ADC_DATA_FRAME_DTYPE
 
         Returns:
-            bool: True if packet number is as expected, False otherwise
-        """        
-        if self._expected_packet_number == None:
-            self._expected_packet_number = (packet_index + 1) % 256 # Wrap around at 256
-            return True
-        elif packet_index != self._expected_packet_number:
-            print(f"Packet number mismatch: expected {self._expected_packet_number}, got {packet_index}")
-            self._expected_packet_number = (packet_index + 1) % 256 # Wrap around at 256
-            return False
-        self._expected_packet_number = (self._expected_packet_number + 1) % 256  # Wrap around at 256
+            np.ndarray: int32 rows with 8 channel values, 8 alert flags and the timestamp
+        """
+        error_flags = decode_alert_flags(frames["alert"])
+        self._check_packet_gaps(frames["index"], frames["timestamp"])
+
+        packet_to_send = np.empty((frames.size, SAMPLE_COLUMNS), dtype=np.int32)
+        if self._decode_channels is None:
+            packet_to_send[:, :8] = decode_channel_values(frames["channel_values"])
+        else:
+            packet_to_send[:, :8] = 0
+            packet_to_send[:, self._decode_channels] = decode_channel_values(frames["channel_values"], self._decode_channels)
+        packet_to_send[:, 8:16] = error_flags
+        packet_to_send[:, 16] = frames["timestamp"].astype(np.int32)
+        self._stats.frames_read += frames.size
+        self._stats.count_alerts(error_flags)
+        return packet_to_send
+
+
+    def _push_channel_quality(self, rows: np.ndarray, sample_times: np.ndarray) -> None:
+        """Feed decoded rows to the channel quality monitor and push the completed windows to the quality outlet
+
+        Args:
+            rows (np.ndarray): int32 rows with 8 channel values, 8 alert flags and the timestamp
+            sample_times (np.ndarray): LSL time of every row
+        """
+        if self._quality_monitor is None:
+            return
+        with self._profiler.span("quality", rows.shape[0]):
+            quality, quality_times = self._quality_monitor.feed(rows[:, :8], rows[:, 8:16], sample_times)
+        if quality.shape[0]:
+            self._deployed_quality_outlet.push_chunk(quality, timestamp=quality_times, pushthrough=True)
+
+
+    def _check_packet_gaps(self, packet_numbers: np.ndarray, timestamps: np.ndarray) -> None:
+        """Check a batch of frames for lost packets, continuing from the last frame of the previous batch. Every gap is
+        counted and queued as (offset, lost_count) with the offset in samples pushed so far
+
+        Args:
+            packet_numbers (np.ndarray): Wrapping 8-bit packet numbers of the batch
+            timestamps (np.ndarray): Device timestamps of the batch in microseconds
+        """
+        previous_number, previous_timestamp = self._last_frame if self._last_frame is not None else (None, None)
+        positions, lost_counts = detect_packet_gaps(packet_numbers, timestamps, self._adc_samplingrate,
+                                                    previous_packet_number=previous_number,
+                                                    previous_timestamp=previous_timestamp)
+        self._last_frame = (int(packet_numbers[-1]), int(timestamps[-1]))
+        if positions.size:
+            self._stats.sequence_gaps += int(positions.size)
+            self._stats.lost_frames += int(lost_counts.sum())
+            self._gap_queue.put((positions + self._stats.frames_pushed, lost_counts))
+
+
+    def _start_raw_capture(self) -> bool:
+        """Open the raw capture file and start the device and the capture thread
+
+        Returns:
+            bool: True if the capture started
+        """
+        self._capture_writer = self._init_raw_capture_writer()
+        self.writer_thread = None
+        self.live_plotter_process = None
+        self.read_process_thread = threading.Thread(target=self._capture_raw_frames, name="RawCapture", daemon=True)
+        self.deployed_mcu_communication_handler.start_daq()
+        self._start_command_demux()
+        if self._cold_start_sec is None:
+            self._cold_start_sec = time.perf_counter() - self._init_time
+        self.read_process_thread.start()
+        self._start_time = time.time()
         return True
 
 
+    def _start_command_demux(self) -> None:
+        """Send the commands through the framer of the read thread until DAQ is stopped, so the device can be queried
+        while the data keeps flowing"""
+        self._command_interface = DemuxInterface(device=self._deployed_serial_connection, framer=self._framer)
+        self._direct_interface = self.deployed_mcu_communication_handler.use_interface(self._command_interface)
+
+
+    def _stop_command_demux(self) -> None:
+        """Send the commands directly again after the read thread ended, the data bytes it left unread are dropped so they
+        are not taken as responses"""
+        if self._command_interface is None:
+            return
+        self.deployed_mcu_communication_handler.use_interface(self._direct_interface)
+        self._direct_interface.clear_input()
+        self._command_interface = None
+        self._direct_interface = None
+
+
+    def _poll_error_register(self) -> None:
+        """Read the error register every error register interval while DAQ is running and queue the readouts with the
+        number of frames received before them for the H5 writer"""
+        next_poll = time.monotonic() + self._error_register_interval
+        while self._running:
+            time.sleep(min(max(next_poll - time.monotonic(), 0.), ERROR_REGISTER_POLL_STEP))
+            if time.monotonic() < next_poll:
+                continue
+            next_poll += self._error_register_interval
+            try:
+                registers = self.output_daq_error_register()
+            except (TimeoutError, ValueError) as e:
+                print(f"Error register readout failed: {e}")
+                continue
+            self._error_register_queue.put((self._command_interface.response_offset, registers))
+
+
+    def _start_isolated_ingest(self) -> None:
+        """Hand the serial port to a child process, which starts DAQ on the device side and decodes the data"""
+        # imported here, the worker module subclasses this controller
+        from .ingest_worker import IsolatedIngest
+        self._ingest = IsolatedIngest(config=self._eeg_device_config, metadata=self._metadata, startup_timeout=self._startup_timeout,
+                                      ring_capacity=max(int(ISOLATED_INGEST_BUFFER_SEC * self._adc_samplingrate), MAX_FRAMES_PER_BATCH))
+        self._deployed_serial_connection.close()
+        try:
+            self._ingest.start()
+        except RuntimeError:
+            self._ingest.close()
+            self._ingest = None
+            self._deployed_serial_connection.open()
+            self.stop_daq()
+            raise
+
+
+    def _pump_isolated_ingest(self) -> None:
+        """Move the samples decoded by the isolated ingest process from shared memory to the LSL outlet, until the process
+        ended and all samples were taken"""
+        stats = self._stats
+        while True:
+            finished = self._ingest.finished
+            rows, timestamps = self._ingest.read(MAX_FRAMES_PER_BATCH)
+            self._ingest.poll_reports(stats, self._gap_queue)
+            stats.handoff_dropped_frames = self._ingest.dropped
+            if rows.shape[0]:
+                with self._profiler.span("lsl_push", rows.shape[0]):
+                    self._deployed_daq_outlet.push_chunk(rows, timestamp=timestamps, pushthrough=True)
+                stats.frames_pushed += rows.shape[0]
+                self._push_channel_quality(rows, timestamps)
+            elif finished:
+                break
+            else:
+                time.sleep(0.001)
+
+
+    def _init_decode_channels(self, channel_mask: list) -> np.ndarray:
+        """Select the channels which are decoded, the frames carry all channels but disabled channels hold no samples
+
+        Args:
+            channel_mask (list): List with 8 elements, 1 for an enabled channel
+
+        Returns:
+            np.ndarray: Enabled channels, None to decode all channels
+        """
+        mask = np.asarray(channel_mask, dtype=bool)
+        if mask.all() or not mask.any():
+            return None
+        return np.flatnonzero(mask)
+
+
+    def _init_daq_outlet(self) -> StreamOutlet:
+        """Initialize the LSL outlet for the decoded samples
+
+        Returns:
+            StreamOutlet: LSL outlet named after the stream name
+        """
+        return LSLHandler(name=self._stream_name, sampling_rate=self._adc_samplingrate).create_lsl_outlet_daq
+
+
+    def _init_quality_outlet(self) -> StreamOutlet:
+        """Initialize the LSL outlet for the channel quality, one sample per window of the quality monitor
+
+        Returns:
+            StreamOutlet: LSL outlet named after the stream name with QUALITY_STREAM_SUFFIX
+        """
+        return LSLHandler(name=self._stream_name + QUALITY_STREAM_SUFFIX,
+                          sampling_rate=self._adc_samplingrate / self._quality_monitor.window_samples).create_lsl_outlet_quality(self._quality_monitor.labels)
+
+
     def _init_h5_file_writer(self) -> H5Handler:
         """Initialize H5 file writer
 
         Returns:
             H5Handler: H5 file handler instance
         """        
-        return H5Handler(recording_name=self._recording_name, metadata= self._metadata, eeg_device_config= self._eeg_device_config, poti_values= self._poti_config)    
+        return H5Handler(recording_name=self._recording_name, metadata= self._metadata, eeg_device_config= self._eeg_device_config, poti_values= self._poti_config,
+                         profiler=self._profiler)
+
+
+    def _init_raw_capture_writer(self) -> RawCaptureWriter:
+        """Initialize the raw capture file, preallocated for the configured measurement duration
+
+        Returns:
+            RawCaptureWriter: Raw capture writer instance
+        """
+        preallocate_frames = int(RAW_CAPTURE_MARGIN * self._eeg_device_config.measure_duration * self._adc_samplingrate) + MAX_FRAMES_PER_BATCH
+        return RawCaptureWriter(path=f"{self._recording_name}_frames.raw", eeg_device_config=self._eeg_device_config, metadata=self._metadata,
+                                poti_values=self._poti_config, preallocate_frames=preallocate_frames, frame_dtype=self._thread_frame_datatype)
+
+
+    def _init_writer_buffer(self) -> BoundedSampleBuffer:
+        """Initialize the buffer between the LSL inlet and the H5 file
+
+        Returns:
+            BoundedSampleBuffer: Buffer with the overflow policy of the writer
+        """
+        return BoundedSampleBuffer(num_columns=SAMPLE_COLUMNS, capacity=max(int(self._writer_buffer_sec * self._adc_samplingrate), MAX_FRAMES_PER_BATCH),
+                                   policy=self._writer_policy, spill_dir=self._spill_dir)
+
+
+    def _resolve_stream(self, name: str) -> list:
+        """Resolve a LSL outlet in short attempts until it is found, DAQ is stopped or the startup timeout expires
+
+        Args:
+            name (str): Name of the stream
+
+        Returns:
+            list: Resolved StreamInfo objects, empty if the stream was not found
+        """
+        deadline = time.monotonic() + self._startup_timeout
+        while self._running and time.monotonic() < deadline:
+            streams = resolve_byprop("name", name, timeout=LSL_RESOLVE_INTERVAL)
+            if streams:
+                return streams
+        return []
+
+
+    def _init_stream_recorders(self) -> list[LSLStreamRecorder]:
+        """Initialize the recorders of the further LSL streams, streams which are not found are skipped
+
+        Returns:
+            list[LSLStreamRecorder]: Recorder of every found stream
+        """
+        recorders = []
+        for name in self._record_streams:
+            streams = self._resolve_stream(name)
+            if not streams:
+                print(f"No LSL stream {name} found within {self._startup_timeout} s, it is not recorded")
+                continue
+            recorders.append(LSLStreamRecorder(streams[0], open_timeout=self._startup_timeout))
+        return recorders
+
+
+    def _write_recorded_streams(self, deployed_h5_writer: H5Handler, recorders: list[LSLStreamRecorder], final: bool = False) -> None:
+        """Pull the further LSL streams and write the samples which are due to the H5 file
+
+        Args:
+            deployed_h5_writer (H5Handler): H5 file handler
+            recorders (list[LSLStreamRecorder]): Recorders of the further streams
+            final (bool, optional): Pull until the inlets are empty and write everything. Defaults to False.
+        """
+        for recorder in recorders:
+            recorder.pull()
+            timestamps, values, clock_offsets = recorder.take(force=final)
+            if timestamps.size or clock_offsets.size:
+                with self._profiler.span("stream_write", timestamps.size):
+                    deployed_h5_writer.append_stream(recorder.name, timestamps, values, clock_offsets, attrs=recorder.description)
+            # the buffer of the recorder may have been full, the rest waits in the inlet
+            while final and recorder.pull():
+                deployed_h5_writer.append_stream(recorder.name, *recorder.take(force=True), attrs=recorder.description)
+
+
+    def _write_gaps(self, deployed_h5_writer: H5Handler, buffer: BoundedSampleBuffer, pending_gaps: list, final: bool = False) -> None:
+        """Write the losses of the writer buffer and the queued gaps of the serial stream to the H5 file. The gaps are queued at their
+        position in the DAQ stream, which maps to a row of the file once all samples in front of them were written or dropped, until
+        then they wait in pending_gaps
+
+        Args:
+            deployed_h5_writer (H5Handler): H5 file handler
+            buffer (BoundedSampleBuffer): Buffer of the H5 writer
+            pending_gaps (list): Gaps (positions, lost_counts) which wait for their row, updated in place
+            final (bool, optional): Write all pending gaps. Defaults to False.
+        """
+        while not self._gap_queue.empty():
+            pending_gaps.append(self._gap_queue.get_nowait())
+        offsets, lost_counts = buffer.take_losses()
+        if pending_gaps:
+            positions = np.concatenate([positions for positions, _ in pending_gaps])
+            gap_counts = np.concatenate([counts for _, counts in pending_gaps])
+            gap_offsets = buffer.consumer_positions(positions)
+            num_ready = positions.size if final else int(np.count_nonzero(gap_offsets <= buffer.taken))
+            pending_gaps[:] = [(positions[num_ready:], gap_counts[num_ready:])] if num_ready < positions.size else []
+            # both kinds of gaps lie between the rows written so far and the rows still waiting, stored in order of their offset
+            offsets = np.concatenate((offsets, gap_offsets[:num_ready]))
+            order = np.argsort(offsets, kind="stable")
+            offsets, lost_counts = offsets[order], np.concatenate((lost_counts, gap_counts[:num_ready]))[order]
+        if offsets.size:
+            deployed_h5_writer.append_gaps_ad7779(offsets, lost_counts)
+
+
+    def _write_error_registers(self, deployed_h5_writer: H5Handler, buffer: BoundedSampleBuffer, pending_readouts: list,
+                               final: bool = False) -> None:
+        """Write the queued error register readouts to the H5 file. Like the gaps, a readout waits in pending_readouts until its position
+        in the DAQ stream maps to a row of the file
+
+        Args:
+            deployed_h5_writer (H5Handler): H5 file handler
+            buffer (BoundedSampleBuffer): Buffer of the H5 writer
+            pending_readouts (list): Readouts (position, ErrorRegisterData) which wait for their row, updated in place
+            final (bool, optional): Write all pending readouts. Defaults to False.
+        """
+        while not self._error_register_queue.empty():
+            pending_readouts.append(self._error_register_queue.get_nowait())
+        if not pending_readouts:
+            return
+        offsets = buffer.consumer_positions(np.array([position for position, _ in pending_readouts]))
+        num_ready = offsets.size if final else int(np.count_nonzero(offsets <= buffer.taken))
+        if num_ready:
+            deployed_h5_writer.append_error_registers_ad7779(offsets[:num_ready].tolist(),
+                                                             [registers for _, registers in pending_readouts[:num_ready]])
+            del pending_readouts[:num_ready]
+
+
+    def _drain_daq_stream(self, data_stream: StreamInlet, buffer: BoundedSampleBuffer) -> None:
+        """Pull the samples from the LSL inlet into the writer buffer until DAQ is stopped and the inlet is empty. liblsl
+        writes the chunks directly into consecutive rows of a preallocated array, the buffer keeps views of them
+
+        Args:
+            data_stream (StreamInlet): Opened inlet of the DAQ stream
+            buffer (BoundedSampleBuffer): Buffer of the H5 writer
+        """
+        stats = self._stats
+        profiler = self._profiler
+        slab, filled = np.empty((DRAIN_SLAB_ROWS, SAMPLE_COLUMNS), dtype=np.int32), 0
+        while True:
+            running = self._running
+            if DRAIN_SLAB_ROWS - filled < MAX_FRAMES_PER_BATCH:
+                # the rows of the used array stay referenced by the buffer until they are written
+                slab, filled = np.empty((DRAIN_SLAB_ROWS, SAMPLE_COLUMNS), dtype=np.int32), 0
+            pull_start = time.perf_counter_ns()
+            num_rows, timestamp = pull_chunk_into(data_stream, slab[filled:filled + MAX_FRAMES_PER_BATCH],
+                                                  timeout=LSL_PULL_TIMEOUT if running else 0.)
+            if num_rows:
+                buffer.put(slab[filled:filled + num_rows], timestamp)
+                profiler.record("lsl_pull", pull_start, time.perf_counter_ns(), num_rows)
+                filled += num_rows
+                stats.queue_depth = data_stream.samples_available()
+            elif not running:
+                break
 
 
     def _write_to_h5_file(self) -> None:
-        """Write data from the queue to H5 file in chunks"""
+        """Write the samples of the LSL stream to the H5 file in chunks. A drain thread moves the samples from the LSL inlet
+        into a bounded buffer, so a slow file write does not overflow the inlet, the writer policy decides what happens if
+        the buffer is full"""
+        streams = self._resolve_stream(self._stream_name)
+        if not streams:
+            print(f"No LSL stream {self._stream_name} found within {self._startup_timeout} s")
+            return
         deployed_h5_writer = self._init_h5_file_writer()
-        streams = resolve_byprop("type", "custom_daq")
         data_stream = StreamInlet(streams[0],
                                   max_buflen= 60,
                                   max_chunklen= 1024,
                                   recover=True,
                                   processing_flags=proc_threadsafe)
-        timeout = (1 / self._adc_samplingrate)*1e-2
-        max_samples = (self._adc_samplingrate /50) if self._adc_samplingrate >50 else 10
-        while self._running:
-            data, timestamp = data_stream.pull_chunk(timeout=timeout)
-            if data:
-                deployed_h5_writer.append_data_ad7779(timestamps =[row[-1] for row in data], 
-                                                      measurements =[row[:8] for row in data], 
-                                                      alerts=[row[8:-1] for row in data])
-            
+        data_stream.open_stream(timeout=self._startup_timeout)
+        buffer = self._init_writer_buffer()
+        drain_thread = threading.Thread(target=self._drain_daq_stream, args=(data_stream, buffer), name="LSLDrain", daemon=True)
+        drain_thread.start()
+        recorders = self._init_stream_recorders()
+        max_samples = int(self._adc_samplingrate /50) if self._adc_samplingrate >50 else 10
+        stats = self._stats
+        pending_gaps, pending_readouts = [], []
+        # after stop, the samples waiting in the buffer are still written
+        while self._running or drain_thread.is_alive() or buffer.depth:
+            rows, timestamp = buffer.get(max_samples, timeout=LSL_PULL_TIMEOUT)
+            if rows.shape[0]:
+                # one reference point per chunk aligns the samples with the LSL clock of the recorded streams
+                deployed_h5_writer.append_lsl_times_ad7779([deployed_h5_writer.get_file_length], [timestamp[0]])
+                deployed_h5_writer.append_data_ad7779(timestamps=rows[:, -1],
+                                                      measurements=rows[:, :8],
+                                                      alerts=rows[:, 8:-1])
+                stats.frames_written += rows.shape[0]
+                stats.writer_lag_sec = local_clock() - timestamp[-1]
+                stats.writer_lag.observe(stats.writer_lag_sec)
+            stats.buffer_depth = buffer.depth
+            stats.buffer_dropped_frames = buffer.dropped
+            stats.buffer_spilled_frames = buffer.spilled
+            self._write_gaps(deployed_h5_writer, buffer, pending_gaps)
+            self._write_error_registers(deployed_h5_writer, buffer, pending_readouts)
+            self._write_recorded_streams(deployed_h5_writer, recorders)
+        buffer.close()
+        self._write_gaps(deployed_h5_writer, buffer, pending_gaps, final=True)
+        self._write_error_registers(deployed_h5_writer, buffer, pending_readouts, final=True)
+        self._write_recorded_streams(deployed_h5_writer, recorders, final=True)
+        for recorder in recorders:
+            recorder.close()
+
         # make sure to close the H5 file when stopping
         print(f"Total samples written to file: {deployed_h5_writer.get_file_length}")
-        deployed_h5_writer.close_h5_file()
\ No newline at end of file
+        deployed_h5_writer.close_h5_file()
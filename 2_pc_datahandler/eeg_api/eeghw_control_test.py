@@ -2,8 +2,15 @@ import unittest
 from unittest.mock import patch, MagicMock, PropertyMock
 from eeg_api.eeghw_control import ApiEEGDeviceController, characteristics_dataframes
 from src.poti import PotiConfig
+from src import AcquisitionStats, StreamFramer, ClockAligner, ADC_DATA_FRAME_DTYPE, EEGDeviceConfig, EEGDeviceMetadata, ChannelQualityMonitor
+from src import read_raw_capture, convert_raw_capture, NULL_PROFILER, VirtualEEGDevice, register_virtual_device, unregister_virtual_device
+from src import read_h5_error_registers, read_h5_gaps, BoundedSampleBuffer
+from pathlib import Path
+import tempfile
+import time
 import queue
 import serial
+import numpy as np
 
 
 class TestApiEEGDeviceController(unittest.TestCase):
@@ -14,6 +21,12 @@ class TestApiEEGDeviceController(unittest.TestCase):
 
     def setUp(self):
         self.controller = ApiEEGDeviceController.__new__(ApiEEGDeviceController)
+        self.controller._quality_monitor = None
+        self.controller._decode_channels = None
+        self.controller._profiler = NULL_PROFILER
+        self.controller._plotter_stop = None
+        self.controller._command_interface = None
+        self.controller.error_register_thread = None
         self.controller._byte_buffer = bytearray([0x00, 0x01, 0x02, 0x03, 0x04, 0x05, 0x06, 0x07, 0x08, 0x09,
                                 0x0A, 0x0B, 0x0C, 0x0D, 0x0E, 0x0F, 0x10, 0x11, 0x12, 0x13,
                                 0x14, 0x15, 0x16, 0x17, 0x18, 0x19, 0x1A, 0x1B, 0x1C, 0x1D,
@@ -28,7 +41,6 @@ class TestApiEEGDeviceController(unittest.TestCase):
         self.controller._running = True
 
         valid_packet = bytearray([0xAA] + [0x00]*36 + [0xBB])  # A valid packet with start and end bytes
-        self.controller._check_packet_number = MagicMock(return_value=True)
         p_mock = PropertyMock(side_effect=[38, 0])
         type(self.controller._deployed_serial_connection).in_waiting = p_mock
         self.controller._deployed_serial_connection.read.return_value = valid_packet
@@ -45,44 +57,132 @@ class TestApiEEGDeviceController(unittest.TestCase):
                 return 0
 
 
-    def test_check_packet_number_is_not_set(self):
-        """Check if the _check_packet_number method works correctly when no expected packet number is set"""
-        self.controller._expected_packet_number = None
-        packet_number = 4
+    def _prepare_gap_check(self, last_frame=None):
+        self.controller._last_frame = last_frame
+        self.controller._adc_samplingrate = 1000
+        self.controller._stats = AcquisitionStats()
+        self.controller._gap_queue = queue.Queue()
 
-        result =self.controller._check_packet_number(packet_index = packet_number)
-        self.assertEqual(result, True) #Check the return value of the function
-        self.assertEqual(self.controller._expected_packet_number, packet_number + 1) #Check if the expected packet number is set correctly
 
+    def test_check_packet_gaps_is_not_set(self):
+        """Check if the first batch without a previous frame only sets the last frame"""
+        self._prepare_gap_check()
 
-    def test_check_packet_number_is_set_and_correct(self):
-        """Check if the _check_packet_number method works correctly when the expected packet number is set and matches the packet number in the buffer"""
-        self.controller._expected_packet_number = 2
-        packet_number = 2
-        
-        result =self.controller._check_packet_number(packet_index = packet_number)
-        self.assertEqual(result, True) #Check the return value of the function
-        self.assertEqual(self.controller._expected_packet_number, packet_number + 1) #Check if the expected packet number is updated correctly
+        self.controller._check_packet_gaps(np.array([4, 5]), np.array([4000, 5000]))
+        self.assertEqual(self.controller._last_frame, (5, 5000))
+        self.assertTrue(self.controller._gap_queue.empty())
 
 
-    def test_check_packet_number_is_set_and_incorrect(self):
-        """Check if the _check_packet_number method works correctly when the expected packet number is set and does not match the packet number in the buffer"""
-        self.controller._expected_packet_number = 1
-        packet_number = 3
-        
-        result =self.controller._check_packet_number(packet_index = packet_number)
-        self.assertEqual(result, False) #Check the return value of the function
-        self.assertEqual(self.controller._expected_packet_number, packet_number+1) #Check if the expected packet number remains unchanged
+    def test_check_packet_gaps_is_set_and_correct(self):
+        """Check if a batch continuing the previous frame is accepted without gap"""
+        self._prepare_gap_check(last_frame=(1, 1000))
 
+        self.controller._check_packet_gaps(np.array([2, 3]), np.array([2000, 3000]))
+        self.assertEqual(self.controller.get_stats().sequence_gaps, 0)
+        self.assertEqual(self.controller._last_frame, (3, 3000))
+
+
+    def test_check_packet_gaps_is_set_and_incorrect(self):
+        """Check if a gap of 2 frames before the batch and a gap of 259 frames inside the batch are queued with offsets"""
+        self._prepare_gap_check(last_frame=(1, 1000))
+        self.controller._stats.frames_pushed = 100
+
+        self.controller._check_packet_gaps(np.array([4, 5, 9]), np.array([4000, 5000, 265000]))
+        offsets, lost_counts = self.controller._gap_queue.get_nowait()
+        self.assertEqual(offsets.tolist(), [100, 102])
+        self.assertEqual(lost_counts.tolist(), [2, 259])
+        self.assertEqual(self.controller.get_stats().lost_frames, 261)
+
+
+    def test_check_packet_gaps_wrap_around(self):
+        """Check if the packet number wrapping from 255 to 0 is not a gap"""
+        self._prepare_gap_check(last_frame=(0xFF, 1000))
+
+        self.controller._check_packet_gaps(np.array([0]), np.array([2000]))
+        self.assertTrue(self.controller._gap_queue.empty())
+
+
+    def test_read_and_process_serial_data_counts(self):
+        """Check if valid frames are pushed, a lost byte is resynchronized and the gap behind it is counted"""
+        frames = np.zeros(8, dtype=ADC_DATA_FRAME_DTYPE)
+        frames["head"], frames["tail"] = 0xAA, 0xBB
+        frames["index"] = [0, 1, 2, 3, 4, 5, 9, 10]
+        frames["timestamp"] = 1000 * frames["index"].astype(np.uint64)
+        frames["alert"][0] = 0x81
+        stream = bytearray(frames.tobytes())
+        del stream[4 * 38 + 20] # frame 4 loses one byte
+        reads = [bytes(stream[:100]), bytes(stream[100:])]
+
+        def read(num_bytes):
+            if len(reads) == 1:
+                self.controller._running = False
+            return reads.pop(0)
+
+        self.controller._deployed_serial_connection = MagicMock()
+        self.controller._deployed_serial_connection.read.side_effect = read
+        type(self.controller._deployed_serial_connection).in_waiting = PropertyMock(return_value=200)
+        self.controller._deployed_daq_outlet = MagicMock()
+        self.controller._framer = StreamFramer()
+        self.controller._clock = ClockAligner()
+        self._prepare_gap_check()
+        self.controller._running = True
+
+        self.controller._read_and_process_serial_data()
+        stats = self.controller.get_stats()
+        self.assertEqual(stats.frames_read, 7)
+        self.assertEqual(stats.frames_pushed, 7)
+        self.assertEqual(stats.framing_errors, 1)
+        self.assertEqual(stats.discarded_bytes, 37)
+        self.assertEqual(stats.incomplete_reads, 1)
+        self.assertEqual(stats.sequence_gaps, 2)
+        self.assertEqual(stats.lost_frames, 4)
+        self.assertEqual(stats.bytes_read, 8*38 - 1)
+        self.assertEqual(stats.alert_counts, [1, 0, 0, 0, 0, 0, 0, 1])
+        pushed = np.concatenate([call[0][0] for call in self.controller._deployed_daq_outlet.push_chunk.call_args_list])
+        self.assertEqual(pushed[:, -1].tolist(), [0, 1000, 2000, 3000, 5000, 9000, 10000])
 
-    def test_check_packet_number_wrap_around(self):
-        """Check if the _check_packet_number method works correctly when the packet number wraps around from 255 to 0"""
-        self.controller._expected_packet_number = 0xFF
-        packet_number = 0xFF
-        
-        result =self.controller._check_packet_number(packet_index = packet_number)
-        self.assertEqual(result, True) #Check the return value of the function
-        self.assertEqual((self.controller._expected_packet_number), 0) #Check if the expected packet number is updated correctly
+
+    def test_push_channel_quality(self):
+        self.controller._quality_monitor = ChannelQualityMonitor(sampling_rate=100)
+        self.controller._deployed_quality_outlet = MagicMock()
+        rows = np.zeros((150, 17), dtype=np.int32)
+        rows[:, 3] = 7
+        rows[:, 8] = 1
+        self.controller._push_channel_quality(rows[:80], np.arange(80) / 100)
+        self.controller._deployed_quality_outlet.push_chunk.assert_not_called()
+        self.controller._push_channel_quality(rows[80:], np.arange(80, 150) / 100)
+        quality, = self.controller._deployed_quality_outlet.push_chunk.call_args[0]
+        self.assertEqual(quality.shape, (1, 48))
+        self.assertEqual(self.controller._deployed_quality_outlet.push_chunk.call_args[1]["timestamp"].tolist(), [0.99])
+        metrics = quality.reshape(8, 6)
+        self.assertEqual(metrics[:, 3].tolist(), [1] * 8)
+        self.assertEqual(metrics[:, 5].tolist(), [1] + [0] * 7)
+
+
+    def test_write_gaps_skips_only_earlier_drops(self):
+        self.controller._gap_queue = queue.Queue()
+        writer = MagicMock()
+        buffer = BoundedSampleBuffer(num_columns=1, capacity=4, policy="drop_oldest")
+        buffer.put(np.arange(4).reshape(-1, 1), np.zeros(4))
+        buffer.get(4)
+        buffer.put(np.arange(4, 6).reshape(-1, 1), np.zeros(2))
+        # gaps in front of the rows 6 and 10 are queued, then the buffer drops the rows 4 to 7 before the writer drains them
+        self.controller._gap_queue.put((np.array([6, 10]), np.array([3, 1])))
+        buffer.put(np.arange(6, 12).reshape(-1, 1), np.zeros(6))
+        pending_gaps = []
+        self.controller._write_gaps(writer, buffer, pending_gaps)
+        offsets, lost_counts = writer.append_gaps_ad7779.call_args[0]
+        self.assertEqual(offsets.tolist(), [4, 4])
+        self.assertEqual(lost_counts.tolist(), [4, 3])
+        # the rows 8 and 9 in front of the second gap are still in the buffer
+        self.assertEqual(pending_gaps[0][0].tolist(), [10])
+
+        buffer.get(4)
+        self.controller._write_gaps(writer, buffer, pending_gaps)
+        offsets, lost_counts = writer.append_gaps_ad7779.call_args[0]
+        self.assertEqual(offsets.tolist(), [6])
+        self.assertEqual(lost_counts.tolist(), [1])
+        self.assertEqual(pending_gaps, [])
 
 
     @patch ("eeg_api.eeghw_control.H5Handler")    
@@ -93,9 +193,104 @@ class TestApiEEGDeviceController(unittest.TestCase):
         self.controller._poti_config = PotiConfig(gain=2, calculated_resistor_value=1000, poti_value=128, actual_resistor_value=1000, actual_gain_value=2)
 
         self.controller._init_h5_file_writer()
-        mock_h5handler.assert_called_once_with(recording_name="test_recording", metadata=self.controller._metadata, eeg_device_config=self.controller._eeg_device_config, poti_values=self.controller._poti_config)
+        mock_h5handler.assert_called_once_with(recording_name="test_recording", metadata=self.controller._metadata, eeg_device_config=self.controller._eeg_device_config, poti_values=self.controller._poti_config,
+                                               profiler=NULL_PROFILER)
+
+
+    @patch ("eeg_api.eeghw_control.resolve_byprop", return_value=[])
+    def test_start_daq_times_out_without_consumer(self, mock_resolve):
+        self.controller._running = False
+        self.controller._stats = AcquisitionStats()
+        self.controller._framer = StreamFramer()
+        self.controller._clock = ClockAligner()
+        self.controller._metrics_port = None
+        self.controller._metrics_exporter = None
+        self.controller._config_live_plotter = None
+        self.controller._startup_timeout = 0.2
+        self.controller._stream_name = "DAQ_Stream"
+        self.controller._isolated_ingest = False
+        self.controller._ingest = None
+        self.controller._raw_capture = False
+        self.controller._capture_writer = None
+        self.controller._cold_start_sec = None
+        self.controller._deployed_daq_outlet = MagicMock()
+        self.controller._deployed_daq_outlet.wait_for_consumers.return_value = False
+        self.controller.deployed_mcu_communication_handler = MagicMock()
+
+        with patch("eeg_api.eeghw_control.time.sleep"):
+            with self.assertRaises(TimeoutError):
+                self.controller.start_daq()
+        self.assertFalse(self.controller._running)
+        self.controller.deployed_mcu_communication_handler.start_daq.assert_not_called()
+        self.assertIsNone(self.controller.get_cold_start_time)
 
         
 
+class TestRawCapture(unittest.TestCase):
+    def test_raw_capture_and_conversion(self):
+        config = EEGDeviceConfig(com_name="eegsim://?seed=0", measure_duration=1, adc_pga_gain=1, channel_mask=[1] * 8,
+                                 sdo_driver_strength=3, adc_samplingrate=4000, test_mode_enabled=False, adc_power_mode_high=True,
+                                 error_header=False, reference_active_shielding=False, gain_instrument_amplifier=1)
+        metadata = EEGDeviceMetadata(waveform_generator="VirtualEEGDevice", waveform_generator_frequency="10",
+                                     waveform_generator_amplitude="1", waveform_type="Sine")
+        controller = ApiEEGDeviceController(config, metadata, fast_start=True, raw_capture=True)
+        self.assertIsNone(controller._deployed_daq_outlet)
+        with tempfile.TemporaryDirectory() as tmpdir:
+            controller._recording_name = str(Path(tmpdir) / "raw")
+            controller.start_daq()
+            time.sleep(0.5)
+            controller.stop_daq()
+            stats = controller.get_stats()
+
+            frames, description = read_raw_capture(Path(tmpdir) / "raw_frames.raw")
+            self.assertGreater(frames.size, 1000)
+            self.assertEqual(frames.size, stats.frames_written)
+            self.assertEqual(description["eeg_device_config"]["adc_samplingrate"], 4000)
+            self.assertTrue(np.all(np.diff(frames["index"].astype(np.int64)) % 256 == 1))
+            self.assertIsNone(controller.writer_thread)
+
+            h5_path = convert_raw_capture(Path(tmpdir) / "raw_frames.raw", num_workers=1)
+            self.assertEqual(h5_path, Path(tmpdir) / "raw_data.h5")
+            del frames
+        controller._deployed_serial_connection.close()
+
+
+
+class TestCommandsDuringDaq(unittest.TestCase):
+    def test_device_queries_while_data_flows(self):
+        device = VirtualEEGDevice(seed=0)
+        config = EEGDeviceConfig(com_name=register_virtual_device("demux", device), measure_duration=1, adc_pga_gain=1, channel_mask=[1] * 8,
+                                 sdo_driver_strength=3, adc_samplingrate=4000, test_mode_enabled=False, adc_power_mode_high=True,
+                                 error_header=False, reference_active_shielding=False, gain_instrument_amplifier=1)
+        metadata = EEGDeviceMetadata(waveform_generator="VirtualEEGDevice", waveform_generator_frequency="10",
+                                     waveform_generator_amplitude="1", waveform_type="Sine")
+        with tempfile.TemporaryDirectory() as tmpdir:
+            controller = ApiEEGDeviceController(config, metadata, fast_start=True, stream_name="DemuxTest",
+                                                recording_name=str(Path(tmpdir) / "demux"), error_register_interval=0.1)
+            controller.start_daq()
+            time.sleep(0.2)
+            handler = controller.deployed_mcu_communication_handler
+            self.assertEqual(handler._get_system_state(), "DAQ")
+            self.assertEqual(handler.get_firmware_version(), "1.0")
+            self.assertGreater(handler.get_runtime_sec(), 0.)
+            device.error_registers = bytes([4] + [0] * 16)
+            time.sleep(0.3)
+            self.assertEqual(controller.output_daq_error_register().channel_0_error_status_register, 4)
+            controller.stop_daq()
+            stats = controller.get_stats()
+            self.assertFalse(handler.is_daq_active)
+
+            path = Path(tmpdir) / "demux_data.h5"
+            registers = read_h5_error_registers(path)
+            self.assertGreaterEqual(registers.shape[0], 3)
+            self.assertTrue(np.all(np.diff(registers[:, 0]) > 0))
+            self.assertEqual(registers[-1, 1], 4)
+            self.assertEqual(stats.framing_errors, 0)
+            self.assertEqual(stats.discarded_bytes, 0)
+            self.assertEqual(read_h5_gaps(path).shape[0], 0)
+        controller._deployed_serial_connection.close()
+        unregister_virtual_device("demux")
+
+
 if __name__ == '__main__':
     unittest.main()
\ No newline at end of file
@@ -0,0 +1,189 @@
+from src import EEGDeviceConfig, EEGDeviceMetadata, AcquisitionStats, SharedRingBuffer
+from .eeghw_control import ApiEEGDeviceController, SAMPLE_COLUMNS
+import multiprocessing, threading, queue, time
+import numpy as np
+
+# Interval in which the ingest workers report their counters in seconds
+STATS_REPORT_INTERVAL = 0.5
+
+
+class _SharedMemoryOutlet:
+    """Stand-in for the StreamOutlet of an ingest worker, which hands the pushed chunks to the parent process"""
+    def __init__(self, ring: SharedRingBuffer) -> None:
+        self._ring = ring
+
+    def push_chunk(self, x: np.ndarray, timestamp: np.ndarray, pushthrough: bool = True) -> None:
+        self._ring.write(x, timestamp)
+
+
+class DeviceIngestController(ApiEEGDeviceController):
+    """Controller of one board inside an ingest worker process. Only the serial ingest runs here, the samples go to an
+    own LSL outlet or, if a shared ring buffer is given, to the parent process"""
+    _ring: SharedRingBuffer
+
+    def __init__(self, *args, ring: SharedRingBuffer = None, **kwargs) -> None:
+        self._ring = ring
+        super().__init__(*args, **kwargs)
+
+
+    def start_daq(self) -> bool:
+        """Start the device and the serial read thread, without H5 writer and live plotter
+
+        Returns:
+            bool: True if the ingest was started
+        """
+        self._running = True
+        self._stats.reset()
+        self._last_frame = None
+        self._framer.reset()
+        self._clock.reset()
+        self.writer_thread = None
+        self.live_plotter_process = None
+        self.read_process_thread = threading.Thread(target=self._read_and_process_serial_data, name="SerialReadProcess", daemon=True)
+        self.deployed_mcu_communication_handler.start_daq()
+        self.read_process_thread.start()
+        self._start_time = time.time()
+        return True
+
+
+    def take_gaps(self) -> list:
+        """Take the gap records detected since the last call
+
+        Returns:
+            list: Tuples of offsets and lost counts, see ApiEEGDeviceController._check_packet_gaps
+        """
+        gaps = []
+        while not self._gap_queue.empty():
+            gaps.append(self._gap_queue.get_nowait())
+        return gaps
+
+
+    def _init_daq_outlet(self):
+        if self._ring is None:
+            return super()._init_daq_outlet()
+        return _SharedMemoryOutlet(self._ring)
+
+
+def run_device_ingest(device_index: int, config: EEGDeviceConfig, metadata: EEGDeviceMetadata, stream_name: str,
+                      startup_timeout: float, ready_event, start_event, stop_event, report_queue, ring_name: str = None,
+                      ring_capacity: int = 0) -> None:
+    """Entry point of an ingest worker process. Opens and configures one board, streams its samples once start_event is
+    set and reports (device_index, AcquisitionStatsSnapshot, gaps) until stop_event is set. An exception while opening
+    the board is reported as (device_index, exception, [])"""
+    ring = SharedRingBuffer(SAMPLE_COLUMNS, ring_capacity, name=ring_name) if ring_name is not None else None
+    try:
+        controller = DeviceIngestController(config=config, metadata=metadata, fast_start=True,
+                                            startup_timeout=startup_timeout, stream_name=stream_name, ring=ring)
+    except Exception as e:
+        report_queue.put((device_index, RuntimeError(f"Board {config.com_name}: {e}"), []))
+        return
+    ready_event.set()
+    while not start_event.wait(0.05):
+        if stop_event.is_set():
+            controller._deployed_serial_connection.close()
+            return
+
+    controller.start_daq()
+    while not stop_event.wait(STATS_REPORT_INTERVAL):
+        report_queue.put((device_index, controller.get_stats(), controller.take_gaps()))
+    controller.stop_daq()
+    report_queue.put((device_index, controller.get_stats(), controller.take_gaps()))
+    controller._deployed_serial_connection.close()
+    if ring is not None:
+        ring.close()
+
+
+class IsolatedIngest:
+    _ring: SharedRingBuffer
+    _process: multiprocessing.Process
+
+    def __init__(self, config: EEGDeviceConfig, metadata: EEGDeviceMetadata, ring_capacity: int, startup_timeout: float) -> None:
+        """Ingest of one board in a child process, which hands the decoded samples to the parent through a shared
+        ring buffer. The child owns the serial port while it runs
+
+        Args:
+            config (EEGDeviceConfig): Configuration of the board
+            metadata (EEGDeviceMetadata): Metadata information for the measurement
+            ring_capacity (int): Number of samples the ring buffer holds
+            startup_timeout (float): Deadline in seconds for the child to start the board
+        """
+        self._config = config
+        self._metadata = metadata
+        self._startup_timeout = startup_timeout
+        self._ring = SharedRingBuffer(SAMPLE_COLUMNS, ring_capacity)
+        self._process = None
+
+
+    @property
+    def finished(self) -> bool:
+        """True once the child process ended"""
+        return self._process is not None and not self._process.is_alive()
+
+    @property
+    def dropped(self) -> int:
+        """Samples dropped because the ring buffer was full"""
+        return self._ring.dropped
+
+
+    def start(self) -> None:
+        """Start the child process and wait until it started the board
+
+        Raises:
+            RuntimeError: If the child could not open the board or did not start it in time
+        """
+        context = multiprocessing.get_context("spawn")
+        ready_event, start_event = context.Event(), context.Event()
+        self._stop_event = context.Event()
+        self._report_queue = context.Queue()
+        start_event.set()
+        self._process = context.Process(target=run_device_ingest, name="IsolatedIngest", daemon=True,
+                                        args=(0, self._config, self._metadata, None, self._startup_timeout, ready_event,
+                                              start_event, self._stop_event, self._report_queue, self._ring.name, self._ring.capacity))
+        self._process.start()
+        deadline = time.monotonic() + self._startup_timeout
+        while not ready_event.wait(0.05):
+            if not self._process.is_alive() or time.monotonic() > deadline:
+                self.stop()
+                error = self._take_error()
+                raise error if error is not None else RuntimeError(f"Isolated ingest did not start within {self._startup_timeout} s")
+
+
+    def read(self, max_rows: int) -> tuple[np.ndarray, np.ndarray]:
+        """Take up to max_rows decoded samples and their LSL timestamps"""
+        return self._ring.read(max_rows)
+
+
+    def poll_reports(self, stats: AcquisitionStats, gap_queue: queue.Queue) -> None:
+        """Copy the latest counters of the child into stats and move its gap records into gap_queue"""
+        while True:
+            try:
+                _, snapshot, gaps = self._report_queue.get_nowait()
+            except queue.Empty:
+                return
+            if isinstance(snapshot, Exception):
+                continue
+            stats.load_reader_snapshot(snapshot)
+            for gap in gaps:
+                gap_queue.put(gap)
+
+
+    def stop(self) -> None:
+        """Stop the board and the child process, the serial port is released afterwards"""
+        self._stop_event.set()
+        self._process.join(timeout=self._startup_timeout)
+        if self._process.is_alive():
+            self._process.terminate()
+
+
+    def close(self) -> None:
+        """Free the ring buffer once all samples were read"""
+        self._ring.close()
+
+
+    def _take_error(self) -> Exception:
+        """Exception reported by the child, None if there is none"""
+        try:
+            _, report, _ = self._report_queue.get(timeout=0.1)
+        except queue.Empty:
+            return None
+        return report if isinstance(report, Exception) else None
@@ -0,0 +1,50 @@
+import os
+import tempfile
+import time
+import unittest
+from pathlib import Path
+import h5py
+from eeg_api import ApiEEGDeviceController
+from src import EEGDeviceConfig, EEGDeviceMetadata, VirtualEEGDevice, VirtualEEGPty
+
+
+@unittest.skipUnless(os.name == "posix", "pseudo terminals are only available on POSIX")
+class TestIsolatedIngest(unittest.TestCase):
+    def setUp(self):
+        self._device = VirtualEEGDevice(sampling_rate=2000, seed=0)
+        self._pty = VirtualEEGPty(self._device).start()
+        self._config = EEGDeviceConfig(com_name=self._pty.port, measure_duration=1, adc_pga_gain=1, channel_mask=[1] * 8,
+                                       sdo_driver_strength=3, adc_samplingrate=2000, test_mode_enabled=False,
+                                       adc_power_mode_high=True, error_header=False, reference_active_shielding=False,
+                                       gain_instrument_amplifier=1)
+        self._metadata = EEGDeviceMetadata(waveform_generator="VirtualEEGDevice", waveform_generator_frequency="10",
+                                           waveform_generator_amplitude="1", waveform_type="Sine")
+
+
+    def tearDown(self):
+        self._pty.stop()
+
+
+    def test_recording_with_isolated_ingest(self):
+        controller = ApiEEGDeviceController(self._config, self._metadata, fast_start=True, isolated_ingest=True)
+        with tempfile.TemporaryDirectory() as tmpdir:
+            controller._recording_name = str(Path(tmpdir) / "isolated")
+            controller.start_daq()
+            time.sleep(1.)
+            controller.stop_daq()
+            stats = controller.get_stats()
+            with h5py.File(Path(tmpdir) / "isolated_data.h5") as file:
+                num_written = file["ad7779_data"]["measurements"].shape[0]
+
+        self.assertGreater(stats.frames_read, 1000)
+        self.assertEqual(stats.frames_pushed, stats.frames_read)
+        self.assertEqual(stats.handoff_dropped_frames, 0)
+        self.assertEqual(stats.sequence_gaps, 0)
+        self.assertEqual(num_written, stats.frames_written)
+        # the parent owns the serial port again after the acquisition
+        self.assertEqual(controller.deployed_mcu_communication_handler.wait_until_ready(timeout=2.) >= 0., True)
+        controller._deployed_serial_connection.close()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,321 @@
+from src import LSLHandler, H5Handler, scan_com_names, generate_poti_config, calculate_requierd_resistor_value_for_amplification, calculate_poti_value, calculate_gain
+from src import EEGDeviceConfig, EEGDeviceMetadata, DeviceStatsSnapshot, MultiDeviceStatsSnapshot, StreamMerger, BoundedSampleBuffer
+from .eeghw_control import SAMPLE_COLUMNS, MAX_FRAMES_PER_BATCH
+from .ingest_worker import run_device_ingest
+from dataclasses import replace
+from datetime import datetime
+from pylsl import StreamOutlet, StreamInlet, resolve_byprop, proc_threadsafe
+import multiprocessing, threading, queue, time, os
+import numpy as np
+
+# Channels of one board
+BOARD_CHANNELS = 8
+
+
+class ApiMultiEEGDeviceController:
+    _eeg_device_config: EEGDeviceConfig
+    _metadata: EEGDeviceMetadata
+    _com_names: list
+    _stream_names: list
+    _num_devices: int
+    _merger: StreamMerger
+    _merged_outlet: StreamOutlet
+    _write_buffer: BoundedSampleBuffer
+    _device_stats: list
+
+    def __init__(self, config: EEGDeviceConfig, metadata: EEGDeviceMetadata, com_names: list=None, startup_timeout: float=10., max_lag_sec: float=0.5,
+                 writer_policy: str="block", writer_buffer_sec: float=10., spill_dir: str=None, recording_name: str=None) -> None:
+        """Acquire several 8-channel boards as one recording. Every board is opened, configured and read by an own
+        ingest worker process, so the decoding of the boards runs in parallel. The workers stamp the samples with
+        their device timestamps mapped to the LSL clock, the controller merges them on a common sample grid into one
+        wide LSL stream (8 channels per board) and one H5 recording
+
+        The workers are started with the spawn method, scripts using this controller need an
+        if __name__ == "__main__" guard.
+
+        Args:
+            config (EEGDeviceConfig): Configuration applied to every board, com_name is ignored
+            metadata (EEGDeviceMetadata): Metadata information for the measurement
+            com_names (list, optional): COM ports or URLs of the boards, None uses all connected boards. Defaults to None.
+            startup_timeout (float, optional): Deadline in seconds for the boards and the LSL streams to get ready. Defaults to 10.
+            max_lag_sec (float, optional): Maximum time a merged sample waits for a stalled board. Defaults to 0.5.
+            writer_policy (str, optional): Overflow policy of the buffer between merger and H5 file, see ApiEEGDeviceController. Defaults to "block".
+            writer_buffer_sec (float, optional): Merged samples held in memory by the writer buffer, in seconds of acquisition. Defaults to 10.
+            spill_dir (str, optional): Directory of the spill file, None uses the temporary directory. Defaults to None.
+            recording_name (str, optional): Path prefix of the H5 file <recording name>_data.h5, None uses
+                Measurement_hardware_eeg<date>_<time> in the working directory. Defaults to None.
+
+        Raises:
+            ConnectionError: If no board is found
+            RuntimeError: If a board could not be opened or did not get ready in time
+        """
+        self._com_names = list(com_names) if com_names is not None else scan_com_names()
+        if not self._com_names:
+            raise ConnectionError("No EEG board found")
+        self._num_devices = len(self._com_names)
+        self._eeg_device_config = config
+        self._adc_samplingrate = config.adc_samplingrate
+        self._metadata = metadata
+        self._startup_timeout = startup_timeout
+        self._recording_name = recording_name if recording_name is not None else datetime.now().strftime("Measurement_hardware_eeg%Y%m%d_%H%M%S")
+        self._running = False
+        self._start_time = None
+        self._samples_merged = 0
+        self._samples_written = 0
+        self.merge_thread = None
+        self.writer_thread = None
+
+        self._poti_config = generate_poti_config(config.gain_instrument_amplifier)
+        self._poti_config.calculated_resistor_value = calculate_requierd_resistor_value_for_amplification(self._poti_config.gain)
+        self._poti_config.poti_value, self._poti_config.actual_resistor_value = calculate_poti_value(self._poti_config.calculated_resistor_value)
+        self._poti_config.actual_gain_value = calculate_gain(self._poti_config.actual_resistor_value)
+
+        self._merger = StreamMerger(num_streams=self._num_devices, num_columns=SAMPLE_COLUMNS, sampling_rate=self._adc_samplingrate, max_lag_sec=max_lag_sec)
+        # rows of the writer buffer: measurements and alerts of all boards, then a missing flag per board
+        self._write_buffer = BoundedSampleBuffer(num_columns=(2 * BOARD_CHANNELS + 1) * self._num_devices,
+                                                 capacity=max(int(writer_buffer_sec * self._adc_samplingrate), MAX_FRAMES_PER_BATCH),
+                                                 policy=writer_policy, spill_dir=spill_dir)
+        self._device_stats = [None] * self._num_devices
+        self._inlets_ready = threading.Event()
+        self._merged_outlet = LSLHandler(name="DAQ_Stream", sampling_rate=self._adc_samplingrate, num_channels=BOARD_CHANNELS * self._num_devices).create_lsl_outlet_daq
+
+        # stream names are unique per process, so several controllers on one network do not mix up their boards
+        self._stream_names = [f"DAQ_Stream_{os.getpid()}_{index}" for index in range(self._num_devices)]
+        self._workers = self._start_workers()
+
+
+    # ========== API METHODS ==========
+    @property
+    def get_com_names(self) -> list:
+        """COM ports or URLs of the boards in the order of the merged channels"""
+        return self._com_names
+
+
+    def get_stats(self) -> MultiDeviceStatsSnapshot:
+        """Get the merged counters and the gap and clock drift statistics of every board
+
+        Returns:
+            MultiDeviceStatsSnapshot: Dataclass with the merged counters and a DeviceStatsSnapshot per board
+        """
+        self._collect_reports()
+        uptime = max(time.monotonic() - self._start_time, 1e-9) if self._start_time is not None else 0.
+        missing = self._merger.missing_samples
+        dropped = self._merger.dropped_samples
+        devices = [DeviceStatsSnapshot(device_index=index, com_name=self._com_names[index], acquisition=self._device_stats[index],
+                                       missing_samples=int(missing[index]), dropped_samples=int(dropped[index]))
+                   for index in range(self._num_devices)]
+        return MultiDeviceStatsSnapshot(uptime_sec=uptime, samples_merged=self._samples_merged, samples_written=self._samples_written,
+                                        samples_per_sec=self._samples_merged / uptime if uptime else 0.,
+                                        buffer_depth=self._write_buffer.depth, buffer_dropped_samples=self._write_buffer.dropped,
+                                        buffer_spilled_samples=self._write_buffer.spilled, devices=devices)
+
+
+    def start_daq(self) -> bool:
+        """Connect to the LSL streams of all boards and start the acquisition on all boards at once
+
+        Raises:
+            TimeoutError: If the LSL streams of the boards are not found within the startup timeout
+
+        Returns:
+            bool: True if the acquisition started, False if it is already running or was already stopped
+        """
+        if self._running or self._stop_event.is_set():
+            print("Already running or stopped, a multi-device acquisition runs once per controller!")
+            return False
+        self._running = True
+        self._merger.reset()
+        self._inlets_ready.clear()
+
+        self.merge_thread = threading.Thread(target=self._merge_device_streams, name="DeviceMerger", daemon=True)
+        self.writer_thread = threading.Thread(target=self._write_to_h5_file, name="FileWriter", daemon=True)
+        self.merge_thread.start()
+        self.writer_thread.start()
+        if not self._inlets_ready.wait(timeout=self._startup_timeout):
+            self.stop_daq()
+            raise TimeoutError(f"LSL streams of the boards not found within {self._startup_timeout} s")
+
+        self._start_event.set()
+        self._start_time = time.monotonic()
+        return True
+
+
+    def stop_daq(self) -> bool:
+        """Stop the acquisition on all boards, finish the merged recording and end the worker processes
+
+        Returns:
+            bool: True if everything stopped
+        """
+        self._running = False
+        if self.merge_thread is not None and self.merge_thread.is_alive():
+            self.merge_thread.join()
+        if self.writer_thread is not None and self.writer_thread.is_alive():
+            self.writer_thread.join()
+        # the inlets are closed with the merge thread, before the outlets of the workers disappear
+        self._stop_event.set()
+        for worker in self._workers:
+            worker.join(timeout=self._startup_timeout)
+        for worker in self._workers:
+            if worker.is_alive():
+                worker.terminate()
+        self._collect_reports()
+        print("Threads stopped.")
+        return True
+
+
+    #  ========== INTERNAL METHODS ==========
+    def _start_workers(self) -> list:
+        """Start one ingest worker process per board and wait until every board is configured
+
+        Raises:
+            RuntimeError: If a board could not be opened or did not get ready in time
+
+        Returns:
+            list: Started worker processes
+        """
+        context = multiprocessing.get_context("spawn")
+        self._start_event = context.Event()
+        self._stop_event = context.Event()
+        self._report_queue = context.Queue()
+        ready_events = [context.Event() for _ in range(self._num_devices)]
+        workers = [context.Process(target=run_device_ingest, name=f"DeviceIngest{index}", daemon=True,
+                                   args=(index, replace(self._eeg_device_config, com_name=com_name), self._metadata,
+                                         self._stream_names[index], self._startup_timeout, ready_events[index],
+                                         self._start_event, self._stop_event, self._report_queue))
+                   for index, com_name in enumerate(self._com_names)]
+        for worker in workers:
+            worker.start()
+
+        deadline = time.monotonic() + self._startup_timeout
+        try:
+            for index, event in enumerate(ready_events):
+                while not event.wait(0.05):
+                    self._collect_reports()
+                    if not workers[index].is_alive() or time.monotonic() > deadline:
+                        raise RuntimeError(f"Board {self._com_names[index]} did not get ready within {self._startup_timeout} s")
+        except RuntimeError:
+            self._stop_event.set()
+            for worker in workers:
+                worker.join(timeout=1.)
+                if worker.is_alive():
+                    worker.terminate()
+            raise
+        return workers
+
+
+    def _collect_reports(self) -> None:
+        """Take the latest counters of the workers from the report queue
+
+        Raises:
+            RuntimeError: If a worker reported an error
+        """
+        while True:
+            try:
+                index, report, _ = self._report_queue.get_nowait()
+            except queue.Empty:
+                return
+            if isinstance(report, Exception):
+                raise report
+            self._device_stats[index] = report
+
+
+    def _connect_device_streams(self) -> list[StreamInlet]:
+        """Resolve and open the LSL streams of all boards
+
+        Returns:
+            list[StreamInlet]: Inlets in the order of the boards, empty if a stream was not found in time
+        """
+        deadline = time.monotonic() + self._startup_timeout
+        inlets = []
+        for stream_name in self._stream_names:
+            streams = []
+            while self._running and not streams and time.monotonic() < deadline:
+                streams = resolve_byprop("name", stream_name, timeout=0.1)
+            if not streams:
+                return []
+            inlet = StreamInlet(streams[0], max_buflen=60, max_chunklen=1024, recover=True, processing_flags=proc_threadsafe)
+            inlet.open_stream(timeout=max(deadline - time.monotonic(), 0.))
+            inlets.append(inlet)
+        return inlets
+
+
+    def _merge_device_streams(self) -> None:
+        """Pull the samples of all boards, merge them on the common grid and hand them to the LSL outlet and the H5 writer"""
+        inlets = self._connect_device_streams()
+        if not inlets:
+            return
+        self._inlets_ready.set()
+        while self._running:
+            received = False
+            for index, inlet in enumerate(inlets):
+                data, timestamps = inlet.pull_chunk(timeout=0.)
+                if timestamps:
+                    self._merger.feed(index, data, timestamps)
+                    received = True
+            rows, times, missing = self._merger.pop()
+            if rows.shape[0]:
+                self._push_merged(rows, times, missing)
+            if not received:
+                time.sleep(0.001)
+
+
+    def _push_merged(self, rows: np.ndarray, times: np.ndarray, missing: np.ndarray) -> None:
+        """Rearrange merged rows into the wide layout, push them to the LSL outlet and hand them to the H5 writer
+
+        Args:
+            rows (np.ndarray): Merged rows with SAMPLE_COLUMNS columns per board side by side
+            times (np.ndarray): Common time of every row in seconds
+            missing (np.ndarray): Boolean mask with shape (num_rows, num_devices) of rows without data of a board
+        """
+        boards = rows.reshape(rows.shape[0], self._num_devices, SAMPLE_COLUMNS)
+        measurements = boards[:, :, :BOARD_CHANNELS].reshape(rows.shape[0], -1)
+        alerts = boards[:, :, BOARD_CHANNELS:2 * BOARD_CHANNELS].reshape(rows.shape[0], -1)
+        timestamps = np.rint((times - self._merger.start_time) * 1e6).astype(np.int64)
+
+        self._merged_outlet.push_chunk(np.column_stack((measurements, alerts, timestamps.astype(np.int32))), timestamp=times, pushthrough=True)
+        self._write_buffer.put(np.column_stack((measurements, alerts, missing)), times)
+        self._samples_merged += rows.shape[0]
+
+
+    @staticmethod
+    def _find_missing_runs(missing: np.ndarray, offset: int) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """Convert a mask of missing samples into runs per board
+
+        Args:
+            missing (np.ndarray): Boolean mask with shape (num_rows, num_devices)
+            offset (int): Index of the first row in the recording
+
+        Returns:
+            tuple[np.ndarray, np.ndarray, np.ndarray]: Board, index of the first missing row and length of every run
+        """
+        padded = np.zeros((missing.shape[0] + 2, missing.shape[1]), dtype=np.int8)
+        padded[1:-1] = missing
+        edges = np.diff(padded, axis=0)
+        start_rows, start_devices = np.nonzero(edges.T == 1)[::-1]
+        end_rows, _ = np.nonzero(edges.T == -1)[::-1]
+        return start_devices, start_rows + offset, end_rows - start_rows
+
+
+    def _write_to_h5_file(self) -> None:
+        """Write the merged samples and the missing sample runs of every board to the H5 file"""
+        deployed_h5_writer = H5Handler(recording_name=self._recording_name, metadata=self._metadata, eeg_device_config=self._eeg_device_config,
+                                       poti_values=self._poti_config, num_channels=BOARD_CHANNELS * self._num_devices,
+                                       extra_attrs={"num_devices": self._num_devices, "device_com_names": self._com_names})
+        num_channels = BOARD_CHANNELS * self._num_devices
+        while self._running or self._write_buffer.depth:
+            rows, times = self._write_buffer.get(MAX_FRAMES_PER_BATCH, timeout=0.1)
+            # merged samples dropped by the writer buffer are missing for all boards
+            offsets, lost_counts = self._write_buffer.take_losses()
+            if offsets.size:
+                deployed_h5_writer.append_gaps_ad7779(offsets, lost_counts)
+            if not rows.shape[0]:
+                continue
+            timestamps = np.rint((times - self._merger.start_time) * 1e6).astype(np.int64)
+            deployed_h5_writer.append_data_ad7779(timestamps=timestamps, measurements=rows[:, :num_channels],
+                                                  alerts=rows[:, num_channels:2 * num_channels].astype(np.int8))
+            devices, offsets, lengths = self._find_missing_runs(rows[:, 2 * num_channels:].astype(bool), self._samples_written)
+            if offsets.size:
+                deployed_h5_writer.append_device_gaps_ad7779(devices, offsets, lengths)
+            self._samples_written += rows.shape[0]
+        self._write_buffer.close()
+        print(f"Total samples written to file: {deployed_h5_writer.get_file_length}")
+        deployed_h5_writer.close_h5_file()
@@ -0,0 +1,49 @@
+import tempfile
+import time
+import unittest
+from pathlib import Path
+import h5py
+import numpy as np
+from eeg_api.multi_device_control import ApiMultiEEGDeviceController
+from src import EEGDeviceConfig, EEGDeviceMetadata
+
+
+class TestApiMultiEEGDeviceController(unittest.TestCase):
+    def test_find_missing_runs(self):
+        missing = np.array([[False, True],
+                            [True, True],
+                            [True, False],
+                            [False, True]])
+        devices, offsets, lengths = ApiMultiEEGDeviceController._find_missing_runs(missing, offset=100)
+        self.assertEqual(devices.tolist(), [0, 1, 1])
+        self.assertEqual(offsets.tolist(), [101, 100, 103])
+        self.assertEqual(lengths.tolist(), [2, 2, 1])
+
+
+    def test_merged_recording_of_virtual_boards(self):
+        config = EEGDeviceConfig(com_name="", measure_duration=1, adc_pga_gain=1, channel_mask=[1] * 8, sdo_driver_strength=3,
+                                 adc_samplingrate=2000, test_mode_enabled=False, adc_power_mode_high=True, error_header=False,
+                                 reference_active_shielding=False, gain_instrument_amplifier=1)
+        metadata = EEGDeviceMetadata(waveform_generator="VirtualEEGDevice", waveform_generator_frequency="10",
+                                     waveform_generator_amplitude="1", waveform_type="Sine")
+        controller = ApiMultiEEGDeviceController(config, metadata, com_names=["eegsim://?seed=0", "eegsim://?seed=1"])
+        with tempfile.TemporaryDirectory() as tmpdir:
+            controller._recording_name = str(Path(tmpdir) / "multi")
+            controller.start_daq()
+            time.sleep(1.)
+            controller.stop_daq()
+            stats = controller.get_stats()
+
+            with h5py.File(Path(tmpdir) / "multi_data.h5") as file:
+                grp = file["ad7779_data"]
+                self.assertEqual(grp["measurements"].shape[1], 16)
+                self.assertEqual(grp.attrs["num_devices"], 2)
+                self.assertGreater(grp["measurements"].shape[0], 1000)
+                np.testing.assert_array_equal(np.unique(np.diff(grp["timestamps"][:])), [500])
+                self.assertGreater(np.mean(grp["measurements"][:, [0, 8]] != 0), 0.95)
+
+        self.assertEqual(stats.samples_written, stats.samples_merged)
+        for device in stats.devices:
+            self.assertGreater(device.acquisition.frames_read, 1000)
+            self.assertLess(device.missing_samples, 20)
+            self.assertLess(abs(device.acquisition.clock_drift_ppm), 1000.)
@@ -1,18 +1,25 @@
 import numpy as np
 from pathlib import Path
-from src import TransientData, TransientMetadata
+from src import TransientData, TransientMetadata, SummaryData, ChannelBlockStats
 from src import post_process_rolling_median, post_process_error_flags, elapsed_time_convert_to_seconds
-from src import plot_transient_data, plot_histogram_timestamps
+from src import plot_transient_data, plot_histogram_timestamps, plot_summary_data
 from src import analysis_frequency
-from src import load_files, read_h5_file
+from src import load_files, read_h5_file, read_h5_gaps, read_h5_summary, read_h5_block_stats, find_saturated_blocks
+from src import read_h5_channel_layout, expand_channels
+from src import ChannelCalibration, read_h5_calibration
 
 
 class EEGDataReader:
-    _scale_data: float = 5. / 2 ** 24
+    _calibration: ChannelCalibration # per-channel scale and offset from ADC codes to volts at the electrode
+    _revision: int # incremented by every post-processing, which invalidates the cached data
+    _data_cache: dict # TransientData of the current revision per dtype
+    _sampling_rate: float # estimated once from the timestamps, None before the first use
+    _channel_index: np.ndarray # logical channel of every stored column, None if all channels are stored
+    _num_channels: int # number of logical channels, the channels which were not recorded read as zero
     _scale_time: float = 1e6 # microseconds to seconds
     
-    _error_flags: np.ndarray # alert data
-    _measurements: np.ndarray # measurements data
+    _error_flags: np.ndarray # alert data of the stored columns
+    _measurements: np.ndarray # measurements data of the stored columns
     _timestamps: np.ndarray # timestamps in microseconds
     _metadata : TransientMetadata # metadata from h5 file, for the loaded recording
     _packet_numbers: list # packet numbers from each data packet
@@ -29,13 +36,44 @@ class EEGDataReader:
         
         self._path_to_selected_file = self._load_files(Path(path), load_case)
         self._error_flags, self._measurements, self._timestamps, self._metadata = self._read_h5_file()
+        self._channel_index, self._num_channels = self._init_channel_layout()
+        self._calibration = read_h5_calibration(self._path_to_selected_file)
 
         self._timestamps = self._elapsed_time_convert_to_seconds()
+        self._timestamps.flags.writeable = False # shared by all TransientData objects
+        self._revision = 0
+        self._data_cache = {}
+        self._sampling_rate = None
 
 
     # ========== API METHODS ==========
-    def get_data(self) -> TransientData:
-        """Get the processed data as TransientData object
+    @property
+    def revision(self) -> int:
+        """Number of post-processing steps applied so far, a TransientData with an older revision is out of date"""
+        return self._revision
+
+    @property
+    def sampling_rate(self) -> float:
+        """Sampling rate in Hz from the median timestamp difference, computed on first use"""
+        if self._sampling_rate is None:
+            self._sampling_rate = float(1 / np.median(np.diff(self._timestamps)))
+        return self._sampling_rate
+
+    @property
+    def num_channels(self) -> int:
+        """Number of logical channels, including the channels which were not recorded"""
+        return self._num_channels
+
+
+    def get_data(self, dtype: np.dtype = np.float64, out: np.ndarray = None) -> TransientData:
+        """Get the processed data as TransientData object, in volts at the electrode. The data is converted once per dtype
+        and post-processing, further calls return the same object with read-only arrays. The timestamps are shared.
+        The samples hold all logical channels, the channels which were not recorded are zero
+
+        Args:
+            dtype (np.dtype, optional): Float type of the samples, np.float32 halves the memory. Defaults to np.float64.
+            out (np.ndarray, optional): Array of shape (num_samples, num_channels) the samples are written to instead of a
+                cached array, e.g. to reuse a buffer. Defaults to None.
 
         Raises:
             ValueError: File is not, the list of data points or timestamps is None
@@ -46,14 +84,64 @@ class EEGDataReader:
         if self._measurements is None or self._timestamps is None or self._error_flags is None:
             raise ValueError("File not loaded. Please load file before getting data!")
 
-        fs = 1/np.median(np.diff(self._timestamps))
-        return TransientData(
-            rawdata= self._scale_data * self._measurements,
+        key = np.dtype(dtype)
+        if out is None and key in self._data_cache:
+            return self._data_cache[key]
+        if self._channel_index is None:
+            rawdata = self._calibration.apply(self._measurements, dtype=dtype, out=out)
+        else:
+            rawdata = np.empty((self._measurements.shape[0], self._num_channels), dtype=dtype) if out is None else out
+            rawdata[:, self._channel_index] = self._calibration.apply(self._measurements, dtype=rawdata.dtype, channels=self._channel_index)
+            rawdata[:, self._inactive_channels()] = 0
+        data = TransientData(
+            rawdata= rawdata,
             timestamps=self._timestamps,
-            sampling_rate=float(fs),
-            error_flags=self._error_flags,
-            channels= self._metadata.channel_mask
+            sampling_rate=self.sampling_rate,
+            error_flags=self._logical_error_flags(),
+            channels= self._metadata.channel_mask,
+            revision=self._revision
         )
+        if out is None:
+            rawdata.flags.writeable = False # a cached array is handed out again, changes would leak into later calls
+            self._data_cache[key] = data
+        return data
+
+
+    def get_volts(self, start_sec: float = 0., stop_sec: float = None, channels: list = None,
+                  dtype: np.dtype = np.float32) -> np.ndarray:
+        """Get a time span of the selected channels in volts at the electrode, converted without a copy of the whole recording
+
+        Args:
+            start_sec (float, optional): Start of the span in seconds from the start of the recording. Defaults to 0..
+            stop_sec (float, optional): End of the span in seconds, None for the end of the recording. Defaults to None.
+            channels (list, optional): Logical channels, None for all channels. Defaults to None.
+            dtype (np.dtype, optional): Float type of the samples. Defaults to np.float32.
+
+        Returns:
+            np.ndarray: Voltages with shape (num_samples, num_channels), zero for the channels which were not recorded
+        """
+        start, stop = np.searchsorted(self._timestamps, [start_sec, stop_sec if stop_sec is not None else np.inf])
+        if self._channel_index is None:
+            codes = self._measurements[start:stop] if channels is None else self._measurements[start:stop, channels]
+            return self._calibration.apply(codes, dtype=dtype, channels=channels)
+        selected = np.arange(self._num_channels) if channels is None else np.asarray(channels)
+        column_of_channel = np.full(self._num_channels, -1)
+        column_of_channel[self._channel_index] = np.arange(self._channel_index.size)
+        columns = column_of_channel[selected]
+        recorded = columns >= 0
+        volts = np.zeros((stop - start, selected.size), dtype=dtype)
+        volts[:, recorded] = self._calibration.apply(self._measurements[start:stop, columns[recorded]], dtype=dtype,
+                                                     channels=selected[recorded])
+        return volts
+
+
+    def get_calibration(self) -> ChannelCalibration:
+        """Get the per-channel calibration of the loaded recording
+
+        Returns:
+            ChannelCalibration: Scale and offset from ADC codes to volts at the electrode
+        """
+        return self._calibration
 
 
     def get_metadata(self) -> TransientMetadata:
@@ -65,6 +153,54 @@ class EEGDataReader:
         return self._metadata
     
 
+    def get_gaps(self) -> np.ndarray:
+        """Get the gap records of the loaded recording
+
+        Returns:
+            np.ndarray: Array with shape (num_gaps, 2), columns offset (index of the first sample after the gap) and lost_count
+        """
+        return read_h5_gaps(self._path_to_selected_file)
+
+
+    def get_summary(self, start_sec: float = 0., stop_sec: float = None, pixel_width: int = 1000) -> SummaryData:
+        """Get a time span at the coarsest summary level with at least pixel_width bins, for overview plots and scrolling
+
+        Args:
+            start_sec (float, optional): Start of the span in seconds from the start of the recording. Defaults to 0..
+            stop_sec (float, optional): End of the span in seconds, None for the end of the recording. Defaults to None.
+            pixel_width (int, optional): Number of points the span is drawn with. Defaults to 1000.
+
+        Returns:
+            SummaryData: Minimum, maximum and mean of every bin in volts at the electrode
+        """
+        summary = read_h5_summary(self._path_to_selected_file, start_sec, stop_sec, pixel_width, scale_time=self._scale_time)
+        summary.minimum = self._calibration.apply(summary.minimum, dtype=np.float64)
+        summary.maximum = self._calibration.apply(summary.maximum, dtype=np.float64)
+        summary.mean = self._calibration.apply(summary.mean, dtype=np.float64)
+        return summary
+
+
+    def get_block_stats(self) -> ChannelBlockStats:
+        """Get the per-channel statistics of the blocks of the loaded recording
+
+        Returns:
+            ChannelBlockStats: Statistics of every block and channel in ADC codes
+        """
+        return read_h5_block_stats(self._path_to_selected_file, scale_time=self._scale_time)
+
+
+    def get_saturated_channels(self, min_near_rail: int = 1) -> list:
+        """Get the channels which were saturated and when, from the block statistics
+
+        Args:
+            min_near_rail (int, optional): Number of samples near the rails for a saturated block. Defaults to 1.
+
+        Returns:
+            list: Tuples (channel, start_sec, stop_sec) of every saturated span
+        """
+        return find_saturated_blocks(self.get_block_stats(), min_near_rail)
+
+
     def get_path2file(self) -> Path:
         """Get the path to the data file
 
@@ -95,6 +231,17 @@ class EEGDataReader:
         plot_histogram_timestamps(data)
 
 
+    @staticmethod
+    def plot_summary_data(data: SummaryData, channel_to_plot: int) -> None:
+        """Plot the range and the mean of every bin of a summary span for a selected channel
+
+        Args:
+            data (SummaryData): Span of the recording from get_summary
+            channel_to_plot (int): Index of the channel to plot (0-based)
+        """
+        plot_summary_data(data, channel_to_plot)
+
+
     @staticmethod
     def frequency_analysis(data: TransientData, selected_channel: int) -> None:
         """Analyze and print the dominant frequency in the selected channel data, with the corresponding sampling rate
@@ -108,18 +255,20 @@ class EEGDataReader:
 
 
     def post_process_rolling_median(self, window_size: int, threshold: int) -> None:
-        """Post-process the data to remove outliers using rolling median
+        """Post-process the data to remove outliers using rolling median, TransientData objects from before are out of date
 
         Args:
             window_size (int): window size for rolling median calculation
             threshold (int): threshold for detecting outliers
         """        
         post_process_rolling_median(self._measurements, window_size, threshold)
+        self._invalidate_data()
 
 
     def post_process_error_flags(self) -> None:
-        """Post-process error flags to interpolate erroneous data points"""        
+        """Post-process error flags to interpolate erroneous data points, TransientData objects from before are out of date"""        
         post_process_error_flags(self._measurements, self._error_flags)
+        self._invalidate_data()
 
 
     # ========== INTERNAL METHODS ==========
@@ -143,8 +292,39 @@ class EEGDataReader:
             np.ndarray: alerts, measurements, timestamps
             TransientMetadata: metadata of the measurement
         """        
-        return read_h5_file(self._path_to_selected_file)
-        
+        return read_h5_file(self._path_to_selected_file, logical_channels=False)
+
+
+    def _init_channel_layout(self) -> tuple[np.ndarray, int]:
+        """Read which logical channels the loaded recording stores
+
+        Returns:
+            tuple[np.ndarray, int]: Logical channel of every stored column, None if all channels are stored, and the
+                number of logical channels
+        """
+        channel_index, num_channels = read_h5_channel_layout(self._path_to_selected_file)
+        if np.array_equal(channel_index, np.arange(num_channels)):
+            return None, num_channels
+        return channel_index, num_channels
+
+
+    def _inactive_channels(self) -> np.ndarray:
+        """Logical channels which were not recorded"""
+        return np.setdiff1d(np.arange(self._num_channels), self._channel_index)
+
+
+    def _logical_error_flags(self) -> np.ndarray:
+        """Alert data of all logical channels, the channels which were not recorded have no alerts"""
+        if self._channel_index is None:
+            return self._error_flags
+        return expand_channels(self._error_flags, self._channel_index, self._num_channels)
+
+
+    def _invalidate_data(self) -> None:
+        """Drop the converted data after the measurements changed"""
+        self._revision += 1
+        self._data_cache.clear()
+
 
     def _elapsed_time_convert_to_seconds(self) -> np.ndarray:
         """Convert elapsed time from microseconds to seconds
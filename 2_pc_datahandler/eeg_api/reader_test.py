@@ -0,0 +1,94 @@
+import io
+import tempfile
+import unittest
+from contextlib import redirect_stdout
+import numpy as np
+from eeg_api import EEGDataReader
+from src import H5Handler, EEGDeviceConfig, EEGDeviceMetadata, PotiConfig
+
+
+class EEGDataReaderTest(unittest.TestCase):
+    def setUp(self):
+        self._tmpdir = tempfile.TemporaryDirectory()
+        config = EEGDeviceConfig(com_name="COM_TEST", measure_duration=1, adc_pga_gain=1, channel_mask=[1] * 8,
+                                 sdo_driver_strength=3, adc_samplingrate=100, test_mode_enabled=False, adc_power_mode_high=True,
+                                 error_header=False, reference_active_shielding=False, gain_instrument_amplifier=1)
+        writer = H5Handler(recording_name=f"{self._tmpdir.name}/rec", eeg_device_config=config,
+                           metadata=EEGDeviceMetadata(waveform_generator="test", waveform_generator_frequency="10",
+                                                      waveform_generator_amplitude="1", waveform_type="Sine"),
+                           poti_values=PotiConfig(gain=1, calculated_resistor_value=0, poti_value=0, actual_resistor_value=0, actual_gain_value=1))
+        self._codes = (np.arange(500)[:, None] * 8 + np.arange(8)).astype(np.int32)
+        alerts = np.zeros((500, 8), dtype=np.int8)
+        alerts[200, 2] = 1
+        writer.append_data_ad7779(timestamps=np.arange(500) * 10000, measurements=self._codes, alerts=alerts)
+        writer.close_h5_file()
+        with redirect_stdout(io.StringIO()):
+            self.reader = EEGDataReader(self._tmpdir.name)
+        self._scale = 1.25 / 2 ** 23
+
+    def tearDown(self):
+        self._tmpdir.cleanup()
+
+    def test_data_is_cached_per_dtype(self):
+        data = self.reader.get_data()
+        self.assertIs(self.reader.get_data(), data)
+        self.assertAlmostEqual(data.sampling_rate, 100.)
+        self.assertFalse(data.rawdata.flags.writeable)
+        single = self.reader.get_data(np.float32)
+        self.assertEqual(single.rawdata.dtype, np.float32)
+        self.assertIs(single.timestamps, data.timestamps)
+        np.testing.assert_allclose(single.rawdata, self._codes * self._scale, rtol=1e-6)
+        out = np.empty((500, 8), dtype=np.float32)
+        self.assertIs(self.reader.get_data(out=out).rawdata, out)
+
+    def test_post_processing_invalidates_data(self):
+        data = self.reader.get_data()
+        self.reader.post_process_error_flags()
+        self.assertEqual(self.reader.revision, 1)
+        current = self.reader.get_data()
+        self.assertIsNot(current, data)
+        self.assertEqual((data.revision, current.revision), (0, 1))
+        self.assertEqual(current.rawdata[200, 2], 200 * 8 * self._scale + 2 * self._scale)
+
+    def test_slices_are_views(self):
+        data = self.reader.get_data()
+        span = data.get_time_slice(1., 2.)
+        self.assertEqual(span.rawdata.shape, (100, 8))
+        self.assertAlmostEqual(span.timestamps[0], 1.)
+        self.assertTrue(np.shares_memory(span.rawdata, data.rawdata))
+        self.assertTrue(np.shares_memory(span.error_flags, data.error_flags))
+        channel = span.get_channel(3)
+        self.assertTrue(np.shares_memory(channel, data.rawdata))
+        np.testing.assert_allclose(channel, self._codes[100:200, 3] * self._scale)
+
+
+    def test_channels_which_were_not_recorded_read_as_zero(self):
+        config = EEGDeviceConfig(com_name="COM_TEST", measure_duration=1, adc_pga_gain=1, channel_mask=[0, 1, 0, 0, 0, 0, 1, 0],
+                                 sdo_driver_strength=3, adc_samplingrate=100, test_mode_enabled=False, adc_power_mode_high=True,
+                                 error_header=False, reference_active_shielding=False, gain_instrument_amplifier=1)
+        with tempfile.TemporaryDirectory() as tmpdir:
+            writer = H5Handler(recording_name=f"{tmpdir}/masked", eeg_device_config=config,
+                               metadata=EEGDeviceMetadata(waveform_generator="test", waveform_generator_frequency="10",
+                                                          waveform_generator_amplitude="1", waveform_type="Sine"),
+                               poti_values=PotiConfig(gain=1, calculated_resistor_value=0, poti_value=0, actual_resistor_value=0, actual_gain_value=1))
+            alerts = np.zeros((500, 8), dtype=np.int8)
+            alerts[200, 6] = 1
+            writer.append_data_ad7779(timestamps=np.arange(500) * 10000, measurements=self._codes, alerts=alerts)
+            writer.close_h5_file()
+            with redirect_stdout(io.StringIO()):
+                reader = EEGDataReader(tmpdir)
+
+            self.assertEqual(reader.num_channels, 8)
+            data = reader.get_data(np.float32)
+            expected = np.zeros((500, 8))
+            expected[:, [1, 6]] = self._codes[:, [1, 6]] * self._scale
+            np.testing.assert_allclose(data.rawdata, expected, rtol=1e-6)
+            self.assertEqual(data.error_flags.tolist(), alerts.tolist())
+            volts = reader.get_volts(1., 2., channels=[6, 0, 1])
+            np.testing.assert_allclose(volts, expected[100:200, [6, 0, 1]], rtol=1e-6)
+            summary = reader.get_summary()
+            np.testing.assert_allclose(summary.maximum, expected, rtol=1e-6)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -41,7 +41,8 @@ if __name__ == "__main__":
     controller = ApiEEGDeviceController(
         config=config,
         metadata=metadata,
-        config_live_plotter=config_plotter0
+        config_live_plotter=config_plotter0,
+        record_streams=["PlayerData"]  # the player data is stored in the group streams of the same H5 file
     )
     controller.start_daq()
     time.sleep(config.measure_duration)
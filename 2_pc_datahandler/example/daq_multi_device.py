@@ -0,0 +1,35 @@
+import time
+from eeg_api import ApiMultiEEGDeviceController
+from src import EEGDeviceConfig, EEGDeviceMetadata
+
+# Configuration applied to every connected board, the COM ports are found automatically
+config = EEGDeviceConfig(
+    com_name="AUTOCOM",
+    measure_duration=120,  # in seconds
+    adc_pga_gain=1,
+    channel_mask=[1,1,1,1,1,1,1,1],
+    sdo_driver_strength=3,
+    adc_samplingrate= 1000,
+    test_mode_enabled=False,
+    adc_power_mode_high=True,
+    error_header=False,
+    reference_active_shielding=False,
+    gain_instrument_amplifier=2
+)
+metadata = EEGDeviceMetadata(
+    waveform_generator="ROHDE&SWARTZ MXO4",
+    waveform_generator_frequency="10",
+    waveform_generator_amplitude="500",
+    waveform_type="Sine"
+)
+
+
+# The boards are read by worker processes, so the guard is required
+if __name__ == "__main__":
+    controller = ApiMultiEEGDeviceController(config=config, metadata=metadata)
+    print(f"Recording {8 * len(controller.get_com_names)} channels from {controller.get_com_names}")
+    controller.start_daq()
+    time.sleep(config.measure_duration)
+    controller.stop_daq()
+    for device in controller.get_stats().devices:
+        print(f"{device.com_name}: {device.missing_samples} missing samples, clock drift {device.acquisition.clock_drift_ppm:.1f} ppm")
@@ -1,12 +1,53 @@
-from .data_structures import EEGDeviceConfig, EEGDeviceMetadata, TransientData, TransientMetadata, ErrorRegisterData
-from .lsl_handler import LSLHandler
-from .serial_handler import SerialHandler
-from .data_processing import extract_channel_data, extract_error_flags
-from .h5_handler import H5Handler
-from .live_visualizer import LivePlotter, start_live_plotter, LivePlotterChannelConfig, translation_func_adc, translation_func_dac
-from .mcu_communication_handler import McuCommunicationHandler
-from .poti import PotiConfig, generate_poti_config, calculate_requierd_resistor_value_for_amplification, calculate_poti_value, calculate_gain
-from .data_post_processing import post_process_rolling_median, post_process_error_flags, elapsed_time_convert_to_seconds
-from .data_plotting import plot_transient_data, plot_histogram_timestamps
-from .data_analysis import analysis_frequency
-from .data_loading import load_files, read_h5_file
\ No newline at end of file
+import importlib
+
+# Exported names by submodule. The submodules are imported on first use of one of their names (PEP 562), so importing
+# the package loads neither h5py and pylsl nor the plotting, live visualization and pandas dependencies before they are needed
+_EXPORTS = {
+    ".data_structures": ["EEGDeviceConfig", "EEGDeviceMetadata", "TransientData", "TransientMetadata", "ErrorRegisterData", "AcquisitionStatsSnapshot", "DeviceStatsSnapshot", "MultiDeviceStatsSnapshot", "SummaryData", "ChannelBlockStats"],
+    ".lsl_handler": ["LSLHandler", "pull_chunk_into", "LSL_NUMPY_DTYPES"],
+    ".serial_handler": ["SerialHandler", "scan_com_names"],
+    ".data_processing": ["extract_channel_data", "extract_error_flags", "decode_channel_values", "decode_alert_flags", "detect_packet_gaps", "ADC_DATA_FRAME_DTYPE"],
+    ".h5_handler": ["H5Handler"],
+    ".live_visualizer": ["LivePlotter", "start_live_plotter", "LivePlotterChannelConfig", "translation_func_adc", "translation_func_dac"],
+    ".mcu_communication_handler": ["McuCommunicationHandler"],
+    ".poti": ["PotiConfig", "generate_poti_config", "calculate_requierd_resistor_value_for_amplification", "calculate_poti_value", "calculate_gain"],
+    ".data_post_processing": ["post_process_rolling_median", "post_process_error_flags", "elapsed_time_convert_to_seconds"],
+    ".data_plotting": ["plot_transient_data", "plot_histogram_timestamps", "plot_summary_data"],
+    ".data_analysis": ["analysis_frequency"],
+    ".data_loading": ["load_files", "read_h5_file", "read_h5_gaps", "read_h5_error_registers", "read_h5_channel_layout", "expand_channels"],
+    ".virtual_device": ["VirtualEEGDevice", "VirtualEEGSerial", "VirtualEEGPty", "register_virtual_device", "unregister_virtual_device"],
+    ".acquisition_stats": ["AcquisitionStats", "StreamingHistogram", "render_prometheus_text"],
+    ".metrics_exporter": ["PrometheusExporter"],
+    ".stream_framer": ["StreamFramer"],
+    ".command_demux": ["DemuxInterface", "RESPONSE_FORMATS"],
+    ".clock_sync": ["ClockAligner"],
+    ".stream_merger": ["StreamMerger"],
+    ".shared_ring_buffer": ["SharedRingBuffer"],
+    ".sample_buffer": ["BoundedSampleBuffer", "OVERFLOW_POLICIES"],
+    ".raw_capture": ["RawCaptureWriter", "read_raw_capture", "convert_raw_capture"],
+    ".bdf_export": ["export_bdf"],
+    ".window_export": ["export_windows", "WindowedDataset", "WINDOW_POLICIES"],
+    ".summary_pyramid": ["SummaryPyramid", "build_summary_pyramid", "read_h5_summary", "PYRAMID_LEVELS"],
+    ".block_statistics": ["BlockStatsAccumulator", "build_block_stats", "read_h5_block_stats", "find_saturated_blocks"],
+    ".channel_quality": ["ChannelQualityMonitor", "format_quality_summary", "QUALITY_LINE_FREQUENCIES"],
+    ".lsl_stream_recorder": ["LSLStreamRecorder", "read_h5_stream", "read_h5_daq_lsl_times"],
+    ".stage_profiler": ["StageProfiler", "NULL_PROFILER", "PROFILER_CAPACITY"],
+    ".recording_info": ["read_recording_info", "analyze_recording"],
+    ".calibration": ["ChannelCalibration", "calibration_from_attrs", "read_h5_calibration", "estimate_channel_corrections", "write_h5_calibration", "ADC_FULL_SCALE_VOLT"],
+}
+_EXPORT_MODULES = {name: module for module, names in _EXPORTS.items() for name in names}
+__all__ = list(_EXPORT_MODULES)
+
+
+def __getattr__(name: str):
+    """Import the submodule of an exported name on first access and keep the name in the package namespace"""
+    module = _EXPORT_MODULES.get(name)
+    if module is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(module, __name__), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__() -> list:
+    return sorted(set(globals()) | set(__all__))
@@ -0,0 +1,181 @@
+import time
+from bisect import bisect_left
+import numpy as np
+from .data_structures import AcquisitionStatsSnapshot
+
+# Upper bounds of the histogram buckets in seconds, from 10 us up to 10 s
+DEFAULT_BUCKETS_SEC = (1e-5, 2.5e-5, 5e-5, 1e-4, 2.5e-4, 5e-4, 1e-3, 2.5e-3, 5e-3, 1e-2, 2.5e-2, 5e-2, 0.1, 0.25, 0.5, 1., 2.5, 5., 10.)
+
+
+class StreamingHistogram:
+    _bounds: tuple
+    _counts: list
+
+    def __init__(self, bounds: tuple = DEFAULT_BUCKETS_SEC) -> None:
+        """Histogram with fixed bucket bounds, which is updated by one thread and read by others without locking
+
+        Args:
+            bounds (tuple, optional): Sorted upper bounds of the buckets. Defaults to DEFAULT_BUCKETS_SEC.
+        """
+        self._bounds = tuple(bounds)
+        self._counts = [0] * (len(self._bounds) + 1)
+        self.count = 0
+        self.sum = 0.
+
+
+    def observe(self, value: float) -> None:
+        """Add one value to the histogram
+
+        Args:
+            value (float): Value to add
+        """
+        self._counts[bisect_left(self._bounds, value)] += 1
+        self.count += 1
+        self.sum += value
+
+
+    def snapshot(self) -> dict:
+        """Copy of the histogram with bucket bounds, counts per bucket, number of values and sum of values"""
+        return {"bounds": list(self._bounds), "counts": list(self._counts), "count": self.count, "sum": self.sum}
+
+
+    def load(self, snapshot: dict) -> None:
+        """Replace the content with a snapshot of a histogram with the same bounds
+
+        Args:
+            snapshot (dict): Snapshot as returned by snapshot()
+        """
+        self._counts = list(snapshot["counts"])
+        self.count = snapshot["count"]
+        self.sum = snapshot["sum"]
+
+
+class AcquisitionStats:
+    def __init__(self, num_channels: int = 8) -> None:
+        """Counters and histograms of the acquisition hot path. Every field is written by exactly one thread (reader or
+        writer), so updates are plain attribute increments and readers take a snapshot without locking
+
+        Args:
+            num_channels (int, optional): Number of ADC channels. Defaults to 8.
+        """
+        self._num_channels = num_channels
+        self.reset()
+
+
+    def reset(self) -> None:
+        """Set all counters to zero and restart the uptime"""
+        self.start_time = time.monotonic()
+        # written by the reader thread
+        self.bytes_read = 0
+        self.frames_read = 0
+        self.frames_pushed = 0
+        self.framing_errors = 0
+        self.discarded_bytes = 0
+        self.incomplete_reads = 0
+        self.sequence_gaps = 0
+        self.lost_frames = 0
+        self.alert_counts = np.zeros(self._num_channels, dtype=np.int64)
+        self.decode_time = StreamingHistogram()
+        self.clock_offset_sec = 0.
+        self.clock_drift_ppm = 0.
+        self.handoff_dropped_frames = 0
+        # written by the writer thread
+        self.frames_written = 0
+        self.queue_depth = 0
+        self.writer_lag_sec = 0.
+        self.writer_lag = StreamingHistogram()
+        self.buffer_depth = 0
+        self.buffer_dropped_frames = 0
+        self.buffer_spilled_frames = 0
+        # written by the controlling thread
+        self.consumer_wait_sec = 0.
+
+
+    def load_reader_snapshot(self, snapshot: AcquisitionStatsSnapshot) -> None:
+        """Take over the reader counters of a snapshot taken in an ingest process, the pushed frames are counted here
+
+        Args:
+            snapshot (AcquisitionStatsSnapshot): Snapshot of the counters of the ingest process
+        """
+        for name in ("bytes_read", "frames_read", "framing_errors", "discarded_bytes", "incomplete_reads", "sequence_gaps",
+                     "lost_frames", "clock_offset_sec", "clock_drift_ppm"):
+            setattr(self, name, getattr(snapshot, name))
+        self.alert_counts = np.array(snapshot.alert_counts, dtype=np.int64)
+        self.decode_time.load(snapshot.decode_time_sec)
+
+
+    def count_alerts(self, error_flags: np.ndarray) -> None:
+        """Add the alert bits of one or several frames to the per channel counters
+
+        Args:
+            error_flags (np.ndarray): Alert flags with shape (num_channels,) or (num_frames, num_channels)
+        """
+        flags = np.asarray(error_flags)
+        self.alert_counts += flags if flags.ndim == 1 else flags.sum(axis=0)
+
+
+    def snapshot(self) -> AcquisitionStatsSnapshot:
+        """Take a consistent enough copy of all counters for monitoring
+
+        Returns:
+            AcquisitionStatsSnapshot: Copy of the counters with derived rates
+        """
+        uptime = max(time.monotonic() - self.start_time, 1e-9)
+        alert_counts = self.alert_counts.copy()
+        frames_read = self.frames_read
+        return AcquisitionStatsSnapshot(
+            uptime_sec=uptime,
+            bytes_read=self.bytes_read,
+            frames_read=frames_read,
+            frames_pushed=self.frames_pushed,
+            frames_written=self.frames_written,
+            framing_errors=self.framing_errors,
+            discarded_bytes=self.discarded_bytes,
+            incomplete_reads=self.incomplete_reads,
+            sequence_gaps=self.sequence_gaps,
+            lost_frames=self.lost_frames,
+            frames_per_sec=frames_read / uptime,
+            alert_counts=alert_counts.tolist(),
+            alert_rate_per_channel=(alert_counts / max(frames_read, 1)).tolist(),
+            queue_depth=self.queue_depth,
+            writer_lag_sec=self.writer_lag_sec,
+            consumer_wait_sec=self.consumer_wait_sec,
+            clock_offset_sec=self.clock_offset_sec,
+            clock_drift_ppm=self.clock_drift_ppm,
+            handoff_dropped_frames=self.handoff_dropped_frames,
+            buffer_depth=self.buffer_depth,
+            buffer_dropped_frames=self.buffer_dropped_frames,
+            buffer_spilled_frames=self.buffer_spilled_frames,
+            decode_time_sec=self.decode_time.snapshot(),
+            writer_lag_histogram_sec=self.writer_lag.snapshot(),
+        )
+
+
+def render_prometheus_text(snapshot: AcquisitionStatsSnapshot, prefix: str = "eeg_daq") -> str:
+    """Render a snapshot in the Prometheus text exposition format
+
+    Args:
+        snapshot (AcquisitionStatsSnapshot): Snapshot of the acquisition counters
+        prefix (str, optional): Prefix of all metric names. Defaults to "eeg_daq".
+
+    Returns:
+        str: Metrics as text
+    """
+    lines = []
+    for name in ("bytes_read", "frames_read", "frames_pushed", "frames_written", "framing_errors", "discarded_bytes", "incomplete_reads", "sequence_gaps", "lost_frames", "handoff_dropped_frames",
+                 "buffer_dropped_frames", "buffer_spilled_frames"):
+        lines += [f"# TYPE {prefix}_{name}_total counter", f"{prefix}_{name}_total {getattr(snapshot, name)}"]
+    for name in ("uptime_sec", "frames_per_sec", "queue_depth", "writer_lag_sec", "consumer_wait_sec", "clock_drift_ppm", "buffer_depth"):
+        lines += [f"# TYPE {prefix}_{name} gauge", f"{prefix}_{name} {getattr(snapshot, name)}"]
+
+    lines.append(f"# TYPE {prefix}_alerts_total counter")
+    lines += [f'{prefix}_alerts_total{{channel="{ch}"}} {count}' for ch, count in enumerate(snapshot.alert_counts)]
+    lines.append(f"# TYPE {prefix}_alert_rate gauge")
+    lines += [f'{prefix}_alert_rate{{channel="{ch}"}} {rate}' for ch, rate in enumerate(snapshot.alert_rate_per_channel)]
+
+    for name, histogram in (("decode_time_sec", snapshot.decode_time_sec), ("writer_lag_histogram_sec", snapshot.writer_lag_histogram_sec)):
+        lines.append(f"# TYPE {prefix}_{name} histogram")
+        bounds = [str(bound) for bound in histogram["bounds"]] + ["+Inf"]
+        lines += [f'{prefix}_{name}_bucket{{le="{bound}"}} {count}' for bound, count in zip(bounds, np.cumsum(histogram["counts"]))]
+        lines += [f"{prefix}_{name}_sum {histogram['sum']}", f"{prefix}_{name}_count {histogram['count']}"]
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,70 @@
+import unittest
+import numpy as np
+from src import AcquisitionStats, StreamingHistogram, render_prometheus_text
+
+
+class StreamingHistogramTest(unittest.TestCase):
+    def test_observe(self):
+        histogram = StreamingHistogram(bounds=(1., 2.))
+        for value in [0.5, 1., 1.5, 3.]:
+            histogram.observe(value)
+
+        result = histogram.snapshot()
+        self.assertEqual(result["counts"], [2, 1, 1])
+        self.assertEqual(result["count"], 4)
+        self.assertAlmostEqual(result["sum"], 6.)
+
+
+class AcquisitionStatsTest(unittest.TestCase):
+    def setUp(self):
+        self._stats = AcquisitionStats()
+
+
+    def test_snapshot_alert_rates(self):
+        self._stats.frames_read = 4
+        self._stats.count_alerts([1, 0, 0, 0, 0, 0, 0, 0])
+        self._stats.count_alerts(np.array([[1, 1, 0, 0, 0, 0, 0, 0], [0, 0, 0, 0, 0, 0, 0, 1]]))
+
+        result = self._stats.snapshot()
+        self.assertEqual(result.alert_counts, [2, 1, 0, 0, 0, 0, 0, 1])
+        self.assertEqual(result.alert_rate_per_channel[0], 0.5)
+
+
+    def test_reset(self):
+        self._stats.frames_read = 10
+        self._stats.decode_time.observe(1e-3)
+        self._stats.reset()
+
+        result = self._stats.snapshot()
+        self.assertEqual(result.frames_read, 0)
+        self.assertEqual(result.decode_time_sec["count"], 0)
+
+
+    def test_load_reader_snapshot(self):
+        reader = AcquisitionStats()
+        reader.frames_read = 12
+        reader.frames_pushed = 12
+        reader.lost_frames = 3
+        reader.count_alerts([0, 1, 0, 0, 0, 0, 0, 0])
+        reader.decode_time.observe(1e-3)
+        self._stats.frames_pushed = 5
+        self._stats.load_reader_snapshot(reader.snapshot())
+
+        result = self._stats.snapshot()
+        self.assertEqual(result.frames_read, 12)
+        self.assertEqual(result.frames_pushed, 5)
+        self.assertEqual(result.lost_frames, 3)
+        self.assertEqual(result.alert_counts[1], 1)
+        self.assertEqual(result.decode_time_sec["count"], 1)
+
+
+    def test_render_prometheus_text(self):
+        self._stats.frames_read = 7
+        self._stats.decode_time.observe(2e-5)
+        text = render_prometheus_text(self._stats.snapshot())
+
+        self.assertIn("eeg_daq_frames_read_total 7\n", text)
+        self.assertIn('eeg_daq_alerts_total{channel="7"} 0\n', text)
+        self.assertIn('eeg_daq_decode_time_sec_bucket{le="2.5e-05"} 1\n', text)
+        self.assertIn('eeg_daq_decode_time_sec_bucket{le="+Inf"} 1\n', text)
+        self.assertIn("eeg_daq_decode_time_sec_count 1\n", text)
@@ -0,0 +1,220 @@
+from collections import deque
+from pathlib import Path
+import time, warnings
+import h5py
+import numpy as np
+from .calibration import calibration_from_attrs
+from .data_loading import read_channel_layout
+
+# Digital range of the 24-bit samples in BDF
+BDF_DIGITAL_MIN = -2 ** 23
+BDF_DIGITAL_MAX = 2 ** 23 - 1
+# Bytes reserved per data record for the annotations of alerts and gaps
+BDF_ANNOTATION_BYTES = 2048
+_MONTHS = ("JAN", "FEB", "MAR", "APR", "MAY", "JUN", "JUL", "AUG", "SEP", "OCT", "NOV", "DEC")
+
+
+def export_bdf(path_to_file: Path, output_path: Path = None, record_duration_sec: float = 1., records_per_block: int = 8,
+               annotation_bytes: int = BDF_ANNOTATION_BYTES) -> Path:
+    """Export the ad7779_data group of a recording to a BDF+ file (24-bit samples). The samples are read, packed and written
+    block by block, so the memory use is bounded by records_per_block data records. Every channel is scaled to microvolt
+    at the electrode with the calibration of the recording (see calibration_from_attrs) through its physical range, so
+    the samples are stored as ADC codes. Only the recorded channels are exported, labelled with their logical channel. Runs of alert
+    flags and the gap records are stored as annotations. The samples are continuous in the file, so a gap is an
+    annotation at the first sample after it. The last data record is filled up with zeros
+
+    Args:
+        path_to_file (Path): Path to the h5 file
+        output_path (Path, optional): Path of the BDF file, None replaces the suffix of the h5 file by .bdf. Defaults to None.
+        record_duration_sec (float, optional): Duration of a data record in seconds, must hold a whole number of samples. Defaults to 1.
+        records_per_block (int, optional): Number of data records read and written at once. Defaults to 8.
+        annotation_bytes (int, optional): Bytes reserved per data record for annotations, annotations which do not fit are
+            moved to the next records. Defaults to BDF_ANNOTATION_BYTES.
+
+    Raises:
+        ValueError: If a data record does not hold a whole number of samples
+
+    Returns:
+        Path: Path of the written BDF file
+    """
+    path_to_file = Path(path_to_file)
+    output_path = Path(output_path) if output_path is not None else path_to_file.with_suffix(".bdf")
+    with h5py.File(path_to_file, "r") as file:
+        grp = file["ad7779_data"]
+        sampling_rate = float(grp.attrs["adc_samplingrate"])
+        samples_per_record = sampling_rate * record_duration_sec
+        if abs(samples_per_record - round(samples_per_record)) > 1e-9 or samples_per_record < 1:
+            raise ValueError(f"A data record of {record_duration_sec} s does not hold a whole number of samples at {sampling_rate} Hz")
+        samples_per_record = int(round(samples_per_record))
+        num_samples, num_channels = grp["measurements"].shape
+        num_records = -(-num_samples // samples_per_record)
+        annotation_samples = -(-annotation_bytes // 3)
+        channel_index, num_logical_channels = read_channel_layout(grp)
+        calibration = calibration_from_attrs(grp.attrs, num_logical_channels)
+        scale_uv, offset = 1e6 * calibration.scale[channel_index], calibration.offset[channel_index]
+        events = _GapEvents(grp, sampling_rate)
+        alerts = _AlertRuns(channel_index, sampling_rate)
+
+        with open(output_path, "wb") as bdf:
+            bdf.write(_bdf_header(file.attrs.get("created_at"), num_records, record_duration_sec, samples_per_record,
+                                  annotation_samples, channel_index, (BDF_DIGITAL_MIN - offset) * scale_uv,
+                                  (BDF_DIGITAL_MAX - offset) * scale_uv))
+            pending = deque()
+            block_samples = records_per_block * samples_per_record
+            for first_record in range(0, num_records, records_per_block):
+                start = first_record * samples_per_record
+                stop = min(start + block_samples, num_samples)
+                block = grp["measurements"][start:stop]
+                # gaps at the very end of the recording go to the last block
+                pending.extend(events.take(start, stop if stop < num_samples else num_samples + 1))
+                pending.extend(alerts.feed(grp["alerts"][start:stop], start, final=stop == num_samples))
+
+                block_records = -(-(stop - start) // samples_per_record)
+                padded = np.zeros((block_records * samples_per_record, num_channels), dtype=np.int32)
+                padded[:block.shape[0]] = block
+                # a data record holds all samples of the first channel, then of the second and so on
+                records = padded.reshape(block_records, samples_per_record, num_channels).transpose(0, 2, 1)
+                data_bytes = _pack_int24(records).reshape(block_records, -1)
+                annotation_rows = np.zeros((block_records, 3 * annotation_samples), dtype=np.uint8)
+                for index in range(block_records):
+                    tal = _take_annotations(pending, (first_record + index) * record_duration_sec, 3 * annotation_samples)
+                    annotation_rows[index, :len(tal)] = np.frombuffer(tal, dtype=np.uint8)
+                bdf.write(np.concatenate((data_bytes, annotation_rows), axis=1).tobytes())
+
+    if pending:
+        warnings.warn(f"{len(pending)} annotations did not fit into the data records of {output_path}, increase annotation_bytes")
+    return output_path
+
+
+def _pack_int24(values: np.ndarray) -> np.ndarray:
+    """Pack integer values into little-endian 24-bit two's complement
+
+    Args:
+        values (np.ndarray): Integer values of any shape
+
+    Returns:
+        np.ndarray: uint8 array with three bytes per value in an additional last axis
+    """
+    clipped = np.ascontiguousarray(np.clip(values, BDF_DIGITAL_MIN, BDF_DIGITAL_MAX), dtype="<i4")
+    return clipped.view(np.uint8).reshape(*values.shape, 4)[..., :3]
+
+
+def _bdf_header(created_at: str, num_records: int, record_duration_sec: float, samples_per_record: int,
+                annotation_samples: int, channels: np.ndarray, physical_min_uv: np.ndarray, physical_max_uv: np.ndarray) -> bytes:
+    """Build the BDF+ header with one signal per exported channel, labelled with its logical channel and with the physical
+    range of the digital range in microvolt, and the annotation signal"""
+    try:
+        start = time.strptime(created_at)
+    except (TypeError, ValueError):
+        start = time.localtime()
+    num_channels = physical_min_uv.size
+    num_signals = num_channels + 1
+    labels = [f"CH{channel + 1}" for channel in channels] + ["BDF Annotations"]
+    physical_min = [_format_field(value, 8) for value in physical_min_uv] + ["-1"]
+    physical_max = [_format_field(value, 8) for value in physical_max_uv] + ["1"]
+
+    fields = [
+        ("\xffBIOSEMI", 8),
+        ("X X X X", 80),
+        (f"Startdate {start.tm_mday:02d}-{_MONTHS[start.tm_mon - 1]}-{start.tm_year} X X AD7779", 80),
+        (time.strftime("%d.%m.%y", start), 8),
+        (time.strftime("%H.%M.%S", start), 8),
+        (str(256 * (num_signals + 1)), 8),
+        ("BDF+C", 44),
+        (str(num_records), 8),
+        (_format_field(record_duration_sec, 8), 8),
+        (str(num_signals), 4),
+    ]
+    header = "".join(value.ljust(width)[:width] for value, width in fields)
+    for values, width in ((labels, 16), ([""] * num_signals, 80), (["uV"] * num_channels + [""], 8), (physical_min, 8),
+                          (physical_max, 8), ([str(BDF_DIGITAL_MIN)] * num_signals, 8), ([str(BDF_DIGITAL_MAX)] * num_signals, 8),
+                          ([""] * num_signals, 80), ([str(samples_per_record)] * num_channels + [str(annotation_samples)], 8),
+                          ([""] * num_signals, 32)):
+        header += "".join(value.ljust(width)[:width] for value in values)
+    return header.encode("latin-1")
+
+
+def _format_field(value: float, width: int) -> str:
+    """Shortest decimal representation of value with at most width characters"""
+    for precision in range(width, -1, -1):
+        text = f"{value:.{precision}f}".rstrip("0").rstrip(".") if precision else f"{value:.0f}"
+        if len(text) <= width:
+            return text
+    return text
+
+
+def _format_tal(onset_sec: float, duration_sec: float = None, text: str = "") -> bytes:
+    """Time-stamped annotation list entry with onset, optional duration and one annotation text"""
+    onset = _format_field(onset_sec, 16)
+    duration = f"\x15{_format_field(duration_sec, 16)}" if duration_sec is not None else ""
+    return f"+{onset}{duration}\x14{text}\x14\x00".encode("utf-8")
+
+
+def _take_annotations(pending: deque, record_onset_sec: float, num_bytes: int) -> bytes:
+    """Time-keeping entry of a data record followed by the pending annotations which fit into num_bytes"""
+    tal = f"+{_format_field(record_onset_sec, 16)}\x14\x14\x00".encode()
+    while pending and len(tal) + len(pending[0]) <= num_bytes:
+        tal += pending.popleft()
+    return tal
+
+
+class _GapEvents:
+    def __init__(self, grp: h5py.Group, sampling_rate: float) -> None:
+        """Annotations of the gap records of a recording in the order of their offset. The gap datasets only hold
+        one row per gap, so they are read at once"""
+        self._sampling_rate = sampling_rate
+        events = []
+        if "gaps" in grp:
+            events += [(int(offset), f"Gap {int(lost)} samples lost") for offset, lost in grp["gaps"][:]]
+        if "device_gaps" in grp:
+            events += [(int(offset), f"Device {int(device)} missing {int(lost)} samples") for device, offset, lost in grp["device_gaps"][:]]
+        events.sort(key=lambda event: event[0])
+        self._offsets = np.array([offset for offset, _ in events], dtype=np.int64)
+        self._texts = [text for _, text in events]
+
+
+    def take(self, start: int, stop: int) -> list:
+        """Annotations of the gaps with an offset in [start, stop)"""
+        first, last = np.searchsorted(self._offsets, [start, stop])
+        return [_format_tal(self._offsets[index] / self._sampling_rate, text=self._texts[index]) for index in range(first, last)]
+
+
+class _AlertRuns:
+    def __init__(self, channels: np.ndarray, sampling_rate: float) -> None:
+        """Turn the alert flags of consecutive blocks into one annotation per run of set flags and channel, the columns
+        of the flags hold the logical channels in channels"""
+        num_channels = len(channels)
+        self._channels = channels
+        self._sampling_rate = sampling_rate
+        self._previous = np.zeros(num_channels, dtype=np.int8)
+        self._run_start = np.full(num_channels, -1, dtype=np.int64)
+
+
+    def feed(self, alerts: np.ndarray, offset: int, final: bool = False) -> list:
+        """Annotations of the runs which ended in this block, all open runs end with the final block
+
+        Args:
+            alerts (np.ndarray): Alert flags with shape (num_samples, num_channels)
+            offset (int): Index of the first sample of the block
+            final (bool, optional): True for the last block of the recording. Defaults to False.
+
+        Returns:
+            list: Annotations of the completed runs
+        """
+        flags = (np.asarray(alerts) != 0).astype(np.int8)
+        edges = np.diff(np.vstack((self._previous, flags)), axis=0)
+        runs = []
+        for channel in range(flags.shape[1]):
+            starts = np.flatnonzero(edges[:, channel] == 1) + offset
+            ends = np.flatnonzero(edges[:, channel] == -1) + offset
+            if self._run_start[channel] >= 0:
+                starts = np.concatenate(([self._run_start[channel]], starts))
+            if final and starts.size > ends.size:
+                ends = np.concatenate((ends, [offset + flags.shape[0]]))
+            runs += [(int(start), int(end), int(self._channels[channel])) for start, end in zip(starts, ends)]
+            self._run_start[channel] = starts[-1] if starts.size > ends.size else -1
+        if flags.shape[0]:
+            self._previous = flags[-1]
+        runs.sort()
+        return [_format_tal(start / self._sampling_rate, (end - start) / self._sampling_rate, f"Alert CH{channel + 1}")
+                for start, end, channel in runs]
@@ -0,0 +1,106 @@
+import tempfile
+import unittest
+from pathlib import Path
+import numpy as np
+from src import H5Handler, EEGDeviceConfig, EEGDeviceMetadata, PotiConfig, export_bdf
+
+
+def read_bdf(path: Path) -> tuple[dict, list]:
+    """Minimal BDF reader for the tests, returns the header fields and the raw bytes of every signal per record"""
+    data = path.read_bytes()
+    num_signals = int(data[252:256])
+    header = {"version": data[:8], "reserved": data[192:236].decode().strip(), "num_records": int(data[236:244]),
+              "record_duration": float(data[244:252]), "num_signals": num_signals}
+    offset = 256
+    for name, width in (("labels", 16), ("transducer", 80), ("dimension", 8), ("physical_min", 8), ("physical_max", 8),
+                        ("digital_min", 8), ("digital_max", 8), ("prefiltering", 80), ("samples", 8), ("reserved_signal", 32)):
+        header[name] = [data[offset + index * width:offset + (index + 1) * width].decode("latin-1").strip() for index in range(num_signals)]
+        offset += num_signals * width
+    samples = [int(value) for value in header["samples"]]
+    records = []
+    position = int(data[184:192])
+    for _ in range(header["num_records"]):
+        signals = []
+        for num_samples in samples:
+            signals.append(data[position:position + 3 * num_samples])
+            position += 3 * num_samples
+        records.append(signals)
+    header["trailing_bytes"] = len(data) - position
+    return header, records
+
+
+def decode_int24(raw: bytes) -> np.ndarray:
+    values = np.frombuffer(raw, dtype=np.uint8).reshape(-1, 3).astype(np.int32)
+    values = values[:, 0] | (values[:, 1] << 8) | (values[:, 2] << 16)
+    return values - ((values & 0x800000) << 1)
+
+
+class ExportBdfTest(unittest.TestCase):
+    def setUp(self):
+        self._tmpdir = tempfile.TemporaryDirectory()
+        config = EEGDeviceConfig(com_name="COM_TEST", measure_duration=1, adc_pga_gain=2, channel_mask=[1] * 8,
+                                 sdo_driver_strength=3, adc_samplingrate=100, test_mode_enabled=False, adc_power_mode_high=True,
+                                 error_header=False, reference_active_shielding=False, gain_instrument_amplifier=5)
+        metadata = EEGDeviceMetadata(waveform_generator="test", waveform_generator_frequency="10",
+                                     waveform_generator_amplitude="1", waveform_type="Sine")
+        poti = PotiConfig(gain=5, calculated_resistor_value=12350, poti_value=32, actual_resistor_value=12500, actual_gain_value=4.95)
+        recording_name = str(Path(self._tmpdir.name) / "rec")
+        writer = H5Handler(recording_name=recording_name, metadata=metadata, eeg_device_config=config, poti_values=poti)
+        self._measurements = (np.arange(250)[:, None] * np.array([1, -1, 1000, -1000, 2 ** 22, -2 ** 23, 0, 7])).astype(np.int32)
+        alerts = np.zeros((250, 8), dtype=np.int8)
+        alerts[30:40, 1] = 1
+        alerts[195:250, 7] = 1
+        for start in range(0, 250, 60):
+            writer.append_data_ad7779(timestamps=np.arange(start, min(start + 60, 250)) * 10000,
+                                      measurements=self._measurements[start:start + 60], alerts=alerts[start:start + 60])
+        writer.append_gaps_ad7779([120], [3])
+        writer.close_h5_file()
+        self._h5_path = Path(f"{recording_name}_data.h5")
+
+
+    def tearDown(self):
+        self._tmpdir.cleanup()
+
+
+    def test_header_and_samples(self):
+        path = export_bdf(self._h5_path, records_per_block=2)
+        header, records = read_bdf(path)
+
+        self.assertEqual(path, self._h5_path.with_suffix(".bdf"))
+        self.assertEqual(header["version"], b"\xffBIOSEMI")
+        self.assertEqual(header["reserved"], "BDF+C")
+        self.assertEqual(header["num_records"], 3)
+        self.assertEqual(header["num_signals"], 9)
+        self.assertEqual(header["labels"][-1], "BDF Annotations")
+        self.assertEqual(header["samples"][:8], ["100"] * 8)
+        self.assertEqual(header["trailing_bytes"], 0)
+        scale = float(header["physical_max"][0]) / float(header["digital_max"][0])
+        self.assertAlmostEqual(scale, 1.25e6 / 2 ** 23 / (2 * 4.95), places=6)
+
+        for channel in range(8):
+            samples = np.concatenate([decode_int24(record[channel]) for record in records])
+            np.testing.assert_array_equal(samples[:250], np.clip(self._measurements[:, channel], -2 ** 23, 2 ** 23 - 1))
+            np.testing.assert_array_equal(samples[250:], 0)
+
+
+    def test_annotations(self):
+        path = export_bdf(self._h5_path, annotation_bytes=60)
+        _, records = read_bdf(path)
+        annotations = [record[-1] for record in records]
+
+        for index, annotation in enumerate(annotations):
+            self.assertTrue(annotation.startswith(f"+{index}\x14\x14\x00".encode()))
+        text = b"".join(annotations)
+        self.assertIn(b"+0.3\x150.1\x14Alert CH2\x14\x00", text)
+        self.assertIn(b"+1.2\x14Gap 3 samples lost\x14\x00", text)
+        self.assertIn(b"+1.95\x150.55\x14Alert CH8\x14\x00", text)
+        self.assertTrue(all(len(record[-1]) == 60 for record in records))
+
+
+    def test_record_duration_must_hold_whole_samples(self):
+        with self.assertRaises(ValueError):
+            export_bdf(self._h5_path, record_duration_sec=0.015)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,215 @@
+from .data_structures import ChannelBlockStats
+from .data_loading import read_channel_layout, expand_channels
+from pathlib import Path
+import h5py
+import numpy as np
+
+# Name of the group in ad7779_data which holds the statistics
+BLOCK_STATS_GROUP = "block_stats"
+# Samples with an absolute ADC code of at least this value count as near the rails of the 24-bit range
+NEAR_RAIL_CODE = int(0.99 * 2 ** 23)
+# Samples read at once by build_block_stats
+BLOCK_STATS_READ_SAMPLES = 1 << 20
+_DATASETS = (("mean", "float64"), ("variance", "float64"), ("min", "int32"), ("max", "int32"), ("near_rail", "int32"), ("alert_count", "int32"))
+
+
+class BlockStatsAccumulator:
+    _completed: list
+
+    def __init__(self, grp: h5py.Group, num_channels: int, block_samples: int, near_rail_code: int = NEAR_RAIL_CODE) -> None:
+        """Compute per-channel statistics of consecutive blocks of block_samples samples while a recording is written.
+        Mean and variance are updated with the batched Welford (Chan) combination, so a block may span several appends.
+        The statistics are stored in the group block_stats with one row per block in the datasets offset and timestamp
+        (first sample of the block), count and the per-channel datasets mean, variance (population), min, max, near_rail
+        (samples with |code| >= near_rail_code) and alert_count.
+
+        Args:
+            grp (h5py.Group): The ad7779_data group of the recording
+            num_channels (int): Number of channels per sample
+            block_samples (int): Number of samples per block
+            near_rail_code (int, optional): Smallest absolute ADC code counted as near the rails. Defaults to NEAR_RAIL_CODE.
+
+        Raises:
+            ValueError: If block_samples is not positive
+        """
+        if block_samples <= 0:
+            raise ValueError("The block size must be positive")
+        self._num_channels = num_channels
+        self._block_samples = int(block_samples)
+        self._near_rail_code = near_rail_code
+        if BLOCK_STATS_GROUP in grp:
+            del grp[BLOCK_STATS_GROUP]
+        self._grp = grp.create_group(BLOCK_STATS_GROUP)
+        self._grp.attrs["block_samples"] = self._block_samples
+        self._grp.attrs["near_rail_code"] = near_rail_code
+        for name in ("offset", "timestamp", "count"):
+            self._grp.create_dataset(name, shape=(0,), maxshape=(None,), dtype="int64", chunks=True)
+        for name, dtype in _DATASETS:
+            self._grp.create_dataset(name, shape=(0, num_channels), maxshape=(None, num_channels), dtype=dtype, chunks=True)
+        self._completed = []
+        self._samples_seen = 0
+        self._reset_block()
+
+
+    # ========== API METHODS ==========
+    def append(self, timestamps: np.ndarray, measurements: np.ndarray, alerts: np.ndarray) -> None:
+        """Add the next samples and write the blocks they complete
+
+        Args:
+            timestamps (np.ndarray): Timestamp of every sample
+            measurements (np.ndarray): ADC codes with shape (num_samples, num_channels)
+            alerts (np.ndarray): Alert flags with shape (num_samples, num_channels)
+        """
+        timestamps = np.asarray(timestamps).reshape(-1)
+        measurements = np.asarray(measurements).reshape(-1, self._num_channels)
+        alerts = np.asarray(alerts).reshape(-1, self._num_channels)
+        position = 0
+        while position < measurements.shape[0]:
+            if not self._count:
+                self._offset, self._timestamp = self._samples_seen + position, int(timestamps[position])
+            num_samples = min(measurements.shape[0] - position, self._block_samples - self._count)
+            self._merge(measurements[position:position + num_samples], alerts[position:position + num_samples])
+            position += num_samples
+            if self._count == self._block_samples:
+                self._complete_block()
+        self._samples_seen += measurements.shape[0]
+        self._write_blocks()
+
+
+    def finish(self) -> None:
+        """Write the unfinished last block, it covers the remaining samples"""
+        if self._count:
+            self._complete_block()
+        self._write_blocks()
+
+
+    #  ========== INTERNAL METHODS ==========
+    def _reset_block(self) -> None:
+        """Start an empty block"""
+        self._count = 0
+        self._offset = self._timestamp = 0
+        self._mean = np.zeros(self._num_channels)
+        self._m2 = np.zeros(self._num_channels)
+        self._min = np.full(self._num_channels, np.iinfo(np.int32).max, dtype=np.int64)
+        self._max = np.full(self._num_channels, np.iinfo(np.int32).min, dtype=np.int64)
+        self._near_rail = np.zeros(self._num_channels, dtype=np.int64)
+        self._alert_count = np.zeros(self._num_channels, dtype=np.int64)
+
+
+    def _merge(self, values: np.ndarray, alerts: np.ndarray) -> None:
+        """Combine the statistics of a chunk with the running statistics of the block"""
+        self._count, self._mean, self._m2 = merge_moments(self._count, self._mean, self._m2, values.astype(np.float64))
+        self._min = np.minimum(self._min, values.min(axis=0))
+        self._max = np.maximum(self._max, values.max(axis=0))
+        self._near_rail += np.count_nonzero(np.abs(values.astype(np.int64)) >= self._near_rail_code, axis=0)
+        self._alert_count += np.count_nonzero(alerts, axis=0)
+
+
+    def _complete_block(self) -> None:
+        """Move the statistics of the current block to the blocks waiting to be written"""
+        self._completed.append((self._offset, self._timestamp, self._count, self._mean, self._m2 / self._count, self._min,
+                                self._max, self._near_rail, self._alert_count))
+        self._reset_block()
+
+
+    def _write_blocks(self) -> None:
+        """Append the completed blocks to the datasets"""
+        if not self._completed:
+            return
+        columns = list(zip(*self._completed))
+        self._completed = []
+        length = self._grp["count"].shape[0]
+        for name, values in zip(("offset", "timestamp", "count") + tuple(name for name, _ in _DATASETS), columns):
+            dset = self._grp[name]
+            dset.resize((length + len(values),) + dset.shape[1:])
+            dset[length:] = np.array(values)
+
+
+def merge_moments(count: int, mean: np.ndarray, m2: np.ndarray, chunk: np.ndarray) -> tuple[int, np.ndarray, np.ndarray]:
+    """Combine running count, mean and sum of squared deviations per column with the ones of a chunk (batched Welford
+    update after Chan et al.), numerically stable for the large offsets of the ADC codes
+
+    Args:
+        count (int): Number of samples merged so far
+        mean (np.ndarray): Running mean per column
+        m2 (np.ndarray): Running sum of squared deviations from the mean per column
+        chunk (np.ndarray): Samples to merge, one row per sample
+
+    Returns:
+        tuple[int, np.ndarray, np.ndarray]: Updated count, mean and sum of squared deviations
+    """
+    num_samples = chunk.shape[0]
+    chunk_mean = chunk.mean(axis=0)
+    total = count + num_samples
+    delta = chunk_mean - mean
+    m2 = m2 + np.square(chunk - chunk_mean).sum(axis=0) + np.square(delta) * count * num_samples / total
+    return total, mean + delta * num_samples / total, m2
+
+
+def build_block_stats(path_to_file: Path, block_samples: int = None, near_rail_code: int = NEAR_RAIL_CODE,
+                      read_samples: int = BLOCK_STATS_READ_SAMPLES) -> None:
+    """Add the block statistics to an existing recording, for files written without them. Existing statistics are replaced
+
+    Args:
+        path_to_file (Path): Path to the h5 file
+        block_samples (int, optional): Number of samples per block, None for one second. Defaults to None.
+        near_rail_code (int, optional): Smallest absolute ADC code counted as near the rails. Defaults to NEAR_RAIL_CODE.
+        read_samples (int, optional): Samples read at once. Defaults to BLOCK_STATS_READ_SAMPLES.
+    """
+    with h5py.File(path_to_file, "r+") as file:
+        grp = file["ad7779_data"]
+        if block_samples is None:
+            block_samples = max(int(grp.attrs["adc_samplingrate"]), 1)
+        accumulator = BlockStatsAccumulator(grp, grp["measurements"].shape[1], block_samples, near_rail_code)
+        for start in range(0, grp["measurements"].shape[0], read_samples):
+            stop = start + read_samples
+            accumulator.append(grp["timestamps"][start:stop], grp["measurements"][start:stop], grp["alerts"][start:stop])
+        accumulator.finish()
+
+
+def read_h5_block_stats(path_to_file: Path, scale_time: float = 1e6) -> ChannelBlockStats:
+    """Read the block statistics of a recording without touching the measurements
+
+    Args:
+        path_to_file (Path): Path to the h5 file
+        scale_time (float, optional): Timestamp units per second. Defaults to 1e6.
+
+    Raises:
+        KeyError: If the recording has no block statistics, see build_block_stats
+
+    Returns:
+        ChannelBlockStats: Statistics of every block and channel, channels which were not recorded are zero
+    """
+    with h5py.File(path_to_file, "r") as file:
+        grp = file["ad7779_data"]
+        if BLOCK_STATS_GROUP not in grp:
+            raise KeyError(f"{path_to_file} has no block statistics, add them with build_block_stats")
+        stats = grp[BLOCK_STATS_GROUP]
+        first_timestamp = grp["timestamps"][0] if grp["timestamps"].shape[0] else 0
+        layout = read_channel_layout(grp)
+        channel_stats = {field: expand_channels(stats[name][:], *layout) for field, name in
+                         (("mean", "mean"), ("variance", "variance"), ("minimum", "min"), ("maximum", "max"),
+                          ("near_rail", "near_rail"), ("alert_count", "alert_count"))}
+        return ChannelBlockStats(offsets=stats["offset"][:], timestamps=(stats["timestamp"][:] - first_timestamp) / scale_time,
+                                 counts=stats["count"][:], block_samples=int(stats.attrs["block_samples"]),
+                                 sampling_rate=float(grp.attrs["adc_samplingrate"]), **channel_stats)
+
+
+def find_saturated_blocks(stats: ChannelBlockStats, min_near_rail: int = 1) -> list:
+    """Find the time spans in which channels were saturated, consecutive saturated blocks form one span
+
+    Args:
+        stats (ChannelBlockStats): Block statistics of a recording
+        min_near_rail (int, optional): Number of samples near the rails for a saturated block. Defaults to 1.
+
+    Returns:
+        list: Tuples (channel, start_sec, stop_sec) in the order of the channels and the time
+    """
+    saturated = stats.near_rail >= min_near_rail
+    stops = stats.timestamps + stats.counts / stats.sampling_rate
+    spans = []
+    for channel in range(saturated.shape[1]):
+        edges = np.diff(np.concatenate(([0], saturated[:, channel].astype(np.int8), [0])))
+        for first, last in zip(np.flatnonzero(edges == 1), np.flatnonzero(edges == -1) - 1):
+            spans.append((channel, float(stats.timestamps[first]), float(stops[last])))
+    return spans
@@ -0,0 +1,83 @@
+import tempfile
+import unittest
+from pathlib import Path
+import h5py
+import numpy as np
+from src import H5Handler, EEGDeviceConfig, EEGDeviceMetadata, PotiConfig, BlockStatsAccumulator, build_block_stats
+from src import read_h5_block_stats, find_saturated_blocks
+
+
+class BlockStatisticsTest(unittest.TestCase):
+    def setUp(self):
+        self._tmpdir = tempfile.TemporaryDirectory()
+        self._config = EEGDeviceConfig(com_name="COM_TEST", measure_duration=1, adc_pga_gain=1, channel_mask=[1] * 8,
+                                       sdo_driver_strength=3, adc_samplingrate=100, test_mode_enabled=False, adc_power_mode_high=True,
+                                       error_header=False, reference_active_shielding=False, gain_instrument_amplifier=1)
+        self._metadata = EEGDeviceMetadata(waveform_generator="test", waveform_generator_frequency="10",
+                                           waveform_generator_amplitude="1", waveform_type="Sine")
+        self._poti = PotiConfig(gain=1, calculated_resistor_value=0, poti_value=0, actual_resistor_value=0, actual_gain_value=1)
+        rng = np.random.default_rng(5)
+        self._measurements = rng.integers(-2 ** 20, 2 ** 20, size=(1050, 8), dtype=np.int32) + 2 ** 20
+        # channel 2 clips at the positive rail in the second and third second, channel 5 once at the negative rail
+        self._measurements[150:210, 2] = 2 ** 23 - 1
+        self._measurements[260, 2] = 2 ** 23 - 1
+        self._measurements[720, 5] = -2 ** 23
+        self._alerts = np.zeros((1050, 8), dtype=np.int8)
+        self._alerts[400:410, 1] = 1
+
+    def tearDown(self):
+        self._tmpdir.cleanup()
+
+    def _write(self, name: str, stats_block_sec: float = 1.) -> Path:
+        recording_name = str(Path(self._tmpdir.name) / name)
+        writer = H5Handler(recording_name=recording_name, metadata=self._metadata, eeg_device_config=self._config,
+                           poti_values=self._poti, stats_block_sec=stats_block_sec)
+        for start in range(0, 1050, 37):
+            stop = min(start + 37, 1050)
+            writer.append_data_ad7779(timestamps=np.arange(start, stop) * 10000 + 500, measurements=self._measurements[start:stop],
+                                      alerts=self._alerts[start:stop])
+        writer.close_h5_file()
+        return Path(f"{recording_name}_data.h5")
+
+    def test_block_statistics_match_samples(self):
+        stats = read_h5_block_stats(self._write("rec"))
+        self.assertEqual(stats.block_samples, 100)
+        self.assertEqual(stats.counts.tolist(), [100] * 10 + [50])
+        self.assertEqual(stats.offsets.tolist(), list(range(0, 1050, 100)))
+        np.testing.assert_allclose(stats.timestamps, np.arange(0, 10.5, 1.))
+        blocks = [self._measurements[start:start + 100] for start in range(0, 1050, 100)]
+        np.testing.assert_allclose(stats.mean, [block.mean(axis=0) for block in blocks])
+        np.testing.assert_allclose(stats.variance, [block.astype(np.float64).var(axis=0) for block in blocks])
+        np.testing.assert_array_equal(stats.minimum, [block.min(axis=0) for block in blocks])
+        np.testing.assert_array_equal(stats.maximum, [block.max(axis=0) for block in blocks])
+        self.assertEqual(stats.near_rail[:, 2].tolist(), [0, 50, 11] + [0] * 8)
+        self.assertEqual(stats.near_rail[7, 5], 1)
+        self.assertEqual(stats.alert_count[4, 1], 10)
+        self.assertEqual(int(stats.alert_count.sum()), 10)
+
+    def test_find_saturated_blocks(self):
+        spans = find_saturated_blocks(read_h5_block_stats(self._write("rec")))
+        self.assertEqual(spans, [(2, 1., 3.), (5, 7., 8.)])
+        spans = find_saturated_blocks(read_h5_block_stats(self._write("strict")), min_near_rail=20)
+        self.assertEqual(spans, [(2, 1., 2.)])
+
+    def test_offline_builder_matches_writer(self):
+        path = self._write("rec", stats_block_sec=None)
+        with h5py.File(path, "r") as file:
+            self.assertNotIn("block_stats", file["ad7779_data"])
+        with self.assertRaises(KeyError):
+            read_h5_block_stats(path)
+        build_block_stats(path, read_samples=333)
+        built, written = read_h5_block_stats(path), read_h5_block_stats(self._write("reference"))
+        np.testing.assert_array_equal(built.offsets, written.offsets)
+        np.testing.assert_allclose(built.variance, written.variance)
+        np.testing.assert_array_equal(built.near_rail, written.near_rail)
+
+    def test_invalid_block_size(self):
+        with h5py.File(Path(self._tmpdir.name) / "block.h5", "w") as file:
+            with self.assertRaises(ValueError):
+                BlockStatsAccumulator(file.create_group("ad7779_data"), 8, 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
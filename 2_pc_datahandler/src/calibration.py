@@ -0,0 +1,194 @@
+from pathlib import Path
+import h5py
+import numpy as np
+from .data_loading import read_channel_layout
+
+# Input range of the ADC in volt for the full 24-bit code range, see translation_func_adc
+ADC_FULL_SCALE_VOLT = 1.25
+# Codes per polarity of the signed 24-bit samples
+ADC_HALF_RANGE_CODES = 2 ** 23
+# Attributes of the ad7779_data group with the per-channel corrections, see write_h5_calibration
+CALIBRATION_OFFSET_ATTR = "calibration_offset_codes"
+CALIBRATION_GAIN_ATTR = "calibration_gain"
+# Attribute of the ad7779_data group which overrides ADC_FULL_SCALE_VOLT for a recording
+FULL_SCALE_ATTR = "adc_full_scale_volt"
+
+
+class ChannelCalibration:
+    _scale: np.ndarray
+    _offset: np.ndarray
+
+    def __init__(self, scale: np.ndarray, offset: np.ndarray = None) -> None:
+        """Per-channel conversion of ADC codes into input-referred volts, volts = (codes - offset) * scale. The vectors are
+        computed once per recording and applied while reading, directly into an output of the requested float type, so
+        no float64 copy of the codes is made
+
+        Args:
+            scale (np.ndarray): Volt at the electrode per ADC code of every channel
+            offset (np.ndarray, optional): Offset of every channel in ADC codes, None for no offset. Defaults to None.
+
+        Raises:
+            ValueError: If offset and scale do not have the same shape
+        """
+        self._scale = np.asarray(scale, dtype=np.float64)
+        self._offset = np.zeros_like(self._scale) if offset is None else np.asarray(offset, dtype=np.float64)
+        if self._offset.shape != self._scale.shape:
+            raise ValueError(f"Offset with shape {self._offset.shape} does not match scale with shape {self._scale.shape}")
+
+
+    # ========== API METHODS ==========
+    @property
+    def scale(self) -> np.ndarray:
+        """Volt at the electrode per ADC code of every channel"""
+        return self._scale
+
+    @property
+    def offset(self) -> np.ndarray:
+        """Offset of every channel in ADC codes"""
+        return self._offset
+
+    @property
+    def num_channels(self) -> int:
+        """Number of channels"""
+        return self._scale.size
+
+
+    def apply(self, codes: np.ndarray, dtype: np.dtype = np.float32, channels: list = None, out: np.ndarray = None) -> np.ndarray:
+        """Convert ADC codes into volts in one pass per operation, without intermediate float64 arrays
+
+        Args:
+            codes (np.ndarray): ADC codes with the channels in the last axis, e.g. (num_samples, num_channels)
+            dtype (np.dtype, optional): Float type of the result, float32 holds the 24-bit codes exactly. Defaults to np.float32.
+            channels (list, optional): Channels of the last axis of codes, None for all channels. Defaults to None.
+            out (np.ndarray, optional): Array for the result with the shape of codes, None to allocate one. Defaults to None.
+
+        Returns:
+            np.ndarray: Input-referred voltages in volt
+        """
+        codes = np.asarray(codes)
+        scale, offset = (self._scale, self._offset) if channels is None else (self._scale[channels], self._offset[channels])
+        dtype = np.dtype(dtype) if out is None else out.dtype
+        if out is None:
+            out = np.empty(codes.shape, dtype=dtype)
+        np.subtract(codes, offset.astype(dtype), out=out, dtype=dtype, casting="unsafe")
+        np.multiply(out, scale.astype(dtype), out=out)
+        return out
+
+
+    def with_corrections(self, offset_codes: np.ndarray = None, gain: np.ndarray = None) -> "ChannelCalibration":
+        """Calibration with measured offset and gain corrections
+
+        Args:
+            offset_codes (np.ndarray, optional): Offset of every channel in ADC codes, None keeps the offset. Defaults to None.
+            gain (np.ndarray, optional): Gain correction factor of every channel, None for no correction. Defaults to None.
+
+        Returns:
+            ChannelCalibration: Corrected calibration
+        """
+        scale = self._scale if gain is None else self._scale * np.asarray(gain, dtype=np.float64)
+        return ChannelCalibration(scale, self._offset if offset_codes is None else offset_codes)
+
+
+def calibration_from_attrs(attrs: h5py.AttributeManager, num_channels: int, full_scale_volt: float = None) -> ChannelCalibration:
+    """Build the calibration of a recording from the attributes of its ad7779_data group: ADC range, PGA gain, actual gain
+    of the instrumentation amplifier and the per-channel corrections if they were stored
+
+    Args:
+        attrs (h5py.AttributeManager): Attributes of the ad7779_data group, or any mapping with the same keys
+        num_channels (int): Number of channels of the recording
+        full_scale_volt (float, optional): Input range of the ADC in volt, None for the attribute adc_full_scale_volt or
+            ADC_FULL_SCALE_VOLT. Defaults to None.
+
+    Returns:
+        ChannelCalibration: Calibration of the recording
+    """
+    if full_scale_volt is None:
+        full_scale_volt = float(attrs.get(FULL_SCALE_ATTR, ADC_FULL_SCALE_VOLT))
+    pga_gain = float(attrs.get("adc_pga_gain", 1))
+    amplifier_gain = attrs.get("actual_gain_value", attrs.get("gain", 1))
+    amplifier_gain = float(amplifier_gain) if amplifier_gain is not None else 1.
+    scale = np.full(num_channels, full_scale_volt / ADC_HALF_RANGE_CODES / (pga_gain * amplifier_gain))
+    offset = attrs.get(CALIBRATION_OFFSET_ATTR)
+    gain = attrs.get(CALIBRATION_GAIN_ATTR)
+    return ChannelCalibration(scale).with_corrections(offset_codes=offset, gain=gain)
+
+
+def read_h5_calibration(path_to_file: Path, full_scale_volt: float = None) -> ChannelCalibration:
+    """Read the calibration of a recording, see calibration_from_attrs
+
+    Args:
+        path_to_file (Path): Path to the h5 file
+        full_scale_volt (float, optional): Input range of the ADC in volt, None for the stored or default range. Defaults to None.
+
+    Returns:
+        ChannelCalibration: Calibration of every logical channel of the recording
+    """
+    with h5py.File(path_to_file, "r") as file:
+        grp = file["ad7779_data"]
+        return calibration_from_attrs(grp.attrs, read_channel_layout(grp)[1], full_scale_volt)
+
+
+def estimate_channel_corrections(offset_recording: Path, gain_recording: Path = None,
+                                 reference_rms_volt: float = None) -> tuple[np.ndarray, np.ndarray]:
+    """Measure the per-channel corrections from test-mode recordings. The mean of a recording with shorted inputs is the
+    offset, the ratio of a known reference RMS to the measured RMS of a recording with the reference applied to all
+    inputs is the gain correction. The statistics come from the block statistics if the recordings have them
+
+    Args:
+        offset_recording (Path): Recording with shorted inputs
+        gain_recording (Path, optional): Recording with the reference signal, None for no gain correction. Defaults to None.
+        reference_rms_volt (float, optional): RMS of the reference signal at the electrodes in volt, needed with
+            gain_recording. Defaults to None.
+
+    Raises:
+        ValueError: If gain_recording is given without reference_rms_volt
+
+    Returns:
+        tuple[np.ndarray, np.ndarray]: Offset in ADC codes and gain correction factor of every logical channel, no
+            correction for channels which were not recorded
+    """
+    from .recording_info import analyze_recording # the live plotter only needs the constants of this module
+
+    if gain_recording is not None and reference_rms_volt is None:
+        raise ValueError("The gain correction needs the RMS of the reference signal")
+    report = analyze_recording(offset_recording)
+    offset_codes = np.zeros(report["num_channels"])
+    for channel in report["channels"]:
+        offset_codes[channel["channel"]] = channel["mean"]
+    gain = np.ones_like(offset_codes)
+    if gain_recording is not None:
+        # the RMS around the offset of the shorted inputs, from the mean and standard deviation of the reference recording,
+        # channels without samples keep an RMS of 0 and thereby no correction
+        rms_codes = np.zeros_like(offset_codes)
+        for channel in analyze_recording(gain_recording)["channels"]:
+            index = channel["channel"]
+            rms_codes[index] = np.sqrt(channel["std"] ** 2 + (channel["mean"] - offset_codes[index]) ** 2)
+        nominal = read_h5_calibration(gain_recording).scale
+        with np.errstate(divide="ignore", invalid="ignore"):
+            gain = np.where(rms_codes > 0, reference_rms_volt / (rms_codes * nominal), 1.)
+    return offset_codes, gain
+
+
+def write_h5_calibration(path_to_file: Path, offset_codes: np.ndarray = None, gain: np.ndarray = None) -> None:
+    """Store per-channel corrections with a recording, they are applied by every reader of the file. New recordings get
+    them with H5Handler(extra_attrs={CALIBRATION_OFFSET_ATTR: ..., CALIBRATION_GAIN_ATTR: ...})
+
+    Args:
+        path_to_file (Path): Path to the h5 file
+        offset_codes (np.ndarray, optional): Offset of every channel in ADC codes, None removes it. Defaults to None.
+        gain (np.ndarray, optional): Gain correction factor of every channel, None removes it. Defaults to None.
+
+    Raises:
+        ValueError: If a correction does not have one value per logical channel
+    """
+    with h5py.File(path_to_file, "r+") as file:
+        grp = file["ad7779_data"]
+        num_channels = read_channel_layout(grp)[1]
+        for name, values in ((CALIBRATION_OFFSET_ATTR, offset_codes), (CALIBRATION_GAIN_ATTR, gain)):
+            if values is None:
+                grp.attrs.pop(name, None)
+                continue
+            values = np.asarray(values, dtype=np.float64)
+            if values.shape != (num_channels,):
+                raise ValueError(f"{name} needs {num_channels} values, got shape {values.shape}")
+            grp.attrs[name] = values
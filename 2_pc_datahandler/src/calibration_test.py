@@ -0,0 +1,90 @@
+import tempfile
+import unittest
+from pathlib import Path
+import numpy as np
+from src import H5Handler, EEGDeviceConfig, EEGDeviceMetadata, PotiConfig
+from src import ChannelCalibration, read_h5_calibration, estimate_channel_corrections, write_h5_calibration, ADC_FULL_SCALE_VOLT
+from src import LivePlotter, LivePlotterChannelConfig, translation_func_adc
+
+
+class CalibrationTest(unittest.TestCase):
+    def setUp(self):
+        self._tmpdir = tempfile.TemporaryDirectory()
+        self._config = EEGDeviceConfig(com_name="COM_TEST", measure_duration=1, adc_pga_gain=2, channel_mask=[1] * 8,
+                                       sdo_driver_strength=3, adc_samplingrate=1000, test_mode_enabled=True, adc_power_mode_high=True,
+                                       error_header=False, reference_active_shielding=False, gain_instrument_amplifier=5)
+        self._scale = ADC_FULL_SCALE_VOLT / 2 ** 23 / (2 * 4.95)
+
+    def tearDown(self):
+        self._tmpdir.cleanup()
+
+    def _write_recording(self, name: str, measurements: np.ndarray) -> Path:
+        recording_name = str(Path(self._tmpdir.name) / name)
+        writer = H5Handler(recording_name=recording_name, metadata=EEGDeviceMetadata(waveform_generator="test", waveform_generator_frequency="10",
+                                                                                     waveform_generator_amplitude="1", waveform_type="Sine"),
+                           eeg_device_config=self._config,
+                           poti_values=PotiConfig(gain=5, calculated_resistor_value=12350, poti_value=32, actual_resistor_value=12500, actual_gain_value=4.95))
+        writer.append_data_ad7779(timestamps=np.arange(measurements.shape[0]) * 1000, measurements=measurements,
+                                  alerts=np.zeros(measurements.shape, dtype=np.int8))
+        writer.close_h5_file()
+        return Path(f"{recording_name}_data.h5")
+
+    def test_scale_from_recording_attributes(self):
+        path = self._write_recording("plain", np.zeros((10, 8), dtype=np.int32))
+        calibration = read_h5_calibration(path)
+        np.testing.assert_allclose(calibration.scale, np.full(8, self._scale))
+        np.testing.assert_array_equal(calibration.offset, np.zeros(8))
+
+    def test_apply_in_requested_type(self):
+        calibration = ChannelCalibration(np.linspace(1e-7, 2e-7, 8), offset=np.arange(8) * 10.)
+        codes = np.random.default_rng(0).integers(-2 ** 23, 2 ** 23, size=(100, 8), dtype=np.int32)
+        expected = (codes - np.arange(8) * 10.) * np.linspace(1e-7, 2e-7, 8)
+        volts = calibration.apply(codes, dtype=np.float64)
+        self.assertEqual(volts.dtype, np.float64)
+        np.testing.assert_allclose(volts, expected, rtol=1e-12)
+        volts = calibration.apply(codes)
+        self.assertEqual(volts.dtype, np.float32)
+        np.testing.assert_allclose(volts, expected, rtol=1e-6, atol=1e-9)
+        out = np.empty((100, 2), dtype=np.float32)
+        self.assertIs(calibration.apply(codes[:, [1, 6]], channels=[1, 6], out=out), out)
+        np.testing.assert_allclose(out, expected[:, [1, 6]], rtol=1e-6, atol=1e-9)
+
+    def test_corrections_from_test_mode_recordings(self):
+        rng = np.random.default_rng(0)
+        offsets = np.arange(8) * 100 - 350
+        shorted = self._write_recording("shorted", (offsets + rng.normal(0, 5, (4000, 8))).round().astype(np.int32))
+        # a 1 mV RMS sine at the electrodes, read with a gain error of +2 % on channel 3
+        gain_error = np.ones(8)
+        gain_error[3] = 1.02
+        sine = np.sqrt(2) * 1e-3 * np.sin(2 * np.pi * 10 * np.arange(4000) / 1000)
+        codes = offsets + sine[:, None] * gain_error / self._scale
+        reference = self._write_recording("reference", codes.round().astype(np.int32))
+
+        offset_codes, gain = estimate_channel_corrections(shorted, reference, reference_rms_volt=1e-3)
+        np.testing.assert_allclose(offset_codes, offsets, atol=0.5)
+        np.testing.assert_allclose(gain, 1 / gain_error, rtol=1e-3)
+
+        write_h5_calibration(reference, offset_codes, gain)
+        volts = read_h5_calibration(reference).apply(codes.round().astype(np.int32), dtype=np.float64)
+        np.testing.assert_allclose(volts, np.repeat(sine[:, None], 8, axis=1), atol=2e-6)
+        with self.assertRaises(ValueError):
+            write_h5_calibration(reference, offset_codes[:4])
+        with self.assertRaises(ValueError):
+            estimate_channel_corrections(shorted, reference)
+
+
+    def test_live_plotter_scales_like_the_recording(self):
+        path = self._write_recording("live", np.zeros((10, 8), dtype=np.int32))
+        config = [LivePlotterChannelConfig(name="DAQ", visualized_channel=2, lsl_layer_name="DAQ_Stream", window_width_sec=1.,
+                                           value_translation_func=translation_func_adc),
+                  LivePlotterChannelConfig(name="Other", visualized_channel=0, lsl_layer_name="Other", window_width_sec=1.)]
+        plotter = LivePlotter.__new__(LivePlotter)
+        funcs = plotter._init_translation_funcs(config, {"adc_pga_gain": 2, "actual_gain_value": 4.95})
+        codes = np.arange(-5, 5) * 1000
+        np.testing.assert_allclose(funcs[0](codes), read_h5_calibration(path).apply(np.repeat(codes[:, None], 8, axis=1), dtype=np.float64)[:, 2])
+        self.assertIsNone(funcs[1])
+        self.assertIs(plotter._init_translation_funcs(config, None)[0], translation_func_adc)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,157 @@
+from .block_statistics import NEAR_RAIL_CODE, merge_moments
+import numpy as np
+
+# Frequencies of the power-line bins in Hz
+QUALITY_LINE_FREQUENCIES = (50., 60.)
+# Channels with a peak-to-peak range of at most this many ADC codes in a window count as flat
+FLATLINE_CODES = 8
+
+
+class ChannelQualityMonitor:
+    def __init__(self, sampling_rate: float, num_channels: int = 8, window_sec: float = 1.,
+                 line_frequencies: tuple = QUALITY_LINE_FREQUENCIES, flatline_codes: int = FLATLINE_CODES,
+                 near_rail_code: int = NEAR_RAIL_CODE) -> None:
+        """Online signal quality of every channel, computed from the decoded blocks of an acquisition for consecutive
+        windows of window_sec. The metrics of a window are per channel:
+
+        - rms: RMS around the mean of the window in ADC codes
+        - line_<f>hz: RMS of the power-line component at f Hz in ADC codes, its square is the band power. It is the
+          Goertzel bin of f over the window with the mean removed, evaluated for all channels and frequencies at once as
+          a product with the precomputed phase factors of the block instead of a recursion per sample
+        - flatline: 1 if the peak-to-peak range is at most flatline_codes, else 0
+        - saturation: Share of samples with |code| >= near_rail_code
+        - alert_rate: Share of samples with alert flag
+
+        Args:
+            sampling_rate (float): Sampling rate of the samples in Hz
+            num_channels (int, optional): Number of channels per sample. Defaults to 8.
+            window_sec (float, optional): Duration of a window in seconds. Defaults to 1..
+            line_frequencies (tuple, optional): Frequencies of the power-line bins in Hz. Defaults to QUALITY_LINE_FREQUENCIES.
+            flatline_codes (int, optional): Largest peak-to-peak range of a flat channel in ADC codes. Defaults to FLATLINE_CODES.
+            near_rail_code (int, optional): Smallest absolute ADC code counted as saturated. Defaults to NEAR_RAIL_CODE.
+        """
+        self._num_channels = num_channels
+        self._window_samples = max(int(round(window_sec * sampling_rate)), 1)
+        self._line_frequencies = tuple(float(frequency) for frequency in line_frequencies)
+        self._omega = 2 * np.pi * np.array(self._line_frequencies) / sampling_rate
+        self._flatline_codes = flatline_codes
+        self._near_rail_code = near_rail_code
+        self.reset()
+
+
+    # ========== API METHODS ==========
+    @property
+    def metric_names(self) -> list:
+        """Names of the metrics of one channel in the order of the columns"""
+        return ["rms"] + [f"line_{frequency:g}hz" for frequency in self._line_frequencies] + ["flatline", "saturation", "alert_rate"]
+
+    @property
+    def labels(self) -> list:
+        """Label of every column of a result row, the metrics of the first channel come first"""
+        return [f"CH{channel + 1}_{name}" for channel in range(self._num_channels) for name in self.metric_names]
+
+    @property
+    def window_samples(self) -> int:
+        """Number of samples per window"""
+        return self._window_samples
+
+
+    def feed(self, values: np.ndarray, alerts: np.ndarray, times: np.ndarray = None) -> tuple[np.ndarray, np.ndarray]:
+        """Add decoded samples and return the metrics of the windows they complete
+
+        Args:
+            values (np.ndarray): ADC codes with shape (num_samples, num_channels)
+            alerts (np.ndarray): Alert flags with shape (num_samples, num_channels)
+            times (np.ndarray, optional): Timestamp of every sample. Defaults to None.
+
+        Returns:
+            tuple[np.ndarray, np.ndarray]: float32 rows with shape (num_windows, num_channels * len(metric_names)) and the
+                timestamp of the last sample of every window, empty times if no times were given
+        """
+        values = np.asarray(values).reshape(-1, self._num_channels)
+        alerts = np.asarray(alerts).reshape(-1, self._num_channels)
+        rows, row_times = [], []
+        position = 0
+        while position < values.shape[0]:
+            num_samples = min(values.shape[0] - position, self._window_samples - self._count)
+            self._merge(values[position:position + num_samples], alerts[position:position + num_samples])
+            position += num_samples
+            if self._count == self._window_samples:
+                rows.append(self._window_metrics())
+                if times is not None:
+                    row_times.append(times[position - 1])
+                self._reset_window()
+        if not rows:
+            return np.zeros((0, self._num_channels * len(self.metric_names)), dtype=np.float32), np.zeros(0)
+        return np.array(rows, dtype=np.float32), np.array(row_times, dtype=np.float64)
+
+
+    def reset(self) -> None:
+        """Drop the samples of the unfinished window"""
+        self._reset_window()
+
+
+    #  ========== INTERNAL METHODS ==========
+    def _reset_window(self) -> None:
+        """Start an empty window"""
+        self._count = 0
+        self._mean = np.zeros(self._num_channels)
+        self._m2 = np.zeros(self._num_channels)
+        self._min = np.full(self._num_channels, np.iinfo(np.int64).max)
+        self._max = np.full(self._num_channels, np.iinfo(np.int64).min)
+        self._near_rail = np.zeros(self._num_channels, dtype=np.int64)
+        self._alert_count = np.zeros(self._num_channels, dtype=np.int64)
+        self._bins = np.zeros((self._omega.size, self._num_channels), dtype=np.complex128)
+        self._phase_sum = np.zeros(self._omega.size, dtype=np.complex128)
+
+
+    def _merge(self, values: np.ndarray, alerts: np.ndarray) -> None:
+        """Add a chunk of the current window to the running moments, extremes, counts and line bins"""
+        chunk = values.astype(np.float64)
+        phases = np.exp(-1j * np.outer(self._omega, np.arange(self._count, self._count + chunk.shape[0])))
+        self._bins += phases @ chunk
+        self._phase_sum += phases.sum(axis=1)
+        self._count, self._mean, self._m2 = merge_moments(self._count, self._mean, self._m2, chunk)
+        self._min = np.minimum(self._min, values.min(axis=0))
+        self._max = np.maximum(self._max, values.max(axis=0))
+        self._near_rail += np.count_nonzero(np.abs(values.astype(np.int64)) >= self._near_rail_code, axis=0)
+        self._alert_count += np.count_nonzero(alerts, axis=0)
+
+
+    def _window_metrics(self) -> np.ndarray:
+        """Metrics of the completed window, one row with the metrics of every channel after each other"""
+        # removing the mean keeps the offset of the electrodes out of the line bins
+        line_bins = self._bins - self._phase_sum[:, None] * self._mean[None, :]
+        metrics = np.vstack((np.sqrt(self._m2 / self._count),
+                             np.sqrt(2) * np.abs(line_bins) / self._count,
+                             (self._max - self._min) <= self._flatline_codes,
+                             self._near_rail / self._count,
+                             self._alert_count / self._count))
+        return metrics.T.reshape(-1)
+
+
+def format_quality_summary(row: np.ndarray, metric_names: list, channels: list, names: list, translation_funcs: list = None) -> str:
+    """Text summary of the quality of selected channels, one line per channel
+
+    Args:
+        row (np.ndarray): Result row of ChannelQualityMonitor
+        metric_names (list): Metric names of the monitor in the order of the columns
+        channels (list): Indices of the channels to show
+        names (list): Display name of every shown channel
+        translation_funcs (list, optional): Function per shown channel to translate ADC codes, None shows codes. Defaults to None.
+
+    Returns:
+        str: Lines with RMS, line components, flatline and saturation state and alert rate
+    """
+    metrics = np.asarray(row).reshape(-1, len(metric_names))
+    lines = []
+    for index, (channel, name) in enumerate(zip(channels, names)):
+        values = dict(zip(metric_names, metrics[channel]))
+        func = translation_funcs[index] if translation_funcs is not None else None
+        # only the slope of the translation applies to RMS values
+        scale = (lambda value: func(value) - func(0.)) if func is not None else (lambda value: value)
+        line_parts = [f"{key.removeprefix('line_').upper().replace('HZ', ' Hz')} {scale(value):.3g}"
+                      for key, value in values.items() if key.startswith("line_")]
+        state = "FLAT" if values["flatline"] else "SAT" if values["saturation"] > 0 else "OK"
+        lines.append(f"{name}: {state} RMS {scale(values['rms']):.3g} | {' | '.join(line_parts)} | alerts {100 * values['alert_rate']:.1f}%")
+    return "\n".join(lines)
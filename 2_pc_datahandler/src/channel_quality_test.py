@@ -0,0 +1,65 @@
+import unittest
+import numpy as np
+from src import ChannelQualityMonitor, format_quality_summary, translation_func_adc
+
+
+class ChannelQualityMonitorTest(unittest.TestCase):
+    def setUp(self):
+        self._fs = 1000
+        samples = np.arange(2 * self._fs)
+        rng = np.random.default_rng(2)
+        self._values = np.zeros((samples.size, 8), dtype=np.int64)
+        # channel 0: 50 Hz hum with a large electrode offset, channel 1: 60 Hz hum, channel 2: white noise
+        self._values[:, 0] = 2 ** 21 + np.round(1000 * np.sin(2 * np.pi * 50 * samples / self._fs))
+        self._values[:, 1] = np.round(400 * np.cos(2 * np.pi * 60 * samples / self._fs + 0.3))
+        self._values[:, 2] = rng.normal(0, 100, samples.size).round()
+        self._values[:, 3] = 12345  # flat channel
+        self._values[:, 4] = rng.normal(0, 100, samples.size).round()
+        self._values[1500:1510, 4] = 2 ** 23 - 1
+        self._values[:, 5:] = rng.normal(0, 50, (samples.size, 3)).round()
+        self._values = self._values.astype(np.int32)
+        self._alerts = np.zeros((samples.size, 8), dtype=np.int8)
+        self._alerts[200:300, 6] = 1
+
+    def test_window_metrics(self):
+        monitor = ChannelQualityMonitor(sampling_rate=self._fs)
+        self.assertEqual(monitor.metric_names, ["rms", "line_50hz", "line_60hz", "flatline", "saturation", "alert_rate"])
+        self.assertEqual(len(monitor.labels), 48)
+        rows, times = monitor.feed(self._values, self._alerts, np.arange(self._values.shape[0]) / self._fs)
+        self.assertEqual(rows.shape, (2, 48))
+        np.testing.assert_allclose(times, [0.999, 1.999])
+        metrics = rows.reshape(2, 8, 6)
+        np.testing.assert_allclose(metrics[:, 0, 0], 1000 / np.sqrt(2), rtol=1e-3)
+        np.testing.assert_allclose(metrics[:, 0, 1], 1000 / np.sqrt(2), rtol=1e-3)
+        self.assertTrue(np.all(metrics[:, 0, 2] < 1))
+        np.testing.assert_allclose(metrics[:, 1, 2], 400 / np.sqrt(2), rtol=1e-3)
+        self.assertTrue(np.all(metrics[:, 2, 1:3] < 15))
+        self.assertEqual(metrics[:, :, 3].tolist(), [[0, 0, 0, 1, 0, 0, 0, 0]] * 2)
+        self.assertEqual(metrics[:, 4, 4].tolist(), [0, np.float32(0.01)])
+        self.assertEqual(metrics[:, 6, 5].tolist(), [np.float32(0.1), 0])
+
+    def test_chunked_feed_matches_single_feed(self):
+        single, _ = ChannelQualityMonitor(sampling_rate=self._fs).feed(self._values, self._alerts)
+        monitor = ChannelQualityMonitor(sampling_rate=self._fs)
+        chunked = [monitor.feed(self._values[start:start + 77], self._alerts[start:start + 77])[0] for start in range(0, 2000, 77)]
+        np.testing.assert_allclose(np.concatenate(chunked), single, rtol=1e-4, atol=1e-3)
+        monitor.feed(self._values[:500], self._alerts[:500])
+        monitor.reset()
+        rows, times = monitor.feed(self._values[:1000], self._alerts[:1000])
+        np.testing.assert_allclose(rows[0], single[0], rtol=1e-4, atol=1e-3)
+        self.assertEqual(times.size, 0)
+
+    def test_format_quality_summary(self):
+        monitor = ChannelQualityMonitor(sampling_rate=self._fs)
+        rows, _ = monitor.feed(self._values, self._alerts)
+        text = format_quality_summary(rows[1], monitor.metric_names, [0, 3, 4], ["EEG 1", "EEG 4", "EEG 5"],
+                                      [translation_func_adc, None, None])
+        lines = text.split("\n")
+        self.assertEqual(len(lines), 3)
+        self.assertTrue(lines[0].startswith("EEG 1: OK RMS 0.000105 | 50 Hz 0.000105 | 60 Hz"))
+        self.assertTrue(lines[1].startswith("EEG 4: FLAT RMS 0"))
+        self.assertTrue(lines[2].startswith("EEG 5: SAT"))
+
+
+if __name__ == "__main__":
+    unittest.main()
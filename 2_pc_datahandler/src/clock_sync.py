@@ -0,0 +1,104 @@
+import numpy as np
+
+
+class ClockAligner:
+    _device_sec: np.ndarray
+    _host_sec: np.ndarray
+
+    def __init__(self, max_points: int = 512, num_bins: int = 8, refit_interval: int = 16) -> None:
+        """Map the microsecond timestamps of a device to the host clock (pylsl.local_clock). Every read batch gives a
+        pair of the last device timestamp and the host time after the read. The transport only adds delay, so the
+        lower envelope of host - device is the best estimate of the clock offset. The minimum per bin of device time
+        is fitted with a line, whose slope is the drift of the device clock against the host clock.
+
+        Args:
+            max_points (int, optional): Number of latest pairs used for the fit. Defaults to 512.
+            num_bins (int, optional): Number of bins of device time for the lower envelope. Defaults to 8.
+            refit_interval (int, optional): Number of new pairs before the line is fitted again. Defaults to 16.
+        """
+        self._max_points = max_points
+        self._num_bins = num_bins
+        self._refit_interval = refit_interval
+        self.reset()
+
+
+    # ========== API METHODS ==========
+    @property
+    def offset_sec(self) -> float:
+        """Host time of device time zero in seconds"""
+        return self._offset
+
+    @property
+    def drift_ppm(self) -> float:
+        """Drift of the device clock against the host clock in parts per million, positive if the device runs slow"""
+        return (self._slope - 1.) * 1e6
+
+    @property
+    def num_points(self) -> int:
+        """Number of pairs currently used for the fit"""
+        return min(self._count, self._max_points)
+
+
+    def reset(self) -> None:
+        """Drop all pairs, e.g. after a reset of the device"""
+        self._device_sec = np.zeros(self._max_points, dtype=np.float64)
+        self._host_sec = np.zeros(self._max_points, dtype=np.float64)
+        self._count = 0
+        self._since_fit = 0
+        self._offset = 0.
+        self._slope = 1.
+
+
+    def observe(self, device_timestamp_us: int, host_time_sec: float) -> None:
+        """Add a pair of a device timestamp and the host time when it was received
+
+        Args:
+            device_timestamp_us (int): Device timestamp in microseconds
+            host_time_sec (float): Host time in seconds, taken right after the read
+        """
+        position = self._count % self._max_points
+        self._device_sec[position] = device_timestamp_us * 1e-6
+        self._host_sec[position] = host_time_sec
+        self._count += 1
+        self._since_fit += 1
+        if self._count == 1 or self._since_fit >= self._refit_interval:
+            self._fit()
+
+
+    def to_host_time(self, device_timestamps_us: np.ndarray) -> np.ndarray:
+        """Convert device timestamps to the host clock
+
+        Args:
+            device_timestamps_us (np.ndarray): Device timestamps in microseconds
+
+        Returns:
+            np.ndarray: Host times in seconds
+        """
+        return self._offset + self._slope * (np.asarray(device_timestamps_us, dtype=np.float64) * 1e-6)
+
+
+    #  ========== INTERNAL METHODS ==========
+    def _fit(self) -> None:
+        """Fit offset and slope through the lower envelope of the stored pairs"""
+        self._since_fit = 0
+        num_points = self.num_points
+        device = self._device_sec[:num_points]
+        delay = self._host_sec[:num_points] - device
+        if num_points < 2 * self._num_bins or np.ptp(device) <= 0.:
+            self._slope = 1.
+            self._offset = float(delay.min())
+            return
+
+        bins = np.minimum(((device - device.min()) / np.ptp(device) * self._num_bins).astype(np.int64), self._num_bins - 1)
+        order = np.lexsort((delay, bins))
+        first_of_bin = np.flatnonzero(np.diff(bins[order], prepend=-1))
+        envelope = order[first_of_bin]
+        if envelope.size < 2:
+            self._slope = 1.
+            self._offset = float(delay.min())
+            return
+
+        center = device[envelope].mean()
+        drift, delay_at_center = np.polyfit(device[envelope] - center, delay[envelope], 1)
+        self._slope = 1. + float(drift)
+        self._offset = float(delay_at_center - drift * center)
@@ -0,0 +1,33 @@
+import unittest
+import numpy as np
+from src import ClockAligner
+
+
+class ClockAlignerTest(unittest.TestCase):
+    def test_offset_and_drift_from_lower_envelope(self):
+        rng = np.random.default_rng(0)
+        aligner = ClockAligner()
+        device_us = np.arange(0, 20_000_000, 20_000)
+        host_sec = 100. + (1. + 50e-6) * device_us * 1e-6 + 1e-4 + rng.exponential(2e-3, device_us.size)
+        for device, host in zip(device_us, host_sec):
+            aligner.observe(int(device), float(host))
+
+        self.assertAlmostEqual(aligner.drift_ppm, 50., delta=5.)
+        self.assertAlmostEqual(aligner.offset_sec, 100.0001, delta=2e-4)
+        mapped = aligner.to_host_time(np.array([19_000_000]))
+        self.assertAlmostEqual(float(mapped[0]), 100. + (1. + 50e-6) * 19. + 1e-4, delta=2e-4)
+
+
+    def test_first_pair_sets_offset(self):
+        aligner = ClockAligner()
+        aligner.observe(1_000_000, 51.)
+        self.assertEqual(aligner.drift_ppm, 0.)
+        np.testing.assert_allclose(aligner.to_host_time(np.array([1_000_000, 1_001_000])), [51., 51.001])
+
+
+    def test_reset(self):
+        aligner = ClockAligner()
+        aligner.observe(1_000_000, 51.)
+        aligner.reset()
+        self.assertEqual(aligner.num_points, 0)
+        self.assertEqual(aligner.offset_sec, 0.)
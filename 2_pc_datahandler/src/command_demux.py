@@ -0,0 +1,112 @@
+import queue
+import threading
+import time
+from serial import Serial
+from .mcu_communication_interface import InterfaceSerialUSB
+from .stream_framer import StreamFramer
+
+# Response of every command head which answers: (length, first byte, last byte or None), see rpc_callbacks.c of the
+# firmware. Most responses repeat the head, the error register is framed by 0xAA and 0xBB like the data frames
+RESPONSE_FORMATS = {0: (3, 0, None), 2: (3, 2, None), 3: (3, 3, None), 4: (3, 4, None), 5: (9, 5, None),
+                    6: (3, 6, None), 10: (19, 0xAA, 0xBB)}
+# Time in seconds a command waits for its response, about the read timeout of the serial connection
+COMMAND_RESPONSE_TIMEOUT = 1.
+
+
+class DemuxInterface(InterfaceSerialUSB):
+    _framer: StreamFramer
+    _responses: queue.Queue
+
+    def __init__(self, device: Serial, framer: StreamFramer, timeout: float = COMMAND_RESPONSE_TIMEOUT,
+                 num_bytes_head: int = 1, num_bytes_data: int = 2) -> None:
+        """Interface for commands while DAQ is running. The serial stream then belongs to the read thread, so the commands
+        are written directly, but their responses are announced to the framer of the read thread, which cuts them out of
+        the stream between two data frames. Commands may be sent from any thread, one at a time. Every announcement is
+        tagged with a sequence number, so a response which arrives after its command timed out is dropped by the next one
+
+        Args:
+            device (Serial): Serial connection of the device
+            framer (StreamFramer): Framer which the read thread feeds with the bytes of the connection
+            timeout (float, optional): Time in seconds a command waits for its response. Defaults to COMMAND_RESPONSE_TIMEOUT.
+            num_bytes_head (int, optional): Number of bytes head. Defaults to 1.
+            num_bytes_data (int, optional): Number of bytes data. Defaults to 2.
+        """
+        super().__init__(device=device, num_bytes_head=num_bytes_head, num_bytes_data=num_bytes_data)
+        self._framer = framer
+        self._timeout = timeout
+        self._lock = threading.Lock()
+        self._responses = queue.Queue()
+        self._sequence = 0
+        self._response_offset = None
+
+
+    # ========== API METHODS ==========
+    @property
+    def response_offset(self) -> int:
+        """Number of frames the framer returned before the last response, None before the first response"""
+        return self._response_offset
+
+
+    def write_wfb(self, data: bytes, size: int = 0) -> bytes:
+        """Write a command and wait until the read thread received its response
+
+        Args:
+            data (bytes): Command with the head as last byte
+            size (int, optional): Not used, the length of the response is known from the head. Defaults to 0.
+
+        Raises:
+            ValueError: If the command has no response
+            TimeoutError: If the response was not received in time
+
+        Returns:
+            bytes: Response of the device
+        """
+        head = data[-1]
+        if head not in RESPONSE_FORMATS:
+            raise ValueError(f"Command {head} has no response")
+        length, first_byte, last_byte = RESPONSE_FORMATS[head]
+        with self._lock:
+            self._sequence += 1
+            sequence = self._sequence
+            self._framer.expect_response(length, first_byte, last_byte,
+                                         on_response=lambda response, offset: self._responses.put((sequence, response, offset)))
+            self.write_wofb(data)
+            try:
+                response, self._response_offset = self._wait_response(sequence)
+            except queue.Empty:
+                self._framer.cancel_responses()
+                raise TimeoutError(f"No response to command {head} within {self._timeout} s")
+        return response
+
+
+    def read(self, no_bytes: int) -> bytes:
+        """Reading is left to the read thread while DAQ is running
+
+        Raises:
+            RuntimeError: Always, use write_wfb
+        """
+        raise RuntimeError("The serial stream belongs to the read thread during DAQ, responses are received with write_wfb")
+
+
+    def clear_input(self) -> None:
+        """Drop responses which arrived after their command timed out, the bytes of the connection belong to the read thread"""
+        while not self._responses.empty():
+            self._responses.get_nowait()
+
+
+    #  ========== INTERNAL METHODS ==========
+    def _wait_response(self, sequence: int) -> tuple[bytes, int]:
+        """Wait for the response of the announcement with the sequence number, stale responses of commands which timed
+        out before are dropped
+
+        Raises:
+            queue.Empty: If the response was not received in time
+
+        Returns:
+            tuple[bytes, int]: Response and the number of frames the framer returned before it
+        """
+        deadline = time.monotonic() + self._timeout
+        while True:
+            received, response, offset = self._responses.get(timeout=max(deadline - time.monotonic(), 0.))
+            if received == sequence:
+                return response, offset
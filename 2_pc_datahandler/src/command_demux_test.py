@@ -0,0 +1,34 @@
+import unittest
+from unittest.mock import MagicMock
+from src import DemuxInterface, StreamFramer
+
+
+class DemuxInterfaceTest(unittest.TestCase):
+    def setUp(self):
+        self._framer = MagicMock(spec=StreamFramer)
+        self._device = MagicMock()
+        self._interface = DemuxInterface(self._device, self._framer, timeout=0.05)
+
+
+    def _answer(self, response: bytes, offset: int) -> None:
+        """Play the read thread, which cuts the response of the last announcement out of the stream"""
+        self._framer.expect_response.call_args.kwargs["on_response"](response, offset)
+
+
+    def test_late_response_is_not_taken_by_the_next_command(self):
+        with self.assertRaises(TimeoutError):
+            self._interface.write_wfb(bytes([0, 0, 3]))
+        self._framer.cancel_responses.assert_called_once()
+        late_callback = self._framer.expect_response.call_args.kwargs["on_response"]
+
+        # the read thread took the first response just before it was cancelled, it arrives after the timeout
+        def write(data: bytes) -> None:
+            late_callback(bytes([3, 0, 1]), 10)
+            self._answer(bytes([3, 0, 2]), 12)
+        self._device.write.side_effect = write
+        self.assertEqual(self._interface.write_wfb(bytes([0, 0, 3])), bytes([3, 0, 2]))
+        self.assertEqual(self._interface.response_offset, 12)
+
+
+if __name__ == "__main__":
+    unittest.main()
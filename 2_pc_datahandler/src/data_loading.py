@@ -3,6 +3,13 @@ from pathlib import Path
 import numpy as np
 import h5py
 
+# Name of the group of the H5 file which holds the further recorded LSL streams
+STREAMS_GROUP = "streams"
+# Attributes of the ad7779_data group with the logical channel of every stored column and the number of logical channels,
+# recordings without them store all channels
+CHANNEL_INDEX_ATTR = "channel_index"
+NUM_CHANNELS_ATTR = "num_channels"
+
 def load_files(master_path: Path, load_case: int) -> Path:
     """Get file paths from the specified directory
 
@@ -28,11 +35,58 @@ def load_files(master_path: Path, load_case: int) -> Path:
     return data_path
 
 
-def read_h5_file(path_to_file: Path) -> np.ndarray:    
+def read_channel_layout(grp: h5py.Group) -> tuple[np.ndarray, int]:
+    """Read which logical channels the columns of the measurements dataset of a recording hold
+
+    Args:
+        grp (h5py.Group): The ad7779_data group of the recording
+
+    Returns:
+        tuple[np.ndarray, int]: Logical channel of every stored column and the number of logical channels
+    """
+    num_stored = grp["measurements"].shape[1]
+    channel_index = np.asarray(grp.attrs.get(CHANNEL_INDEX_ATTR, np.arange(num_stored)), dtype=np.int64)
+    return channel_index, int(grp.attrs.get(NUM_CHANNELS_ATTR, num_stored))
+
+
+def read_h5_channel_layout(path_to_file: Path) -> tuple[np.ndarray, int]:
+    """Read which logical channels a recording stores without touching the measurements, see read_channel_layout
+
+    Args:
+        path_to_file (Path): Path to the h5 file
+
+    Returns:
+        tuple[np.ndarray, int]: Logical channel of every stored column and the number of logical channels
+    """
+    with h5py.File(path_to_file, 'r') as raw_extraction:
+        return read_channel_layout(raw_extraction["ad7779_data"])
+
+
+def expand_channels(values: np.ndarray, channel_index: np.ndarray, num_channels: int) -> np.ndarray:
+    """Place the stored columns of a recording at their logical channels, channels which were not recorded are zero
+
+    Args:
+        values (np.ndarray): Values with the stored columns in the last axis
+        channel_index (np.ndarray): Logical channel of every stored column, see read_channel_layout
+        num_channels (int): Number of logical channels
+
+    Returns:
+        np.ndarray: values itself if all channels are stored in order, otherwise a copy with num_channels columns
+    """
+    if channel_index.size == num_channels and np.array_equal(channel_index, np.arange(num_channels)):
+        return values
+    expanded = np.zeros(values.shape[:-1] + (num_channels,), dtype=values.dtype)
+    expanded[..., channel_index] = values
+    return expanded
+
+
+def read_h5_file(path_to_file: Path, logical_channels: bool = True) -> np.ndarray:    
     """Read h5 file and output timestamps, measurements and error flags
 
     Args:
         path_to_file (Path): Path to the h5 file
+        logical_channels (bool, optional): Return all logical channels with zeros for the channels which were not
+            recorded, False for the stored columns only, see read_channel_layout. Defaults to True.
     
     Returns:
         np.ndarray: alerts, measurements, timestamps
@@ -44,6 +98,10 @@ def read_h5_file(path_to_file: Path) -> np.ndarray:
         print(f"Error reading files: {e}")
     alerts =np.array(raw_extraction["ad7779_data"]["alerts"])
     measurements =np.array(raw_extraction["ad7779_data"]["measurements"])
+    if logical_channels:
+        channel_index, num_channels = read_channel_layout(raw_extraction["ad7779_data"])
+        alerts = expand_channels(alerts, channel_index, num_channels)
+        measurements = expand_channels(measurements, channel_index, num_channels)
     timestamps =np.array(raw_extraction["ad7779_data"]["timestamps"])
     metadata = TransientMetadata(measurement_duration = raw_extraction["ad7779_data"].attrs.get("measurement_duration"),
                                     adc_samplingrate = raw_extraction["ad7779_data"].attrs.get("adc_samplingrate"),
@@ -56,4 +114,36 @@ def read_h5_file(path_to_file: Path) -> np.ndarray:
         pass
         return alerts, measurements, timestamps, metadata
     else:
-        return alerts, measurements, timestamps, metadata
\ No newline at end of file
+        return alerts, measurements, timestamps, metadata
+
+
+def read_h5_gaps(path_to_file: Path) -> np.ndarray:
+    """Read the gap records of a recording without touching the measurements
+
+    Args:
+        path_to_file (Path): Path to the h5 file
+
+    Returns:
+        np.ndarray: Array with shape (num_gaps, 2) and the columns offset (first sample after the gap) and lost_count,
+            empty for recordings without gap records
+    """
+    with h5py.File(path_to_file, 'r') as raw_extraction:
+        if "gaps" not in raw_extraction["ad7779_data"]:
+            return np.zeros((0, 2), dtype=np.int64)
+        return np.array(raw_extraction["ad7779_data"]["gaps"])
+
+
+def read_h5_error_registers(path_to_file: Path) -> np.ndarray:
+    """Read the error register readouts which were taken during DAQ without touching the measurements
+
+    Args:
+        path_to_file (Path): Path to the h5 file
+
+    Returns:
+        np.ndarray: Array with shape (num_readouts, 18) and the columns offset (first sample after the readout) and the 17
+            registers in the order of ErrorRegisterData, empty for recordings without readouts
+    """
+    with h5py.File(path_to_file, 'r') as raw_extraction:
+        if "error_registers" not in raw_extraction["ad7779_data"]:
+            return np.zeros((0, 18), dtype=np.int64)
+        return np.array(raw_extraction["ad7779_data"]["error_registers"])
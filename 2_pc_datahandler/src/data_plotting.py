@@ -1,10 +1,10 @@
-import matplotlib.pyplot as plt
 import numpy as np
-from src import TransientData
+from src import TransientData, SummaryData
 
 
 def plot_transient_data(data: TransientData, channel_to_plot) -> None:
     """Plot the data points"""
+    import matplotlib.pyplot as plt  # loaded on first use, it takes longer to import than the rest of the package
     if channel_to_plot < 0 or channel_to_plot >= data.rawdata.shape[1]:
         raise ValueError("Invalid channel index to plot.")
     
@@ -18,6 +18,7 @@ def plot_transient_data(data: TransientData, channel_to_plot) -> None:
 
 def plot_histogram_timestamps(data: TransientData) -> None:
     """Plot histogram for timestamps differences"""
+    import matplotlib.pyplot as plt
     dt = np.diff(data.timestamps)
 
     plt.figure(figsize=(10, 6))
@@ -26,4 +27,21 @@ def plot_histogram_timestamps(data: TransientData) -> None:
     plt.xlabel('Time (s)')
     plt.ylabel('Number of Occurrences')
     plt.grid(True, alpha=0.5)
-    plt.show()
\ No newline at end of file
+    plt.show()
+
+
+def plot_summary_data(data: SummaryData, channel_to_plot: int) -> None:
+    """Plot the range and the mean of every bin of a summary span"""
+    import matplotlib.pyplot as plt
+    if channel_to_plot < 0 or channel_to_plot >= data.mean.shape[1]:
+        raise ValueError("Invalid channel index to plot.")
+
+    plt.fill_between(data.timestamps, data.minimum[:, channel_to_plot], data.maximum[:, channel_to_plot], color='grey', step='post')
+    plt.plot(data.timestamps, data.mean[:, channel_to_plot], color='k', drawstyle='steps-post')
+    if data.timestamps.size:
+        plt.xlim([data.timestamps[0], data.timestamps[-1]])
+    plt.title(f"Decimation 1:{data.decimation}")
+    plt.xlabel("Time (s)")
+    plt.ylabel("ADC output [V]")
+    plt.tight_layout()
+    plt.show()
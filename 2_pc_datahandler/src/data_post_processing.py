@@ -1,5 +1,4 @@
 import numpy as np
-import pandas
 
 def post_process_rolling_median(measurements: np.ndarray, window_size: int=5, threshold: int=25) -> np.ndarray:
     """Post-process the data to remove outliers using rolling median
@@ -12,6 +11,7 @@ def post_process_rolling_median(measurements: np.ndarray, window_size: int=5, th
     Returns:
         np.ndarray: Numpy array of measurements with outliers replaced by rolling median values
     """
+    import pandas  # loaded on first use, most users of the package never need it
     for channel_index in range(measurements.shape[1]):
         data_channel = measurements[:, channel_index]
         data_series = pandas.Series(data_channel)
@@ -1,5 +1,17 @@
 import numpy as np
 
+# Layout of the adcDataPacket_t frame sent by the firmware (see 1_firmware/src/packet_frames.h)
+ADC_DATA_FRAME_DTYPE = np.dtype([
+    ("head", "u1"),  # 1 Byte unsigned
+    ("frame_id", "u1"),  # 1 Byte unsigned
+    ("index", "u1"),  # 1 Byte unsigned
+    ("timestamp", "<u8"),  # 8 Byte unsigned
+    ("active_channels", "u1"),  # 1 Byte unsigned
+    ("alert", "u1",),  # 1 Byte unsigned
+    ("channel_values", "u1", (24,)),  # 24 Byte unsigned
+    ("tail", "u1"),  # 1 Byte unsigned
+])
+
 def extract_channel_data(raw_data_packet: np.ndarray) -> list:
     """
 
@@ -31,4 +43,66 @@ def extract_error_flags(error_flag_byte: int) -> list:
             channel_flags.append(1)
         else:
             channel_flags.append(0)
-    return channel_flags
\ No newline at end of file
+    return channel_flags
+
+def decode_channel_values(channel_values: np.ndarray, channels: np.ndarray = None) -> np.ndarray:
+    """Decode the big-endian signed 24-bit channel values of many frames at once
+
+    Args:
+        channel_values (np.ndarray): Raw bytes with shape (num_frames, 24)
+        channels (np.ndarray, optional): Channels to decode, None for all channels. Defaults to None.
+
+    Returns:
+        np.ndarray: Channel values with shape (num_frames, 8), or one column per selected channel, as int32
+    """
+    raw = np.asarray(channel_values, dtype=np.uint8).reshape(-1, 8, 3)
+    raw = (raw if channels is None else raw[:, channels]).astype(np.int32)
+    values = (raw[:, :, 0] << 16) | (raw[:, :, 1] << 8) | raw[:, :, 2]
+    return values - ((values & 0x800000) << 1)
+
+
+def decode_alert_flags(alert_bytes: np.ndarray) -> np.ndarray:
+    """Unpack the alert bytes of many frames at once, bit n is the flag of channel n like extract_error_flags
+
+    Args:
+        alert_bytes (np.ndarray): Alert bytes with shape (num_frames,)
+
+    Returns:
+        np.ndarray: Alert flags (0 or 1) with shape (num_frames, 8) as int8
+    """
+    flags = np.unpackbits(np.asarray(alert_bytes, dtype=np.uint8)[:, None], axis=1, bitorder="little")
+    return flags.view(np.int8)
+
+
+def detect_packet_gaps(packet_numbers: np.ndarray, timestamps: np.ndarray, sampling_rate: float,
+                       previous_packet_number: int = None, previous_timestamp: int = None) -> tuple[np.ndarray, np.ndarray]:
+    """Find the gaps in a batch of frames and compute the exact number of lost frames. The 8-bit packet number gives
+    the loss modulo 256 and the device timestamp selects the multiple of 256 which fits the elapsed time
+
+    Args:
+        packet_numbers (np.ndarray): Wrapping 8-bit packet numbers of the frames
+        timestamps (np.ndarray): Device timestamps of the frames in microseconds
+        sampling_rate (float): Sampling rate in Hz
+        previous_packet_number (int, optional): Packet number of the frame before the batch. Defaults to None.
+        previous_timestamp (int, optional): Timestamp of the frame before the batch. Defaults to None.
+
+    Returns:
+        tuple[np.ndarray, np.ndarray]: Positions in the batch of the first frame after each gap and the number of lost frames
+    """
+    numbers = np.asarray(packet_numbers, dtype=np.int64)
+    times = np.asarray(timestamps, dtype=np.int64)
+    if previous_packet_number is not None and previous_timestamp is not None:
+        numbers = np.concatenate(([previous_packet_number], numbers))
+        times = np.concatenate(([previous_timestamp], times))
+        shift = 0
+    else:
+        shift = 1
+    if numbers.size < 2:
+        return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64)
+
+    lost_mod_256 = (np.diff(numbers) - 1) % 256
+    lost_by_time = np.diff(times) * (sampling_rate * 1e-6) - 1
+    lost = lost_mod_256 + 256 * np.rint((lost_by_time - lost_mod_256) / 256).astype(np.int64)
+    lost = np.where(lost < 0, lost_mod_256, lost) # timestamps disagree, trust the packet number
+    positions = np.flatnonzero(lost > 0)
+    return positions + shift, lost[positions]
@@ -1,6 +1,6 @@
 import unittest
 import numpy as np
-from src import extract_channel_data, extract_error_flags
+from src import extract_channel_data, extract_error_flags, decode_channel_values, decode_alert_flags, detect_packet_gaps
 
 class DataProcessingTest(unittest.TestCase):
     def setUp(self):
@@ -31,4 +31,43 @@ class DataProcessingTest(unittest.TestCase):
 
         result = extract_error_flags(error_flag_byte=flag_byte)
         expected_flags = [0, 1, 0, 1, 0, 1, 0, 1]
-        self.assertEqual(result, expected_flags)
\ No newline at end of file
+        self.assertEqual(result, expected_flags)
+
+class BatchDecodingTest(unittest.TestCase):
+    def test_decode_channel_values_matches_extract_channel_data(self):
+        raw = np.random.default_rng(0).integers(0, 256, size=(50, 24), dtype=np.uint8)
+
+        result = decode_channel_values(raw)
+        self.assertEqual(result.dtype, np.int32)
+        self.assertEqual(result.tolist(), [extract_channel_data(row) for row in raw])
+
+
+    def test_decode_channel_values_of_selected_channels(self):
+        raw = np.random.default_rng(1).integers(0, 256, size=(20, 24), dtype=np.uint8)
+
+        result = decode_channel_values(raw, np.array([1, 6]))
+        self.assertEqual(result.shape, (20, 2))
+        self.assertEqual(result.tolist(), decode_channel_values(raw)[:, [1, 6]].tolist())
+
+
+    def test_decode_alert_flags_matches_extract_error_flags(self):
+        alert_bytes = np.arange(256, dtype=np.uint8)
+
+        result = decode_alert_flags(alert_bytes)
+        self.assertEqual(result.tolist(), [extract_error_flags(int(value)) for value in alert_bytes])
+
+
+    def test_detect_packet_gaps_uses_timestamps_for_wrapped_losses(self):
+        packet_numbers = np.array([10, 11, 14, 15, 18])
+        timestamps = np.array([0, 1000, 4000, 5000, (5 + 256 + 3) * 1000]) # second gap: 2 + 256 frames lost
+
+        positions, lost = detect_packet_gaps(packet_numbers, timestamps, sampling_rate=1000)
+        self.assertEqual(positions.tolist(), [2, 4])
+        self.assertEqual(lost.tolist(), [2, 258])
+
+
+    def test_detect_packet_gaps_with_previous_frame(self):
+        positions, lost = detect_packet_gaps(np.array([2, 3]), np.array([2000, 3000]), sampling_rate=1000,
+                                             previous_packet_number=0xFF, previous_timestamp=-1000)
+        self.assertEqual(positions.tolist(), [0])
+        self.assertEqual(lost.tolist(), [2])
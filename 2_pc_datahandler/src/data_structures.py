@@ -69,15 +69,28 @@ class TransientData:
     """Dataclass for handling measured transient data
     Attributes:
         timestamps: Numpy array in seconds from start of measurement
-        rawdata:    Numpy array data points in volts
+        rawdata:    Numpy array data points in volts, float64 or float32 with shape (num_samples, num_channels)
         sampling_rate:  Float with sampling rate in Hz
         channels:   List containing a list with all channels active (1) or inactive (0)
+        revision:   int Post-processing revision of the reader the data was converted at, see EEGDataReader.revision
     """
     timestamps: np.ndarray
     rawdata: np.ndarray
     sampling_rate: float
     error_flags: list
     channels: list
+    revision: int = 0
+
+    def get_channel(self, channel: int) -> np.ndarray:
+        """Samples of one channel as view of rawdata, without a copy"""
+        return self.rawdata[:, channel]
+
+    def get_time_slice(self, start_sec: float = 0., stop_sec: float = None) -> "TransientData":
+        """Samples with start_sec <= timestamp < stop_sec (None for the end), whose arrays are views of this object"""
+        start, stop = np.searchsorted(self.timestamps, [start_sec, np.inf if stop_sec is None else stop_sec])
+        return TransientData(timestamps=self.timestamps[start:stop], rawdata=self.rawdata[start:stop], sampling_rate=self.sampling_rate,
+                             error_flags=self.error_flags[start:stop] if self.error_flags is not None else None,
+                             channels=self.channels, revision=self.revision)
 
 
 @dataclass
@@ -118,4 +131,146 @@ class ErrorRegisterData:
     general_error_register_2: int
     error_status_register_1: int
     error_status_register_2: int
-    error_status_register_3: int
\ No newline at end of file
+    error_status_register_3: int
+
+@dataclass
+class AcquisitionStatsSnapshot:
+    """Dataclass with a copy of the acquisition counters of ApiEEGDeviceController
+    Attributes:
+        uptime_sec: float Time since the counters were reset in seconds
+        bytes_read: int Bytes read from the serial connection
+        frames_read: int Valid data frames decoded from the serial stream
+        frames_pushed: int Frames pushed to the LSL outlet
+        frames_written: int Frames written to the H5 file
+        framing_errors: int Number of times the frame alignment was lost
+        discarded_bytes: int Bytes dropped while resynchronizing to the frame boundaries
+        incomplete_reads: int Reads which returned less bytes than requested
+        sequence_gaps: int Number of discontinuities in the packet number
+        lost_frames: int Number of frames lost in all gaps
+        frames_per_sec: float Average rate of valid frames since reset
+        alert_counts: list Number of frames with alert bit per channel
+        alert_rate_per_channel: list Fraction of frames with alert bit per channel
+        queue_depth: int Samples waiting in the LSL inlet of the H5 writer
+        writer_lag_sec: float Age of the last sample written to the H5 file
+        consumer_wait_sec: float Time start_daq waited for LSL consumers
+        clock_offset_sec: float Host time of device time zero on the LSL clock
+        clock_drift_ppm: float Drift of the device clock against the host clock in ppm
+        handoff_dropped_frames: int Frames dropped because the buffer of an isolated ingest process was full
+        buffer_depth: int Samples waiting in the writer buffer in memory and in the spill file
+        buffer_dropped_frames: int Frames dropped by the overflow policy of the writer buffer
+        buffer_spilled_frames: int Frames written to the spill file of the writer buffer
+        decode_time_sec: dict Histogram of the decode time per batch
+        writer_lag_histogram_sec: dict Histogram of the writer lag per written chunk
+    """
+    uptime_sec: float
+    bytes_read: int
+    frames_read: int
+    frames_pushed: int
+    frames_written: int
+    framing_errors: int
+    discarded_bytes: int
+    incomplete_reads: int
+    sequence_gaps: int
+    lost_frames: int
+    frames_per_sec: float
+    alert_counts: list
+    alert_rate_per_channel: list
+    queue_depth: int
+    writer_lag_sec: float
+    consumer_wait_sec: float
+    clock_offset_sec: float
+    clock_drift_ppm: float
+    handoff_dropped_frames: int
+    buffer_depth: int
+    buffer_dropped_frames: int
+    buffer_spilled_frames: int
+    decode_time_sec: dict
+    writer_lag_histogram_sec: dict
+
+
+@dataclass
+class DeviceStatsSnapshot:
+    """Dataclass with the statistics of one board of a multi-device acquisition
+    Attributes:
+        device_index: int Position of the board in the merged recording
+        com_name: str COM port or URL of the board
+        acquisition: AcquisitionStatsSnapshot Counters of the ingest worker of the board, None before the first report
+        missing_samples: int Merged samples without data of the board
+        dropped_samples: int Samples of the board dropped while merging (duplicate, late or before the start)
+    """
+    device_index: int
+    com_name: str
+    acquisition: AcquisitionStatsSnapshot
+    missing_samples: int
+    dropped_samples: int
+
+
+@dataclass
+class MultiDeviceStatsSnapshot:
+    """Dataclass with the statistics of a multi-device acquisition
+    Attributes:
+        uptime_sec: float Time since the acquisition was started in seconds
+        samples_merged: int Merged samples pushed to the LSL outlet
+        samples_written: int Merged samples written to the H5 file
+        samples_per_sec: float Average rate of merged samples since start
+        buffer_depth: int Merged samples waiting in the writer buffer in memory and in the spill file
+        buffer_dropped_samples: int Merged samples dropped by the overflow policy of the writer buffer
+        buffer_spilled_samples: int Merged samples written to the spill file of the writer buffer
+        devices: list DeviceStatsSnapshot of every board
+    """
+    uptime_sec: float
+    samples_merged: int
+    samples_written: int
+    samples_per_sec: float
+    buffer_depth: int
+    buffer_dropped_samples: int
+    buffer_spilled_samples: int
+    devices: list
+
+
+@dataclass
+class SummaryData:
+    """Dataclass with a span of a recording at one level of the summary pyramid
+    Attributes:
+        timestamps: Numpy array with the time of the first sample of every bin in seconds from start of measurement
+        minimum: Numpy array with the smallest value of every bin and channel
+        maximum: Numpy array with the largest value of every bin and channel
+        mean: Numpy array with the mean of every bin and channel
+        decimation: int Number of samples per bin, 1 for the samples themselves
+        sampling_rate: float Sampling rate of the samples in Hz
+    """
+    timestamps: np.ndarray
+    minimum: np.ndarray
+    maximum: np.ndarray
+    mean: np.ndarray
+    decimation: int
+    sampling_rate: float
+
+
+@dataclass
+class ChannelBlockStats:
+    """Dataclass with the per-channel statistics of consecutive blocks of a recording
+    Attributes:
+        offsets: Numpy array with the index of the first sample of every block
+        timestamps: Numpy array with the time of the first sample of every block in seconds from start of measurement
+        counts: Numpy array with the number of samples of every block
+        mean: Numpy array with the mean of every block and channel in ADC codes
+        variance: Numpy array with the population variance of every block and channel in ADC codes squared
+        minimum: Numpy array with the smallest ADC code of every block and channel
+        maximum: Numpy array with the largest ADC code of every block and channel
+        near_rail: Numpy array with the number of samples near the rails of the 24-bit range per block and channel
+        alert_count: Numpy array with the number of samples with alert flag per block and channel
+        block_samples: int Number of samples per block, the last block may be shorter
+        sampling_rate: float Sampling rate of the samples in Hz
+    """
+    offsets: np.ndarray
+    timestamps: np.ndarray
+    counts: np.ndarray
+    mean: np.ndarray
+    variance: np.ndarray
+    minimum: np.ndarray
+    maximum: np.ndarray
+    near_rail: np.ndarray
+    alert_count: np.ndarray
+    block_samples: int
+    sampling_rate: float
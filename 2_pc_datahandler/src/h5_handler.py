@@ -1,8 +1,13 @@
 import h5py
 import time
-from src import EEGDeviceMetadata, EEGDeviceConfig
-from dataclasses import asdict
+import numpy as np
+from src import EEGDeviceMetadata, EEGDeviceConfig, ErrorRegisterData
+from dataclasses import asdict, astuple, fields
 from .poti import PotiConfig
+from .summary_pyramid import SummaryPyramid, PYRAMID_LEVELS
+from .block_statistics import BlockStatsAccumulator
+from .data_loading import STREAMS_GROUP, CHANNEL_INDEX_ATTR, NUM_CHANNELS_ATTR
+from .stage_profiler import StageProfiler, NULL_PROFILER
 
 class H5Handler:
     _recording_name: str
@@ -12,7 +17,9 @@ class H5Handler:
     _grp_ad7779: h5py.Group
     _length_ad7779: int
 
-    def __init__(self, recording_name: str, metadata: EEGDeviceMetadata, eeg_device_config: EEGDeviceConfig, poti_values: PotiConfig) -> None:
+    def __init__(self, recording_name: str, metadata: EEGDeviceMetadata, eeg_device_config: EEGDeviceConfig, poti_values: PotiConfig,
+                 num_channels: int = 8, extra_attrs: dict = None, summary_levels: tuple = PYRAMID_LEVELS,
+                 stats_block_sec: float = 1., profiler: StageProfiler = NULL_PROFILER, store_inactive_channels: bool = False) -> None:
         """Class to handle H5 file writing for EEG data, including initialization and appending data
 
         Args:
@@ -20,12 +27,32 @@ class H5Handler:
             metadata (EEGDeviceMetadata): Metadata information about the measurement
             eeg_device_config (EEGDeviceConfig): Configuration parameters for the EEG device
             poti_values (PotiConfig): Potentiometer configuration values for the instrumentation amplifier
+            num_channels (int, optional): Number of channels per sample, 8 per board. Defaults to 8.
+            extra_attrs (dict, optional): Additional attributes of the ad7779 group. Defaults to None.
+            summary_levels (tuple, optional): Decimation factors of the min/max/mean summary which is updated with every
+                appended block, None or an empty tuple to write no summary. Defaults to PYRAMID_LEVELS.
+            stats_block_sec (float, optional): Duration of the blocks of the per-channel statistics in seconds, None or 0
+                to write no statistics. Defaults to 1..
+            profiler (StageProfiler, optional): Profiler which records the dataset writes, summary and statistics updates
+                and flushes as spans. Defaults to NULL_PROFILER.
+            store_inactive_channels (bool, optional): Store all channels, False to store only the channels enabled in the
+                channel mask of eeg_device_config, which is repeated for every board. Defaults to False.
         """  
         self._recording_name = recording_name
+        self._num_channels = num_channels
+        self._extra_attrs = extra_attrs if extra_attrs is not None else {}
         self._metadata = metadata
         self._eeg_device_config = eeg_device_config
         self._poti_values = poti_values
+        self._profiler = profiler
+        self._stored_columns = self._init_stored_columns(store_inactive_channels)
         self._h5file, self._grp_ad7779 = self._init_h5_file_writer()
+        num_stored = self._num_stored_channels
+        self._summary = SummaryPyramid(self._grp_ad7779, num_stored, summary_levels) if summary_levels else None
+        self._block_stats = None
+        if stats_block_sec:
+            block_samples = max(round(stats_block_sec * eeg_device_config.adc_samplingrate), 1)
+            self._block_stats = BlockStatsAccumulator(self._grp_ad7779, num_stored, block_samples)
         self._length_ad7779 = 0
         self._num_of_data_in_buffer = 0
 
@@ -40,6 +67,27 @@ class H5Handler:
         return self._length_ad7779
 
 
+    @property
+    def _num_stored_channels(self) -> int:
+        """Number of columns of the measurements and alerts datasets"""
+        return self._num_channels if self._stored_columns is None else self._stored_columns.size
+
+
+    def _init_stored_columns(self, store_inactive_channels: bool) -> np.ndarray:
+        """Select the channels which are stored from the channel mask
+
+        Args:
+            store_inactive_channels (bool): Store all channels
+
+        Returns:
+            np.ndarray: Logical channel of every stored column, None if all channels are stored
+        """
+        mask = np.resize(np.asarray(self._eeg_device_config.channel_mask, dtype=bool), self._num_channels)
+        if store_inactive_channels or mask.all() or not mask.any():
+            return None
+        return np.flatnonzero(mask)
+
+
     def _init_h5_file_writer(self) -> tuple[h5py.File, h5py.Group]:
         """Initialize the H5 file and create necessary groups and datasets
 
@@ -63,22 +111,33 @@ class H5Handler:
         grp_ad7779.attrs["adc_samplingrate"] = self._eeg_device_config.adc_samplingrate
         grp_ad7779.attrs["channel_mask"] = self._eeg_device_config.channel_mask
         grp_ad7779.attrs["adc_pga_gain"] = self._eeg_device_config.adc_pga_gain
+        for key, value in self._extra_attrs.items():
+            grp_ad7779.attrs[key] = value
+
+        num_stored = self._num_stored_channels
+        grp_ad7779.attrs[CHANNEL_INDEX_ATTR] = np.arange(num_stored) if self._stored_columns is None else self._stored_columns
+        grp_ad7779.attrs[NUM_CHANNELS_ATTR] = self._num_channels
 
         # Create datasets with maxshape for appending data
         grp_ad7779.create_dataset('timestamps', shape=(0,), maxshape=(None,), dtype='int64', chunks=True)
-        grp_ad7779.create_dataset('measurements', shape=(0, 8), maxshape=(None, 8), dtype='int32', chunks=True)
-        grp_ad7779.create_dataset('alerts', shape=(0, 8), maxshape=(None, 8), dtype='int8', chunks=True)
+        grp_ad7779.create_dataset('measurements', shape=(0, num_stored), maxshape=(None, num_stored), dtype='int32', chunks=True)
+        grp_ad7779.create_dataset('alerts', shape=(0, num_stored), maxshape=(None, num_stored), dtype='int8', chunks=True)
+        dset_gaps = grp_ad7779.create_dataset('gaps', shape=(0, 2), maxshape=(None, 2), dtype='int64', chunks=True)
+        dset_gaps.attrs["columns"] = ["offset", "lost_count"]
         return file, grp_ad7779
 
 
     def append_data_ad7779(self, timestamps: float, measurements: list, alerts: list) -> None:
-        """Append data to the ad7779 datasets in the H5 file
+        """Append data to the ad7779 datasets in the H5 file, only the stored channels are written
 
         Args:
             timestamps (int): timestamp value to the datapoint
             measurements (list): list of measurement values for all channels at the data point
             alerts (list): a list of alert bits for all channels of the data point
         """
+        if self._stored_columns is not None:
+            measurements = np.asarray(measurements)[:, self._stored_columns]
+            alerts = np.asarray(alerts)[:, self._stored_columns]
         dset_time =self._grp_ad7779["timestamps"]
         dset_meas =self._grp_ad7779["measurements"]
         dset_alert =self._grp_ad7779["alerts"]
@@ -86,22 +145,143 @@ class H5Handler:
         current_length = self._length_ad7779
         self._length_ad7779 += len(timestamps)
 
-        dset_time.resize((self._length_ad7779,))
-        dset_meas.resize((self._length_ad7779, 8))
-        dset_alert.resize((self._length_ad7779, 8))
-        
-        dset_time[current_length:self._length_ad7779] = timestamps
-        dset_meas[current_length:self._length_ad7779, :] = measurements
-        dset_alert[current_length:self._length_ad7779] = alerts
-        
+        with self._profiler.span("h5_write", len(timestamps)):
+            dset_time.resize((self._length_ad7779,))
+            dset_meas.resize((self._length_ad7779, self._num_stored_channels))
+            dset_alert.resize((self._length_ad7779, self._num_stored_channels))
+
+            dset_time[current_length:self._length_ad7779] = timestamps
+            dset_meas[current_length:self._length_ad7779, :] = measurements
+            dset_alert[current_length:self._length_ad7779] = alerts
+        if self._summary is not None:
+            with self._profiler.span("h5_summary", len(timestamps)):
+                self._summary.append(measurements)
+        if self._block_stats is not None:
+            with self._profiler.span("h5_block_stats", len(timestamps)):
+                self._block_stats.append(timestamps, measurements, alerts)
+
         if self._num_of_data_in_buffer >= 10:
-            self._h5file.flush()
+            with self._profiler.span("h5_flush"):
+                self._h5file.flush()
             self._num_of_data_in_buffer = 0
         else:
             self._num_of_data_in_buffer += 1
             
 
+    def append_gaps_ad7779(self, offsets: list, lost_counts: list) -> None:
+        """Append gap records to the ad7779 group, each gap is stored as (offset, lost_count)
+
+        Args:
+            offsets (list): Index of the first sample in the measurements dataset after each gap, must not decrease and
+                not be smaller than the offsets stored before
+            lost_counts (list): Number of samples lost in each gap
+
+        Raises:
+            ValueError: If the offsets are not in order
+        """
+        dset_gaps = self._grp_ad7779["gaps"]
+        current_length = dset_gaps.shape[0]
+        offsets = np.asarray(offsets, dtype=np.int64)
+        previous_offset = dset_gaps[current_length - 1, 0] if current_length else 0
+        if offsets.size and (offsets[0] < previous_offset or np.any(np.diff(offsets) < 0)):
+            raise ValueError(f"Gap offsets must not decrease, got {offsets.tolist()} after offset {previous_offset}")
+        dset_gaps.resize((current_length + len(offsets), 2))
+        dset_gaps[current_length:, 0] = offsets
+        dset_gaps[current_length:, 1] = lost_counts
+
+
+    def append_device_gaps_ad7779(self, devices: list, offsets: list, lost_counts: list) -> None:
+        """Append gap records of merged multi-device recordings, each gap is stored as (device, offset, lost_count)
+
+        Args:
+            devices (list): Index of the device which missed the samples
+            offsets (list): Index of the first sample in the measurements dataset without data of the device
+            lost_counts (list): Number of consecutive samples without data of the device
+        """
+        if "device_gaps" not in self._grp_ad7779:
+            dset_gaps = self._grp_ad7779.create_dataset('device_gaps', shape=(0, 3), maxshape=(None, 3), dtype='int64', chunks=True)
+            dset_gaps.attrs["columns"] = ["device", "offset", "lost_count"]
+        dset_gaps = self._grp_ad7779["device_gaps"]
+        current_length = dset_gaps.shape[0]
+        dset_gaps.resize((current_length + len(offsets), 3))
+        dset_gaps[current_length:, 0] = devices
+        dset_gaps[current_length:, 1] = offsets
+        dset_gaps[current_length:, 2] = lost_counts
+
+
+    def append_lsl_times_ad7779(self, offsets: list, lsl_times: list) -> None:
+        """Append reference points between the samples and the LSL clock, each stored as (offset, lsl_time)
+
+        Args:
+            offsets (list): Index of a sample in the measurements dataset
+            lsl_times (list): LSL time of the sample in seconds
+        """
+        if "lsl_times" not in self._grp_ad7779:
+            dset_times = self._grp_ad7779.create_dataset('lsl_times', shape=(0, 2), maxshape=(None, 2), dtype='float64', chunks=True)
+            dset_times.attrs["columns"] = ["offset", "lsl_time"]
+        dset_times = self._grp_ad7779["lsl_times"]
+        current_length = dset_times.shape[0]
+        dset_times.resize((current_length + len(offsets), 2))
+        dset_times[current_length:, 0] = offsets
+        dset_times[current_length:, 1] = lsl_times
+
+
+    def append_error_registers_ad7779(self, offsets: list, registers: list[ErrorRegisterData]) -> None:
+        """Append error register readouts taken during DAQ, each stored as (offset, register values...) with the
+        register names as columns
+
+        Args:
+            offsets (list): Index of the first sample in the measurements dataset after each readout
+            registers (list[ErrorRegisterData]): Error register values of each readout
+        """
+        num_columns = 1 + len(fields(ErrorRegisterData))
+        if "error_registers" not in self._grp_ad7779:
+            dset_registers = self._grp_ad7779.create_dataset('error_registers', shape=(0, num_columns), maxshape=(None, num_columns),
+                                                             dtype='int64', chunks=True)
+            dset_registers.attrs["columns"] = ["offset"] + [field.name for field in fields(ErrorRegisterData)]
+        dset_registers = self._grp_ad7779["error_registers"]
+        current_length = dset_registers.shape[0]
+        dset_registers.resize((current_length + len(offsets), num_columns))
+        dset_registers[current_length:, 0] = offsets
+        dset_registers[current_length:, 1:] = [astuple(register) for register in registers]
+
+
+    def append_stream(self, name: str, timestamps: np.ndarray, values: np.ndarray, clock_offsets: np.ndarray,
+                      attrs: dict = None) -> None:
+        """Append samples of a further LSL stream to its group streams/<name>, created with the first call. The group
+        holds the datasets time_stamps (clock of the sender), values and clock_offsets as rows (local time, offset)
+
+        Args:
+            name (str): Name of the stream
+            timestamps (np.ndarray): Timestamp of every sample in seconds
+            values (np.ndarray): Values with shape (num_samples, channel_count), object arrays are stored as strings
+            clock_offsets (np.ndarray): Clock offset measurements with shape (num_measurements, 2)
+            attrs (dict, optional): Attributes of the group, only used when it is created. Defaults to None.
+        """
+        streams = self._h5file.require_group(STREAMS_GROUP)
+        if name not in streams:
+            grp = streams.create_group(name)
+            for key, value in (attrs if attrs is not None else {}).items():
+                grp.attrs[key] = value
+            channel_count = values.shape[1]
+            dtype = h5py.string_dtype() if values.dtype == object else values.dtype
+            grp.create_dataset('time_stamps', shape=(0,), maxshape=(None,), dtype='float64', chunks=True)
+            grp.create_dataset('values', shape=(0, channel_count), maxshape=(None, channel_count), dtype=dtype, chunks=True)
+            dset_offsets = grp.create_dataset('clock_offsets', shape=(0, 2), maxshape=(None, 2), dtype='float64', chunks=True)
+            dset_offsets.attrs["columns"] = ["time", "offset"]
+        grp = streams[name]
+        for dset_name, data in (("time_stamps", timestamps), ("values", values), ("clock_offsets", clock_offsets)):
+            dset = grp[dset_name]
+            current_length = dset.shape[0]
+            dset.resize((current_length + len(data),) + dset.shape[1:])
+            dset[current_length:] = data
+
+
     def close_h5_file(self) -> None:
-        """Close the H5 file properly"""
+        """Close the H5 file properly, after the last bins of the summary and the last block statistics were written"""
+        if self._summary is not None:
+            self._summary.finish()
+        if self._block_stats is not None:
+            self._block_stats.finish()
         self._h5file.flush()
         self._h5file.close()
\ No newline at end of file
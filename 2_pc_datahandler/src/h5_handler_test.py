@@ -1,13 +1,23 @@
 import unittest
+import tempfile
+from pathlib import Path
+import numpy as np
 from src import TransientMetadata
 from unittest.mock import patch, MagicMock
-from src import H5Handler, EEGDeviceConfig, PotiConfig
+from src import H5Handler, EEGDeviceConfig, PotiConfig, EEGDeviceMetadata, read_h5_gaps, NULL_PROFILER
+from src import read_h5_file, read_h5_summary, read_recording_info
 
 
 class H5HandlerTest(unittest.TestCase):
     def setUp(self):
         self.handler = H5Handler.__new__(H5Handler)  # Create an instance without calling __init__
         self.handler._num_of_data_in_buffer = 0
+        self.handler._num_channels = 8
+        self.handler._extra_attrs = {}
+        self.handler._summary = None
+        self.handler._block_stats = None
+        self.handler._profiler = NULL_PROFILER
+        self.handler._stored_columns = None
         self.handler._recording_name = "test_recording"
         self.handler._metadata = TransientMetadata(
             measurement_duration=671,
@@ -53,6 +63,7 @@ class H5HandlerTest(unittest.TestCase):
         mock_group.create_dataset.assert_any_call('timestamps', shape=(0,), maxshape=(None,), dtype='int64', chunks=True)
         mock_group.create_dataset.assert_any_call('measurements', shape=(0, 8), maxshape=(None, 8), dtype='int32', chunks=True)
         mock_group.create_dataset.assert_any_call('alerts', shape=(0, 8), maxshape=(None, 8), dtype='int8', chunks=True)
+        mock_group.create_dataset.assert_any_call('gaps', shape=(0, 2), maxshape=(None, 2), dtype='int64', chunks=True)
         mock_group.attrs.__setitem__.assert_any_call("gain", 2)
         mock_group.attrs.__setitem__.assert_any_call("calculated_resistor_value", 1000)
         mock_group.attrs.__setitem__.assert_any_call("poti_value", 128)
@@ -79,3 +90,79 @@ class H5HandlerTest(unittest.TestCase):
         self.handler._grp_ad7779["timestamps"].resize.assert_called_with((2,))
         self.handler._grp_ad7779["measurements"].resize.assert_called_with((2, 8))
         self.handler._grp_ad7779["alerts"].resize.assert_called_with((2, 8))
+
+
+    def test_append_gaps_ad7779_roundtrip(self):
+        self.handler._metadata = EEGDeviceMetadata(waveform_generator="g_test", waveform_generator_frequency="1",
+                                                   waveform_generator_amplitude="1", waveform_type="t_test")
+        with tempfile.TemporaryDirectory() as tmpdir:
+            self.handler._recording_name = str(Path(tmpdir) / "gaps")
+            self.handler._h5file, self.handler._grp_ad7779 = self.handler._init_h5_file_writer()
+            self.handler.append_gaps_ad7779(np.array([10, 300]), np.array([2, 259]))
+            self.handler.append_gaps_ad7779([400], [1])
+            self.handler.close_h5_file()
+
+            result = read_h5_gaps(Path(tmpdir) / "gaps_data.h5")
+        self.assertEqual(result.tolist(), [[10, 2], [300, 259], [400, 1]])
+
+
+    def test_append_gaps_ad7779_rejects_decreasing_offsets(self):
+        self.handler._metadata = EEGDeviceMetadata(waveform_generator="g_test", waveform_generator_frequency="1",
+                                                   waveform_generator_amplitude="1", waveform_type="t_test")
+        with tempfile.TemporaryDirectory() as tmpdir:
+            self.handler._recording_name = str(Path(tmpdir) / "gaps")
+            self.handler._h5file, self.handler._grp_ad7779 = self.handler._init_h5_file_writer()
+            with self.assertRaises(ValueError):
+                self.handler.append_gaps_ad7779([300, 10], [1, 1])
+            self.handler.append_gaps_ad7779([300], [1])
+            with self.assertRaises(ValueError):
+                self.handler.append_gaps_ad7779([10], [1])
+            self.handler.close_h5_file()
+
+
+    def test_multi_device_layout(self):
+        self.handler._metadata = EEGDeviceMetadata(waveform_generator="g_test", waveform_generator_frequency="1",
+                                                   waveform_generator_amplitude="1", waveform_type="t_test")
+        self.handler._num_channels = 16
+        self.handler._extra_attrs = {"num_devices": 2}
+        with tempfile.TemporaryDirectory() as tmpdir:
+            self.handler._recording_name = str(Path(tmpdir) / "multi")
+            self.handler._length_ad7779 = 0
+            self.handler._h5file, self.handler._grp_ad7779 = self.handler._init_h5_file_writer()
+            self.handler.append_data_ad7779(np.arange(3), np.ones((3, 16)), np.zeros((3, 16)))
+            self.handler.append_device_gaps_ad7779([1], [2], [5])
+            grp = self.handler._grp_ad7779
+            self.assertEqual(grp["measurements"].shape, (3, 16))
+            self.assertEqual(grp.attrs["num_devices"], 2)
+            self.assertEqual(grp["device_gaps"][:].tolist(), [[1, 2, 5]])
+            self.handler.close_h5_file()
+
+
+    def test_only_active_channels_are_stored(self):
+        self.handler._eeg_device_config.channel_mask = [1, 0, 1, 0, 0, 0, 0, 0]
+        metadata = EEGDeviceMetadata(waveform_generator="g_test", waveform_generator_frequency="1",
+                                     waveform_generator_amplitude="1", waveform_type="t_test")
+        measurements = np.arange(2000 * 8, dtype=np.int32).reshape(2000, 8)
+        alerts = np.zeros((2000, 8), dtype=np.int8)
+        alerts[5, 2] = 1
+        with tempfile.TemporaryDirectory() as tmpdir:
+            writer = H5Handler(recording_name=str(Path(tmpdir) / "masked"), metadata=metadata, poti_values=self.handler._poti_values,
+                               eeg_device_config=self.handler._eeg_device_config, summary_levels=(16,))
+            writer.append_data_ad7779(np.arange(2000) * 1000, measurements, alerts)
+            self.assertEqual(writer._grp_ad7779["measurements"].shape, (2000, 2))
+            self.assertEqual(writer._grp_ad7779.attrs["channel_index"].tolist(), [0, 2])
+            writer.close_h5_file()
+            path = Path(tmpdir) / "masked_data.h5"
+
+            read_alerts, read_measurements, _, _ = read_h5_file(path)
+            expected = measurements.copy()
+            expected[:, [1, 3, 4, 5, 6, 7]] = 0
+            self.assertEqual(read_measurements.tolist(), expected.tolist())
+            self.assertEqual(read_alerts.tolist(), alerts.tolist())
+            self.assertEqual(read_h5_file(path, logical_channels=False)[1].tolist(), measurements[:, [0, 2]].tolist())
+            summary = read_h5_summary(path, pixel_width=100)
+            self.assertEqual(summary.maximum.shape, (125, 8))
+            self.assertEqual(summary.maximum[0].tolist(), [15 * 8, 0, 15 * 8 + 2, 0, 0, 0, 0, 0])
+            info = read_recording_info(path)
+            self.assertEqual((info["num_channels"], info["channel_index"]), (8, [0, 2]))
+            self.assertEqual(info["alert_counts"], [0, 0, 1, 0, 0, 0, 0, 0])
@@ -1,8 +1,13 @@
 import numpy as np
+import time
 from dataclasses import dataclass
 import pyqtgraph as pg
 from pyqtgraph.Qt import QtCore, QtWidgets
 from pylsl import StreamInlet, resolve_bypred, proc_threadsafe, local_clock
+from .calibration import ADC_FULL_SCALE_VOLT, ADC_HALF_RANGE_CODES, CALIBRATION_OFFSET_ATTR, CALIBRATION_GAIN_ATTR, calibration_from_attrs
+from .channel_quality import format_quality_summary
+from .lsl_handler import pull_chunk_into, LSL_NUMPY_DTYPES
+from .stage_profiler import StageProfiler, NULL_PROFILER
 
 
 @dataclass
@@ -24,23 +29,74 @@ class LivePlotterChannelConfig:
 
 
 class LivePlotter:
-    def __init__(self, config: LivePlotterChannelConfig):
-        self._translation_func = [i.value_translation_func for i in config]
+    def __init__(self, config: LivePlotterChannelConfig, quality_layer_name: str = None, profile_path: str = None, stop_event=None,
+                 calibration_attrs: dict = None):
+        """Live plot of selected channels of LSL streams
+
+        Args:
+            config (LivePlotterChannelConfig): Configuration of the plotted channels, a single one or a list
+            quality_layer_name (str, optional): Name of the channel quality stream of the acquisition, which is shown as
+                summary of the plotted channels. Defaults to None.
+            profile_path (str, optional): Record the pulls, drawing and frequency calculations as spans and write them as
+                Chrome trace to this path when the plotter quits, see StageProfiler. Defaults to None.
+            stop_event (multiprocessing.Event, optional): The plotter quits once the event is set. Defaults to None.
+            calibration_attrs (dict, optional): Gains and corrections of the acquisition with the keys of the ad7779_data
+                attributes, see calibration_from_attrs. Channels shown with translation_func_adc are then converted into
+                volts at the electrode like the recording, None keeps the volts at the ADC input. Defaults to None.
+        """
+        self._profile_path = profile_path
+        self._profiler = StageProfiler(process_name="LivePlotter") if profile_path is not None else NULL_PROFILER
+        self._stop_event = stop_event
+        self._translation_func = self._init_translation_funcs(config, calibration_attrs)
         self._inlet = self._search_lsl_stream_and_connect([i.lsl_layer_name for i in config])
         self._fs = self._get_stream_samplingrate() if self._get_stream_samplingrate() >0 else 250
         self._visualized_channel = [i.visualized_channel for i in config]
 
         self.max_samples = int(self._fs * config.window_width_sec) if type(config) == LivePlotterChannelConfig else int(self._fs * config[0].window_width_sec)
 
+        self._pull_buffers = self._init_pull_buffers()
         self.data_buffers = [np.zeros(self.max_samples) for _ in config]
         self.time_buffers = [np.zeros(self.max_samples) for _ in config]
         self.write_pointers = [0 for _ in self._inlet]
         self.caluclate_counter = 0
 
         self._app, self._win, self._plot_item, self._curves, self._freq_labels =self._init_plot([i.curve_color for i in config], [i.name for i in config])
+        self._quality_inlet, self._quality_metrics, self._quality_label = None, [], None
+        if quality_layer_name is not None:
+            self._quality_inlet = self._search_lsl_stream_and_connect([quality_layer_name])[0]
+            self._quality_metrics = self._get_quality_metric_names()
+            self._quality_label = self._init_quality_summary()
+        self._quality_channels = [(idx, i.visualized_channel) for idx, i in enumerate(config) if i.visualized_channel < 8]
+        self._quality_names = [config[idx].name for idx, _ in self._quality_channels]
         self._timer = self._init_timer()
 
 
+    def _init_translation_funcs(self, config: list, calibration_attrs: dict) -> list:
+        """Translation function of every plotted channel, translation_func_adc is replaced by the calibration of the
+        acquisition if it is known
+
+        Args:
+            config (list): Configuration of the plotted channels
+            calibration_attrs (dict): Gains and corrections of the acquisition, None to keep the configured functions
+
+        Returns:
+            list: Translation function of every plotted channel, None shows the values as they are
+        """
+        funcs = [i.value_translation_func for i in config]
+        if calibration_attrs is None:
+            return funcs
+        num_channels = max(i.visualized_channel for i in config) + 1
+        for key in (CALIBRATION_OFFSET_ATTR, CALIBRATION_GAIN_ATTR):
+            if calibration_attrs.get(key) is not None:
+                num_channels = np.size(calibration_attrs[key])
+        calibration = calibration_from_attrs(calibration_attrs, num_channels)
+        for idx, channel_config in enumerate(config):
+            if funcs[idx] is translation_func_adc:
+                channel = channel_config.visualized_channel
+                funcs[idx] = lambda values, channel=channel: calibration.apply(values, dtype=np.float64, channels=channel)
+        return funcs
+
+
     def _search_lsl_stream_and_connect(self, lsl_layer_name: list) -> list[StreamInlet]:
         """Search for an LSL streams by name and connecting to them
         
@@ -82,6 +138,19 @@ class LivePlotter:
         return int(max(fs))
     
 
+    def _init_pull_buffers(self) -> list[np.ndarray]:
+        """Initialize one reusable array per inlet, which the chunks are pulled into
+
+        Returns:
+            list[np.ndarray]: Arrays with shape (max_samples, channel_count) in the data type of the stream
+        """
+        buffers = []
+        for inlet in self._inlet:
+            info = inlet.info()
+            buffers.append(np.empty((self.max_samples, info.channel_count()), dtype=LSL_NUMPY_DTYPES[info.channel_format()]))
+        return buffers
+
+
     def _init_plot(self, curves_color: list[str], curves_name: list[str]) -> tuple:
         """Initialize the PyQtGraph plot for live data visualization
 
@@ -126,6 +195,49 @@ class LivePlotter:
         return app, win, plot_item, curves, freq_labels
     
 
+    def _get_quality_metric_names(self) -> list:
+        """Read the metric names of one channel from the channel labels of the quality stream
+
+        Returns:
+            list: Metric names in the order of the columns
+        """
+        labels = []
+        channel = self._quality_inlet.info(timeout=1.).desc().child("channels").child("channel")
+        while not channel.empty():
+            labels.append(channel.child_value("label"))
+            channel = channel.next_sibling()
+        return [label.split("_", 1)[1] for label in labels if label.startswith("CH1_")]
+
+
+    def _init_quality_summary(self) -> pg.TextItem:
+        """Add a text panel for the channel quality below the plot
+
+        Returns:
+            pg.TextItem: Text item with the quality summary
+        """
+        quality_box = pg.ViewBox()
+        quality_box.setBackgroundColor((50, 50, 50, 180))
+        quality_box.setFixedHeight(20 + len(self.data_buffers) * 22)
+        quality_box.setRange(xRange=(0, 1), yRange=(0, 1), padding=0)
+        quality_box.setMouseEnabled(x=False, y=False)
+        quality_box.setMenuEnabled(False)
+        label = pg.TextItem(text="Channel quality: --", color="w", anchor=(0, 0))
+        label.setPos(0.01, 0.95)
+        quality_box.addItem(label)
+        self._win.addItem(quality_box, row=1, col=0, colspan=2)
+        return label
+
+
+    def _update_quality_summary(self) -> None:
+        """Show the latest quality window of the plotted channels"""
+        rows, _ = self._quality_inlet.pull_chunk(timeout=0.0)
+        if not rows or not self._quality_channels:
+            return
+        translation_funcs = [self._translation_func[idx] for idx, _ in self._quality_channels]
+        self._quality_label.setText(format_quality_summary(rows[-1], self._quality_metrics, [channel for _, channel in self._quality_channels],
+                                                           self._quality_names, translation_funcs))
+
+
     def _init_timer(self) -> QtCore.QTimer:
         """Initialize the QTimer for periodic plot updates
 
@@ -144,19 +256,24 @@ class LivePlotter:
         Args:
             iterr_threshold_for_calulaction (int, optional): Threshold for the calculation. Defaults to 10.
         """        
+        if self._stop_event is not None and self._stop_event.is_set():
+            self._quit()
+            return
+        profiler = self._profiler
         for idx ,selected_inlet in enumerate(self._inlet):
-            data, timestamp = selected_inlet.pull_chunk(timeout=0.0, max_samples=self.max_samples)
-            if not data:
+            pull_start = time.perf_counter_ns()
+            num_samples, timestamp = pull_chunk_into(selected_inlet, self._pull_buffers[idx])
+            if not num_samples:
                 continue
-            data = np.array(data)[:,self._visualized_channel[idx]]
-            timestamp = np.array(timestamp)
+            profiler.record("plot_pull", pull_start, time.perf_counter_ns(), num_samples)
+            data = self._pull_buffers[idx][:num_samples, self._visualized_channel[idx]]
             end_pointer = self.write_pointers[idx] + len(data)
             if self._translation_func[idx] is not None:
                 data = self._translation_func[idx](data)
 
             if end_pointer <= self.max_samples:
                 self.data_buffers[idx][self.write_pointers[idx]:end_pointer] = data
-                self.time_buffers[idx][self.write_pointers[idx]:end_pointer] = np.array(timestamp)
+                self.time_buffers[idx][self.write_pointers[idx]:end_pointer] = timestamp
             else:
                 break_point = self.max_samples - self.write_pointers[idx]
                 self.data_buffers[idx][self.write_pointers[idx]:] = data[:break_point]
@@ -166,15 +283,21 @@ class LivePlotter:
                 self.time_buffers[idx][:len(data) - break_point] = timestamp[break_point:]
             self.write_pointers[idx] = (self.write_pointers[idx] + len(data)) % self.max_samples
 
+        if self._quality_inlet is not None:
+            with profiler.span("plot_quality"):
+                self._update_quality_summary()
+
         time_now = local_clock()
         for idx, curve in enumerate(self._curves):
             plot_data = np.concatenate((self.data_buffers[idx][self.write_pointers[idx]:], self.data_buffers[idx][:self.write_pointers[idx]]))
             plot_time = np.concatenate((self.time_buffers[idx][self.write_pointers[idx]:], self.time_buffers[idx][:self.write_pointers[idx]]))
             valid_mask = plot_time >0 #Check for valid timestamps
             if np.any(valid_mask):
-                curve.setData(plot_time[valid_mask] - time_now, plot_data[valid_mask])
+                with profiler.span("plot_draw", int(np.sum(valid_mask))):
+                    curve.setData(plot_time[valid_mask] - time_now, plot_data[valid_mask])
                 if np.sum(valid_mask) >= self.max_samples and self.caluclate_counter  >=iterr_threshold_for_calulaction:
-                    self._caluclate_frequency(idx = idx, data= plot_data[valid_mask], time= plot_time[valid_mask])
+                    with profiler.span("plot_frequency"):
+                        self._caluclate_frequency(idx = idx, data= plot_data[valid_mask], time= plot_time[valid_mask])
         if self.caluclate_counter  >=iterr_threshold_for_calulaction:
             self.caluclate_counter =0
         else:
@@ -197,14 +320,24 @@ class LivePlotter:
         self._freq_labels[idx].setText(f"{peak_freq:.2f} Hz")
 
 
+    def _quit(self) -> None:
+        """Stop the updates, write the trace of a profiled plotter and quit the application"""
+        self._timer.stop()
+        if self._profiler.enabled:
+            self._profiler.write_chrome_trace(self._profile_path)
+        QtWidgets.QApplication.instance().quit()
+
+
     def start(self):
         """Start the live plotter"""        
         QtWidgets.QApplication.instance().exec_()
 
 
-def start_live_plotter(config: list) -> None:
-    """Start the live plotter with the given configuration"""
-    plotter = LivePlotter(config=config)
+def start_live_plotter(config: list, quality_layer_name: str = None, profile_path: str = None, stop_event=None,
+                       calibration_attrs: dict = None) -> None:
+    """Start the live plotter with the given configuration, the optional channel quality stream, profiling and calibration"""
+    plotter = LivePlotter(config=config, quality_layer_name=quality_layer_name, profile_path=profile_path, stop_event=stop_event,
+                          calibration_attrs=calibration_attrs)
     plotter.start()
 
 
@@ -214,7 +347,8 @@ def translation_func_dac(value_to_translate: np.array, v_ref: float =5.) -> list
 
 
 def translation_func_adc(value_to_translate: int) -> list:
-    value_to_translate = value_to_translate * 1.25 / 2 ** 23
+    """Volts at the ADC input, the live plotter of the controller replaces it by the calibration of the acquisition"""
+    value_to_translate = value_to_translate * ADC_FULL_SCALE_VOLT / ADC_HALF_RANGE_CODES
     return value_to_translate
 
 
@@ -1,10 +1,24 @@
-from pylsl import StreamInfo, StreamOutlet, FOREVER, IRREGULAR_RATE, cf_int64, cf_int32
+from pylsl import StreamInfo, StreamOutlet, StreamInlet, FOREVER, IRREGULAR_RATE, cf_int64, cf_int32, cf_int16, cf_int8, cf_float32, cf_double64
+import inspect
+import numpy as np
+
+# numpy data type of the values of every numeric LSL channel format
+LSL_NUMPY_DTYPES = {cf_float32: np.float32, cf_double64: np.float64, cf_int8: np.int8, cf_int16: np.int16, cf_int32: np.int32, cf_int64: np.int64}
+# pylsl >= 1.18 returns the timestamps of a chunk as numpy array instead of a list of floats
+_PULL_AS_NUMPY = "as_numpy" in inspect.signature(StreamInlet.pull_chunk).parameters
 
 class LSLHandler:
-    def __init__(self, name, sampling_rate: float= IRREGULAR_RATE):
-        """Class to handle LSL stream creation and management for EEG DAQ data"""
+    def __init__(self, name, sampling_rate: float= IRREGULAR_RATE, num_channels: int = 8):
+        """Class to handle LSL stream creation and management for EEG DAQ data
+
+        Args:
+            name (str): Name of the LSL stream
+            sampling_rate (float, optional): Nominal sampling rate in Hz. Defaults to IRREGULAR_RATE.
+            num_channels (int, optional): Number of data channels, 8 per board. Defaults to 8.
+        """
         self._name = name
         self._sampling_rate = sampling_rate
+        self._num_channels = num_channels
 
 
     @property
@@ -16,8 +30,49 @@ class LSLHandler:
         """        
         info = StreamInfo(name=self._name,
                         type='custom_daq',
-                        channel_count=17, # 8 Data Channels +8 Error Flags(for each channel one)+ 1 Timestamp Channel 
+                        channel_count=2 * self._num_channels + 1, # Data Channels + Error Flags (for each channel one) + 1 Timestamp Channel
                         nominal_srate=self._sampling_rate,
                         channel_format=cf_int32,
                         source_id=self._name + '_uid')
-        return StreamOutlet(info)
\ No newline at end of file
+        return StreamOutlet(info)
+
+
+    def create_lsl_outlet_quality(self, labels: list) -> StreamOutlet:
+        """Returns an LSL StreamOutlet for the channel quality metrics
+
+        Args:
+            labels (list): Label of every metric column, stored in the channel description of the stream
+
+        Returns:
+            StreamOutlet: The created LSL StreamOutlet object
+        """
+        info = StreamInfo(name=self._name,
+                        type='channel_quality',
+                        channel_count=len(labels),
+                        nominal_srate=self._sampling_rate,
+                        channel_format=cf_float32,
+                        source_id=self._name + '_uid')
+        channels = info.desc().append_child("channels")
+        for label in labels:
+            channels.append_child("channel").append_child_value("label", label)
+        return StreamOutlet(info)
+
+
+def pull_chunk_into(inlet: StreamInlet, dest: np.ndarray, timeout: float = 0.) -> tuple[int, np.ndarray]:
+    """Pull a chunk of a numeric LSL stream directly into preallocated rows, liblsl writes the values into the memory of
+    dest, so no Python object is created per sample or value
+
+    Args:
+        inlet (StreamInlet): Opened inlet of a numeric stream
+        dest (np.ndarray): C-contiguous rows with shape (max_samples, channel_count) in the numpy type of the channel format
+        timeout (float, optional): Time in seconds to wait for the first samples. Defaults to 0..
+
+    Returns:
+        tuple[int, np.ndarray]: Number of pulled samples, the first rows of dest, and their timestamps
+    """
+    if _PULL_AS_NUMPY:
+        _, timestamps = inlet.pull_chunk(timeout=timeout, max_samples=dest.shape[0], dest_obj=dest, as_numpy=True)
+    else:
+        _, timestamps = inlet.pull_chunk(timeout=timeout, max_samples=dest.shape[0], dest_obj=dest)
+    timestamps = np.asarray(timestamps, dtype=np.float64)
+    return timestamps.shape[0], timestamps
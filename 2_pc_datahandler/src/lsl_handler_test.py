@@ -1,7 +1,9 @@
+import time
 import unittest
 from unittest.mock import patch, MagicMock
-from pylsl import cf_int32
-from src import LSLHandler
+import numpy as np
+from pylsl import StreamInfo, StreamOutlet, StreamInlet, resolve_byprop, cf_int32, cf_float32
+from src import LSLHandler, pull_chunk_into, LSL_NUMPY_DTYPES
 
 class TestLSLHandler(unittest.TestCase):
     def setUp(self):
@@ -12,6 +14,7 @@ class TestLSLHandler(unittest.TestCase):
     def test_create_lsl_outlet_daq(self, mock_stream_outlet, mock_stream_info):
         self._handler._name = "TestStream"
         self._handler._sampling_rate = 250
+        self._handler._num_channels = 8
         mock_stream_info_instance = MagicMock()
         mock_stream_info.return_value = mock_stream_info_instance
         mock_stream_outlet_instance = MagicMock()
@@ -25,4 +28,42 @@ class TestLSLHandler(unittest.TestCase):
             nominal_srate=250,
             channel_format=cf_int32,
             source_id="TestStream_uid"
-        )
\ No newline at end of file
+        )
+
+    @patch ('src.lsl_handler.StreamInfo')
+    @patch ('src.lsl_handler.StreamOutlet')
+    def test_create_lsl_outlet_quality(self, mock_stream_outlet, mock_stream_info):
+        self._handler._name = "TestStream_Quality"
+        self._handler._sampling_rate = 1.
+        self._handler._num_channels = 8
+
+        self._handler.create_lsl_outlet_quality(["CH1_rms", "CH1_flatline"])
+        mock_stream_info.assert_called_once_with(
+            name="TestStream_Quality",
+            type='channel_quality',
+            channel_count=2,
+            nominal_srate=1.,
+            channel_format=cf_float32,
+            source_id="TestStream_Quality_uid"
+        )
+        channels = mock_stream_info.return_value.desc.return_value.append_child.return_value
+        self.assertEqual(channels.append_child.return_value.append_child_value.call_count, 2)
+        mock_stream_outlet.assert_called_once_with(mock_stream_info.return_value)
+
+    def test_pull_chunk_into_preallocated_rows(self):
+        outlet = StreamOutlet(StreamInfo("PullIntoTest", "test", 3, 100, cf_int32, "PullIntoTest_uid"))
+        inlet = StreamInlet(resolve_byprop("name", "PullIntoTest", timeout=5.)[0])
+        inlet.open_stream(timeout=5.)
+        values = np.arange(30, dtype=np.int32).reshape(10, 3)
+        outlet.push_chunk(values)
+        dest = np.zeros((16, 3), dtype=LSL_NUMPY_DTYPES[cf_int32])
+        pulled, times = 0, []
+        deadline = time.monotonic() + 5.
+        while pulled < 10 and time.monotonic() < deadline:
+            num_samples, timestamps = pull_chunk_into(inlet, dest[pulled:], timeout=0.1)
+            pulled += num_samples
+            times.append(timestamps)
+        self.assertEqual(pulled, 10)
+        np.testing.assert_array_equal(dest[:10], values)
+        self.assertEqual(np.concatenate(times).dtype, np.float64)
+        inlet.close_stream()
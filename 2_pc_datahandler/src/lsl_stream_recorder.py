@@ -0,0 +1,197 @@
+from pylsl import StreamInlet, StreamInfo, local_clock, cf_string
+from .lsl_handler import pull_chunk_into, LSL_NUMPY_DTYPES
+from .data_loading import STREAMS_GROUP
+from pathlib import Path
+import time
+import h5py
+import numpy as np
+
+# Samples held in memory between two writes, in seconds of the nominal rate of the stream
+STREAM_BUFFER_SEC = 10.
+# Smallest buffer in samples, also used for streams with irregular rate like markers
+STREAM_BUFFER_MIN_SAMPLES = 1024
+# Longest time in seconds the pulled samples wait in memory before they are written
+STREAM_FLUSH_INTERVAL = 1.
+# Interval of the clock offset measurements in seconds
+CLOCK_OFFSET_INTERVAL = 5.
+# Timeout of a clock offset measurement in seconds, the first one waits for the initial estimate of liblsl
+CLOCK_OFFSET_TIMEOUT = 2.
+
+
+class LSLStreamRecorder:
+    _values: np.ndarray
+    _strings: list
+
+    def __init__(self, stream_info: StreamInfo, buffer_sec: float = STREAM_BUFFER_SEC, flush_interval: float = STREAM_FLUSH_INTERVAL,
+                 open_timeout: float = 10.) -> None:
+        """Record a further LSL stream (markers, stimulus or player data) next to the DAQ data. The owner polls the
+        recorder: pull moves the samples liblsl buffered in the background into a preallocated array without waiting,
+        take hands them over for writing once the array is half full or flush_interval passed. The timestamps stay in
+        the clock of the sender, the offset to the local clock is measured every CLOCK_OFFSET_INTERVAL like XDF does
+
+        Args:
+            stream_info (StreamInfo): Resolved stream
+            buffer_sec (float, optional): Samples held in memory, in seconds of the nominal rate. Defaults to STREAM_BUFFER_SEC.
+            flush_interval (float, optional): Longest time in seconds samples wait in memory. Defaults to STREAM_FLUSH_INTERVAL.
+            open_timeout (float, optional): Timeout for opening the stream in seconds. Defaults to 10.
+        """
+        self._inlet = StreamInlet(stream_info, max_buflen=60, max_chunklen=1024, recover=True)
+        self._inlet.open_stream(timeout=open_timeout)
+        info = self._inlet.info(timeout=open_timeout)
+        self._name = info.name()
+        self._channel_count = info.channel_count()
+        self._string_stream = info.channel_format() == cf_string
+        self._dtype = np.dtype(object) if self._string_stream else np.dtype(LSL_NUMPY_DTYPES[info.channel_format()])
+        self._description = {"type": info.type(), "source_id": info.source_id(), "hostname": info.hostname(),
+                             "nominal_srate": info.nominal_srate(), "created_at": info.created_at()}
+        capacity = max(int(buffer_sec * info.nominal_srate()), STREAM_BUFFER_MIN_SAMPLES)
+        if self._string_stream:
+            self._strings = []
+        else:
+            self._values = np.empty((capacity, self._channel_count), dtype=self._dtype)
+        self._times = np.empty(capacity)
+        self._fill = 0
+        self._capacity = capacity
+        self._flush_interval = flush_interval
+        self._last_flush = time.monotonic()
+        self._offsets = []
+        self._next_offset = 0.
+
+
+    # ========== API METHODS ==========
+    @property
+    def name(self) -> str:
+        """Name of the recorded stream"""
+        return self._name
+
+    @property
+    def channel_count(self) -> int:
+        """Number of channels of the stream"""
+        return self._channel_count
+
+    @property
+    def dtype(self) -> np.dtype:
+        """Data type of the values, object for string streams"""
+        return self._dtype
+
+    @property
+    def description(self) -> dict:
+        """Type, source id, host, nominal rate and creation time of the stream"""
+        return dict(self._description)
+
+
+    def pull(self) -> int:
+        """Move the samples waiting in the inlet into the buffer without waiting, as many as fit
+
+        Returns:
+            int: Number of samples pulled
+        """
+        if time.monotonic() >= self._next_offset:
+            self._measure_clock_offset()
+        space = self._capacity - self._fill
+        if not space:
+            return 0
+        if self._string_stream:
+            values, timestamps = self._inlet.pull_chunk(timeout=0., max_samples=space)
+            self._strings.extend(values)
+            num_samples = len(timestamps)
+        else:
+            num_samples, timestamps = pull_chunk_into(self._inlet, self._values[self._fill:])
+        self._times[self._fill:self._fill + num_samples] = timestamps
+        self._fill += num_samples
+        return num_samples
+
+
+    def take(self, force: bool = False) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """Hand over the pulled samples and clock offsets if the buffer is half full or the flush interval passed
+
+        Args:
+            force (bool, optional): Hand over everything regardless of the fill level. Defaults to False.
+
+        Returns:
+            tuple[np.ndarray, np.ndarray, np.ndarray]: Timestamps, values with shape (num_samples, channel_count) and clock
+                offsets as rows (local time of the measurement, offset), empty if nothing is due
+        """
+        due = force or 2 * self._fill >= self._capacity or time.monotonic() - self._last_flush >= self._flush_interval
+        if not due or not (self._fill or self._offsets):
+            return np.zeros(0), np.zeros((0, self._channel_count), dtype=self._dtype), np.zeros((0, 2))
+        if self._string_stream:
+            values = np.empty((self._fill, self._channel_count), dtype=object)
+            values[:] = self._strings
+            self._strings = []
+        else:
+            values = self._values[:self._fill].copy()
+        timestamps = self._times[:self._fill].copy()
+        offsets = np.array(self._offsets, dtype=np.float64).reshape(-1, 2)
+        self._fill, self._offsets = 0, []
+        self._last_flush = time.monotonic()
+        return timestamps, values, offsets
+
+
+    def close(self) -> None:
+        """Close the inlet"""
+        self._inlet.close_stream()
+
+
+    #  ========== INTERNAL METHODS ==========
+    def _measure_clock_offset(self) -> None:
+        """Record the offset between the clock of the sender and the local clock"""
+        self._next_offset = time.monotonic() + CLOCK_OFFSET_INTERVAL
+        try:
+            offset = self._inlet.time_correction(timeout=CLOCK_OFFSET_TIMEOUT if not self._offsets else 0.5)
+        except Exception:
+            # the sender did not answer in time, the next measurement follows after the interval
+            return
+        self._offsets.append((local_clock(), offset))
+
+
+def read_h5_stream(path_to_file: Path, name: str, apply_clock_offsets: bool = True) -> tuple[np.ndarray, np.ndarray]:
+    """Read a stream recorded next to the DAQ data
+
+    Args:
+        path_to_file (Path): Path to the h5 file
+        name (str): Name of the stream
+        apply_clock_offsets (bool, optional): Map the timestamps to the local LSL clock of the recording with the measured
+            offsets, interpolated between the measurements. Defaults to True.
+
+    Returns:
+        tuple[np.ndarray, np.ndarray]: Timestamps in seconds and values with shape (num_samples, channel_count)
+    """
+    with h5py.File(path_to_file, "r") as file:
+        grp = file[STREAMS_GROUP][name]
+        timestamps = grp["time_stamps"][:]
+        values = grp["values"][:]
+        offsets = grp["clock_offsets"][:]
+    if values.dtype == object:
+        values = values.astype(str)
+    if apply_clock_offsets and offsets.shape[0]:
+        # the offsets were measured on the local clock, the sender clock is the local clock minus the offset
+        timestamps = timestamps + np.interp(timestamps, offsets[:, 0] - offsets[:, 1], offsets[:, 1])
+    return timestamps, values
+
+
+def read_h5_daq_lsl_times(path_to_file: Path) -> np.ndarray:
+    """Local LSL time of every DAQ sample, to align the DAQ data with the recorded streams. The times are interpolated
+    between the reference points stored with every written chunk, after the last one they follow the sampling rate
+
+    Args:
+        path_to_file (Path): Path to the h5 file
+
+    Raises:
+        KeyError: If the recording has no LSL reference times
+
+    Returns:
+        np.ndarray: LSL time of every sample in seconds
+    """
+    with h5py.File(path_to_file, "r") as file:
+        grp = file["ad7779_data"]
+        if "lsl_times" not in grp:
+            raise KeyError(f"{path_to_file} has no LSL reference times")
+        references = grp["lsl_times"][:]
+        num_samples = grp["measurements"].shape[0]
+        sampling_rate = float(grp.attrs["adc_samplingrate"])
+    positions = np.arange(num_samples, dtype=np.float64)
+    times = np.interp(positions, references[:, 0], references[:, 1])
+    behind = positions > references[-1, 0]
+    times[behind] = references[-1, 1] + (positions[behind] - references[-1, 0]) / sampling_rate
+    return times
@@ -0,0 +1,71 @@
+import tempfile
+import time
+import unittest
+from pathlib import Path
+import numpy as np
+from pylsl import StreamInfo, StreamOutlet, resolve_byprop, cf_float32, cf_string
+from src import H5Handler, EEGDeviceConfig, EEGDeviceMetadata, PotiConfig, LSLStreamRecorder, read_h5_stream, read_h5_daq_lsl_times
+
+
+class LSLStreamRecorderTest(unittest.TestCase):
+    def setUp(self):
+        self._tmpdir = tempfile.TemporaryDirectory()
+        self._config = EEGDeviceConfig(com_name="COM_TEST", measure_duration=1, adc_pga_gain=1, channel_mask=[1] * 8,
+                                       sdo_driver_strength=3, adc_samplingrate=100, test_mode_enabled=False, adc_power_mode_high=True,
+                                       error_header=False, reference_active_shielding=False, gain_instrument_amplifier=1)
+        self._metadata = EEGDeviceMetadata(waveform_generator="test", waveform_generator_frequency="10",
+                                           waveform_generator_amplitude="1", waveform_type="Sine")
+        self._poti = PotiConfig(gain=1, calculated_resistor_value=0, poti_value=0, actual_resistor_value=0, actual_gain_value=1)
+
+    def tearDown(self):
+        self._tmpdir.cleanup()
+
+    def _open(self, name: str, channel_count: int, nominal_srate: float, channel_format) -> tuple[StreamOutlet, LSLStreamRecorder]:
+        outlet = StreamOutlet(StreamInfo(name, "test", channel_count, nominal_srate, channel_format, f"{name}_uid"))
+        recorder = LSLStreamRecorder(resolve_byprop("name", name, timeout=5.)[0], buffer_sec=1., flush_interval=60.)
+        return outlet, recorder
+
+    def _pull_all(self, recorder: LSLStreamRecorder, num_samples: int) -> int:
+        pulled = 0
+        deadline = time.monotonic() + 5.
+        while pulled < num_samples and time.monotonic() < deadline:
+            pulled += recorder.pull()
+        return pulled
+
+    def test_records_numeric_and_marker_streams(self):
+        data_outlet, data_recorder = self._open("RecorderTestData", 2, 200., cf_float32)
+        marker_outlet, marker_recorder = self._open("RecorderTestMarkers", 1, 0., cf_string)
+        writer = H5Handler(recording_name=str(Path(self._tmpdir.name) / "rec"), metadata=self._metadata, eeg_device_config=self._config,
+                           poti_values=self._poti)
+        values = np.arange(1200, dtype=np.float32).reshape(600, 2)
+        data_outlet.push_chunk(values, timestamp=100.)
+        for index, marker in enumerate(("start", "stimulus", "stop")):
+            marker_outlet.push_sample([marker], timestamp=100. + index)
+        self.assertEqual(self._pull_all(data_recorder, 600), 600)
+        self.assertEqual(self._pull_all(marker_recorder, 3), 3)
+
+        # the numeric buffer holds 1024 samples, half full is due, the three markers are not
+        timestamps, recorded, offsets = data_recorder.take()
+        np.testing.assert_array_equal(recorded, values)
+        self.assertEqual(timestamps.shape, (600,))
+        self.assertEqual(offsets.shape, (1, 2))
+        self.assertEqual(marker_recorder.take()[0].size, 0)
+        writer.append_stream(data_recorder.name, timestamps, recorded, offsets, attrs=data_recorder.description)
+        writer.append_stream(marker_recorder.name, *marker_recorder.take(force=True), attrs=marker_recorder.description)
+        writer.append_lsl_times_ad7779([0, 50], [10., 10.5])
+        writer.append_data_ad7779(timestamps=np.arange(80), measurements=np.zeros((80, 8), dtype=np.int32),
+                                  alerts=np.zeros((80, 8), dtype=np.int8))
+        writer.close_h5_file()
+        data_recorder.close()
+        marker_recorder.close()
+
+        path = Path(self._tmpdir.name) / "rec_data.h5"
+        raw_times, raw_values = read_h5_stream(path, "RecorderTestData", apply_clock_offsets=False)
+        np.testing.assert_array_equal(raw_values, values)
+        np.testing.assert_allclose(raw_times[-1], 100.)
+        aligned_times, _ = read_h5_stream(path, "RecorderTestData")
+        np.testing.assert_allclose(aligned_times - raw_times, offsets[0, 1])
+        marker_times, markers = read_h5_stream(path, "RecorderTestMarkers", apply_clock_offsets=False)
+        self.assertEqual(markers[:, 0].tolist(), ["start", "stimulus", "stop"])
+        np.testing.assert_allclose(marker_times, [100., 101., 102.])
+        np.testing.assert_allclose(read_h5_daq_lsl_times(path)[[0, 25, 50, 79]], [10., 10.25, 10.5, 10.79])
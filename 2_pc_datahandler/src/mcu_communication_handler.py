@@ -33,10 +33,49 @@ class McuCommunicationHandler:
         return self._get_system_state() == "DAQ"
     
 
-    def do_reset(self) -> None:
-        """Performing a Software Reset on the Platform"""
+    def do_reset(self, timeout: float = 4.) -> float:
+        """Performing a Software Reset on the Platform and waiting until the device answers again
+
+        Args:
+            timeout (float, optional): Maximum time in seconds for the device to come back. Defaults to 4.
+
+        Returns:
+            float: Time in seconds until the device was ready
+        """
         self._write_wofb(1, 0)
-        time.sleep(4)
+        return self.wait_until_ready(timeout=timeout)
+
+
+    def wait_until_ready(self, timeout: float = 4., poll_interval: float = 0.01) -> float:
+        """Polling the system state until the device reports IDLE, instead of waiting a fixed time. A DAQ left running
+        from a previous session is stopped and a port which vanished during a reset is opened again
+
+        Args:
+            timeout (float, optional): Maximum time in seconds to wait for the device. Defaults to 4.
+            poll_interval (float, optional): Pause between two polls in seconds. Defaults to 0.01.
+
+        Raises:
+            TimeoutError: If the device does not report IDLE before the deadline
+
+        Returns:
+            float: Time in seconds until the device was ready
+        """
+        start = time.monotonic()
+        while True:
+            time.sleep(poll_interval)
+            try:
+                self._interface.clear_input()
+                state = self._get_system_state()
+                if state == "IDLE":
+                    return time.monotonic() - start
+                if state == "DAQ":
+                    self.stop_daq()
+            except (serial.SerialException, OSError):
+                self._reopen_interface()
+            except (ValueError, IndexError):
+                pass # incomplete or interleaved answer, poll again
+            if time.monotonic() - start > timeout:
+                raise TimeoutError(f"Device not ready after {timeout} s")
 
 
     def echo(self, data: str) -> str:
@@ -131,10 +170,9 @@ class McuCommunicationHandler:
         self._write_wofb(9, 0)
 
 
-    def error_register(self) -> None:
+    def error_register(self) -> ErrorRegisterData:
         """Reading the error register of the device"""
-        self._write_wofb(10, 0)
-        register_values_packet = self._interface.read(19)
+        register_values_packet = self._write_wfb(10, 0, size=19)
         if register_values_packet[0] != 0xaa or register_values_packet[-1] != 0xbb:
             raise ValueError("Invalid packet received from device")
         error_data = ErrorRegisterData( channel_0_error_status_register=register_values_packet[1],
@@ -190,7 +228,28 @@ class McuCommunicationHandler:
         self._set_poti_value(position_poti)
 
 
+    def use_interface(self, interface: InterfaceSerialUSB) -> InterfaceSerialUSB:
+        """Sending the commands through another interface, e.g. a DemuxInterface while DAQ is running
+
+        Args:
+            interface (InterfaceSerialUSB): Interface for the following commands
+
+        Returns:
+            InterfaceSerialUSB: Interface used so far
+        """
+        previous, self._interface = self._interface, interface
+        return previous
+
+
     #  ========== INTERNAL METHODS ==========
+    def _reopen_interface(self) -> None:
+        """Trying to open the serial port again, e.g. after the device re-enumerated"""
+        try:
+            self._interface.open()
+        except (serial.SerialException, OSError):
+            pass
+
+
     def _update_registers(self) -> None:
         """Updating the registers of the device"""
         self._write_wofb(13, 0)
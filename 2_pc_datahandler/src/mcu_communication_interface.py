@@ -43,6 +43,10 @@ class InterfaceSerialUSB:
         """Read content from device"""
         return self.__device.read(no_bytes)
 
+    def clear_input(self) -> None:
+        """Drop all bytes waiting in the input buffer of the device"""
+        self.__device.reset_input_buffer()
+
     def write_wofb(self, data: bytes) -> None:
         """Write content to device without feedback"""
         self.__device.write(data)
@@ -0,0 +1,64 @@
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from .acquisition_stats import AcquisitionStats, render_prometheus_text
+
+
+class PrometheusExporter:
+    _stats: AcquisitionStats
+    _server: ThreadingHTTPServer
+    _thread: threading.Thread
+
+    def __init__(self, stats: AcquisitionStats, port: int = 9110, host: str = "127.0.0.1") -> None:
+        """Serve the acquisition counters as Prometheus text on http://host:port/metrics. Requests are answered from
+        a snapshot in the server thread, the acquisition threads are never blocked
+
+        Args:
+            stats (AcquisitionStats): Counters to export
+            port (int, optional): TCP port, 0 selects a free port. Defaults to 9110.
+            host (str, optional): Interface to bind. Defaults to "127.0.0.1".
+        """
+        self._stats = stats
+        self._server = ThreadingHTTPServer((host, port), self._build_request_handler())
+        self._server.daemon_threads = True
+        self._thread = None
+
+
+    @property
+    def get_address(self) -> tuple:
+        """Host and port the exporter is listening on"""
+        return self._server.server_address
+
+
+    def start(self) -> None:
+        """Start serving in a background thread"""
+        self._thread = threading.Thread(target=self._server.serve_forever, name="PrometheusExporter", daemon=True)
+        self._thread.start()
+
+
+    def stop(self) -> None:
+        """Stop serving and release the port"""
+        self._server.shutdown()
+        self._server.server_close()
+        if self._thread is not None:
+            self._thread.join()
+
+
+    def _build_request_handler(self) -> type:
+        stats = self._stats
+
+        class MetricsRequestHandler(BaseHTTPRequestHandler):
+            def do_GET(self) -> None:
+                if self.path.split("?")[0] not in ("/", "/metrics"):
+                    self.send_error(404)
+                    return
+                body = render_prometheus_text(stats.snapshot()).encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args) -> None:
+                pass
+
+        return MetricsRequestHandler
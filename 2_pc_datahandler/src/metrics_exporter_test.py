@@ -0,0 +1,29 @@
+import unittest
+from urllib.request import urlopen
+from urllib.error import HTTPError
+from src import AcquisitionStats, PrometheusExporter
+
+
+class PrometheusExporterTest(unittest.TestCase):
+    def setUp(self):
+        self._stats = AcquisitionStats()
+        self._exporter = PrometheusExporter(self._stats, port=0)
+        self._exporter.start()
+        self._url = "http://{}:{}".format(*self._exporter.get_address)
+
+
+    def tearDown(self):
+        self._exporter.stop()
+
+
+    def test_metrics_endpoint(self):
+        self._stats.bytes_read = 380
+        with urlopen(f"{self._url}/metrics", timeout=2) as response:
+            body = response.read().decode("utf-8")
+            self.assertEqual(response.status, 200)
+        self.assertIn("eeg_daq_bytes_read_total 380", body)
+
+
+    def test_unknown_path(self):
+        with self.assertRaises(HTTPError):
+            urlopen(f"{self._url}/unknown", timeout=2)
@@ -0,0 +1,2 @@
+# pySerial URL handler for eegsim://, found through serial.protocol_handler_packages (registered in serial_handler.py and virtual_device.py)
+from .virtual_device import VirtualEEGSerial as Serial
@@ -0,0 +1,230 @@
+from .data_structures import EEGDeviceConfig, EEGDeviceMetadata
+from .data_processing import ADC_DATA_FRAME_DTYPE, decode_channel_values, decode_alert_flags, detect_packet_gaps
+from .h5_handler import H5Handler
+from .poti import PotiConfig
+from concurrent.futures import ProcessPoolExecutor
+from collections import deque
+from dataclasses import asdict
+from pathlib import Path
+import json, os, struct, time
+import numpy as np
+
+# File signature of a raw capture
+RAW_CAPTURE_MAGIC = b"EEGRAW01"
+# Size of the header in front of the frames in bytes
+RAW_CAPTURE_HEADER_SIZE = 4096
+# Fixed part of the header: magic, frame size, length of the JSON description, number of frames
+_HEADER_STRUCT = struct.Struct("<8sIIQ")
+# Number of appends between two updates of the frame count in the header
+HEADER_UPDATE_INTERVAL = 64
+# Frames decoded per task of the converter
+CONVERT_BLOCK_FRAMES = 1 << 16
+
+
+class RawCaptureWriter:
+    def __init__(self, path: Path, eeg_device_config: EEGDeviceConfig, metadata: EEGDeviceMetadata, poti_values: PotiConfig,
+                 preallocate_frames: int, frame_dtype: np.dtype = ADC_DATA_FRAME_DTYPE) -> None:
+        """Append validated raw frames to a preallocated file without decoding them. The file starts with a header of
+        RAW_CAPTURE_HEADER_SIZE bytes, which holds the frame size, the number of frames and the configuration, metadata
+        and poti values as JSON. The frames follow back to back and the file grows in steps of preallocate_frames
+
+        Args:
+            path (Path): Path of the capture file
+            eeg_device_config (EEGDeviceConfig): Configuration parameters for the EEG device
+            metadata (EEGDeviceMetadata): Metadata information about the measurement
+            poti_values (PotiConfig): Potentiometer configuration values for the instrumentation amplifier
+            preallocate_frames (int): Number of frames the file is preallocated for
+            frame_dtype (np.dtype, optional): Structured dtype of one frame. Defaults to ADC_DATA_FRAME_DTYPE.
+
+        Raises:
+            ValueError: If the description does not fit into the header
+        """
+        self._path = Path(path)
+        self._frame_size = frame_dtype.itemsize
+        self._preallocate_frames = max(int(preallocate_frames), 1)
+        self._num_frames = 0
+        self._appends = 0
+        description = json.dumps({"created_at": time.ctime(), "eeg_device_config": asdict(eeg_device_config),
+                                  "metadata": asdict(metadata), "poti_values": asdict(poti_values)}).encode()
+        if _HEADER_STRUCT.size + len(description) > RAW_CAPTURE_HEADER_SIZE:
+            raise ValueError("Configuration does not fit into the header of the raw capture")
+        self._description = description
+
+        self._file = open(self._path, "w+b")
+        self._file.write(self._pack_header().ljust(RAW_CAPTURE_HEADER_SIZE, b"\x00"))
+        self._capacity = 0
+        self._grow()
+
+
+    # ========== API METHODS ==========
+    @property
+    def path(self) -> Path:
+        """Path of the capture file"""
+        return self._path
+
+    @property
+    def frames_written(self) -> int:
+        """Number of frames appended so far"""
+        return self._num_frames
+
+
+    def append(self, frames: np.ndarray) -> None:
+        """Append frames as they were received
+
+        Args:
+            frames (np.ndarray): Structured array of valid frames
+        """
+        if not frames.size:
+            return
+        if self._num_frames + frames.size > self._capacity:
+            self._grow()
+        self._file.write(np.ascontiguousarray(frames).view(np.uint8))
+        self._num_frames += frames.size
+        self._appends += 1
+        # keep the header up to date, so a capture of a crashed process stays readable
+        if self._appends % HEADER_UPDATE_INTERVAL == 0:
+            self._write_frame_count()
+
+
+    def close(self) -> None:
+        """Write the final frame count and cut the file to the captured frames"""
+        self._write_frame_count()
+        self._file.truncate(RAW_CAPTURE_HEADER_SIZE + self._num_frames * self._frame_size)
+        self._file.close()
+
+
+    #  ========== INTERNAL METHODS ==========
+    def _pack_header(self) -> bytes:
+        """Fixed header fields followed by the JSON description"""
+        return _HEADER_STRUCT.pack(RAW_CAPTURE_MAGIC, self._frame_size, len(self._description), self._num_frames) + self._description
+
+
+    def _write_frame_count(self) -> None:
+        """Update the frame count in the header and return to the end of the frames"""
+        self._file.seek(0)
+        self._file.write(self._pack_header())
+        self._file.seek(RAW_CAPTURE_HEADER_SIZE + self._num_frames * self._frame_size)
+        self._file.flush()
+
+
+    def _grow(self) -> None:
+        """Extend the file by preallocate_frames frames, reserving the disk space where the OS supports it"""
+        self._capacity += self._preallocate_frames
+        size = RAW_CAPTURE_HEADER_SIZE + self._capacity * self._frame_size
+        self._file.flush()
+        try:
+            os.posix_fallocate(self._file.fileno(), 0, size)
+        except (AttributeError, OSError):
+            # not available on Windows and some file systems, the file is extended without reserving the space
+            position = self._file.tell()
+            self._file.truncate(size)
+            self._file.seek(position)
+
+
+def read_raw_capture(path: Path, frame_dtype: np.dtype = ADC_DATA_FRAME_DTYPE) -> tuple[np.memmap, dict]:
+    """Map the frames of a raw capture into memory without reading them
+
+    Args:
+        path (Path): Path of the capture file
+        frame_dtype (np.dtype, optional): Structured dtype of one frame. Defaults to ADC_DATA_FRAME_DTYPE.
+
+    Raises:
+        ValueError: If the file is not a raw capture or was written with another frame size
+
+    Returns:
+        tuple[np.memmap, dict]: Read-only structured array of all frames and the description with the keys
+            eeg_device_config, metadata, poti_values and created_at
+    """
+    with open(path, "rb") as file:
+        fixed = file.read(_HEADER_STRUCT.size)
+        if len(fixed) < _HEADER_STRUCT.size:
+            raise ValueError(f"{path} is not a raw capture")
+        magic, frame_size, description_length, num_frames = _HEADER_STRUCT.unpack(fixed)
+        if magic != RAW_CAPTURE_MAGIC:
+            raise ValueError(f"{path} is not a raw capture")
+        if frame_size != frame_dtype.itemsize:
+            raise ValueError(f"Frames of {path} have {frame_size} bytes, expected {frame_dtype.itemsize}")
+        description = json.loads(file.read(description_length))
+    available = (os.path.getsize(path) - RAW_CAPTURE_HEADER_SIZE) // frame_size
+    if not available:
+        return np.zeros(0, dtype=frame_dtype), description
+
+    frames = np.memmap(path, dtype=frame_dtype, mode="r", offset=RAW_CAPTURE_HEADER_SIZE, shape=(available,))
+    if available > num_frames:
+        # the capture was not closed, the frames behind the last header update end at the preallocated zeros
+        tail = frames[num_frames:]
+        valid = (tail["head"] == 0xAA) & (tail["tail"] == 0xBB)
+        num_frames += tail.size if valid.all() else int(np.argmin(valid))
+    return frames[:num_frames], description
+
+
+def _decode_capture_block(path: Path, start: int, stop: int) -> tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+    """Decode the frames [start, stop) of a raw capture, runs in the worker processes of convert_raw_capture
+
+    Returns:
+        tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]: Timestamps, measurements, alerts and packet numbers of the block
+    """
+    frames, _ = read_raw_capture(path)
+    block = np.array(frames[start:stop])
+    timestamps = block["timestamp"].astype(np.int64)
+    return timestamps, decode_channel_values(block["channel_values"]), decode_alert_flags(block["alert"]), block["index"].copy()
+
+
+def convert_raw_capture(path: Path, recording_name: str = None, num_workers: int = None,
+                        block_frames: int = CONVERT_BLOCK_FRAMES) -> Path:
+    """Convert a raw capture into the ad7779_data layout of the H5 recordings. Blocks of frames are decoded in parallel
+    by worker processes and written in order, with at most two blocks per worker in flight. Packet gaps are detected
+    across block boundaries and stored as gap records
+
+    Args:
+        path (Path): Path of the capture file
+        recording_name (str, optional): Recording name of the H5 file, None uses the capture path without the suffix
+            "_frames.raw". Defaults to None.
+        num_workers (int, optional): Number of decoding processes, 1 decodes in this process, None uses all cores. Defaults to None.
+        block_frames (int, optional): Frames decoded per task. Defaults to CONVERT_BLOCK_FRAMES.
+
+    Returns:
+        Path: Path of the written H5 file
+    """
+    path = Path(path)
+    frames, description = read_raw_capture(path)
+    config = EEGDeviceConfig(**description["eeg_device_config"])
+    if recording_name is None:
+        recording_name = str(path.with_name(path.name.removesuffix("_frames.raw").removesuffix(path.suffix)))
+    writer = H5Handler(recording_name=recording_name, metadata=EEGDeviceMetadata(**description["metadata"]),
+                       eeg_device_config=config, poti_values=PotiConfig(**description["poti_values"]))
+    num_workers = num_workers if num_workers is not None else os.cpu_count() or 1
+    bounds = [(start, min(start + block_frames, frames.size)) for start in range(0, frames.size, block_frames)]
+    del frames
+
+    previous = None
+    if num_workers > 1 and len(bounds) > 1:
+        with ProcessPoolExecutor(max_workers=num_workers) as executor:
+            pending = deque()
+            for start, stop in bounds:
+                pending.append(executor.submit(_decode_capture_block, path, start, stop))
+                if len(pending) >= 2 * num_workers:
+                    previous = _write_decoded_block(writer, pending.popleft().result(), previous, config.adc_samplingrate)
+            while pending:
+                previous = _write_decoded_block(writer, pending.popleft().result(), previous, config.adc_samplingrate)
+    else:
+        for start, stop in bounds:
+            previous = _write_decoded_block(writer, _decode_capture_block(path, start, stop), previous, config.adc_samplingrate)
+    writer.close_h5_file()
+    return Path(f"{recording_name}_data.h5")
+
+
+def _write_decoded_block(writer: H5Handler, block: tuple, previous: tuple, sampling_rate: float) -> tuple:
+    """Append a decoded block and its gap records
+
+    Returns:
+        tuple: Packet number and timestamp of the last frame of the block
+    """
+    timestamps, measurements, alerts, packet_numbers = block
+    previous_number, previous_timestamp = previous if previous is not None else (None, None)
+    positions, lost_counts = detect_packet_gaps(packet_numbers, timestamps, sampling_rate,
+                                                previous_packet_number=previous_number, previous_timestamp=previous_timestamp)
+    if positions.size:
+        writer.append_gaps_ad7779(positions + writer.get_file_length, lost_counts)
+    writer.append_data_ad7779(timestamps=timestamps, measurements=measurements, alerts=alerts)
+    return int(packet_numbers[-1]), int(timestamps[-1])
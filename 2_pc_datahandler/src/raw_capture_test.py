@@ -0,0 +1,88 @@
+import tempfile
+import unittest
+from pathlib import Path
+import h5py
+import numpy as np
+from src import RawCaptureWriter, read_raw_capture, convert_raw_capture, read_h5_gaps
+from src import EEGDeviceConfig, EEGDeviceMetadata, ADC_DATA_FRAME_DTYPE, PotiConfig
+
+
+def build_frames(packet_numbers: np.ndarray, sampling_rate: int = 1000) -> np.ndarray:
+    frames = np.zeros(packet_numbers.size, dtype=ADC_DATA_FRAME_DTYPE)
+    frames["head"] = 0xAA
+    frames["tail"] = 0xBB
+    frames["index"] = packet_numbers % 256
+    frames["timestamp"] = packet_numbers * (1_000_000 // sampling_rate)
+    values = np.outer(packet_numbers, np.arange(1, 9)) - 100
+    raw = values.astype(">i4").view(np.uint8).reshape(-1, 8, 4)[:, :, 1:]
+    frames["channel_values"] = raw.reshape(-1, 24)
+    frames["alert"] = packet_numbers % 2
+    return frames
+
+
+class RawCaptureTest(unittest.TestCase):
+    def setUp(self):
+        self._tmpdir = tempfile.TemporaryDirectory()
+        self._path = Path(self._tmpdir.name) / "capture_frames.raw"
+        self._config = EEGDeviceConfig(com_name="eegsim://", measure_duration=1, adc_pga_gain=1, channel_mask=[1] * 8,
+                                       sdo_driver_strength=3, adc_samplingrate=1000, test_mode_enabled=False,
+                                       adc_power_mode_high=True, error_header=False, reference_active_shielding=False,
+                                       gain_instrument_amplifier=1)
+        self._metadata = EEGDeviceMetadata(waveform_generator="test", waveform_generator_frequency="10",
+                                           waveform_generator_amplitude="1", waveform_type="Sine")
+        self._poti_config = PotiConfig(gain=1, calculated_resistor_value=100e3, poti_value=255, actual_resistor_value=100e3, actual_gain_value=1.)
+
+
+    def tearDown(self):
+        self._tmpdir.cleanup()
+
+
+    def _write_capture(self, packet_numbers: np.ndarray, close: bool = True) -> RawCaptureWriter:
+        writer = RawCaptureWriter(self._path, self._config, self._metadata, self._poti_config, preallocate_frames=50)
+        for chunk in np.array_split(packet_numbers, 7):
+            writer.append(build_frames(chunk))
+        if close:
+            writer.close()
+        return writer
+
+
+    def test_memmap_round_trip(self):
+        self._write_capture(np.arange(120))
+        frames, description = read_raw_capture(self._path)
+
+        self.assertIsInstance(frames, np.memmap)
+        self.assertEqual(frames.dtype, ADC_DATA_FRAME_DTYPE)
+        self.assertEqual(frames.size, 120)
+        self.assertEqual(frames["index"][-1], 119)
+        self.assertEqual(description["eeg_device_config"]["adc_samplingrate"], 1000)
+        self.assertEqual(description["poti_values"]["gain"], 1)
+
+
+    def test_unclosed_capture_is_readable(self):
+        writer = self._write_capture(np.arange(80), close=False)
+        writer._file.flush()
+        frames, _ = read_raw_capture(self._path)
+        self.assertEqual(frames.size, 80)
+        writer.close()
+
+
+    def test_convert_with_gaps(self):
+        packet_numbers = np.concatenate((np.arange(100), np.arange(103, 400)))
+        self._write_capture(packet_numbers)
+        serial_path = convert_raw_capture(self._path, recording_name=str(Path(self._tmpdir.name) / "serial"), num_workers=1, block_frames=64)
+        parallel_path = convert_raw_capture(self._path, num_workers=2, block_frames=64)
+
+        self.assertEqual(parallel_path, Path(self._tmpdir.name) / "capture_data.h5")
+        for path in (serial_path, parallel_path):
+            with h5py.File(path) as file:
+                grp = file["ad7779_data"]
+                self.assertEqual(grp["measurements"].shape, (397, 8))
+                np.testing.assert_array_equal(grp["measurements"][:, 0], packet_numbers - 100)
+                np.testing.assert_array_equal(grp["measurements"][:, 7], 8 * packet_numbers - 100)
+                np.testing.assert_array_equal(grp["timestamps"][:], packet_numbers * 1000)
+                np.testing.assert_array_equal(grp["alerts"][:, 0], packet_numbers % 2)
+            self.assertEqual(read_h5_gaps(path).tolist(), [[100, 3]])
+
+
+if __name__ == "__main__":
+    unittest.main()
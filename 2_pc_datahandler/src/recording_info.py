@@ -0,0 +1,111 @@
+from .block_statistics import BLOCK_STATS_GROUP, BLOCK_STATS_READ_SAMPLES, NEAR_RAIL_CODE, merge_moments
+from .summary_pyramid import SUMMARY_GROUP
+from .data_loading import STREAMS_GROUP, read_channel_layout, expand_channels
+from pathlib import Path
+import h5py
+import numpy as np
+
+
+def read_recording_info(path_to_file: Path, scale_time: float = 1e6) -> dict:
+    """Read the metadata of a recording with the number of gaps and alerts, only from the attributes, the gap records,
+    the first and last timestamp and the block statistics, so the measurements are never read
+
+    Args:
+        path_to_file (Path): Path to the h5 file
+        scale_time (float, optional): Timestamp units per second. Defaults to 1e6.
+
+    Returns:
+        dict: File and group attributes, number of samples and logical channels, logical channel of every stored column,
+            sampling rate, duration in seconds, number of gaps
+            and lost samples, number of device gaps, alert count per channel (None without block statistics), summary
+            levels and number of samples of every recorded stream
+    """
+    with h5py.File(path_to_file, "r") as file:
+        grp = file["ad7779_data"]
+        dset_time = grp["timestamps"]
+        num_samples = dset_time.shape[0]
+        gaps = grp["gaps"][:] if "gaps" in grp else np.zeros((0, 2), dtype=np.int64)
+        channel_index, num_channels = read_channel_layout(grp)
+        alert_counts = None
+        if BLOCK_STATS_GROUP in grp:
+            alert_counts = expand_channels(grp[BLOCK_STATS_GROUP]["alert_count"][:].sum(axis=0), channel_index, num_channels).tolist()
+        return {
+            "path": str(path_to_file),
+            "file_attrs": {key: _to_builtin(value) for key, value in file.attrs.items()},
+            "attrs": {key: _to_builtin(value) for key, value in grp.attrs.items()},
+            "num_samples": int(num_samples),
+            "num_channels": num_channels,
+            "channel_index": channel_index.tolist(),
+            "sampling_rate": float(grp.attrs["adc_samplingrate"]),
+            "duration_sec": float(dset_time[-1] - dset_time[0]) / scale_time if num_samples else 0.,
+            "num_gaps": int(gaps.shape[0]),
+            "lost_samples": int(gaps[:, 1].sum()),
+            "num_device_gaps": int(grp["device_gaps"].shape[0]) if "device_gaps" in grp else 0,
+            "alert_counts": alert_counts,
+            "summary_levels": [int(level) for level in grp[SUMMARY_GROUP].attrs["levels"]] if SUMMARY_GROUP in grp else [],
+            "streams": {name: int(stream["time_stamps"].shape[0]) for name, stream in file[STREAMS_GROUP].items()}
+            if STREAMS_GROUP in file else {},
+        }
+
+
+def analyze_recording(path_to_file: Path, near_rail_code: int = NEAR_RAIL_CODE, read_samples: int = BLOCK_STATS_READ_SAMPLES) -> dict:
+    """Compute the statistics of every channel over the whole recording. Recordings with block statistics are analyzed
+    from them alone, the others are read block by block without changing the file
+
+    Args:
+        path_to_file (Path): Path to the h5 file
+        near_rail_code (int, optional): Smallest absolute ADC code counted as near the rails, only used without block
+            statistics. Defaults to NEAR_RAIL_CODE.
+        read_samples (int, optional): Samples read at once without block statistics. Defaults to BLOCK_STATS_READ_SAMPLES.
+
+    Returns:
+        dict: Result of read_recording_info with the list channels, which holds per stored channel the logical channel,
+            mean, standard deviation, minimum and maximum in ADC codes, the number of samples near the rails and the
+            number of alerts
+    """
+    info = read_recording_info(path_to_file)
+    num_channels = len(info["channel_index"])
+    with h5py.File(path_to_file, "r") as file:
+        grp = file["ad7779_data"]
+        if BLOCK_STATS_GROUP in grp:
+            stats = grp[BLOCK_STATS_GROUP]
+            counts = stats["count"][:].astype(np.float64)
+            block_mean, block_variance = stats["mean"][:], stats["variance"][:]
+            count = counts.sum()
+            mean = (counts[:, None] * block_mean).sum(axis=0) / count if count else np.zeros(num_channels)
+            m2 = (counts[:, None] * (block_variance + (block_mean - mean) ** 2)).sum(axis=0)
+            minimum = stats["min"][:].min(axis=0) if count else np.zeros(num_channels)
+            maximum = stats["max"][:].max(axis=0) if count else np.zeros(num_channels)
+            near_rail = stats["near_rail"][:].sum(axis=0)
+            alert_count = stats["alert_count"][:].sum(axis=0)
+        else:
+            count, mean, m2 = 0, np.zeros(num_channels), np.zeros(num_channels)
+            minimum = np.full(num_channels, np.iinfo(np.int32).max, dtype=np.int64)
+            maximum = np.full(num_channels, np.iinfo(np.int32).min, dtype=np.int64)
+            near_rail = np.zeros(num_channels, dtype=np.int64)
+            alert_count = np.zeros(num_channels, dtype=np.int64)
+            for start in range(0, info["num_samples"], read_samples):
+                values = grp["measurements"][start:start + read_samples]
+                count, mean, m2 = merge_moments(count, mean, m2, values.astype(np.float64))
+                np.minimum(minimum, values.min(axis=0), out=minimum)
+                np.maximum(maximum, values.max(axis=0), out=maximum)
+                near_rail += np.count_nonzero(np.abs(values.astype(np.int64)) >= near_rail_code, axis=0)
+                alert_count += np.count_nonzero(grp["alerts"][start:start + read_samples], axis=0)
+            if not count:
+                minimum[:], maximum[:] = 0, 0
+    std = np.sqrt(m2 / count) if count else np.zeros(num_channels)
+    info["channels"] = [{"channel": channel, "mean": float(mean[column]), "std": float(std[column]),
+                         "min": int(minimum[column]), "max": int(maximum[column]), "near_rail": int(near_rail[column]),
+                         "alerts": int(alert_count[column])} for column, channel in enumerate(info["channel_index"])]
+    return info
+
+
+def _to_builtin(value):
+    """Convert h5py attribute values (numpy scalars, arrays and bytes) into JSON serializable Python values"""
+    if isinstance(value, bytes):
+        return value.decode(errors="replace")
+    if isinstance(value, np.ndarray):
+        return [_to_builtin(item) for item in value.tolist()]
+    if isinstance(value, np.generic):
+        return value.item()
+    return value
@@ -0,0 +1,327 @@
+from collections import deque
+import tempfile, threading
+import numpy as np
+
+# Behaviour of put when the buffer is full: wait for the consumer, drop the oldest rows or append them to a file
+OVERFLOW_POLICIES = ("block", "drop_oldest", "spill")
+
+
+class BoundedSampleBuffer:
+    _chunks: deque
+    _losses: list
+    _drop_ranges: list
+    _spill_segments: deque
+
+    def __init__(self, num_columns: int, capacity: int, policy: str = "block", spill_dir: str = None,
+                 max_spill_rows: int = None, dtype: np.dtype = np.int32) -> None:
+        """Bounded FIFO of rows with a timestamp each between one producer thread and one consumer thread. The memory
+        use is capped to capacity rows, the overflow policy decides what happens when the consumer falls behind:
+
+        - "block": put waits until the consumer took enough rows. Nothing is lost in the buffer, but the producer stalls,
+          so rows which the producer loses upstream while it waits (e.g. an overflowing LSL inlet) are not seen and
+          therefore neither counted nor recorded
+        - "drop_oldest": the oldest rows are dropped to make room
+        - "spill": further rows are appended to a temporary file, which is read back in order and emptied once the
+          consumer caught up
+
+        Every dropped row is counted and recorded as loss at its position in the stream of the consumer, and positions
+        in the stream of the producer are mapped to the stream of the consumer with consumer_positions.
+
+        Args:
+            num_columns (int): Number of columns of a row
+            capacity (int): Maximum number of rows held in memory
+            policy (str, optional): One of OVERFLOW_POLICIES. Defaults to "block".
+            spill_dir (str, optional): Directory of the spill file, None uses the temporary directory. Defaults to None.
+            max_spill_rows (int, optional): Maximum number of rows in the spill file, further rows are dropped, None for
+                no limit. Defaults to None.
+            dtype (np.dtype, optional): Data type of the rows. Defaults to np.int32.
+
+        Raises:
+            ValueError: If the policy is unknown or the capacity is not positive
+        """
+        if policy not in OVERFLOW_POLICIES:
+            raise ValueError(f"Unknown overflow policy {policy}, use one of {OVERFLOW_POLICIES}")
+        if capacity <= 0:
+            raise ValueError("The capacity must be positive")
+        self._num_columns = num_columns
+        self._capacity = capacity
+        self._policy = policy
+        self._spill_dir = spill_dir
+        self._max_spill_rows = max_spill_rows
+        self._dtype = np.dtype(dtype)
+        self._record_dtype = np.dtype([("row", self._dtype, (num_columns,)), ("time", np.float64)])
+        self._condition = threading.Condition()
+        self._chunks = deque()
+        self._memory_rows = 0
+        self._spill_file = None
+        self._spill_read = 0
+        self._spill_write = 0
+        self._taken = 0
+        self._put_position = 0
+        self._dropped = 0
+        self._spilled = 0
+        self._peak_depth = 0
+        self._losses = []
+        self._drop_ranges = []
+        self._spill_segments = deque()
+        self._closed = False
+
+
+    # ========== API METHODS ==========
+    @property
+    def policy(self) -> str:
+        """Overflow policy of the buffer"""
+        return self._policy
+
+    @property
+    def depth(self) -> int:
+        """Number of rows waiting in memory and in the spill file"""
+        return self._memory_rows + self._spill_write - self._spill_read
+
+    @property
+    def peak_depth(self) -> int:
+        """Largest number of waiting rows so far"""
+        return self._peak_depth
+
+    @property
+    def dropped(self) -> int:
+        """Number of rows dropped so far"""
+        return self._dropped
+
+    @property
+    def spilled(self) -> int:
+        """Number of rows written to the spill file so far"""
+        return self._spilled
+
+    @property
+    def taken(self) -> int:
+        """Number of rows taken by the consumer so far"""
+        return self._taken
+
+
+    def put(self, rows: np.ndarray, times: np.ndarray) -> int:
+        """Append rows, see the overflow policy for a full buffer. Rows put after close are dropped
+
+        Args:
+            rows (np.ndarray): Rows with shape (num_rows, num_columns)
+            times (np.ndarray): Timestamp of every row
+
+        Returns:
+            int: Number of rows which were not dropped
+        """
+        rows = np.asarray(rows, dtype=self._dtype).reshape(-1, self._num_columns)
+        times = np.asarray(times, dtype=np.float64)
+        with self._condition:
+            position = self._put_position
+            self._put_position += rows.shape[0]
+            if self._closed:
+                self._record_loss(self._taken + self.depth, rows.shape[0], position)
+                return 0
+            if self._policy == "block":
+                kept = self._put_blocking(rows, times, position)
+            elif self._policy == "drop_oldest":
+                kept = self._put_dropping_oldest(rows, times, position)
+            else:
+                kept = self._put_spilling(rows, times, position)
+            self._peak_depth = max(self._peak_depth, self.depth)
+            self._condition.notify_all()
+        return kept
+
+
+    def get(self, max_rows: int, timeout: float = 0.) -> tuple[np.ndarray, np.ndarray]:
+        """Take up to max_rows of the oldest rows
+
+        Args:
+            max_rows (int): Maximum number of rows to take
+            timeout (float, optional): Time in seconds to wait for rows if the buffer is empty. Defaults to 0.
+
+        Returns:
+            tuple[np.ndarray, np.ndarray]: Rows and their timestamps, empty if no rows arrived in time
+        """
+        with self._condition:
+            if not self.depth and timeout > 0:
+                self._condition.wait_for(lambda: self.depth > 0 or self._closed, timeout=timeout)
+            row_parts, time_parts = [], []
+            num_rows = 0
+            while self._chunks and num_rows < max_rows:
+                rows, times = self._chunks.popleft()
+                if num_rows + rows.shape[0] > max_rows:
+                    split = max_rows - num_rows
+                    self._chunks.appendleft((rows[split:], times[split:]))
+                    rows, times = rows[:split], times[:split]
+                row_parts.append(rows)
+                time_parts.append(times)
+                num_rows += rows.shape[0]
+                self._memory_rows -= rows.shape[0]
+            # the memory only holds rows older than the spill file, so the file is read once the memory is empty
+            if num_rows < max_rows and self._spill_write > self._spill_read:
+                records = self._read_spill(max_rows - num_rows)
+                row_parts.append(records["row"])
+                time_parts.append(records["time"])
+                num_rows += records.size
+            self._taken += num_rows
+            self._condition.notify_all()
+        if not num_rows:
+            return np.zeros((0, self._num_columns), dtype=self._dtype), np.zeros(0)
+        return np.concatenate(row_parts), np.concatenate(time_parts)
+
+
+    def take_losses(self) -> tuple[np.ndarray, np.ndarray]:
+        """Take the losses recorded since the last call
+
+        Returns:
+            tuple[np.ndarray, np.ndarray]: Index of the first row taken by the consumer after every loss and the number
+                of rows lost there
+        """
+        with self._condition:
+            losses, self._losses = self._losses, []
+        if not losses:
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64)
+        offsets, counts = np.array(losses, dtype=np.int64).T
+        return offsets, counts
+
+
+    def consumer_positions(self, positions: np.ndarray) -> np.ndarray:
+        """Map positions in the stream of the producer (the number of rows put before a row) to positions in the stream
+        of the consumer. A dropped row maps to the next row which is kept. The result is final once the consumer took
+        all rows in front of it, i.e. once it is not larger than taken
+
+        Args:
+            positions (np.ndarray): Positions in the stream of the producer
+
+        Returns:
+            np.ndarray: Positions in the stream of the consumer
+        """
+        positions = np.asarray(positions, dtype=np.int64)
+        with self._condition:
+            ranges = np.array(self._drop_ranges, dtype=np.int64).reshape(-1, 2)
+        if not ranges.size:
+            return positions.copy()
+        starts, counts = ranges.T
+        return positions - np.clip(positions[..., None] - starts, 0, counts).sum(axis=-1)
+
+
+    def close(self) -> None:
+        """Wake up a blocked producer, drop all further rows and delete the spill file. Waiting rows stay readable until
+        they were spilled"""
+        with self._condition:
+            self._closed = True
+            if self._spill_file is not None:
+                for start, num_rows in self._spill_segments:
+                    self._record_loss(self._taken + self._memory_rows, num_rows, start)
+                self._spill_segments.clear()
+                self._spill_file.close()
+                self._spill_file = None
+                self._spill_read = self._spill_write = 0
+            self._condition.notify_all()
+
+
+    #  ========== INTERNAL METHODS ==========
+    def _put_blocking(self, rows: np.ndarray, times: np.ndarray, position: int) -> int:
+        """Append rows in pieces which fit, waiting for free space in between"""
+        offset = 0
+        while offset < rows.shape[0]:
+            self._condition.wait_for(lambda: self._memory_rows < self._capacity or self._closed)
+            if self._closed:
+                self._record_loss(self._taken + self.depth, rows.shape[0] - offset, position + offset)
+                break
+            num_rows = min(rows.shape[0] - offset, self._capacity - self._memory_rows)
+            self._append(rows[offset:offset + num_rows], times[offset:offset + num_rows])
+            offset += num_rows
+            self._condition.notify_all()
+        return offset
+
+
+    def _put_dropping_oldest(self, rows: np.ndarray, times: np.ndarray, position: int) -> int:
+        """Append rows and drop the oldest rows which exceed the capacity"""
+        self._append(rows, times)
+        excess = self._memory_rows - self._capacity
+        if excess > 0:
+            # the memory holds consecutive rows of the producer which end with the appended ones
+            self._record_loss(self._taken, excess, position + rows.shape[0] - self._memory_rows)
+        while excess > 0:
+            oldest_rows, oldest_times = self._chunks.popleft()
+            if oldest_rows.shape[0] > excess:
+                self._chunks.appendleft((oldest_rows[excess:], oldest_times[excess:]))
+            removed = min(excess, oldest_rows.shape[0])
+            self._memory_rows -= removed
+            excess -= removed
+        return rows.shape[0]
+
+
+    def _put_spilling(self, rows: np.ndarray, times: np.ndarray, position: int) -> int:
+        """Append rows to the memory while it has room and nothing was spilled, the rest to the spill file"""
+        in_memory = 0 if self._spill_write > self._spill_read else min(rows.shape[0], self._capacity - self._memory_rows)
+        if in_memory:
+            self._append(rows[:in_memory], times[:in_memory])
+        to_spill = rows.shape[0] - in_memory
+        if self._max_spill_rows is not None:
+            to_spill = min(to_spill, self._max_spill_rows - (self._spill_write - self._spill_read))
+        if to_spill > 0:
+            self._write_spill(rows[in_memory:in_memory + to_spill], times[in_memory:in_memory + to_spill],
+                              position + in_memory)
+        lost = rows.shape[0] - in_memory - max(to_spill, 0)
+        if lost:
+            self._record_loss(self._taken + self.depth, lost, position + rows.shape[0] - lost)
+        return rows.shape[0] - lost
+
+
+    def _append(self, rows: np.ndarray, times: np.ndarray) -> None:
+        """Append rows to the memory part"""
+        if rows.shape[0]:
+            self._chunks.append((rows, times))
+            self._memory_rows += rows.shape[0]
+
+
+    def _write_spill(self, rows: np.ndarray, times: np.ndarray, position: int) -> None:
+        """Append rows to the spill file, which is created on first use, and remember their position in the stream of
+        the producer"""
+        if self._spill_file is None:
+            self._spill_file = tempfile.TemporaryFile(prefix="eeg_spill_", dir=self._spill_dir)
+        records = np.empty(rows.shape[0], dtype=self._record_dtype)
+        records["row"] = rows
+        records["time"] = times
+        self._spill_file.seek(self._spill_write * self._record_dtype.itemsize)
+        self._spill_file.write(records.tobytes())
+        self._spill_write += rows.shape[0]
+        self._spilled += rows.shape[0]
+        _append_range(self._spill_segments, position, rows.shape[0])
+
+
+    def _read_spill(self, max_rows: int) -> np.ndarray:
+        """Read the oldest rows of the spill file and empty the file once everything was read"""
+        num_rows = min(max_rows, self._spill_write - self._spill_read)
+        self._spill_file.seek(self._spill_read * self._record_dtype.itemsize)
+        records = np.frombuffer(self._spill_file.read(num_rows * self._record_dtype.itemsize), dtype=self._record_dtype)
+        self._spill_read += num_rows
+        remaining = num_rows
+        while remaining:
+            start, segment_rows = self._spill_segments.popleft()
+            if segment_rows > remaining:
+                self._spill_segments.appendleft([start + remaining, segment_rows - remaining])
+            remaining -= min(remaining, segment_rows)
+        if self._spill_read == self._spill_write:
+            self._spill_file.truncate(0)
+            self._spill_read = self._spill_write = 0
+        return records
+
+
+    def _record_loss(self, offset: int, num_rows: int, position: int) -> None:
+        """Count lost rows and record them at the given position of the consumer stream, position is the position of
+        the first lost row in the stream of the producer"""
+        if num_rows <= 0:
+            return
+        self._dropped += num_rows
+        _append_range(self._drop_ranges, position, num_rows)
+        if self._losses and self._losses[-1][0] == offset:
+            self._losses[-1] = (offset, self._losses[-1][1] + num_rows)
+        else:
+            self._losses.append((offset, num_rows))
+
+
+def _append_range(ranges, start: int, num_rows: int) -> None:
+    """Append a range of rows [start, num_rows] to a list or deque of ranges, joined with the last one if it continues it"""
+    if ranges and ranges[-1][0] + ranges[-1][1] == start:
+        ranges[-1][1] += num_rows
+    else:
+        ranges.append([start, num_rows])
@@ -0,0 +1,126 @@
+import threading
+import time
+import unittest
+import numpy as np
+from src import BoundedSampleBuffer
+
+
+def build_rows(start: int, num_rows: int) -> tuple[np.ndarray, np.ndarray]:
+    values = np.arange(start, start + num_rows)
+    return values.astype(np.int32).reshape(-1, 1), values.astype(np.float64)
+
+
+class BoundedSampleBufferTest(unittest.TestCase):
+    def test_unknown_policy(self):
+        with self.assertRaises(ValueError):
+            BoundedSampleBuffer(num_columns=1, capacity=4, policy="ignore")
+
+
+    def test_block_waits_for_consumer(self):
+        buffer = BoundedSampleBuffer(num_columns=1, capacity=4, policy="block")
+        producer = threading.Thread(target=buffer.put, args=build_rows(0, 10))
+        producer.start()
+        time.sleep(0.05)
+        self.assertTrue(producer.is_alive())
+        self.assertEqual(buffer.depth, 4)
+
+        taken = []
+        while len(taken) < 10:
+            rows, _ = buffer.get(3, timeout=0.1)
+            taken += rows[:, 0].tolist()
+        producer.join(timeout=1.)
+        self.assertEqual(taken, list(range(10)))
+        self.assertEqual(buffer.dropped, 0)
+
+
+    def test_close_releases_blocked_producer(self):
+        buffer = BoundedSampleBuffer(num_columns=1, capacity=4, policy="block")
+        producer = threading.Thread(target=buffer.put, args=build_rows(0, 10))
+        producer.start()
+        time.sleep(0.05)
+        buffer.close()
+        producer.join(timeout=1.)
+        self.assertFalse(producer.is_alive())
+        self.assertEqual(buffer.dropped, 6)
+
+
+    def test_drop_oldest_records_losses(self):
+        buffer = BoundedSampleBuffer(num_columns=1, capacity=4, policy="drop_oldest")
+        buffer.put(*build_rows(0, 3))
+        buffer.get(2)
+        buffer.put(*build_rows(3, 5))
+        rows, times = buffer.get(10)
+
+        self.assertEqual(rows[:, 0].tolist(), [4, 5, 6, 7])
+        self.assertEqual(times.tolist(), [4., 5., 6., 7.])
+        self.assertEqual(buffer.dropped, 2)
+        offsets, lost_counts = buffer.take_losses()
+        self.assertEqual(offsets.tolist(), [2])
+        self.assertEqual(lost_counts.tolist(), [2])
+        self.assertEqual(buffer.take_losses()[0].size, 0)
+
+
+    def test_spill_keeps_order_and_drains(self):
+        buffer = BoundedSampleBuffer(num_columns=1, capacity=4, policy="spill")
+        buffer.put(*build_rows(0, 6))
+        buffer.get(3)
+        buffer.put(*build_rows(6, 2))
+        self.assertEqual(buffer.spilled, 4)
+        self.assertEqual(buffer.depth, 5)
+
+        rows, times = buffer.get(10)
+        self.assertEqual(rows[:, 0].tolist(), [3, 4, 5, 6, 7])
+        self.assertEqual(times.tolist(), [3., 4., 5., 6., 7.])
+        # once the spill file was drained new rows go to the memory again
+        buffer.put(*build_rows(8, 2))
+        self.assertEqual(buffer.spilled, 4)
+        self.assertEqual(buffer.get(10)[0][:, 0].tolist(), [8, 9])
+        self.assertEqual(buffer.dropped, 0)
+        buffer.close()
+
+
+    def test_spill_limit_drops_newest(self):
+        buffer = BoundedSampleBuffer(num_columns=1, capacity=2, policy="spill", max_spill_rows=3)
+        self.assertEqual(buffer.put(*build_rows(0, 7)), 5)
+        rows, _ = buffer.get(10)
+
+        self.assertEqual(rows[:, 0].tolist(), [0, 1, 2, 3, 4])
+        offsets, lost_counts = buffer.take_losses()
+        self.assertEqual(offsets.tolist(), [5])
+        self.assertEqual(lost_counts.tolist(), [2])
+        buffer.close()
+
+
+    def test_consumer_positions_skip_only_earlier_drops(self):
+        buffer = BoundedSampleBuffer(num_columns=1, capacity=4, policy="drop_oldest")
+        buffer.put(*build_rows(0, 4))
+        buffer.get(4)
+        buffer.put(*build_rows(4, 2))
+        # a gap in front of row 6 is seen here, the next put drops rows 4 to 7 on both sides of it
+        gap_position = 6
+        buffer.put(*build_rows(6, 6))
+        rows, _ = buffer.get(10)
+
+        self.assertEqual(rows[:, 0].tolist(), [8, 9, 10, 11])
+        self.assertEqual(buffer.dropped, 4)
+        offset = buffer.consumer_positions(np.array([gap_position]))[0]
+        self.assertEqual(offset, 4)
+        # the first row taken after the gap is the first one after the first 4 taken rows
+        self.assertEqual(rows[offset - 4, 0], 8)
+        self.assertEqual(buffer.consumer_positions(np.array([3, 12])).tolist(), [3, 8])
+
+
+    def test_consumer_positions_with_spill(self):
+        buffer = BoundedSampleBuffer(num_columns=1, capacity=2, policy="spill", max_spill_rows=3)
+        buffer.put(*build_rows(0, 7))
+        buffer.get(3)
+        self.assertEqual(buffer.consumer_positions(np.array([4, 6, 7])).tolist(), [4, 5, 5])
+        # the spilled rows 3 and 4 are lost on close
+        buffer.close()
+        buffer.put(*build_rows(7, 1))
+        self.assertEqual(buffer.consumer_positions(np.array([3, 4, 8])).tolist(), [3, 3, 3])
+        self.assertEqual(buffer.dropped, 5)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -6,17 +6,32 @@ import time
 USB_VID = 0x2E8A
 USB_PID = 0x0009
 
+# the eegsim:// URLs of the virtual device are resolved by protocol_eegsim of this package
+if __package__ and __package__ not in serial.protocol_handler_packages:
+    serial.protocol_handler_packages.append(__package__)
+
 
 class SerialHandler:
     _com_name: str
     _baudrate: int
     _time_out: float
+    _fast_start: bool
     _serial_connection: serial.Serial
     """Class to handle serial communication with EEG hardware devices"""
-    def __init__(self, com_name: str ="AUTOCOM", baudrate: int = 115200, time_out: float = 1.0):
+    def __init__(self, com_name: str ="AUTOCOM", baudrate: int = 115200, time_out: float = 1.0, fast_start: bool = False):
+        """Open the serial connection to the device
+
+        Args:
+            com_name (str, optional): Name of the COM port or a pySerial URL, "AUTOCOM" searches the device. Defaults to "AUTOCOM".
+            baudrate (int, optional): Baudrate of the connection. Defaults to 115200.
+            time_out (float, optional): Read timeout in seconds. Defaults to 1.0.
+            fast_start (bool, optional): Skip the fixed settle time after opening, the caller checks the readiness of
+                the device instead (see McuCommunicationHandler.wait_until_ready). Defaults to False.
+        """
         self._com_name = com_name if com_name != "AUTOCOM" else self._scan_com_name[0]
         self._baudrate = baudrate
         self._time_out = time_out
+        self._fast_start = fast_start
         self._serial_connection = self._init_serial_connection
 
 
@@ -50,9 +65,7 @@ class SerialHandler:
         Returns:
             list: List of COM port names matching the specified VID and PID
         """
-        available_coms = list_ports.comports()
-        list_right_com = [port.device for port in available_coms if
-                          port.vid == USB_VID and port.pid == USB_PID]
+        list_right_com = scan_com_names()
         if len(list_right_com) == 0:
             raise ConnectionError(f"No COM Port with right USB found - Please adapt the VID and PID values from "
                                   f"available COM ports: {self.__read_usb_properties}")
@@ -62,7 +75,7 @@ class SerialHandler:
 
     @property
     def _init_serial_connection(self) -> serial.Serial:
-        """Initialize serial connection
+        """Initialize serial connection, names containing :// are opened as pySerial URL (e.g. eegsim:// or loop://)
 
         Raises:
             IOError: If there is an error initializing the serial connection
@@ -70,6 +83,11 @@ class SerialHandler:
         Returns:
             serial.Serial: Initialized serial connection object
         """
+        if "://" in self._com_name:
+            try:
+                return serial.serial_for_url(self._com_name, baudrate=self._baudrate, timeout=self._time_out)
+            except (serial.SerialException, ValueError) as e:
+                raise IOError(f"Error initializing serial connection: {e}")
         try: 
             deployed_serial = serial.Serial(
                 port=self._com_name,
@@ -83,7 +101,8 @@ class SerialHandler:
                 dsrdtr=False,
                 timeout=self._time_out
             )
-            time.sleep(2*self._time_out)
+            if not self._fast_start:
+                time.sleep(2*self._time_out)
         except serial.SerialException as e:
             raise IOError(f"Error initializing serial connection: {e}")
         return deployed_serial
@@ -91,4 +110,13 @@ class SerialHandler:
 
     def clear_serial_buffer(self) -> None:
         """Clear the serial input buffer to remove any residual data"""
-        self._serial_connection.reset_input_buffer()    
\ No newline at end of file
+        self._serial_connection.reset_input_buffer()    
+
+
+def scan_com_names() -> list:
+    """Returning the COM Port names of all connected devices with the VID and PID of the EEG boards
+
+    Returns:
+        list: List of COM port names, empty if no board is connected
+    """
+    return [port.device for port in list_ports.comports() if port.vid == USB_VID and port.pid == USB_PID]
@@ -65,6 +65,7 @@ class TestSerialHandler(unittest.TestCase):
         self._handler._com_name = "/dev/ttyUSB0"
         self._handler._baudrate = 115200
         self._handler._time_out = 1
+        self._handler._fast_start = False
 
         expected_serial_instance = MagicMock()
         mock_serial_cls.return_value = expected_serial_instance
@@ -79,4 +80,18 @@ class TestSerialHandler(unittest.TestCase):
                                                 xonxoff=False,
                                                 rtscts=False,
                                                 dsrdtr=False,
-                                                timeout=self._handler._time_out)
\ No newline at end of file
+                                                timeout=self._handler._time_out)
+        mock_sleep.assert_called_once_with(2)
+
+
+    @patch("src.serial_handler.serial.Serial")
+    @patch("src.serial_handler.time.sleep")
+    def test_init_serial_connection_fast_start(self, mock_sleep, mock_serial_cls):
+        self._handler._com_name = "/dev/ttyUSB0"
+        self._handler._baudrate = 115200
+        self._handler._time_out = 1
+        self._handler._fast_start = True
+
+        self._handler._init_serial_connection()
+        mock_serial_cls.assert_called_once()
+        mock_sleep.assert_not_called()
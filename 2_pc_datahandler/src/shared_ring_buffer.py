@@ -0,0 +1,116 @@
+from multiprocessing import shared_memory
+import numpy as np
+
+# Header fields in front of the data: total rows written, total rows read, rows dropped because the buffer was full
+_HEADER_FIELDS = 3
+
+
+class SharedRingBuffer:
+    _shm: shared_memory.SharedMemory
+    _header: np.ndarray
+    _rows: np.ndarray
+    _times: np.ndarray
+
+    def __init__(self, num_columns: int, capacity: int, name: str = None, dtype: np.dtype = np.int32) -> None:
+        """Ring buffer of rows with a timestamp each in shared memory, for handing blocks from one producer process to
+        one consumer process without pickling. The producer only writes the write counter and the consumer only the
+        read counter, both are updated after the data was copied, so no lock is needed.
+
+        Args:
+            num_columns (int): Number of columns of a row
+            capacity (int): Maximum number of buffered rows
+            name (str, optional): Name of an existing buffer to attach to, None creates a new buffer. Defaults to None.
+            dtype (np.dtype, optional): Data type of the rows. Defaults to np.int32.
+        """
+        self._capacity = capacity
+        self._owner = name is None
+        header_size = _HEADER_FIELDS * np.dtype(np.int64).itemsize
+        rows_size = capacity * num_columns * np.dtype(dtype).itemsize
+        if self._owner:
+            self._shm = shared_memory.SharedMemory(create=True, size=header_size + rows_size + capacity * np.dtype(np.float64).itemsize)
+        else:
+            # processes started by multiprocessing share the resource tracker of the creator, which unlinks the memory
+            # only if the creator did not
+            self._shm = shared_memory.SharedMemory(name=name)
+        self._header = np.ndarray((_HEADER_FIELDS,), dtype=np.int64, buffer=self._shm.buf)
+        self._rows = np.ndarray((capacity, num_columns), dtype=dtype, buffer=self._shm.buf, offset=header_size)
+        self._times = np.ndarray((capacity,), dtype=np.float64, buffer=self._shm.buf, offset=header_size + rows_size)
+        if self._owner:
+            self._header[:] = 0
+
+
+    # ========== API METHODS ==========
+    @property
+    def name(self) -> str:
+        """Name to attach to the buffer from another process"""
+        return self._shm.name
+
+    @property
+    def capacity(self) -> int:
+        """Maximum number of buffered rows"""
+        return self._capacity
+
+    @property
+    def available(self) -> int:
+        """Number of rows waiting to be read"""
+        return int(self._header[0] - self._header[1])
+
+    @property
+    def dropped(self) -> int:
+        """Number of rows dropped by write because the buffer was full"""
+        return int(self._header[2])
+
+
+    def write(self, rows: np.ndarray, times: np.ndarray) -> int:
+        """Append rows, rows which do not fit are dropped and counted
+
+        Args:
+            rows (np.ndarray): Rows with shape (num_rows, num_columns)
+            times (np.ndarray): Timestamp of every row
+
+        Returns:
+            int: Number of rows written
+        """
+        write_index, read_index = int(self._header[0]), int(self._header[1])
+        num_rows = min(len(rows), self._capacity - (write_index - read_index))
+        self._copy_in(write_index, rows[:num_rows], times[:num_rows])
+        self._header[2] += len(rows) - num_rows
+        self._header[0] = write_index + num_rows
+        return num_rows
+
+
+    def read(self, max_rows: int) -> tuple[np.ndarray, np.ndarray]:
+        """Take up to max_rows of the oldest rows
+
+        Args:
+            max_rows (int): Maximum number of rows to take
+
+        Returns:
+            tuple[np.ndarray, np.ndarray]: Copies of the rows and their timestamps
+        """
+        write_index, read_index = int(self._header[0]), int(self._header[1])
+        num_rows = min(max_rows, write_index - read_index)
+        start = read_index % self._capacity
+        positions = (start + np.arange(num_rows)) % self._capacity if start + num_rows > self._capacity else slice(start, start + num_rows)
+        rows, times = self._rows[positions].copy(), self._times[positions].copy()
+        self._header[1] = read_index + num_rows
+        return rows, times
+
+
+    def close(self) -> None:
+        """Detach from the buffer and free it, if this process created it"""
+        del self._header, self._rows, self._times
+        self._shm.close()
+        if self._owner:
+            self._shm.unlink()
+
+
+    #  ========== INTERNAL METHODS ==========
+    def _copy_in(self, write_index: int, rows: np.ndarray, times: np.ndarray) -> None:
+        """Copy rows behind write_index, wrapping around at the end of the buffer"""
+        start = write_index % self._capacity
+        first = min(len(rows), self._capacity - start)
+        self._rows[start:start + first] = rows[:first]
+        self._times[start:start + first] = times[:first]
+        self._rows[:len(rows) - first] = rows[first:]
+        self._times[:len(rows) - first] = times[first:]
@@ -0,0 +1,48 @@
+import unittest
+import numpy as np
+from src import SharedRingBuffer
+
+
+def build_rows(start: int, num_rows: int) -> np.ndarray:
+    return np.arange(start, start + num_rows, dtype=np.int32).repeat(2).reshape(-1, 2)
+
+
+class SharedRingBufferTest(unittest.TestCase):
+    def setUp(self):
+        self._ring = SharedRingBuffer(num_columns=2, capacity=8)
+
+
+    def tearDown(self):
+        self._ring.close()
+
+
+    def test_read_wraps_around(self):
+        self._ring.write(build_rows(0, 6), np.arange(6.))
+        self._ring.read(5)
+        self.assertEqual(self._ring.write(build_rows(6, 6), np.arange(6., 12.)), 6)
+        rows, times = self._ring.read(100)
+
+        self.assertEqual(rows[:, 0].tolist(), list(range(5, 12)))
+        self.assertEqual(times.tolist(), list(range(5, 12)))
+        self.assertEqual(self._ring.available, 0)
+
+
+    def test_full_buffer_drops_newest_rows(self):
+        self.assertEqual(self._ring.write(build_rows(0, 10), np.arange(10.)), 8)
+        self.assertEqual(self._ring.dropped, 2)
+        rows, _ = self._ring.read(100)
+        self.assertEqual(rows[:, 0].tolist(), list(range(8)))
+
+
+    def test_attach_by_name(self):
+        attached = SharedRingBuffer(num_columns=2, capacity=8, name=self._ring.name)
+        attached.write(build_rows(3, 2), np.array([1., 2.]))
+        attached.close()
+        rows, times = self._ring.read(100)
+
+        self.assertEqual(rows.tolist(), [[3, 3], [4, 4]])
+        self.assertEqual(times.tolist(), [1., 2.])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,188 @@
+from pathlib import Path
+import json
+import os
+import threading
+import time
+import numpy as np
+
+# Spans held by a profiler, further spans are counted as dropped
+PROFILER_CAPACITY = 1 << 19
+_SPAN_DTYPE = np.dtype([("stage", np.uint16), ("thread", np.uint16), ("start", np.int64), ("duration", np.int64), ("count", np.int32)])
+
+
+class _Span:
+    __slots__ = ("_profiler", "_stage", "_start", "count")
+
+    def __init__(self, profiler, stage: str, count: int) -> None:
+        """Timed span of a stage, the number of processed items may be set inside the block"""
+        self._profiler = profiler
+        self._stage = stage
+        self.count = count
+
+    def __enter__(self):
+        self._start = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self._profiler.record(self._stage, self._start, time.perf_counter_ns(), self.count)
+
+
+class _NullSpan:
+    __slots__ = ("count",)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        pass
+
+
+class StageProfiler:
+    _stages: dict
+    _threads: dict
+
+    def __init__(self, capacity: int = PROFILER_CAPACITY, process_name: str = "eeg-hardware") -> None:
+        """Record timestamped spans of the processing stages (serial read, decoding, LSL push, file writes, ...) into a
+        preallocated array and export them as Chrome trace events, which chrome://tracing or https://ui.perfetto.dev show as
+        timeline per thread. Recording a span costs about a microsecond, a profiler with capacity 0 is disabled and its
+        spans cost nothing but the call. The times come from time.perf_counter_ns, so traces of several processes of the
+        same host can be merged into one timeline
+
+        Args:
+            capacity (int, optional): Number of spans held, 0 disables the profiler. Defaults to PROFILER_CAPACITY.
+            process_name (str, optional): Name of the process in the trace. Defaults to "eeg-hardware".
+        """
+        self._capacity = capacity
+        self._process_name = process_name
+        self._spans = np.zeros(capacity, dtype=_SPAN_DTYPE)
+        self._lock = threading.Lock()
+        self._null_span = _NullSpan()
+        self.reset()
+
+
+    # ========== API METHODS ==========
+    @property
+    def enabled(self) -> bool:
+        """True if spans are recorded"""
+        return self._capacity > 0
+
+    @property
+    def num_spans(self) -> int:
+        """Number of recorded spans"""
+        return min(self._num_spans, self._capacity)
+
+    @property
+    def dropped(self) -> int:
+        """Number of spans which did not fit into the profiler"""
+        return max(self._num_spans - self._capacity, 0)
+
+
+    def span(self, stage: str, count: int = 0):
+        """Time a block as span of a stage, use as context manager. The count of the returned span can be set in the block
+
+        Args:
+            stage (str): Name of the stage
+            count (int, optional): Number of items (frames, samples, bytes) processed in the span. Defaults to 0.
+        """
+        if not self._capacity:
+            return self._null_span
+        return _Span(self, stage, count)
+
+
+    def record(self, stage: str, start_ns: int, stop_ns: int, count: int = 0) -> None:
+        """Record a span which was timed by the caller, for stages that are only recorded if they processed something
+
+        Args:
+            stage (str): Name of the stage
+            start_ns (int): Start of the span from time.perf_counter_ns
+            stop_ns (int): End of the span from time.perf_counter_ns
+            count (int, optional): Number of items processed in the span. Defaults to 0.
+        """
+        if not self._capacity:
+            return
+        thread = threading.get_ident()
+        with self._lock:
+            index = self._num_spans
+            self._num_spans += 1
+            if index >= self._capacity:
+                return
+            stage_id = self._stages.get(stage)
+            if stage_id is None:
+                stage_id = self._stages[stage] = len(self._stages)
+            thread_id = self._threads.get(thread)
+            if thread_id is None:
+                thread_id = self._threads[thread] = len(self._threads)
+                self._thread_names[thread_id] = threading.current_thread().name
+        self._spans[index] = (stage_id, thread_id, start_ns, stop_ns - start_ns, count)
+
+
+    def summary(self) -> dict:
+        """Aggregate the recorded spans per stage
+
+        Returns:
+            dict: Per stage the number of spans, processed items, total, mean and maximum duration in seconds
+        """
+        spans = self._spans[:self.num_spans]
+        result = {}
+        for stage, stage_id in self._stages.items():
+            durations = spans["duration"][spans["stage"] == stage_id] * 1e-9
+            result[stage] = {"spans": int(durations.size), "items": int(spans["count"][spans["stage"] == stage_id].sum()),
+                             "total_sec": float(durations.sum()), "mean_sec": float(durations.mean()) if durations.size else 0.,
+                             "max_sec": float(durations.max()) if durations.size else 0.}
+        return result
+
+
+    def chrome_trace_events(self) -> list:
+        """Recorded spans as complete events ("ph": "X") of the Chrome trace event format, with the names of the process
+        and threads as metadata events
+
+        Returns:
+            list: Trace events with times in microseconds
+        """
+        pid = os.getpid()
+        events = [{"name": "process_name", "ph": "M", "pid": pid, "args": {"name": self._process_name}}]
+        events += [{"name": "thread_name", "ph": "M", "pid": pid, "tid": thread_id, "args": {"name": name}}
+                   for thread_id, name in self._thread_names.items()]
+        stage_names = {stage_id: stage for stage, stage_id in self._stages.items()}
+        for stage_id, thread_id, start, duration, count in self._spans[:self.num_spans].tolist():
+            event = {"name": stage_names[stage_id], "cat": "stage", "ph": "X", "pid": pid, "tid": thread_id,
+                     "ts": start / 1e3, "dur": duration / 1e3}
+            if count:
+                event["args"] = {"count": count}
+            events.append(event)
+        return events
+
+
+    def write_chrome_trace(self, path: Path, merge_files: list = None) -> Path:
+        """Write the recorded spans as Chrome trace JSON file
+
+        Args:
+            path (Path): Path of the trace file
+            merge_files (list, optional): Trace files of other processes, e.g. the live plotter, whose events are added to the
+                timeline. Missing files are skipped. Defaults to None.
+
+        Returns:
+            Path: Path of the written file
+        """
+        events = self.chrome_trace_events()
+        for merge_path in merge_files if merge_files is not None else []:
+            if Path(merge_path).exists():
+                with open(merge_path) as file:
+                    events += json.load(file)["traceEvents"]
+        with open(path, "w") as file:
+            json.dump({"traceEvents": events, "displayTimeUnit": "ms",
+                       "otherData": {"dropped_spans": self.dropped}}, file)
+        return Path(path)
+
+
+    def reset(self) -> None:
+        """Drop the recorded spans"""
+        with self._lock:
+            self._num_spans = 0
+            self._stages = {}
+            self._threads = {}
+            self._thread_names = {}
+
+
+# Disabled profiler, the default of the profiled classes
+NULL_PROFILER = StageProfiler(capacity=0)
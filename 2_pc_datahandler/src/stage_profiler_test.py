@@ -0,0 +1,63 @@
+import json
+import tempfile
+import threading
+import time
+import unittest
+from pathlib import Path
+from src import StageProfiler, NULL_PROFILER
+
+
+class StageProfilerTest(unittest.TestCase):
+    def test_spans_of_several_threads(self):
+        profiler = StageProfiler(capacity=100, process_name="test")
+
+        def work(stage: str) -> None:
+            for _ in range(10):
+                with profiler.span(stage) as span:
+                    time.sleep(0.001)
+                    span.count = 4
+        threads = [threading.Thread(target=work, args=(stage,), name=stage) for stage in ("decode", "h5_write")]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        profiler.record("lsl_pull", 1000, 3000, 7)
+
+        summary = profiler.summary()
+        self.assertEqual(profiler.num_spans, 21)
+        self.assertEqual(summary["decode"]["spans"], 10)
+        self.assertEqual(summary["decode"]["items"], 40)
+        self.assertGreaterEqual(summary["h5_write"]["mean_sec"], 0.001)
+        self.assertAlmostEqual(summary["lsl_pull"]["total_sec"], 2e-6)
+
+    def test_chrome_trace_with_merged_file(self):
+        profiler = StageProfiler(capacity=10, process_name="controller")
+        plotter = StageProfiler(capacity=10, process_name="plotter")
+        profiler.record("decode", 2_000_000, 2_500_000, 38)
+        plotter.record("plot_draw", 3_000_000, 3_100_000)
+        with tempfile.TemporaryDirectory() as tmpdir:
+            plotter_path = plotter.write_chrome_trace(Path(tmpdir) / "plotter.json")
+            path = profiler.write_chrome_trace(Path(tmpdir) / "trace.json", merge_files=[plotter_path, Path(tmpdir) / "missing.json"])
+            with open(path) as file:
+                events = json.load(file)["traceEvents"]
+        spans = [event for event in events if event["ph"] == "X"]
+        self.assertEqual([(span["name"], span["ts"], span["dur"]) for span in spans], [("decode", 2000., 500.), ("plot_draw", 3000., 100.)])
+        self.assertEqual(spans[0]["args"], {"count": 38})
+        self.assertEqual({event["args"]["name"] for event in events if event["name"] == "process_name"}, {"controller", "plotter"})
+        self.assertIn("MainThread", [event["args"]["name"] for event in events if event["name"] == "thread_name"])
+
+    def test_full_and_disabled_profiler(self):
+        profiler = StageProfiler(capacity=2)
+        for _ in range(5):
+            profiler.record("decode", 0, 10)
+        self.assertEqual((profiler.num_spans, profiler.dropped), (2, 3))
+        profiler.reset()
+        self.assertEqual((profiler.num_spans, profiler.dropped), (0, 0))
+        with NULL_PROFILER.span("decode") as span:
+            span.count = 3
+        self.assertFalse(NULL_PROFILER.enabled)
+        self.assertEqual(NULL_PROFILER.num_spans, 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,234 @@
+from collections import deque
+import threading
+import numpy as np
+from .data_processing import ADC_DATA_FRAME_DTYPE
+
+FRAMER_SEARCHING = "SEARCHING"
+FRAMER_LOCKED = "LOCKED"
+
+
+class StreamFramer:
+    _pending: np.ndarray
+    _state: str
+    _expected: deque
+
+    def __init__(self, frame_dtype: np.dtype = ADC_DATA_FRAME_DTYPE, head: int = 0xAA, tail: int = 0xBB,
+                 frame_id: int = 0x00, confirm_frames: int = 3) -> None:
+        """Cut a byte stream into fixed-length frames and resynchronize after lost or corrupted bytes.
+
+        The framer is a state machine with two states. SEARCHING scans the buffered bytes with array operations for a
+        position where confirm_frames consecutive frames have a valid head, frame id and tail, discards the bytes in
+        front of it and switches to LOCKED. LOCKED validates whole frames at once and falls back to SEARCHING at the
+        first invalid frame. Each byte is inspected a bounded number of times, so recovery costs O(bytes).
+
+        Command responses which the device sends between two frames while DAQ is running are cut out of the stream if
+        they were announced with expect_response, so commands can be sent while the framer is LOCKED. A response is
+        recognized at the position of the first invalid frame by its length (shorter than a frame), its first and last
+        byte and a valid frame (or the start of one) after it. Responses received while SEARCHING are discarded. The
+        announcements are guarded by a lock, so they may be made and cancelled from another thread than feed.
+
+        Args:
+            frame_dtype (np.dtype, optional): Structured dtype of one frame. Defaults to ADC_DATA_FRAME_DTYPE.
+            head (int, optional): Value of the first byte of a frame. Defaults to 0xAA.
+            tail (int, optional): Value of the last byte of a frame. Defaults to 0xBB.
+            frame_id (int, optional): Value of the second byte of a frame, None skips the check. Defaults to 0x00.
+            confirm_frames (int, optional): Number of consecutive valid frames needed to lock. Defaults to 3.
+        """
+        self._frame_dtype = frame_dtype
+        self._frame_length = frame_dtype.itemsize
+        self._head = head
+        self._tail = tail
+        self._frame_id = frame_id
+        self._confirm_frames = confirm_frames
+        self._response_lock = threading.Lock()
+        self.reset()
+
+
+    # ========== API METHODS ==========
+    @property
+    def state(self) -> str:
+        """Current state of the framer, SEARCHING or LOCKED"""
+        return self._state
+
+
+    @property
+    def discarded_bytes(self) -> int:
+        """Total number of bytes dropped while searching for frame boundaries"""
+        return self._discarded_bytes
+
+
+    @property
+    def resync_count(self) -> int:
+        """Number of times the framer lost the alignment after being locked"""
+        return self._resync_count
+
+
+    @property
+    def pending_bytes(self) -> int:
+        """Number of buffered bytes which do not form a complete frame yet"""
+        return self._pending.size
+
+
+    @property
+    def expected_responses(self) -> int:
+        """Number of announced command responses which were not received yet"""
+        return len(self._expected)
+
+
+    def reset(self) -> None:
+        """Drop all buffered bytes and announced responses and search for the alignment again"""
+        self._pending = np.zeros(0, dtype=np.uint8)
+        self._state = FRAMER_SEARCHING
+        self._discarded_bytes = 0
+        self._resync_count = 0
+        self._frames_returned = 0
+        with self._response_lock:
+            self._expected = deque()
+
+
+    def expect_response(self, length: int, first_byte: int, last_byte: int = None, on_response=None) -> None:
+        """Announce a command response before the command is sent, may be called from another thread than feed. The
+        responses are expected in the order of the announcements
+
+        Args:
+            length (int): Number of bytes of the response
+            first_byte (int): Value of the first byte of the response
+            last_byte (int, optional): Value of the last byte of the response, None skips the check. Defaults to None.
+            on_response (callable, optional): Called by feed with the bytes of the response and the number of frames
+                returned before it, while the announcements are locked, so it must not announce or cancel responses.
+                Defaults to None.
+        """
+        with self._response_lock:
+            self._expected.append((length, first_byte, last_byte, on_response))
+
+
+    def cancel_responses(self) -> None:
+        """Forget all announced responses, e.g. after the command timed out. A response which is cut out of the stream
+        concurrently is either handed to its callback before this returns or treated as invalid bytes afterwards"""
+        with self._response_lock:
+            self._expected.clear()
+
+
+    def feed(self, data: bytes) -> np.ndarray:
+        """Add received bytes and return all complete and valid frames
+
+        Args:
+            data (bytes): Bytes received from the serial connection
+
+        Returns:
+            np.ndarray: Structured array of frames with the framer dtype
+        """
+        buffer = np.concatenate((self._pending, np.frombuffer(data, dtype=np.uint8))) if self._pending.size else np.frombuffer(data, dtype=np.uint8)
+        position = 0
+        chunks = []
+        while True:
+            if self._state == FRAMER_LOCKED:
+                num_valid, num_frames = self._count_valid_frames(buffer[position:])
+                # the announcement which matched is taken under the same lock, cancel_responses cannot remove it in between
+                with self._response_lock:
+                    response_length = 0
+                    if num_valid < num_frames and self._expected:
+                        if num_valid and self._expected[0][1] == self._head:
+                            # a response starting like a frame may have passed the validation of the frame in front of the
+                            # invalid one, checked first because the tail of the following frame then ends the invalid one
+                            response_length = self._match_response(buffer[position + (num_valid - 1) * self._frame_length:])
+                            if response_length:
+                                num_valid -= 1
+                        if not response_length:
+                            response_length = self._match_response(buffer[position + num_valid * self._frame_length:])
+                    if num_valid:
+                        chunks.append(buffer[position:position + num_valid * self._frame_length])
+                        position += num_valid * self._frame_length
+                        self._frames_returned += num_valid
+                    if response_length:
+                        self._take_response(buffer[position:position + response_length])
+                        position += response_length
+                        continue
+                if num_valid == num_frames:
+                    break
+                self._state = FRAMER_SEARCHING
+                self._resync_count += 1
+            else:
+                offset, locked = self._search_alignment(buffer[position:])
+                self._discarded_bytes += offset
+                position += offset
+                if not locked:
+                    break
+                self._state = FRAMER_LOCKED
+
+        self._pending = buffer[position:].copy()
+        if not chunks:
+            return np.zeros(0, dtype=self._frame_dtype)
+        return np.concatenate(chunks).view(self._frame_dtype)
+
+
+    #  ========== INTERNAL METHODS ==========
+    def _valid_starts(self, window: np.ndarray, num_positions: int, offset: int = 0) -> np.ndarray:
+        """Boolean array marking the positions offset + [0, num_positions) where a valid frame starts"""
+        length = self._frame_length
+        valid = window[offset:offset + num_positions] == self._head
+        valid &= window[offset + length - 1:offset + length - 1 + num_positions] == self._tail
+        if self._frame_id is not None:
+            valid &= window[offset + 1:offset + 1 + num_positions] == self._frame_id
+        return valid
+
+
+    def _match_response(self, window: np.ndarray) -> int:
+        """Check if the next announced response starts a window which begins at a frame boundary and holds at least one
+        frame length of bytes, called with the announcements locked
+
+        Returns:
+            int: Length of the response if it matches, otherwise 0
+        """
+        length, first_byte, last_byte, _ = self._expected[0]
+        if window.size <= length or window[0] != first_byte or (last_byte is not None and window[length - 1] != last_byte):
+            return 0
+        following = window[length:length + self._frame_length]
+        if following.size == self._frame_length:
+            return length if self._count_valid_frames(following)[0] else 0
+        return length if following[0] == self._head else 0
+
+
+    def _take_response(self, response: np.ndarray) -> None:
+        """Hand a response which was cut out of the stream to the callback of its announcement, called with the
+        announcements locked"""
+        _, _, _, on_response = self._expected.popleft()
+        if on_response is not None:
+            on_response(response.tobytes(), self._frames_returned)
+
+
+    def _count_valid_frames(self, window: np.ndarray) -> tuple[int, int]:
+        """Validate all complete frames of an aligned window
+
+        Returns:
+            tuple[int, int]: Number of valid frames before the first invalid one and number of complete frames
+        """
+        num_frames = window.size // self._frame_length
+        if not num_frames:
+            return 0, 0
+        frames = window[:num_frames * self._frame_length].reshape(num_frames, self._frame_length)
+        valid = (frames[:, 0] == self._head) & (frames[:, -1] == self._tail)
+        if self._frame_id is not None:
+            valid &= frames[:, 1] == self._frame_id
+        num_valid = num_frames if valid.all() else int(np.argmin(valid))
+        return num_valid, num_frames
+
+
+    def _search_alignment(self, window: np.ndarray) -> tuple[int, bool]:
+        """Search the first position where confirm_frames consecutive valid frames start
+
+        Returns:
+            tuple[int, bool]: Number of bytes to discard and True if the alignment was found. If it was not found, all
+                positions which could already be confirmed are discarded and the rest is kept for the next feed
+        """
+        span = self._confirm_frames * self._frame_length
+        num_positions = window.size - span + 1
+        if num_positions <= 0:
+            return 0, False
+        candidates = self._valid_starts(window, num_positions)
+        for frame in range(1, self._confirm_frames):
+            candidates &= self._valid_starts(window, num_positions, offset=frame * self._frame_length)
+        found = np.flatnonzero(candidates)
+        if found.size:
+            return int(found[0]), True
+        return num_positions, False
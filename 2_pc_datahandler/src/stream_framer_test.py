@@ -0,0 +1,117 @@
+import unittest
+import numpy as np
+from src import StreamFramer, ADC_DATA_FRAME_DTYPE
+
+
+def build_stream(num_frames: int) -> bytes:
+    frames = np.zeros(num_frames, dtype=ADC_DATA_FRAME_DTYPE)
+    frames["head"] = 0xAA
+    frames["tail"] = 0xBB
+    frames["index"] = np.arange(num_frames) % 256
+    frames["channel_values"] = 0xAA # payload bytes that look like headers
+    return frames.tobytes()
+
+
+class StreamFramerTest(unittest.TestCase):
+    def setUp(self):
+        self._framer = StreamFramer()
+
+
+    def test_aligned_stream(self):
+        frames = self._framer.feed(build_stream(10))
+        self.assertEqual(frames["index"].tolist(), list(range(10)))
+        self.assertEqual(self._framer.state, "LOCKED")
+        self.assertEqual(self._framer.discarded_bytes, 0)
+
+
+    def test_partial_frames_are_kept(self):
+        stream = build_stream(6)
+        first = self._framer.feed(stream[:100])
+        second = self._framer.feed(stream[100:])
+        self.assertEqual(first.size + second.size, 6)
+        self.assertEqual(self._framer.pending_bytes, 0)
+
+
+    def test_lost_byte_recovers_after_one_frame(self):
+        stream = bytearray(build_stream(20))
+        del stream[5 * 38 + 7] # frame 5 loses one byte, all later frames are shifted
+
+        frames = self._framer.feed(bytes(stream))
+        self.assertEqual(frames["index"].tolist(), [0, 1, 2, 3, 4] + list(range(6, 20)))
+        self.assertEqual(self._framer.discarded_bytes, 37)
+        self.assertEqual(self._framer.resync_count, 1)
+
+
+    def test_leading_garbage_is_discarded(self):
+        frames = self._framer.feed(bytes([0xAA, 0xBB, 0x00] * 5) + build_stream(4))
+        self.assertEqual(frames["index"].tolist(), [0, 1, 2, 3])
+        self.assertEqual(self._framer.discarded_bytes, 15)
+
+
+    def test_corrupted_frame_in_the_middle(self):
+        stream = bytearray(build_stream(8))
+        stream[3 * 38] = 0x55 # invalid head of frame 3
+
+        frames = self._framer.feed(bytes(stream))
+        self.assertEqual(frames["index"].tolist(), [0, 1, 2, 4, 5, 6, 7])
+        self.assertEqual(self._framer.discarded_bytes, 38)
+
+
+    def test_byte_wise_feed(self):
+        stream = build_stream(5)
+        frames = [self._framer.feed(stream[idx:idx + 1]) for idx in range(len(stream))]
+        self.assertEqual(np.concatenate(frames)["index"].tolist(), [0, 1, 2, 3, 4])
+
+
+    def test_announced_responses_are_cut_out(self):
+        stream = build_stream(20)
+        state, runtime, registers = bytes([3, 0, 5]), bytes([5]) + (1234).to_bytes(8, "little"), bytes([0xAA] + [0] * 17 + [0xBB])
+        wire = stream[:4 * 38] + stream[4 * 38:5 * 38] + state + stream[5 * 38:11 * 38] + runtime + stream[11 * 38:16 * 38] + registers + stream[16 * 38:]
+        responses = []
+        self._framer.feed(wire[:4 * 38])
+        for length, first_byte, last_byte in ((3, 3, None), (9, 5, None), (19, 0xAA, 0xBB)):
+            self._framer.expect_response(length, first_byte, last_byte, on_response=lambda *response: responses.append(response))
+        frames = [self._framer.feed(wire[idx:idx + 50]) for idx in range(4 * 38, len(wire), 50)]
+
+        self.assertEqual(np.concatenate(frames)["index"].tolist(), list(range(4, 20)))
+        self.assertEqual(responses, [(state, 5), (runtime, 11), (registers, 16)])
+        self.assertEqual(self._framer.resync_count, 0)
+        self.assertEqual(self._framer.expected_responses, 0)
+
+
+    def test_response_which_passes_as_frame(self):
+        frames = np.frombuffer(build_stream(10), dtype=ADC_DATA_FRAME_DTYPE).copy()
+        frames["channel_values"][6, 5] = 0xBB # seen from a response in front, the frame ends like a tail
+        registers = bytes([0xAA, 0x00] + [1] * 16 + [0xBB])
+        responses = []
+        self._framer.feed(frames[:6].tobytes())
+        self._framer.expect_response(19, 0xAA, 0xBB, on_response=lambda *response: responses.append(response))
+
+        received = self._framer.feed(registers + frames[6:].tobytes())
+        self.assertEqual(received["index"].tolist(), [6, 7, 8, 9])
+        self.assertEqual(responses, [(registers, 6)])
+        self.assertEqual(self._framer.resync_count, 0)
+
+
+    def test_unannounced_response_is_discarded(self):
+        stream = build_stream(10)
+        frames = self._framer.feed(stream[:5 * 38] + bytes([3, 0, 5]) + stream[5 * 38:])
+        self.assertEqual(frames["index"].tolist(), list(range(10)))
+        self.assertEqual(self._framer.resync_count, 1)
+        self.assertEqual(self._framer.discarded_bytes, 3)
+
+
+    def test_response_cancelled_while_half_framed(self):
+        stream = build_stream(12)
+        runtime = bytes([5]) + (1234).to_bytes(8, "little")
+        responses = []
+        self._framer.feed(stream[:5 * 38])
+        self._framer.expect_response(9, 5, None, on_response=lambda *response: responses.append(response))
+        self.assertEqual(self._framer.feed(stream[5 * 38:6 * 38] + runtime[:4]).size, 1)
+
+        self._framer.cancel_responses()
+        frames = self._framer.feed(runtime[4:] + stream[6 * 38:])
+        self.assertEqual(frames["index"].tolist(), list(range(6, 12)))
+        self.assertEqual(responses, [])
+        self.assertEqual(self._framer.expected_responses, 0)
+        self.assertEqual(self._framer.discarded_bytes, 9)
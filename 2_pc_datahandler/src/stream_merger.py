@@ -0,0 +1,148 @@
+import numpy as np
+
+# Deviation in slots between the time of a sample and its slot before the slot is corrected
+SLOT_HYSTERESIS = 0.75
+
+
+class StreamMerger:
+    _pending_slots: list
+    _pending_samples: list
+
+    def __init__(self, num_streams: int, num_columns: int, sampling_rate: float, max_lag_sec: float = 0.5) -> None:
+        """Merge the samples of several streams with equal sampling rate into wide rows on a common time grid.
+
+        Every sample carries a time on the common clock. The grid starts at the latest first sample of all streams and
+        a sample belongs to the slot closest to its time. A slot is emitted as soon as every stream has passed it, or
+        once it is more than max_lag_sec behind the newest sample of any stream, so a stalled stream does not stop the
+        others. Slots without a sample of a stream are filled with zeros and marked as missing. Consecutive samples of a
+        stream advance by their distance in slots, so jitter of the common clock does not move single samples. The slot
+        is only corrected if the time of a sample deviates by more than SLOT_HYSTERESIS, e.g. after clock drift.
+
+        Args:
+            num_streams (int): Number of merged streams
+            num_columns (int): Number of columns of each stream
+            sampling_rate (float): Common sampling rate in Hz
+            max_lag_sec (float, optional): Maximum time a slot waits for a stalled stream. Defaults to 0.5.
+        """
+        self._num_streams = num_streams
+        self._num_columns = num_columns
+        self._sampling_rate = sampling_rate
+        self._max_lag_slots = int(np.ceil(max_lag_sec * sampling_rate))
+        self.reset()
+
+
+    # ========== API METHODS ==========
+    @property
+    def start_time(self) -> float:
+        """Common time of the first slot, None until every stream delivered a sample"""
+        return self._start_time
+
+    @property
+    def missing_samples(self) -> np.ndarray:
+        """Number of emitted slots without a sample, per stream"""
+        return self._missing.copy()
+
+    @property
+    def dropped_samples(self) -> np.ndarray:
+        """Number of samples dropped as duplicates, as late or before the start of the grid, per stream"""
+        return self._dropped.copy()
+
+
+    def reset(self) -> None:
+        """Drop all buffered samples and start a new grid"""
+        self._start_time = None
+        self._first_times = [None] * self._num_streams
+        self._next_slot = 0
+        self._newest_slot = np.full(self._num_streams, -1, dtype=np.int64)
+        self._last_slot = [None] * self._num_streams
+        self._last_position = [None] * self._num_streams
+        self._pending_chunks = [[] for _ in range(self._num_streams)]
+        self._pending_slots = [np.zeros(0, dtype=np.int64) for _ in range(self._num_streams)]
+        self._pending_samples = [np.zeros((0, self._num_columns), dtype=np.int32) for _ in range(self._num_streams)]
+        self._missing = np.zeros(self._num_streams, dtype=np.int64)
+        self._dropped = np.zeros(self._num_streams, dtype=np.int64)
+
+
+    def feed(self, stream: int, samples: np.ndarray, times: np.ndarray) -> None:
+        """Add samples of one stream
+
+        Args:
+            stream (int): Index of the stream
+            samples (np.ndarray): Samples with shape (num_samples, num_columns)
+            times (np.ndarray): Time of each sample on the common clock in seconds
+        """
+        samples = np.asarray(samples, dtype=np.int32).reshape(-1, self._num_columns)
+        times = np.asarray(times, dtype=np.float64)
+        if not times.size:
+            return
+        if self._start_time is None:
+            self._pending_chunks[stream].append((samples, times))
+            if self._first_times[stream] is None:
+                self._first_times[stream] = float(times[0])
+            if all(first is not None for first in self._first_times):
+                self._start_time = max(self._first_times)
+                for index, buffered in enumerate(self._pending_chunks):
+                    for buffered_samples, buffered_times in buffered:
+                        self._add(index, buffered_samples, buffered_times)
+                self._pending_chunks = [[] for _ in range(self._num_streams)]
+            return
+        self._add(stream, samples, times)
+
+
+    def pop(self) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """Take all slots which are complete or waited longer than the maximum lag
+
+        Returns:
+            tuple[np.ndarray, np.ndarray, np.ndarray]: int32 rows with the columns of all streams side by side with
+                shape (num_slots, num_streams*num_columns), the common time of every slot in seconds and a boolean
+                mask with shape (num_slots, num_streams) marking slots without a sample of a stream
+        """
+        last_slot = max(int(self._newest_slot.min()), int(self._newest_slot.max()) - self._max_lag_slots)
+        num_slots = last_slot - self._next_slot + 1
+        if self._start_time is None or num_slots <= 0:
+            return (np.zeros((0, self._num_streams * self._num_columns), dtype=np.int32), np.zeros(0),
+                    np.zeros((0, self._num_streams), dtype=bool))
+
+        rows = np.zeros((num_slots, self._num_streams * self._num_columns), dtype=np.int32)
+        missing = np.ones((num_slots, self._num_streams), dtype=bool)
+        for stream in range(self._num_streams):
+            slots = self._pending_slots[stream]
+            emitted = slots <= last_slot
+            positions = slots[emitted] - self._next_slot
+            rows[positions, stream * self._num_columns:(stream + 1) * self._num_columns] = self._pending_samples[stream][emitted]
+            missing[positions, stream] = False
+            self._pending_slots[stream] = slots[~emitted]
+            self._pending_samples[stream] = self._pending_samples[stream][~emitted]
+        self._missing += missing.sum(axis=0)
+
+        times = self._start_time + (self._next_slot + np.arange(num_slots)) / self._sampling_rate
+        self._next_slot = last_slot + 1
+        return rows, times, missing
+
+
+    #  ========== INTERNAL METHODS ==========
+    def _add(self, stream: int, samples: np.ndarray, times: np.ndarray) -> None:
+        """Assign samples to slots and keep them until their slots are emitted"""
+        position = (times - self._start_time) * self._sampling_rate
+        if self._last_slot[stream] is None:
+            slots = np.rint(position).astype(np.int64)
+        else:
+            steps = np.ceil(np.diff(position, prepend=self._last_position[stream]) - SLOT_HYSTERESIS).astype(np.int64)
+            slots = self._last_slot[stream] + np.cumsum(steps)
+        while True:
+            deviating = np.flatnonzero(np.abs(position - slots) > SLOT_HYSTERESIS)
+            if not deviating.size:
+                break
+            slots[deviating[0]:] += np.int64(np.rint(position[deviating[0]] - slots[deviating[0]]))
+        self._last_slot[stream] = int(slots[-1])
+        self._last_position[stream] = float(position[-1])
+
+        # keep the first sample of every slot which was not emitted or filled yet
+        floor = max(self._next_slot, int(self._newest_slot[stream]) + 1)
+        valid = slots > np.maximum.accumulate(np.concatenate(([floor - 1], slots)))[:-1]
+        self._dropped[stream] += int(slots.size - np.count_nonzero(valid))
+        if not np.any(valid):
+            return
+        self._pending_slots[stream] = np.concatenate((self._pending_slots[stream], slots[valid]))
+        self._pending_samples[stream] = np.concatenate((self._pending_samples[stream], samples[valid]))
+        self._newest_slot[stream] = slots[valid][-1]
@@ -0,0 +1,55 @@
+import unittest
+import numpy as np
+from src import StreamMerger
+
+
+def build_samples(values: list) -> np.ndarray:
+    return np.array(values, dtype=np.int32).reshape(-1, 1)
+
+
+class StreamMergerTest(unittest.TestCase):
+    def setUp(self):
+        self._merger = StreamMerger(num_streams=2, num_columns=1, sampling_rate=1000., max_lag_sec=0.01)
+
+
+    def test_grid_starts_at_latest_stream(self):
+        self._merger.feed(0, build_samples([1, 2, 3, 4]), 10. + np.arange(4) * 1e-3)
+        self._merger.feed(1, build_samples([11, 12, 13]), 10.0012 + np.arange(3) * 1e-3)
+        rows, times, missing = self._merger.pop()
+
+        self.assertEqual(rows.tolist(), [[2, 11], [3, 12], [4, 13]])
+        np.testing.assert_allclose(times, 10.0012 + np.arange(3) * 1e-3)
+        self.assertFalse(missing.any())
+        self.assertEqual(self._merger.dropped_samples.tolist(), [1, 0])
+
+
+    def test_gap_is_filled_and_marked(self):
+        self._merger.feed(0, build_samples([1, 2, 3, 4, 5]), np.arange(5) * 1e-3)
+        self._merger.feed(1, build_samples([11, 12, 15]), np.array([0, 1, 4]) * 1e-3)
+        rows, _, missing = self._merger.pop()
+
+        self.assertEqual(rows[:, 1].tolist(), [11, 12, 0, 0, 15])
+        self.assertEqual(missing[:, 1].tolist(), [False, False, True, True, False])
+        self.assertEqual(self._merger.missing_samples.tolist(), [0, 2])
+
+
+    def test_waits_for_slow_stream_until_max_lag(self):
+        self._merger.feed(0, build_samples(range(5)), np.arange(5) * 1e-3)
+        self._merger.feed(1, build_samples([0]), np.zeros(1))
+        self.assertEqual(self._merger.pop()[0].shape[0], 1)
+
+        self._merger.feed(0, build_samples(range(5, 20)), np.arange(5, 20) * 1e-3)
+        rows, _, missing = self._merger.pop()
+        self.assertEqual(rows.shape[0], 9) # slots 1 to 9 are more than 10 slots behind slot 19
+        self.assertTrue(missing[:, 1].all())
+
+
+    def test_clock_jitter_does_not_move_samples(self):
+        self._merger.feed(0, build_samples(range(20)), np.arange(20) * 1e-3)
+        self._merger.feed(1, build_samples(range(10)), np.arange(10) * 1e-3)
+        # the clock mapping of the second chunk jumped by 0.6 periods, which stays below the hysteresis
+        self._merger.feed(1, build_samples(range(10, 20)), np.arange(10, 20) * 1e-3 + 0.6e-3)
+        rows, _, missing = self._merger.pop()
+
+        self.assertEqual(rows[:, 1].tolist(), list(range(20)))
+        self.assertFalse(missing.any())
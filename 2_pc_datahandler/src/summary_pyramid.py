@@ -0,0 +1,187 @@
+from .data_structures import SummaryData
+from .data_loading import read_channel_layout, expand_channels
+from pathlib import Path
+import h5py
+import numpy as np
+
+# Decimation factors of the summary levels, every level must divide the next one
+PYRAMID_LEVELS = (16, 256, 4096)
+# Name of the group in ad7779_data which holds the summary levels
+SUMMARY_GROUP = "summary"
+# Samples read at once by build_summary_pyramid
+SUMMARY_BLOCK_SAMPLES = 1 << 20
+# Completed bins per level collected in memory before they are written, resizing the datasets is slow
+SUMMARY_FLUSH_BINS = 256
+
+
+class SummaryPyramid:
+    _pending: list
+    _completed: list
+    _datasets: list
+
+    def __init__(self, grp: h5py.Group, num_channels: int, levels: tuple = PYRAMID_LEVELS) -> None:
+        """Keep a decimated min/max/mean summary per channel of the measurements of a recording. Every level is stored
+        as group summary/level_<decimation> with the datasets min, max (int32) and mean (float32) of shape
+        (num_bins, num_channels). The first level is computed from the samples and every further level from the level
+        below, the samples of an unfinished bin wait in memory until the bin is complete or finish is called. Completed bins
+        are written in batches of SUMMARY_FLUSH_BINS.
+
+        Args:
+            grp (h5py.Group): The ad7779_data group of the recording
+            num_channels (int): Number of channels per sample
+            levels (tuple, optional): Increasing decimation factors, every factor must divide the next one. Defaults to PYRAMID_LEVELS.
+
+        Raises:
+            ValueError: If a factor is not larger than the one before or does not divide the next one
+        """
+        self._ratios = _level_ratios(levels)
+        self._levels = tuple(int(level) for level in levels)
+        self._num_channels = num_channels
+        if SUMMARY_GROUP in grp:
+            del grp[SUMMARY_GROUP]
+        self._grp = grp.create_group(SUMMARY_GROUP)
+        self._grp.attrs["levels"] = self._levels
+        self._datasets = []
+        for level in self._levels:
+            grp_level = self._grp.create_group(f"level_{level}")
+            grp_level.attrs["decimation"] = level
+            self._datasets.append({name: grp_level.create_dataset(name, shape=(0, num_channels), maxshape=(None, num_channels),
+                                                                  dtype=dtype, chunks=True)
+                                   for name, dtype in (("min", "int32"), ("max", "int32"), ("mean", "float32"))})
+        self._pending = [None] * len(self._levels)
+        self._completed = [[] for _ in self._levels]
+        self._completed_bins = [0] * len(self._levels)
+
+
+    # ========== API METHODS ==========
+    def append(self, measurements: np.ndarray) -> None:
+        """Add the next block of samples to all levels
+
+        Args:
+            measurements (np.ndarray): ADC codes with shape (num_samples, num_channels)
+        """
+        values = np.asarray(measurements).reshape(-1, self._num_channels)
+        if not values.shape[0]:
+            return
+        self._feed((values, values, values.astype(np.float64), np.ones(values.shape[0], dtype=np.int64)), final=False)
+
+
+    def finish(self) -> None:
+        """Write the unfinished bins at the end of the recording, they summarize the remaining samples"""
+        self._feed(None, final=True)
+        for index in range(len(self._levels)):
+            self._write_bins(index)
+
+
+    #  ========== INTERNAL METHODS ==========
+    def _feed(self, bins: tuple, final: bool) -> None:
+        """Pass bins of (min, max, sum, count) from level to level and collect the completed bins of every level"""
+        for index, ratio in enumerate(self._ratios):
+            pending = self._pending[index]
+            if bins is not None:
+                pending = bins if pending is None else tuple(np.concatenate((old, new)) for old, new in zip(pending, bins))
+            if pending is None:
+                bins = None
+                continue
+            complete = pending[3].size if final else pending[3].size // ratio * ratio
+            bins = _reduce_bins(tuple(part[:complete] for part in pending), ratio) if complete else None
+            self._pending[index] = tuple(part[complete:] for part in pending) if complete < pending[3].size else None
+            if bins is not None:
+                self._completed[index].append(bins)
+                self._completed_bins[index] += bins[3].size
+                if self._completed_bins[index] >= SUMMARY_FLUSH_BINS:
+                    self._write_bins(index)
+
+
+    def _write_bins(self, index: int) -> None:
+        """Append the collected bins to the datasets of a level"""
+        if not self._completed[index]:
+            return
+        minimum, maximum, total, count = (np.concatenate(parts) for parts in zip(*self._completed[index]))
+        self._completed[index] = []
+        self._completed_bins[index] = 0
+        datasets = self._datasets[index]
+        length = datasets["min"].shape[0]
+        for name, values in (("min", minimum), ("max", maximum), ("mean", total / count[:, None])):
+            datasets[name].resize((length + count.size, self._num_channels))
+            datasets[name][length:] = values
+
+
+def _level_ratios(levels: tuple) -> list:
+    """Decimation of every level relative to the level below, the first level relative to the samples"""
+    ratios, previous = [], 1
+    for level in levels:
+        if level <= previous or level % previous:
+            raise ValueError(f"Summary levels {levels} must increase and every level must divide the next one")
+        ratios.append(level // previous)
+        previous = level
+    return ratios
+
+
+def _reduce_bins(bins: tuple, ratio: int) -> tuple:
+    """Combine groups of ratio consecutive bins into one, a shorter last group forms its own bin"""
+    minimum, maximum, total, count = bins
+    starts = np.arange(0, count.size, ratio)
+    return (np.minimum.reduceat(minimum, starts, axis=0), np.maximum.reduceat(maximum, starts, axis=0),
+            np.add.reduceat(total, starts, axis=0), np.add.reduceat(count, starts))
+
+
+def build_summary_pyramid(path_to_file: Path, levels: tuple = PYRAMID_LEVELS, block_samples: int = SUMMARY_BLOCK_SAMPLES) -> None:
+    """Add the summary levels to an existing recording, for files written without them. Existing levels are replaced,
+    the measurements are read block by block
+
+    Args:
+        path_to_file (Path): Path to the h5 file
+        levels (tuple, optional): Increasing decimation factors, every factor must divide the next one. Defaults to PYRAMID_LEVELS.
+        block_samples (int, optional): Samples read at once. Defaults to SUMMARY_BLOCK_SAMPLES.
+    """
+    with h5py.File(path_to_file, "r+") as file:
+        grp = file["ad7779_data"]
+        dset_meas = grp["measurements"]
+        pyramid = SummaryPyramid(grp, dset_meas.shape[1], levels)
+        for start in range(0, dset_meas.shape[0], block_samples):
+            pyramid.append(dset_meas[start:start + block_samples])
+        pyramid.finish()
+
+
+def read_h5_summary(path_to_file: Path, start_sec: float = 0., stop_sec: float = None, pixel_width: int = 1000,
+                    scale_time: float = 1e6) -> SummaryData:
+    """Read a time span of a recording at the coarsest level with at least pixel_width bins, so the amount of data read
+    is about the same for every zoom level. Spans shorter than pixel_width samples and recordings without summary
+    levels are read from the samples, which then are minimum, maximum and mean at once
+
+    Args:
+        path_to_file (Path): Path to the h5 file
+        start_sec (float, optional): Start of the span in seconds of samples from the start of the recording. Defaults to 0..
+        stop_sec (float, optional): End of the span in seconds of samples, None for the end of the recording. Defaults to None.
+        pixel_width (int, optional): Number of points the span is drawn with. Defaults to 1000.
+        scale_time (float, optional): Timestamp units per second. Defaults to 1e6.
+
+    Returns:
+        SummaryData: Bins of the span in ADC codes with the timestamp of their first sample, channels which were not
+            recorded are zero
+    """
+    with h5py.File(path_to_file, "r") as file:
+        grp = file["ad7779_data"]
+        sampling_rate = float(grp.attrs["adc_samplingrate"])
+        num_samples = grp["measurements"].shape[0]
+        first = min(max(int(start_sec * sampling_rate), 0), num_samples)
+        last = num_samples if stop_sec is None else min(max(int(np.ceil(stop_sec * sampling_rate)), first), num_samples)
+
+        levels = [int(level) for level in grp[SUMMARY_GROUP].attrs["levels"]] if SUMMARY_GROUP in grp else []
+        suitable = [level for level in levels if (last - first) // level >= pixel_width]
+        decimation = max(suitable, default=1)
+        first_bin, last_bin = first // decimation, -(-last // decimation)
+        if decimation == 1:
+            values = grp["measurements"][first:last]
+            minimum, maximum, mean = values, values, values.astype(np.float64)
+        else:
+            grp_level = grp[SUMMARY_GROUP][f"level_{decimation}"]
+            minimum, maximum = grp_level["min"][first_bin:last_bin], grp_level["max"][first_bin:last_bin]
+            mean = grp_level["mean"][first_bin:last_bin].astype(np.float64)
+        first_timestamp = grp["timestamps"][0] if num_samples else 0
+        timestamps = grp["timestamps"][first_bin * decimation:min(last_bin * decimation, num_samples):decimation]
+        layout = read_channel_layout(grp)
+    return SummaryData(timestamps=(timestamps.astype(np.float64) - first_timestamp) / scale_time, minimum=expand_channels(minimum, *layout),
+                       maximum=expand_channels(maximum, *layout), mean=expand_channels(mean, *layout), decimation=decimation,
+                       sampling_rate=sampling_rate)
@@ -0,0 +1,91 @@
+import tempfile
+import unittest
+from pathlib import Path
+import h5py
+import numpy as np
+from src import H5Handler, EEGDeviceConfig, EEGDeviceMetadata, PotiConfig, SummaryPyramid, build_summary_pyramid, read_h5_summary
+
+
+class SummaryPyramidTest(unittest.TestCase):
+    def setUp(self):
+        self._tmpdir = tempfile.TemporaryDirectory()
+        self._config = EEGDeviceConfig(com_name="COM_TEST", measure_duration=1, adc_pga_gain=1, channel_mask=[1] * 8,
+                                       sdo_driver_strength=3, adc_samplingrate=1000, test_mode_enabled=False, adc_power_mode_high=True,
+                                       error_header=False, reference_active_shielding=False, gain_instrument_amplifier=1)
+        self._metadata = EEGDeviceMetadata(waveform_generator="test", waveform_generator_frequency="10",
+                                           waveform_generator_amplitude="1", waveform_type="Sine")
+        self._poti = PotiConfig(gain=1, calculated_resistor_value=0, poti_value=0, actual_resistor_value=0, actual_gain_value=1)
+        rng = np.random.default_rng(3)
+        self._measurements = rng.integers(-2 ** 23, 2 ** 23, size=(10000, 8), dtype=np.int32)
+
+    def tearDown(self):
+        self._tmpdir.cleanup()
+
+    def _write(self, name: str, levels: tuple = (4, 16, 64)) -> Path:
+        recording_name = str(Path(self._tmpdir.name) / name)
+        writer = H5Handler(recording_name=recording_name, metadata=self._metadata, eeg_device_config=self._config,
+                           poti_values=self._poti, summary_levels=levels)
+        for start in range(0, self._measurements.shape[0], 333):
+            block = self._measurements[start:start + 333]
+            writer.append_data_ad7779(timestamps=np.arange(start, start + block.shape[0]) * 1000, measurements=block,
+                                      alerts=np.zeros(block.shape, dtype=np.int8))
+        writer.close_h5_file()
+        return Path(f"{recording_name}_data.h5")
+
+    def _expected(self, decimation: int) -> tuple:
+        starts = np.arange(0, self._measurements.shape[0], decimation)
+        counts = np.diff(np.append(starts, self._measurements.shape[0]))
+        return (np.minimum.reduceat(self._measurements, starts), np.maximum.reduceat(self._measurements, starts),
+                np.add.reduceat(self._measurements.astype(np.float64), starts) / counts[:, None])
+
+    def test_incremental_levels_match_samples(self):
+        path = self._write("rec")
+        with h5py.File(path, "r") as file:
+            grp = file["ad7779_data"]["summary"]
+            self.assertEqual(list(grp.attrs["levels"]), [4, 16, 64])
+            for level in (4, 16, 64):
+                minimum, maximum, mean = self._expected(level)
+                # the last bin of every level only covers the remaining samples
+                self.assertEqual(grp[f"level_{level}"]["min"].shape, (-(-10000 // level), 8))
+                np.testing.assert_array_equal(grp[f"level_{level}"]["min"][:], minimum)
+                np.testing.assert_array_equal(grp[f"level_{level}"]["max"][:], maximum)
+                np.testing.assert_allclose(grp[f"level_{level}"]["mean"][:], mean, rtol=1e-6)
+
+    def test_offline_builder_matches_writer(self):
+        path = self._write("rec", levels=None)
+        with h5py.File(path, "r") as file:
+            self.assertNotIn("summary", file["ad7779_data"])
+        build_summary_pyramid(path, levels=(4, 16, 64), block_samples=1001)
+        reference = self._write("reference")
+        with h5py.File(path, "r") as built, h5py.File(reference, "r") as written:
+            for level in (4, 16, 64):
+                for name in ("min", "max", "mean"):
+                    np.testing.assert_array_equal(built[f"ad7779_data/summary/level_{level}/{name}"][:],
+                                                  written[f"ad7779_data/summary/level_{level}/{name}"][:])
+
+    def test_read_picks_level_for_span(self):
+        path = self._write("rec")
+        overview = read_h5_summary(path, pixel_width=100)
+        self.assertEqual(overview.decimation, 64)
+        self.assertEqual(overview.mean.shape, (157, 8))
+        np.testing.assert_allclose(overview.timestamps[:2], [0., 0.064])
+
+        zoomed = read_h5_summary(path, start_sec=2., stop_sec=3., pixel_width=100)
+        self.assertEqual(zoomed.decimation, 4)
+        minimum, _, _ = self._expected(4)
+        np.testing.assert_array_equal(zoomed.minimum, minimum[500:750])
+        np.testing.assert_allclose(zoomed.timestamps[0], 2.)
+
+        samples = read_h5_summary(path, start_sec=2., stop_sec=2.1, pixel_width=100)
+        self.assertEqual(samples.decimation, 1)
+        np.testing.assert_array_equal(samples.maximum, self._measurements[2000:2100])
+
+    def test_invalid_levels(self):
+        with h5py.File(Path(self._tmpdir.name) / "levels.h5", "w") as file:
+            for levels in ((16, 24), (16, 16), (1, 16)):
+                with self.assertRaises(ValueError):
+                    SummaryPyramid(file.create_group(str(levels)), 8, levels)
+
+
+if __name__ == "__main__":
+    unittest.main()
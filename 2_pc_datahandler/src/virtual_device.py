@@ -0,0 +1,580 @@
+import os
+import threading
+import time
+import numpy as np
+from urllib.parse import urlparse, parse_qs
+import serial
+from serial.serialutil import SerialBase, SerialException, PortNotOpenError
+from .data_processing import ADC_DATA_FRAME_DTYPE
+
+# Command heads of the usb_cmd_t enum (see 1_firmware/callbacks/rpc_callbacks.c)
+USB_CMD = {"ECHO": 0, "RESET": 1, "CLOCK_SYS": 2, "STATE_SYS": 3, "STATE_PIN": 4, "RUNTIME": 5, "FIRMWARE": 6,
+           "ENABLE_LED": 7, "DISABLE_LED": 8, "PING_LED": 9, "ERROR_STATUS_REG": 10, "START_DAQ": 11,
+           "STOP_DAQ": 12, "UPDATE_DAQ": 13, "SET_PGA_GAIN": 14, "SET_CHANNELS": 15, "SET_SDO_STH": 16,
+           "SET_SAMP_RATE": 17, "SET_TEST_MODE": 18, "SET_POWER_MODE": 19, "SET_HEADER_TYPE": 20,
+           "SHIELDING_REF": 21, "POTI_SET_VALUE": 22}
+
+# Values of system_state_t (see 1_firmware/src/init_system.h)
+SYSTEM_STATE = {"ERROR": 0, "RESET": 1, "INIT": 2, "IDLE": 3, "TEST": 4, "DAQ": 5}
+
+COMMAND_LENGTH = 3
+ERROR_REGISTER_LENGTH = 17
+FULL_SCALE_CODE = 2 ** 23 - 1
+
+
+class VirtualEEGDevice:
+    _lock: threading.Condition
+    _rx_buffer: bytearray
+    _tx_buffer: bytearray
+    _rng: np.random.Generator
+
+    def __init__(self, sampling_rate: int = 1000, channel_mask: int = 0xFF, signal_frequency_hz: float = 10.,
+                 signal_amplitude: int = 2 ** 20, noise_amplitude: int = 0, tx_buffer_size: int = 1 << 22,
+                 firmware_version: tuple = (1, 0), seed: int = None) -> None:
+        """Software model of the EEG hardware which speaks the USB protocol of the firmware. Commands are decoded
+        from 3-byte frames (2 data bytes little-endian + 1 head byte) and answered like rpc_callbacks.c, while in DAQ
+        state 38-byte adcDataPacket_t frames are generated in real time with the configured sampling rate
+
+        Args:
+            sampling_rate (int, optional): Sampling rate in Hz until the host overwrites it. Defaults to 1000.
+            channel_mask (int, optional): Bitmask of active channels until the host overwrites it. Defaults to 0xFF.
+            signal_frequency_hz (float, optional): Frequency of the synthetic sine on each channel. Defaults to 10.
+            signal_amplitude (int, optional): Amplitude of the synthetic sine in ADC codes. Defaults to 2**20.
+            noise_amplitude (int, optional): Standard deviation of added gaussian noise in ADC codes. Defaults to 0.
+            tx_buffer_size (int, optional): Bytes the device buffers for the host before frames are lost. Defaults to 4 MiB.
+            firmware_version (tuple, optional): Reported firmware version (major, minor). Defaults to (1, 0).
+            seed (int, optional): Seed for the noise generator. Defaults to None.
+        """
+        self._lock = threading.Condition()
+        self._rx_buffer = bytearray()
+        self._tx_buffer = bytearray()
+        self._rng = np.random.default_rng(seed)
+        self._boot_time = time.perf_counter()
+
+        self.signal_frequency_hz = signal_frequency_hz
+        self.signal_amplitude = signal_amplitude
+        self.noise_amplitude = noise_amplitude
+        self.tx_buffer_size = tx_buffer_size
+        self.firmware_version = firmware_version
+        self.sampling_rate_locked = False
+        self.error_registers = bytes(ERROR_REGISTER_LENGTH)
+
+        self._default_sampling_rate = sampling_rate
+        self._default_channel_mask = channel_mask
+        self._reset_state()
+
+
+    # ========== API METHODS ==========
+    @property
+    def boot_time(self) -> float:
+        """Host time (time.perf_counter) which corresponds to device timestamp 0"""
+        return self._boot_time
+
+
+    @property
+    def system_state(self) -> str:
+        """Name of the current system state of the device"""
+        return [key for key, value in SYSTEM_STATE.items() if value == self._system_state][0]
+
+
+    @property
+    def sampling_rate(self) -> int:
+        """Currently configured sampling rate in Hz"""
+        return self._sampling_rate
+
+
+    @property
+    def counters(self) -> dict:
+        """Dictionary with the number of generated, skipped, corrupted and overflowed frames and the sent bytes"""
+        with self._lock:
+            return dict(self._counters)
+
+
+    def lock_sampling_rate(self, sampling_rate: int) -> None:
+        """Pin the sampling rate so SET_SAMP_RATE commands are ignored. The command only carries 16 bits, so this is
+        the way to emulate rates above 65535 SPS
+
+        Args:
+            sampling_rate (int): Sampling rate in Hz
+        """
+        with self._lock:
+            self._sampling_rate = sampling_rate
+            self.sampling_rate_locked = True
+
+
+    def write(self, data: bytes) -> int:
+        """Receive bytes from the host and execute every complete command frame
+
+        Args:
+            data (bytes): Bytes sent by the host
+
+        Returns:
+            int: Number of accepted bytes
+        """
+        with self._lock:
+            self._rx_buffer += data
+            num_commands = len(self._rx_buffer) // COMMAND_LENGTH
+            for idx in range(num_commands):
+                self._execute_command(self._rx_buffer[idx * COMMAND_LENGTH:(idx + 1) * COMMAND_LENGTH])
+            del self._rx_buffer[:num_commands * COMMAND_LENGTH]
+            self._lock.notify_all()
+        return len(data)
+
+
+    def read(self, size: int) -> bytes:
+        """Return up to size bytes which the device has sent so far, without blocking
+
+        Args:
+            size (int): Maximum number of bytes
+
+        Returns:
+            bytes: Bytes from the device
+        """
+        with self._lock:
+            self._generate_due_frames()
+            chunk = bytes(self._tx_buffer[:size])
+            del self._tx_buffer[:size]
+            return chunk
+
+
+    @property
+    def in_waiting(self) -> int:
+        """Number of bytes ready to be read by the host"""
+        with self._lock:
+            self._generate_due_frames()
+            return len(self._tx_buffer)
+
+
+    def wait_for_data(self, timeout: float = None) -> None:
+        """Block until new bytes are expected, i.e. until the next frame is due in DAQ state or until the host sends
+        a command otherwise
+
+        Args:
+            timeout (float, optional): Maximum waiting time in seconds, None waits without limit. Defaults to None.
+        """
+        with self._lock:
+            if self._system_state == SYSTEM_STATE["DAQ"]:
+                next_due = self._daq_start_time + (self._frames_due_total + 1) / self._sampling_rate
+                wait = max(next_due - time.perf_counter(), 0.)
+                wait = wait if timeout is None else min(wait, timeout)
+                self._lock.wait(max(wait, 1e-4))
+            else:
+                self._lock.wait(timeout)
+
+
+    def clear_output(self) -> None:
+        """Drop all bytes which are not yet read by the host"""
+        with self._lock:
+            self._generate_due_frames()
+            self._tx_buffer.clear()
+
+
+    def inject_alert(self, alert_byte: int, num_frames: int = 1) -> None:
+        """Set the alert byte of the next frames, bit n marks channel n like decode_alert_flags
+
+        Args:
+            alert_byte (int): Raw alert byte of the frame
+            num_frames (int, optional): Number of frames carrying the alert byte. Defaults to 1.
+        """
+        with self._lock:
+            self._pending_alerts.append([num_frames, alert_byte])
+
+
+    def inject_gap(self, num_frames: int) -> None:
+        """Skip the next frames, packet number and timestamp advance as if they were sent
+
+        Args:
+            num_frames (int): Number of frames which are lost
+        """
+        with self._lock:
+            self._pending_gap += num_frames
+
+
+    def inject_corrupted_frame(self, mode: str = "drop_bytes", num_bytes: int = 1) -> None:
+        """Corrupt the next frame on the wire
+
+        Args:
+            mode (str, optional): "drop_bytes" removes num_bytes from the end of the frame and shifts the stream,
+                "garbage" overwrites head and tail so the frame fails validation. Defaults to "drop_bytes".
+            num_bytes (int, optional): Number of bytes removed for "drop_bytes". Defaults to 1.
+
+        Raises:
+            ValueError: If the mode is unknown
+        """
+        if mode not in ("drop_bytes", "garbage"):
+            raise ValueError(f"Unknown corruption mode: {mode}")
+        with self._lock:
+            self._pending_corruptions.append((mode, num_bytes))
+
+
+    #  ========== INTERNAL METHODS ==========
+    def _reset_state(self) -> None:
+        """Bring the device into the state after the boot process"""
+        self._system_state = SYSTEM_STATE["IDLE"]
+        if not self.sampling_rate_locked:
+            self._sampling_rate = self._default_sampling_rate
+        self._channel_mask = self._default_channel_mask
+        self._pga_gain = 1
+        self._sdo_driver_strength = 0
+        self._test_mode = False
+        self._power_mode_high = False
+        self._error_header = False
+        self._shielding_reference = False
+        self._poti_value = 0
+        self._led_enabled = False
+        self._packet_number = 0
+        self._daq_start_time = 0.
+        self._frames_due_total = 0
+        self._pending_alerts = []
+        self._pending_gap = 0
+        self._pending_corruptions = []
+        self._counters = {"frames_generated": 0, "frames_skipped": 0, "frames_corrupted": 0,
+                          "frames_overflowed": 0, "bytes_sent": 0}
+
+
+    def _send(self, data: bytes) -> None:
+        self._tx_buffer += data
+        self._counters["bytes_sent"] += len(data)
+
+
+    def _execute_command(self, frame: bytearray) -> None:
+        """Execute one command frame, the firmware sees the bytes reversed as [head, data_high, data_low]"""
+        head, data_high, data_low = frame[2], frame[1], frame[0]
+        answer = bytes([head, data_high, data_low])
+        self._generate_due_frames()
+
+        if head == USB_CMD["ECHO"]:
+            self._send(answer)
+        elif head == USB_CMD["RESET"]:
+            self._reset_state()
+        elif head == USB_CMD["CLOCK_SYS"]:
+            self._send(bytes([head]) + (150_000_000 // 10_000).to_bytes(2, "little"))
+        elif head == USB_CMD["STATE_SYS"]:
+            self._send(bytes([head, data_high, self._system_state]))
+        elif head == USB_CMD["STATE_PIN"]:
+            self._send(bytes([head, data_high, int(self._shielding_reference)]))
+        elif head == USB_CMD["RUNTIME"]:
+            runtime = int((time.perf_counter() - self._boot_time) * 1e6)
+            self._send(bytes([head]) + runtime.to_bytes(8, "little"))
+        elif head == USB_CMD["FIRMWARE"]:
+            self._send(bytes([head, self.firmware_version[0], self.firmware_version[1]]))
+        elif head in (USB_CMD["ENABLE_LED"], USB_CMD["DISABLE_LED"], USB_CMD["PING_LED"]):
+            self._led_enabled = {USB_CMD["ENABLE_LED"]: True, USB_CMD["DISABLE_LED"]: False}.get(head, not self._led_enabled)
+        elif head == USB_CMD["ERROR_STATUS_REG"]:
+            self._send(bytes([0xAA]) + bytes(self.error_registers) + bytes([0xBB]))
+        elif head == USB_CMD["START_DAQ"]:
+            if self._system_state != SYSTEM_STATE["DAQ"]:
+                self._system_state = SYSTEM_STATE["DAQ"]
+                self._daq_start_time = time.perf_counter()
+                self._frames_due_total = 0
+        elif head == USB_CMD["STOP_DAQ"]:
+            self._system_state = SYSTEM_STATE["IDLE"]
+        elif head == USB_CMD["SET_PGA_GAIN"]:
+            self._pga_gain = data_low
+        elif head == USB_CMD["SET_CHANNELS"]:
+            self._channel_mask = data_low
+        elif head == USB_CMD["SET_SDO_STH"]:
+            self._sdo_driver_strength = data_low
+        elif head == USB_CMD["SET_SAMP_RATE"]:
+            if not self.sampling_rate_locked:
+                self._sampling_rate = (data_high << 8) | data_low
+        elif head == USB_CMD["SET_TEST_MODE"]:
+            self._test_mode = bool(data_low)
+        elif head == USB_CMD["SET_POWER_MODE"]:
+            self._power_mode_high = bool(data_low)
+        elif head == USB_CMD["SET_HEADER_TYPE"]:
+            self._error_header = bool(data_low)
+        elif head == USB_CMD["SHIELDING_REF"]:
+            self._shielding_reference = bool(data_low)
+        elif head == USB_CMD["POTI_SET_VALUE"]:
+            self._poti_value = data_low
+
+
+    def _generate_due_frames(self) -> None:
+        """Append all frames which are due since the start of the DAQ to the output buffer"""
+        if self._system_state != SYSTEM_STATE["DAQ"] or self._sampling_rate <= 0:
+            return
+        frames_due = int((time.perf_counter() - self._daq_start_time) * self._sampling_rate)
+        num_frames = frames_due - self._frames_due_total
+        if num_frames <= 0:
+            return
+        first_frame = self._frames_due_total
+        self._frames_due_total = frames_due
+
+        num_skipped = min(self._pending_gap, num_frames)
+        self._pending_gap -= num_skipped
+        self._counters["frames_skipped"] += num_skipped
+        frames = self._build_frames(first_frame + num_skipped, num_frames - num_skipped,
+                                    first_packet_number=(self._packet_number + num_skipped) % 256)
+        self._packet_number = (self._packet_number + num_frames) % 256
+        if not frames.size:
+            return
+
+        self._apply_pending_alerts(frames)
+        wire = frames.tobytes()
+        if self._pending_corruptions:
+            wire = self._apply_pending_corruption(wire)
+
+        free_space = self.tx_buffer_size - len(self._tx_buffer)
+        if len(wire) > free_space:
+            num_fitting = max(free_space, 0) // ADC_DATA_FRAME_DTYPE.itemsize
+            self._counters["frames_overflowed"] += frames.size - num_fitting
+            wire = wire[:num_fitting * ADC_DATA_FRAME_DTYPE.itemsize]
+        self._counters["frames_generated"] += frames.size
+        self._send(wire)
+
+
+    def _build_frames(self, first_frame: int, num_frames: int, first_packet_number: int) -> np.ndarray:
+        """Build the frames for the given range of sample positions since the start of the DAQ
+
+        Args:
+            first_frame (int): Position of the first frame since the DAQ start
+            num_frames (int): Number of frames
+            first_packet_number (int): Packet number of the first frame
+
+        Returns:
+            np.ndarray: Structured array with ADC_DATA_FRAME_DTYPE
+        """
+        frames = np.zeros(num_frames, dtype=ADC_DATA_FRAME_DTYPE)
+        if not num_frames:
+            return frames
+        sample_position = np.arange(first_frame, first_frame + num_frames, dtype=np.int64)
+        offset_us = (self._daq_start_time - self._boot_time) * 1e6
+        frames["head"] = 0xAA
+        frames["tail"] = 0xBB
+        frames["frame_id"] = 0x00
+        frames["index"] = (first_packet_number + np.arange(num_frames)) % 256
+        frames["timestamp"] = (offset_us + sample_position * (1e6 / self._sampling_rate)).astype(np.uint64)
+        frames["active_channels"] = self._channel_mask
+
+        time_sec = sample_position / self._sampling_rate
+        phase = np.arange(8) * (np.pi / 4)
+        codes = self.signal_amplitude * np.sin(2 * np.pi * self.signal_frequency_hz * time_sec[:, None] + phase[None, :])
+        if self.noise_amplitude:
+            codes += self._rng.normal(0., self.noise_amplitude, codes.shape)
+        codes = np.clip(np.rint(codes), -FULL_SCALE_CODE - 1, FULL_SCALE_CODE).astype(">i4")
+        codes[:, [(self._channel_mask >> ch) & 1 == 0 for ch in range(8)]] = 0
+        frames["channel_values"] = codes.view(np.uint8).reshape(num_frames, 8, 4)[:, :, 1:].reshape(num_frames, 24)
+        return frames
+
+
+    def _apply_pending_alerts(self, frames: np.ndarray) -> None:
+        position = 0
+        while self._pending_alerts and position < frames.size:
+            remaining, alert_byte = self._pending_alerts[0]
+            num_frames = min(remaining, frames.size - position)
+            frames["alert"][position:position + num_frames] = alert_byte
+            position += num_frames
+            if num_frames == remaining:
+                self._pending_alerts.pop(0)
+            else:
+                self._pending_alerts[0][0] -= num_frames
+
+
+    def _apply_pending_corruption(self, wire: bytes) -> bytes:
+        mode, num_bytes = self._pending_corruptions.pop(0)
+        frame_length = ADC_DATA_FRAME_DTYPE.itemsize
+        self._counters["frames_corrupted"] += 1
+        if mode == "garbage":
+            return bytes([0x55]) + wire[1:frame_length - 1] + bytes([0x55]) + wire[frame_length:]
+        return wire[:frame_length - num_bytes] + wire[frame_length:]
+
+
+class VirtualEEGSerial(SerialBase):
+    """pySerial compatible port which connects to a VirtualEEGDevice, opened with serial.serial_for_url
+
+    URL format: eegsim://[name][?sampling_rate=1000&channel_mask=255&signal_frequency_hz=10&noise_amplitude=0&seed=0]
+    A name refers to a device added with register_virtual_device, otherwise a new device is created from the options
+    """
+    _device: VirtualEEGDevice
+
+    def open(self) -> None:
+        if self._port is None:
+            raise SerialException("Port must be configured before it can be used.")
+        if self.is_open:
+            raise SerialException("Port is already open.")
+        self._device = self._device_from_url(self._port)
+        self.is_open = True
+
+
+    def close(self) -> None:
+        self.is_open = False
+
+
+    @property
+    def device(self) -> VirtualEEGDevice:
+        """Virtual device behind the port"""
+        return self._device
+
+
+    @property
+    def in_waiting(self) -> int:
+        if not self.is_open:
+            raise PortNotOpenError()
+        return self._device.in_waiting
+
+
+    def read(self, size: int = 1) -> bytes:
+        if not self.is_open:
+            raise PortNotOpenError()
+        data = bytearray()
+        deadline = None if self._timeout is None else time.perf_counter() + self._timeout
+        while len(data) < size:
+            data += self._device.read(size - len(data))
+            if len(data) >= size:
+                break
+            remaining = None if deadline is None else deadline - time.perf_counter()
+            if remaining is not None and remaining <= 0:
+                break
+            self._device.wait_for_data(remaining)
+        return bytes(data)
+
+
+    def write(self, data: bytes) -> int:
+        if not self.is_open:
+            raise PortNotOpenError()
+        return self._device.write(bytes(data))
+
+
+    def reset_input_buffer(self) -> None:
+        if not self.is_open:
+            raise PortNotOpenError()
+        self._device.clear_output()
+
+
+    def reset_output_buffer(self) -> None:
+        pass
+
+
+    def _reconfigure_port(self) -> None:
+        pass
+
+
+    @staticmethod
+    def _device_from_url(url: str) -> VirtualEEGDevice:
+        """Get the registered device or build a new device from the URL options
+
+        Args:
+            url (str): URL starting with eegsim://
+
+        Raises:
+            SerialException: If the URL is not valid
+
+        Returns:
+            VirtualEEGDevice: Device behind the URL
+        """
+        parts = urlparse(url)
+        if parts.scheme != "eegsim":
+            raise SerialException(f"Expected URL starting with eegsim://, got {url}")
+        if parts.netloc:
+            if parts.netloc not in _registered_devices:
+                raise SerialException(f"No virtual device registered with name {parts.netloc}")
+            return _registered_devices[parts.netloc]
+        options = {key: value[-1] for key, value in parse_qs(parts.query).items()}
+        converters = {"sampling_rate": int, "channel_mask": int, "signal_frequency_hz": float,
+                      "signal_amplitude": int, "noise_amplitude": int, "seed": int}
+        try:
+            kwargs = {key: converters[key](value) for key, value in options.items()}
+        except (KeyError, ValueError) as e:
+            raise SerialException(f"Invalid option in {url}: {e}")
+        return VirtualEEGDevice(**kwargs)
+
+
+class VirtualEEGPty:
+    _device: VirtualEEGDevice
+    _thread: threading.Thread
+
+    def __init__(self, device: VirtualEEGDevice) -> None:
+        """Expose a VirtualEEGDevice on a pseudo terminal, so any program can open it like the real COM port (POSIX only)
+
+        Args:
+            device (VirtualEEGDevice): Device to expose
+
+        Raises:
+            OSError: If pseudo terminals are not available on this platform
+        """
+        if os.name != "posix":
+            raise OSError("Pseudo terminals are only available on POSIX systems, use the eegsim:// URL instead")
+        import tty
+        self._device = device
+        self._master_fd, self._slave_fd = os.openpty()
+        tty.setraw(self._slave_fd)
+        os.set_blocking(self._master_fd, False)
+        self._port = os.ttyname(self._slave_fd)
+        self._running = False
+        self._thread = None
+
+
+    @property
+    def port(self) -> str:
+        """Path of the pseudo terminal, to be used as com_name"""
+        return self._port
+
+
+    @property
+    def device(self) -> VirtualEEGDevice:
+        """Virtual device behind the pseudo terminal"""
+        return self._device
+
+
+    def start(self) -> "VirtualEEGPty":
+        """Start pumping bytes between the pseudo terminal and the device"""
+        self._running = True
+        self._thread = threading.Thread(target=self._pump, name="VirtualEEGPty", daemon=True)
+        self._thread.start()
+        return self
+
+
+    def stop(self) -> None:
+        """Stop the pump and close the pseudo terminal"""
+        self._running = False
+        if self._thread is not None:
+            self._thread.join()
+        os.close(self._master_fd)
+        os.close(self._slave_fd)
+
+
+    def _pump(self) -> None:
+        import select
+        pending = b""
+        while self._running:
+            readable, _, _ = select.select([self._master_fd], [], [], 1e-3)
+            if readable:
+                self._device.write(os.read(self._master_fd, 4096))
+            if not pending:
+                pending = self._device.read(1 << 16)
+            if pending:
+                try:
+                    pending = pending[os.write(self._master_fd, pending):]
+                except BlockingIOError:
+                    pass
+
+
+_registered_devices: dict = {}
+
+
+def register_virtual_device(name: str, device: VirtualEEGDevice) -> str:
+    """Make a device reachable with the URL eegsim://<name>
+
+    Args:
+        name (str): Name of the device in the URL
+        device (VirtualEEGDevice): Device to register
+
+    Returns:
+        str: URL of the device
+    """
+    _registered_devices[name] = device
+    return f"eegsim://{name}"
+
+
+def unregister_virtual_device(name: str) -> None:
+    """Remove a device from the URL registry
+
+    Args:
+        name (str): Name of the device in the URL
+    """
+    _registered_devices.pop(name, None)
+
+
+if __package__ and __package__ not in serial.protocol_handler_packages:
+    serial.protocol_handler_packages.append(__package__)
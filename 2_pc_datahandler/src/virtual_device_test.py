@@ -0,0 +1,129 @@
+import os
+import time
+import unittest
+from unittest.mock import MagicMock
+import numpy as np
+import serial
+from src import VirtualEEGDevice, VirtualEEGPty, register_virtual_device, unregister_virtual_device
+from src import McuCommunicationHandler, SerialHandler, EEGDeviceConfig, ADC_DATA_FRAME_DTYPE
+
+
+class VirtualEEGDeviceTest(unittest.TestCase):
+    def setUp(self):
+        self._device = VirtualEEGDevice(sampling_rate=2000, seed=0)
+        self._url = register_virtual_device("unittest", self._device)
+        self._serial = serial.serial_for_url(self._url, timeout=0.2)
+        self._config = EEGDeviceConfig(com_name=self._url, measure_duration=1, adc_pga_gain=2,
+                                       channel_mask=[1,1,0,0,0,0,0,0], sdo_driver_strength=3,
+                                       adc_samplingrate=4000, test_mode_enabled=False, adc_power_mode_high=True,
+                                       error_header=False, reference_active_shielding=True, gain_instrument_amplifier=1)
+        self._handler = McuCommunicationHandler(serial_handler=self._serial, config=self._config)
+
+
+    def tearDown(self):
+        unregister_virtual_device("unittest")
+
+
+    def _read_frames(self, num_frames: int) -> np.ndarray:
+        return np.frombuffer(self._serial.read(num_frames * ADC_DATA_FRAME_DTYPE.itemsize), dtype=ADC_DATA_FRAME_DTYPE)
+
+
+    def test_command_responses(self):
+        self.assertEqual(self._handler.echo("Hello"), "Hello")
+        self.assertEqual(self._handler._get_system_state(), "IDLE")
+        self.assertEqual(self._handler.get_firmware_version(), "1.0")
+        self.assertEqual(self._handler.get_system_clock_khz(), 150000)
+        self.assertGreater(self._handler.get_runtime_sec(), 0.)
+        self.assertEqual(self._handler.error_register().channel_0_error_status_register, 0)
+
+
+    def test_daq_settings_are_applied(self):
+        self._handler.set_daq_settings()
+        self._handler.set_shielding_settings()
+        self.assertEqual(self._device.sampling_rate, 4000)
+        self.assertEqual(self._handler.get_pin_state(), "LED_USER")
+
+        self._handler.start_daq()
+        frames = self._read_frames(10)
+        self._handler.stop_daq()
+        self.assertTrue(np.all(frames["active_channels"] == 0b11))
+        self.assertTrue(np.all(frames["channel_values"][:, 6:] == 0))
+
+
+    def test_frames_are_valid_and_continuous(self):
+        self._device.lock_sampling_rate(10000)
+        self._handler.start_daq()
+        frames = self._read_frames(300)
+        self._handler.stop_daq()
+
+        self.assertEqual(frames.size, 300)
+        self.assertTrue(np.all((frames["head"] == 0xAA) & (frames["tail"] == 0xBB)))
+        self.assertTrue(np.all(np.diff(frames["index"].astype(int)) % 256 == 1))
+        np.testing.assert_allclose(np.diff(frames["timestamp"].astype(np.int64)), 100, atol=1)
+
+
+    def test_inject_gap_and_alert(self):
+        self._handler.start_daq()
+        self._device.inject_gap(5)
+        self._device.inject_alert(0b10000000, num_frames=2)
+        frames = self._read_frames(4)
+        self._handler.stop_daq()
+
+        self.assertEqual(frames["index"][0], 5)
+        self.assertEqual(frames["timestamp"][1] - frames["timestamp"][0], 500)
+        self.assertEqual(frames["alert"].tolist(), [0x80, 0x80, 0, 0])
+        self.assertEqual(self._device.counters["frames_skipped"], 5)
+
+
+    def test_inject_corrupted_frame_shifts_stream(self):
+        self._handler.start_daq()
+        self._device.inject_corrupted_frame(mode="drop_bytes", num_bytes=1)
+        raw = self._serial.read(3 * ADC_DATA_FRAME_DTYPE.itemsize)
+        self._handler.stop_daq()
+
+        self.assertEqual(raw[0], 0xAA)
+        self.assertEqual(raw[ADC_DATA_FRAME_DTYPE.itemsize - 1], 0xAA) # next frame starts one byte early
+
+
+    def test_wait_until_ready_stops_leftover_daq(self):
+        self._handler.start_daq()
+        time.sleep(0.02)
+        self._handler.wait_until_ready(timeout=2.)
+        self.assertEqual(self._device.system_state, "IDLE")
+
+
+    def test_reset_polls_until_ready(self):
+        self.assertLess(self._handler.do_reset(timeout=2.), 1.)
+        self.assertEqual(self._handler._get_system_state(), "IDLE")
+
+
+    def test_wait_until_ready_times_out(self):
+        silent = MagicMock()
+        silent.read.return_value = b""
+        handler = McuCommunicationHandler(serial_handler=silent, config=self._config)
+        with self.assertRaises(TimeoutError):
+            handler.wait_until_ready(timeout=0.1)
+
+
+    def test_serial_handler_opens_url(self):
+        connection = SerialHandler(com_name="eegsim://?sampling_rate=500", time_out=0.1).get_serial_connection
+        self.assertTrue(connection.is_open)
+        self.assertEqual(connection.device.sampling_rate, 500)
+
+
+    @unittest.skipUnless(os.name == "posix", "pseudo terminals are only available on POSIX")
+    def test_pty_exposure(self):
+        pty = VirtualEEGPty(self._device).start()
+        try:
+            connection = serial.Serial(pty.port, timeout=1)
+            handler = McuCommunicationHandler(serial_handler=connection, config=self._config)
+            self.assertEqual(handler._get_system_state(), "IDLE")
+            handler.start_daq()
+            time.sleep(0.01)
+            frames = np.frombuffer(connection.read(5 * ADC_DATA_FRAME_DTYPE.itemsize), dtype=ADC_DATA_FRAME_DTYPE)
+            handler.stop_daq()
+            connection.close()
+        finally:
+            pty.stop()
+        self.assertEqual(frames.size, 5)
+        self.assertTrue(np.all(frames["head"] == 0xAA))
@@ -0,0 +1,272 @@
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+import os
+import h5py
+import numpy as np
+from .calibration import ChannelCalibration, calibration_from_attrs
+from .data_loading import read_channel_layout, read_h5_channel_layout
+
+# Handling of windows with alert flags or gaps: leave them out or keep them with a sample mask
+WINDOW_POLICIES = ("skip", "mask")
+# Maximum number of windows per shard file
+SHARD_WINDOWS = 4096
+
+
+def export_windows(files: list, output_dir: Path, window_length: int, stride: int = None, channels: list = None,
+                   labels: dict = None, policy: str = "skip", shard_windows: int = SHARD_WINDOWS, num_workers: int = None) -> Path:
+    """Cut recordings into fixed-length windows for training and store them as memory-mappable shards. Every shard is a
+    .npy file with int32 ADC codes and shape (num_windows, window_length, num_channels). The index.npz file in the output
+    directory lists for every window its shard, row, recording, first sample and label and for every recording the
+    calibration of the exported channels, see WindowedDataset.
+
+    A window is invalid if one of its samples has an alert flag in the selected channels or if a gap lies inside of it.
+    With policy "skip" invalid windows are left out, with "mask" they are kept and an additional shard <shard>_mask.npy
+    marks the samples with alert flag and the first sample after each gap. The recordings are processed in parallel,
+    one worker per recording, and each worker reads at most shard_windows windows at once.
+
+    Args:
+        files (list): Paths to the h5 files
+        output_dir (Path): Directory for the shards and the index, created if missing
+        window_length (int): Number of samples per window
+        stride (int, optional): Number of samples between the starts of two windows, None for no overlap. Defaults to None.
+        channels (list, optional): Logical channels which are exported, channels which were not recorded are zero, None
+            for all logical channels, which requires the same number of logical channels in all recordings. Defaults to None.
+        labels (dict, optional): Label of every recording with the path as key, recordings without label get -1. Defaults to None.
+        policy (str, optional): One of WINDOW_POLICIES. Defaults to "skip".
+        shard_windows (int, optional): Maximum number of windows per shard. Defaults to SHARD_WINDOWS.
+        num_workers (int, optional): Number of worker processes, 1 exports in this process, None uses all cores. Defaults to None.
+
+    Raises:
+        ValueError: If the policy is unknown, the window length or stride is not positive or channels is None and the
+            recordings differ in their number of logical channels
+
+    Returns:
+        Path: Path of the index file
+    """
+    if policy not in WINDOW_POLICIES:
+        raise ValueError(f"Unknown window policy {policy}, use one of {WINDOW_POLICIES}")
+    stride = stride if stride is not None else window_length
+    if window_length <= 0 or stride <= 0:
+        raise ValueError("Window length and stride must be positive")
+    files = [Path(file) for file in files]
+    if channels is None:
+        # all shards and calibrations of the index share the channel axis
+        channel_counts = {file: read_h5_channel_layout(file)[1] for file in files}
+        if len(set(channel_counts.values())) > 1:
+            raise ValueError(f"Recordings differ in their number of logical channels {channel_counts}, select the exported channels")
+    output_dir = Path(output_dir)
+    output_dir.mkdir(parents=True, exist_ok=True)
+    labels = {str(Path(key)): value for key, value in (labels or {}).items()}
+    tasks = [(index, file, output_dir, window_length, stride, channels, policy, shard_windows) for index, file in enumerate(files)]
+
+    num_workers = num_workers if num_workers is not None else os.cpu_count() or 1
+    if num_workers > 1 and len(files) > 1:
+        with ProcessPoolExecutor(max_workers=min(num_workers, len(files))) as executor:
+            results = list(executor.map(_export_file_windows, *zip(*tasks)))
+    else:
+        results = [_export_file_windows(*task) for task in tasks]
+
+    shard_names = []
+    columns = {"shard": [], "row": [], "recording": [], "start": [], "label": [], "valid": []}
+    for file_index, (file_shards, _, _) in enumerate(results):
+        for name, starts, valid in file_shards:
+            columns["shard"].append(np.full(starts.size, len(shard_names), dtype=np.int32))
+            columns["row"].append(np.arange(starts.size, dtype=np.int32))
+            columns["recording"].append(np.full(starts.size, file_index, dtype=np.int32))
+            columns["start"].append(starts)
+            columns["label"].append(np.full(starts.size, labels.get(str(files[file_index]), -1), dtype=np.int64))
+            columns["valid"].append(valid)
+            shard_names.append(name)
+    index = {key: np.concatenate(values) if values else np.zeros(0, dtype=np.int64) for key, values in columns.items()}
+    index_path = output_dir / "index.npz"
+    np.savez(index_path, **index, shard_names=np.array(shard_names, dtype=str), file_names=np.array([str(file) for file in files], dtype=str),
+             sampling_rates=np.array([sampling_rate for _, sampling_rate, _ in results], dtype=np.float64),
+             scales=np.array([calibration.scale for _, _, calibration in results], dtype=np.float64),
+             offsets=np.array([calibration.offset for _, _, calibration in results], dtype=np.float64),
+             window_length=window_length, stride=stride, channels=np.array(channels if channels is not None else [], dtype=np.int64),
+             masked=policy == "mask")
+    return index_path
+
+
+def _export_file_windows(file_index: int, path: Path, output_dir: Path, window_length: int, stride: int, channels: list,
+                         policy: str, shard_windows: int) -> tuple[list, float, ChannelCalibration]:
+    """Write the windows of one recording into shards, runs in the worker processes of export_windows
+
+    Returns:
+        tuple[list, float, ChannelCalibration]: (shard name, first sample of every window, validity of every window) per
+            shard, the sampling rate and the calibration of the exported channels of the recording
+    """
+    shards = []
+    with h5py.File(path, "r") as file:
+        grp = file["ad7779_data"]
+        sampling_rate = float(grp.attrs.get("adc_samplingrate", 0.))
+        num_samples = grp["measurements"].shape[0]
+        channel_index, num_logical_channels = read_channel_layout(grp)
+        calibration = calibration_from_attrs(grp.attrs, num_logical_channels)
+        if channels is not None:
+            calibration = ChannelCalibration(calibration.scale[channels], calibration.offset[channels])
+        # stored column of every exported channel, -1 for channels which were not recorded
+        column_of_channel = np.full(num_logical_channels, -1, dtype=np.int64)
+        column_of_channel[channel_index] = np.arange(channel_index.size)
+        columns = column_of_channel if channels is None else column_of_channel[channels]
+        gap_offsets = _gap_offsets(grp)
+        starts = np.arange(0, num_samples - window_length + 1, stride, dtype=np.int64)
+        for shard_index, first in enumerate(range(0, starts.size, shard_windows)):
+            shard_starts = starts[first:first + shard_windows]
+            begin, end = int(shard_starts[0]), int(shard_starts[-1]) + window_length
+            measurements = _take_columns(grp["measurements"][begin:end], columns)
+            alerts = _take_columns(grp["alerts"][begin:end] != 0, columns)
+
+            # a window is valid without alerts and without a gap between two of its samples
+            alert_count = np.concatenate(([0], np.cumsum(alerts.any(axis=1))))
+            relative = shard_starts - begin
+            has_alert = alert_count[relative + window_length] > alert_count[relative]
+            has_gap = np.searchsorted(gap_offsets, shard_starts + window_length) > np.searchsorted(gap_offsets, shard_starts, side="right")
+            valid = ~(has_alert | has_gap)
+            keep = valid if policy == "skip" else np.ones(valid.size, dtype=bool)
+            if not keep.any():
+                continue
+
+            name = f"shard_{file_index:05d}_{shard_index:05d}"
+            windows = np.lib.stride_tricks.sliding_window_view(measurements, window_length, axis=0)[relative[keep]]
+            np.save(output_dir / f"{name}.npy", np.ascontiguousarray(windows.transpose(0, 2, 1), dtype=np.int32))
+            if policy == "mask":
+                marked = alerts.copy()
+                inside = gap_offsets[(gap_offsets >= begin) & (gap_offsets < end)] - begin
+                marked[inside] = True
+                mask = np.lib.stride_tricks.sliding_window_view(marked, window_length, axis=0)[relative[keep]]
+                np.save(output_dir / f"{name}_mask.npy", np.ascontiguousarray(mask.transpose(0, 2, 1)))
+            shards.append((name, shard_starts[keep], valid[keep]))
+    return shards, sampling_rate, calibration
+
+
+def _take_columns(values: np.ndarray, columns: np.ndarray) -> np.ndarray:
+    """Select the stored columns of the exported channels, columns of -1 are filled with zeros"""
+    if columns.size == values.shape[1] and np.array_equal(columns, np.arange(columns.size)):
+        return values
+    taken = np.zeros((values.shape[0], columns.size), dtype=values.dtype)
+    recorded = columns >= 0
+    taken[:, recorded] = values[:, columns[recorded]]
+    return taken
+
+
+def _gap_offsets(grp: h5py.Group) -> np.ndarray:
+    """Sorted offsets of the first sample after every gap, including the missing samples of merged devices"""
+    offsets = [np.zeros(0, dtype=np.int64)]
+    if "gaps" in grp:
+        offsets.append(grp["gaps"][:, 0])
+    if "device_gaps" in grp:
+        device_gaps = grp["device_gaps"][:]
+        # samples without data of a device count as gap at both ends
+        offsets += [device_gaps[:, 1], device_gaps[:, 1] + device_gaps[:, 2]]
+    return np.sort(np.concatenate(offsets).astype(np.int64))
+
+
+class WindowedDataset:
+    _shards: dict
+
+    def __init__(self, index_path: Path) -> None:
+        """Random access to the windows written by export_windows. The shards are memory-mapped on first access, so a
+        window is read from disk without decoding
+
+        Args:
+            index_path (Path): Path of the index.npz file
+        """
+        self._directory = Path(index_path).parent
+        with np.load(index_path) as index:
+            self._index = {key: index[key] for key in index.files}
+        self._shards = {}
+
+
+    # ========== API METHODS ==========
+    @property
+    def labels(self) -> np.ndarray:
+        """Label of every window"""
+        return self._index["label"]
+
+    @property
+    def valid(self) -> np.ndarray:
+        """False for windows with alert flags or gaps, only exported with the policy "mask" """
+        return self._index["valid"]
+
+    @property
+    def window_length(self) -> int:
+        """Number of samples per window"""
+        return int(self._index["window_length"])
+
+
+    def __len__(self) -> int:
+        return self._index["label"].size
+
+
+    def __getitem__(self, index: int) -> tuple[np.ndarray, int]:
+        """Window and label
+
+        Args:
+            index (int): Index of the window
+
+        Returns:
+            tuple[np.ndarray, int]: int32 ADC codes with shape (window_length, num_channels), read-only view of the shard
+                and the label of the window
+        """
+        return self._shard(int(self._index["shard"][index]))[int(self._index["row"][index])], int(self._index["label"][index])
+
+
+    def get_volts(self, index: int, dtype: np.dtype = np.float32, out: np.ndarray = None) -> np.ndarray:
+        """Window in input-referred volts, converted with the calibration of its recording straight from the shard
+
+        Args:
+            index (int): Index of the window
+            dtype (np.dtype, optional): Float type of the result. Defaults to np.float32.
+            out (np.ndarray, optional): Array of shape (window_length, num_channels) for the result, e.g. a reused batch
+                row. Defaults to None.
+
+        Raises:
+            ValueError: If the index was exported without calibration
+
+        Returns:
+            np.ndarray: Voltages with shape (window_length, num_channels)
+        """
+        if "scales" not in self._index:
+            raise ValueError("The windows were exported without calibration, export them again")
+        recording = int(self._index["recording"][index])
+        calibration = ChannelCalibration(self._index["scales"][recording], self._index["offsets"][recording])
+        return calibration.apply(self[index][0], dtype=dtype, out=out)
+
+
+    def get_mask(self, index: int) -> np.ndarray:
+        """Samples of a window with alert flag or directly after a gap
+
+        Args:
+            index (int): Index of the window
+
+        Raises:
+            ValueError: If the windows were exported without mask
+
+        Returns:
+            np.ndarray: Boolean array with shape (window_length, num_channels)
+        """
+        if not bool(self._index["masked"]):
+            raise ValueError("The windows were exported without mask, use the policy mask")
+        return self._shard(int(self._index["shard"][index]), suffix="_mask")[int(self._index["row"][index])]
+
+
+    def get_source(self, index: int) -> tuple[Path, int]:
+        """Recording and first sample of a window
+
+        Args:
+            index (int): Index of the window
+
+        Returns:
+            tuple[Path, int]: Path of the recording and index of the first sample of the window in it
+        """
+        return Path(str(self._index["file_names"][self._index["recording"][index]])), int(self._index["start"][index])
+
+
+    #  ========== INTERNAL METHODS ==========
+    def _shard(self, shard: int, suffix: str = "") -> np.ndarray:
+        """Memory-mapped shard, opened once"""
+        key = (shard, suffix)
+        if key not in self._shards:
+            self._shards[key] = np.load(self._directory / f"{self._index['shard_names'][shard]}{suffix}.npy", mmap_mode="r")
+        return self._shards[key]
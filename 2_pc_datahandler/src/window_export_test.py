@@ -0,0 +1,107 @@
+import tempfile
+import unittest
+from pathlib import Path
+import numpy as np
+from src import H5Handler, EEGDeviceConfig, EEGDeviceMetadata, PotiConfig, export_windows, WindowedDataset
+
+
+class ExportWindowsTest(unittest.TestCase):
+    def setUp(self):
+        self._tmpdir = tempfile.TemporaryDirectory()
+        self._config = config = EEGDeviceConfig(com_name="COM_TEST", measure_duration=1, adc_pga_gain=2, channel_mask=[1] * 8,
+                                 sdo_driver_strength=3, adc_samplingrate=100, test_mode_enabled=False, adc_power_mode_high=True,
+                                 error_header=False, reference_active_shielding=False, gain_instrument_amplifier=5)
+        self._metadata = metadata = EEGDeviceMetadata(waveform_generator="test", waveform_generator_frequency="10",
+                                     waveform_generator_amplitude="1", waveform_type="Sine")
+        self._poti = poti = PotiConfig(gain=5, calculated_resistor_value=12350, poti_value=32, actual_resistor_value=12500, actual_gain_value=4.95)
+        self._files = []
+        for index in range(2):
+            recording_name = str(Path(self._tmpdir.name) / f"rec{index}")
+            writer = H5Handler(recording_name=recording_name, metadata=metadata, eeg_device_config=config, poti_values=poti)
+            measurements = (np.arange(100)[:, None] * 8 + np.arange(8) + 1000 * index).astype(np.int32)
+            alerts = np.zeros((100, 8), dtype=np.int8)
+            alerts[25, 3] = 1
+            writer.append_data_ad7779(timestamps=np.arange(100) * 10000, measurements=measurements, alerts=alerts)
+            writer.append_gaps_ad7779([60], [2])
+            writer.close_h5_file()
+            self._files.append(Path(f"{recording_name}_data.h5"))
+        self._output = Path(self._tmpdir.name) / "windows"
+
+    def tearDown(self):
+        self._tmpdir.cleanup()
+
+    def test_skip_invalid_windows(self):
+        index_path = export_windows(self._files, self._output, window_length=10, stride=5, channels=[0, 3],
+                                    labels={self._files[1]: 7}, shard_windows=4, num_workers=1)
+        dataset = WindowedDataset(index_path)
+        # 19 windows per file, 2 with the alert at sample 25 and 1 across the gap at sample 60
+        self.assertEqual(len(dataset), 2 * 16)
+        self.assertTrue(dataset.valid.all())
+        self.assertEqual(list(np.unique(dataset.labels)), [-1, 7])
+        for index in range(len(dataset)):
+            window, label = dataset[index]
+            path, start = dataset.get_source(index)
+            file_index = self._files.index(path)
+            self.assertEqual(label, 7 if file_index else -1)
+            self.assertEqual(window.shape, (10, 2))
+            self.assertFalse(start < 25 < start + 10 or start < 60 < start + 10)
+            expected = (np.arange(start, start + 10)[:, None] * 8 + np.array([0, 3]) + 1000 * file_index)
+            np.testing.assert_array_equal(window, expected)
+        with self.assertRaises(ValueError):
+            dataset.get_mask(0)
+
+    def test_windows_in_volts(self):
+        index_path = export_windows(self._files, self._output, window_length=10, channels=[0, 3], num_workers=1)
+        dataset = WindowedDataset(index_path)
+        scale = 1.25 / 2 ** 23 / (2 * 4.95)
+        for index in (0, len(dataset) - 1):
+            volts = dataset.get_volts(index)
+            self.assertEqual(volts.dtype, np.float32)
+            np.testing.assert_allclose(volts, dataset[index][0] * scale, rtol=1e-6)
+        out = np.empty((10, 2))
+        self.assertIs(dataset.get_volts(0, out=out), out)
+
+    def test_mask_invalid_windows(self):
+        index_path = export_windows(self._files[:1], self._output, window_length=10, policy="mask")
+        dataset = WindowedDataset(index_path)
+        self.assertEqual(len(dataset), 10)
+        self.assertEqual(list(np.flatnonzero(~dataset.valid)), [2])
+        mask = dataset.get_mask(2)
+        self.assertEqual(mask.shape, (10, 8))
+        self.assertEqual([tuple(position) for position in np.argwhere(mask)], [(5, 3)])
+        # the window starting at the gap is continuous, only its first sample is marked
+        self.assertTrue(dataset.get_mask(6)[0].all())
+        self.assertTrue(dataset.valid[6])
+
+    def test_parallel_export_matches_serial(self):
+        serial = WindowedDataset(export_windows(self._files, self._output / "serial", window_length=16, stride=3, num_workers=1))
+        parallel = WindowedDataset(export_windows(self._files, self._output / "parallel", window_length=16, stride=3, num_workers=2))
+        self.assertEqual(len(serial), len(parallel))
+        for index in range(len(serial)):
+            np.testing.assert_array_equal(serial[index][0], parallel[index][0])
+
+    def test_invalid_policy(self):
+        with self.assertRaises(ValueError):
+            export_windows(self._files, self._output, window_length=10, policy="drop")
+
+    def test_mixed_channel_counts_need_channels(self):
+        # a merged recording of two devices has 16 logical channels
+        recording_name = str(Path(self._tmpdir.name) / "merged")
+        writer = H5Handler(recording_name=recording_name, metadata=self._metadata, eeg_device_config=self._config,
+                           poti_values=self._poti, num_channels=16, extra_attrs={"num_devices": 2})
+        writer.append_data_ad7779(timestamps=np.arange(100) * 10000, measurements=np.ones((100, 16), dtype=np.int32),
+                                  alerts=np.zeros((100, 16), dtype=np.int8))
+        writer.close_h5_file()
+        files = [self._files[0], Path(f"{recording_name}_data.h5")]
+        with self.assertRaises(ValueError):
+            export_windows(files, self._output, window_length=10, num_workers=1)
+        self.assertFalse(self._output.exists())
+
+        dataset = WindowedDataset(export_windows(files, self._output, window_length=10, channels=[0, 3], num_workers=1))
+        # 10 windows per file, the one with the alert at sample 25 is skipped
+        self.assertEqual(len(dataset), 9 + 10)
+        self.assertEqual(dataset[len(dataset) - 1][0].shape, (10, 2))
+
+
+if __name__ == "__main__":
+    unittest.main()